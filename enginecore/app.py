@@ -74,15 +74,45 @@ def run_app():
     argparser.add_argument(
         "-d", "--develop", help="Run in a development mode", action="store_true"
     )
+    argparser.add_argument(
+        "-p",
+        "--poll-redis",
+        help="Poll redis pub/sub channels on a timer instead of blocking readers",
+        action="store_true",
+    )
+
+    argparser.add_argument(
+        "--power-flow",
+        help="Compute state of the system on wallpower updates in one pass "
+        + "(steady-state solver) instead of propagating power events",
+        action="store_true",
+    )
+
+    argparser.add_argument(
+        "-w",
+        "--warm-start",
+        help="Re-use state & running agents of the assets that have not changed "
+        + "since the last start (agents are left running on exit)",
+        action="store_true",
+    )
 
     args = vars(argparser.parse_args())
 
+    if args["power_flow"]:
+        os.environ["SIMENGINE_POWER_FLOW"] = "1"
+
+    if args["warm_start"]:
+        os.environ["SIMENGINE_WARM_START"] = "1"
+
     # logging config
     configure_logger(develop=args["develop"], debug=args["verbose"])
 
     # run daemon
     StateListener(
-        engine_cls=Engine, debug=args["verbose"], force_snmp_init=args["reload_data"]
+        engine_cls=Engine,
+        debug=args["verbose"],
+        force_snmp_init=args["reload_data"],
+        poll=args["poll_redis"],
     ).run()
 
 
@@ -5,9 +5,11 @@ to db sessions and contains commonly used queries """
 # (black formatter will handle most cases):
 # pylint: disable=line-too-long
 
+import atexit
 import os
 import json
 import time
+import threading
 from enum import Enum
 
 from neo4j.v1 import GraphDatabase, basic_auth
@@ -15,25 +17,104 @@ from enginecore.tools.utils import format_as_redis_key
 import enginecore.tools.query_helpers as qh
 
 
+class DriverRegistry:
+    """Process-wide registry of neo4j drivers; drivers (and their connection pools)
+    are shared by all GraphReference instances using the same db config
+    (see NEO4J_URI, NEO4J_USR, NEO4J_PSW & NEO4J_POOL_SIZE env vars)"""
+
+    _drivers = {}
+    _lock = threading.Lock()
+    _stats = {"drivers_created": 0, "sessions_opened": 0, "queries_run": 0}
+
+    @classmethod
+    def get_driver(cls, uri=None, user=None, password=None, pool_size=None):
+        """Get driver for the db config (created on the first request)
+        Args:
+            uri(str): bolt uri, defaults to NEO4J_URI or bolt://localhost
+            user(str): db username, defaults to NEO4J_USR
+            password(str): db password, defaults to NEO4J_PSW
+            pool_size(int): max number of connections held by the driver,
+                            defaults to NEO4J_POOL_SIZE (or driver's default)
+        Returns:
+            neo4j.Driver: shared driver instance
+        """
+
+        uri = uri or os.environ.get("NEO4J_URI", "bolt://localhost")
+        user = user or os.environ.get("NEO4J_USR", "simengine")
+        password = password or os.environ.get("NEO4J_PSW", "simengine")
+        pool_size = pool_size or os.environ.get("NEO4J_POOL_SIZE")
+
+        driver_conf = {"auth": basic_auth(user, password)}
+        if pool_size:
+            driver_conf["max_connection_pool_size"] = int(pool_size)
+
+        with cls._lock:
+            driver_key = (uri, user, password)
+            if driver_key not in cls._drivers:
+                cls._drivers[driver_key] = GraphDatabase.driver(uri, **driver_conf)
+                cls._stats["drivers_created"] += 1
+
+            return cls._drivers[driver_key]
+
+    @classmethod
+    def close_all(cls):
+        """Close all the shared drivers"""
+        with cls._lock:
+            for driver in cls._drivers.values():
+                driver.close()
+            cls._drivers.clear()
+
+    @classmethod
+    def count(cls, stat_name):
+        """Increment usage counter"""
+        with cls._lock:
+            cls._stats[stat_name] += 1
+
+    @classmethod
+    def stats(cls):
+        """Usage counters (number of drivers created, sessions opened
+        & queries run)"""
+        with cls._lock:
+            return dict(cls._stats)
+
+
+# processes that don't stop the engine (e.g. cli) release connections at exit
+atexit.register(DriverRegistry.close_all)
+
+
+class CountingSession:
+    """Db session wrapper that keeps track of the queries run"""
+
+    def __init__(self, session):
+        self._session = session
+        DriverRegistry.count("sessions_opened")
+
+    def __enter__(self):
+        self._session.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._session.__exit__(exc_type, exc_value, traceback)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def run(self, statement, parameters=None, **kwparameters):
+        """Run cypher query"""
+        DriverRegistry.count("queries_run")
+        return self._session.run(statement, parameters, **kwparameters)
+
+
 class GraphReference:
     """Graph DB wrapper"""
 
-    def __init__(self):
-        self._driver = GraphDatabase.driver(
-            "bolt://localhost",
-            auth=basic_auth(
-                os.environ.get("NEO4J_USR", "simengine"),
-                os.environ.get("NEO4J_PSW", "simengine"),
-            ),
-        )
-
     def close(self):
-        """Close as db"""
-        self._driver.close()
+        """Release db resources
+        (driver is shared so it's kept open, see DriverRegistry.close_all)"""
 
     def get_session(self):
         """Get a database session"""
-        return self._driver.session()
+        return CountingSession(DriverRegistry.get_driver().session())
 
     @classmethod
     def get_parent_assets(cls, session, asset_key):
@@ -160,6 +241,37 @@ class GraphReference:
 
         return oid_info, v_specs
 
+    @classmethod
+    def get_asset_oids(cls, session, asset_key):
+        """Get all OIDs that belong to a particular asset
+        Args:
+            session: database session
+            asset_key(int): key of the asset OIDs belong to
+        Returns:
+            dict: OID names mapped to tuples of SNMP OID &
+                  optional state details (see get_asset_oid_by_name)
+        """
+
+        results = session.run(
+            """
+            MATCH (:Asset { key: $key })-[:HAS_OID]->(oid)
+            OPTIONAL MATCH (oid)-[:HAS_STATE_DETAILS]->(oid_details)
+            RETURN oid, oid_details
+            """,
+            key=asset_key,
+        )
+
+        asset_oids = {}
+        for record in results:
+            v_specs = (
+                {v: k for k, v in dict(record["oid_details"]).items()}
+                if record["oid_details"]
+                else None
+            )
+            asset_oids[record["oid"]["OIDName"]] = (record["oid"]["OID"], v_specs)
+
+        return asset_oids
+
     @classmethod
     def get_component_oid_by_name(cls, session, component_key, oid_name):
         """Get OID that is associated with a particular component
@@ -240,13 +352,16 @@ class GraphReference:
             list: list of asset details with it's 'parent' & 'children' information
         """
 
+        # parents of server PSUs are fetched in the same query
         results = session.run(
             """
             MATCH (asset:Asset) WHERE NOT (asset)<-[:HAS_COMPONENT]-(:Asset)
             OPTIONAL MATCH (asset)-[:POWERED_BY]->(p:Asset)
             OPTIONAL MATCH (asset)-[:HAS_COMPONENT]->(c) 
+            OPTIONAL MATCH (asset)-[:POWERED_BY]->(psu:Component)-[:POWERED_BY]->(psu_p)
             RETURN asset, collect(DISTINCT c) as children, 
-            collect(DISTINCT p) as parent
+            collect(DISTINCT p) as parent,
+            collect(DISTINCT [psu.key, psu_p]) as psu_parent
             """
         )
 
@@ -263,19 +378,15 @@ class GraphReference:
             if (
                 asset["type"] == "server" or asset["type"] == "serverwithbmc"
             ) and asset["parent"]:
-                keys = map(lambda x: x["key"], asset["parent"])
-                presults = session.run(
-                    """
-                    MATCH (c:Component)-[:POWERED_BY]->(parent) 
-                    WHERE c.key IN $list RETURN parent ORDER BY c.key
-                    """
-                    "",
-                    list=keys,
+                psu_parents = sorted(
+                    (
+                        (psu_key, parent)
+                        for psu_key, parent in record["psu_parent"]
+                        if parent is not None
+                    ),
+                    key=lambda x: x[0],
                 )
-
-                asset["parent"] = []
-                for presult in presults:
-                    asset["parent"].append(dict(presult["parent"]))
+                asset["parent"] = [dict(parent) for _, parent in psu_parents]
 
             ## Set asset children
             # format asset children as list of child_key: { child_info }
@@ -461,6 +572,55 @@ class GraphReference:
         )
         return list(map(lambda x: x.get("key"), results))
 
+    @classmethod
+    def get_power_connections(cls, session):
+        """All power connections between assets in the system topology
+
+        Args:
+            session: database session
+        Returns:
+            list: of (child key, parent key) tuples where child asset
+                  is powered by the parent asset
+        """
+        results = session.run(
+            """
+            MATCH (child:Asset)-[:POWERED_BY]->(parent:Asset)
+            RETURN child.key as child_key, parent.key as parent_key
+            ORDER BY child.key, parent.key
+            """
+        )
+        return [(r.get("child_key"), r.get("parent_key")) for r in results]
+
+    @classmethod
+    def get_oid_power_connections(cls, session):
+        """All OIDs that control power of assets
+        (e.g. PDU OIDs switching outlets on/off)
+
+        Args:
+            session: database session
+        Returns:
+            list: of dicts containing key of the asset OID belongs to ('owner_key'),
+                  SNMP OID ('oid'), key of the asset powered by the OID ('asset_key')
+                  and OID details in the same format as get_asset_oid_info ('info')
+        """
+        results = session.run(
+            """
+            MATCH (asset:Asset)-[:POWERED_BY]->(oid:OID)<-[:HAS_OID]-(owner:Asset)
+            MATCH (oid)-[:HAS_STATE_DETAILS]->(oid_specs)
+            RETURN owner.key as owner_key, asset.key as asset_key, oid, oid_specs
+            """
+        )
+
+        return [
+            {
+                "owner_key": r.get("owner_key"),
+                "asset_key": r.get("asset_key"),
+                "oid": r["oid"]["OID"],
+                "info": {"name": r["oid"]["OIDName"], "specs": dict(r["oid_specs"])},
+            }
+            for r in results
+        ]
+
     @classmethod
     def format_target_elements(cls, results, t_format=None):
         """Format neo4j results as target sensors"""
@@ -1119,6 +1279,78 @@ class GraphReference:
 
         return True, new_temp
 
+    @classmethod
+    def get_storage(cls, session, server_key):
+        """Retrieve all storage components of a server in one query
+        Args:
+            session:  database session
+            server_key(int): key of the server storage belongs to
+        Returns:
+            list: controllers (as 'controller') with their cachevault ('cachevault'),
+                  virtual drives ('virtual_drives') & physical drives
+                  ('physical_drives' as dicts with 'drive' & 'vdNum' keys)
+        """
+
+        results = session.run(
+            """
+            MATCH (:Asset { key: $key })-[:HAS_CONTROLLER]->(ctrl:Controller)
+            OPTIONAL MATCH (ctrl)-[:HAS_CACHEVAULT]->(cv:CacheVault)
+            WITH ctrl, cv
+            OPTIONAL MATCH (ctrl)-[:HAS_VIRTUAL_DRIVE]->(vd:VirtualDrive)
+            WITH ctrl, cv, collect(vd) as vds
+            OPTIONAL MATCH (ctrl)-[:HAS_PHYSICAL_DRIVE]->(pd:PhysicalDrive)
+            OPTIONAL MATCH (pd)-[:BELONGS_TO_VIRTUAL_SPACE]->(pd_vd:VirtualDrive)<-[:HAS_VIRTUAL_DRIVE]-(ctrl)
+            RETURN ctrl, cv, vds, collect({ drive: pd, vdNum: pd_vd.vdNum }) as pds
+            """,
+            key=server_key,
+        )
+
+        return [
+            {
+                "controller": dict(record.get("ctrl")),
+                "cachevault": dict(record.get("cv")) if record.get("cv") else None,
+                "virtual_drives": list(map(dict, record.get("vds"))),
+                "physical_drives": [
+                    {"drive": dict(pd["drive"]), "vdNum": pd["vdNum"]}
+                    for pd in record.get("pds")
+                    if pd["drive"]
+                ],
+            }
+            for record in results
+        ]
+
+    @classmethod
+    def update_storage(cls, session, server_key, updates):
+        """Write back properties of storage components (in bulk)
+        Args:
+            session:  database session
+            server_key(int): key of the server storage belongs to
+            updates(dict): component updates keyed by component label
+                           ('Controller', 'PhysicalDrive' or 'CacheVault'),
+                           each update is a dict containing controller number
+                           ('controller'), drive id ('DID', physical drives only)
+                           & new property values ('props')
+        """
+
+        component_match = {
+            "Controller": "WITH ctrl as component, update",
+            "PhysicalDrive": "MATCH (ctrl)-[:HAS_PHYSICAL_DRIVE]->(component:PhysicalDrive { DID: update.DID })",
+            "CacheVault": "MATCH (ctrl)-[:HAS_CACHEVAULT]->(component:CacheVault)",
+        }
+
+        for label, component_updates in updates.items():
+            if not component_updates:
+                continue
+
+            query = [
+                "UNWIND $updates as update",
+                "MATCH (:Asset { key: $key })-[:HAS_CONTROLLER]->(ctrl:Controller { controllerNum: update.controller })",
+                component_match[label],
+                "SET component += update.props",
+            ]
+
+            session.run("\n".join(query), key=server_key, updates=component_updates)
+
     @classmethod
     def get_all_hd_thermal_elements(cls, session, server_key):
         """Retrieve all storage components that support temperature sensors"""
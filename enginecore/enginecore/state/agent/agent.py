@@ -1,16 +1,74 @@
 """Interface for 3-rd party programs managed by the assets (e.g. ipmi_sim, snmpsimd)"""
 import atexit
+import logging
 import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ExternalProcess:
+    """Process started by a previous engine run (not a child of this process);
+    mimics subset of Popen interface used by the agents"""
+
+    def __init__(self, pid):
+        self.pid = pid
+
+    @classmethod
+    def find(cls, pid, cmd_name):
+        """Find running process
+        Args:
+            pid(int): process id
+            cmd_name(str): program that is expected to run under this pid
+        Returns:
+            ExternalProcess: None if there's no such process
+        """
+        try:
+            with open("/proc/{}/cmdline".format(pid), "rb") as cmd_handler:
+                cmdline = cmd_handler.read().decode(errors="replace")
+        except OSError:
+            return None
+
+        return cls(pid) if cmd_name in cmdline else None
+
+    def poll(self):
+        """Returns None if process is still running"""
+        return None if os.path.exists("/proc/" + str(self.pid)) else 0
+
+    def terminate(self):
+        """Send SIGTERM to the process"""
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def wait(self, timeout=5):
+        """Wait for process termination"""
+        deadline = time.time() + timeout
+        while self.poll() is None and time.time() < deadline:
+            time.sleep(0.05)
 
 
 class Agent:
     """Abstract Agent Class"""
 
     agent_num = 1
+    _agent_num_lock = threading.Lock()
+
+    # name of the program run by the agent
+    process_name = None
+    # agent processes can be re-used by the next engine run (warm start)
+    adoptable = False
 
     def __init__(self):
         self._process = None
-        Agent.agent_num += 1
+
+        # agents can be created concurrently (see Engine.reload_model)
+        with Agent._agent_num_lock:
+            Agent.agent_num += 1
+            self.agent_num = Agent.agent_num
 
     @property
     def pid(self):
@@ -32,13 +90,29 @@ class Agent:
         """Logic for starting up the agent"""
         raise NotImplementedError
 
+    @classmethod
+    def stop_stale_agent(cls, pid):
+        """Terminate agent process left running by the previous engine run
+        Args:
+            pid(int): process id recorded by the previous run
+        """
+        process = ExternalProcess.find(pid, cls.process_name)
+        if process:
+            logger.info("Stopping stale agent: %s", pid)
+            process.terminate()
+            process.wait()
+
     def register_process(self, process):
         """Set process instance
         Args:
             process(Popen): process to be managed
         """
         self._process = process
-        atexit.register(self.stop_agent)
+
+        # adoptable agents outlive the engine in warm-start mode
+        # (they are re-used by the next engine run)
+        if not self.adoptable or os.environ.get("SIMENGINE_WARM_START") != "1":
+            atexit.register(self.stop_agent)
 
     def __str__(self):
         agent_msg = "is {}running".format("" if self.process_running() else "not ")
@@ -6,7 +6,13 @@ import os
 import subprocess
 import logging
 from distutils import dir_util
+import glob
+import hashlib
+import json
+import shutil
 import sysconfig
+import tempfile
+import threading
 
 from string import Template
 
@@ -16,11 +22,112 @@ from enginecore.state.agent.agent import Agent
 logger = logging.getLogger(__name__)
 
 
+class CompiledSDRCache:
+    """Content-addressed store of compiled SDRs (sdrcomp output);
+    BMCs sharing the same sensor layout re-use one compilation"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    sdr_filename = "sdr.main"
+
+    def __init__(self, cache_dir, templ_dir):
+        """
+        Args:
+            cache_dir(str): location of the compiled SDRs
+            templ_dir(str): ipmi template directory containing .sdrs includes
+        """
+        self._cache_dir = cache_dir
+        self._templ_dir = templ_dir
+        self._templ_digest = None
+
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @classmethod
+    def shared(cls):
+        """Cache instance shared by all the ipmi agents"""
+        with cls._shared_lock:
+            if not cls._shared:
+                cls._shared = cls(
+                    os.environ.get(
+                        "SIMENGINE_SDR_CACHE",
+                        os.path.join(tempfile.gettempdir(), "simengine-sdr-cache"),
+                    ),
+                    os.environ.get("SIMENGINE_IPMI_TEMPL"),
+                )
+
+            return cls._shared
+
+    def _template_digest(self):
+        """Hash of the .sdrs template files (computed once)"""
+        with self._lock:
+            if self._templ_digest is None:
+                digest = hashlib.sha1()
+                for sdrs_path in sorted(
+                    glob.glob(os.path.join(self._templ_dir, "*.sdrs"))
+                ):
+                    digest.update(os.path.basename(sdrs_path).encode())
+                    with open(sdrs_path, "rb") as sdrs_handler:
+                        digest.update(sdrs_handler.read())
+                self._templ_digest = digest.hexdigest()
+
+            return self._templ_digest
+
+    def key(self, bmc_address, sdrs_opt):
+        """Cache key for sensor definitions
+        Args:
+            bmc_address(str): baseboard address
+            sdrs_opt(dict): options populating .sdrs templates
+                            (must not contain server-specific paths)
+        Returns:
+            str: hex digest identifying compiled SDRs
+        """
+        digest = hashlib.sha1(self._template_digest().encode())
+        digest.update(bmc_address.encode())
+        digest.update(json.dumps(sdrs_opt, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        """Location of the cached SDRs"""
+        return os.path.join(self._cache_dir, key, self.sdr_filename)
+
+    def lock(self, key):
+        """Lock guarding compilation of the SDRs with this key
+        (so that identical sensor layouts are compiled only once)"""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def fetch(self, key, dest_path):
+        """Copy cached SDRs to the destination
+        Returns:
+            bool: True if SDRs were found in the cache
+        """
+        if not os.path.exists(self.path(key)):
+            return False
+
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        shutil.copyfile(self.path(key), dest_path)
+        return True
+
+    def store(self, key, src_path):
+        """Add compiled SDRs to the cache"""
+        cached_path = self.path(key)
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+
+        # other engine processes may be reading the cache
+        tmp_path = "{}.{}.tmp".format(cached_path, os.getpid())
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, cached_path)
+
+
 class IPMIAgent(Agent):
     """Python wrapper managing ipmi_sim program that takes
     SensorRepository & translates it into ipmi_sim sensor definitions.
     """
 
+    process_name = "ipmi_sim"
+
     supported_sensors = dict.fromkeys(SUPPORTED_SENSORS, "")
     lan_conf_attributes = [
         "host",
@@ -137,13 +244,24 @@ class IPMIAgent(Agent):
                 os.path.join(self._ipmi_dir, "main_dual_psu.sdrs")
             )
 
+        # identical sensor layouts produce identical SDRs
+        self._sdr_key = CompiledSDRCache.shared().key(
+            self._bmc_address,
+            {k: v.replace(self._ipmi_dir, "") for k, v in sdrs_opt.items()},
+        )
+
         # populate templates with options
         self._substitute_template_file(self.lan_conf_path, lan_conf_opt)
         self._substitute_template_file(self.ipmisim_emu_path, ipmisim_emu_opt)
         self._substitute_template_file(self.sensor_def_path, sdrs_opt)
 
     def _init_ipmi_dir(self):
-        """Copy clean template files to the working ipmi directory"""
+        """Copy clean template files to the working ipmi directory
+        (emulator state left by the previous engine run is removed
+        since the directory is kept between warm restarts)"""
+
+        shutil.rmtree(self.emu_state_dir_path, ignore_errors=True)
+        os.makedirs(self._ipmi_dir, exist_ok=True)
 
         # a workaround: https://stackoverflow.com/a/28055993
         # pylint: disable=W0212
@@ -153,8 +271,21 @@ class IPMIAgent(Agent):
         dir_util.copy_tree(os.environ.get("SIMENGINE_IPMI_TEMPL"), self._ipmi_dir)
 
     def _compile_sensors(self):
-        """Compile SDRs sensor definitions"""
-        os.system("sdrcomp -o {} {}".format(self.sdr_main_path, self.sensor_def_path))
+        """Compile SDRs sensor definitions
+        (or re-use SDRs compiled for a server with the same sensors)"""
+        sdr_cache = CompiledSDRCache.shared()
+
+        with sdr_cache.lock(self._sdr_key):
+            if sdr_cache.fetch(self._sdr_key, self.sdr_main_path):
+                logger.debug("Using cached SDRs: %s", sdr_cache.path(self._sdr_key))
+                return
+
+            exit_status = os.system(
+                "sdrcomp -o {} {}".format(self.sdr_main_path, self.sensor_def_path)
+            )
+
+            if exit_status == 0:
+                sdr_cache.store(self._sdr_key, self.sdr_main_path)
 
     def _update_permissions(self):
         """Update recursively"""
@@ -6,7 +6,7 @@ import os
 import logging
 import pwd
 import grp
-from enginecore.state.agent.agent import Agent
+from enginecore.state.agent.agent import Agent, ExternalProcess
 
 logger = logging.getLogger(__name__)
 
@@ -17,15 +17,33 @@ class SNMPAgent(Agent):
     and manages simulator instance.
     """
 
-    def __init__(self, asset_key, snmp_conf):
+    process_name = "snmpsimd"
+    adoptable = True
+
+    def __init__(self, asset_key, snmp_conf, running_pid=None):
+        """
+        Args:
+            asset_key(int): key of the SNMP device
+            snmp_conf(dict): snmp configurations of the device
+            running_pid(int): adopt snmpsimd process started by the previous
+                              engine run instead of launching a new one
+        """
         super(SNMPAgent, self).__init__()
 
         self._asset_key = asset_key
         self._snmp_conf = snmp_conf
 
         self._init_agent_environment()
-        self._init_snmprec_files()
 
+        process = (
+            ExternalProcess.find(running_pid, self.process_name) if running_pid else None
+        )
+        if process:
+            logger.info("Adopting running agent: %s", running_pid)
+            self.register_process(process)
+            return
+
+        self._init_snmprec_files()
         self.start_agent()
 
     def _init_agent_environment(self):
@@ -65,10 +83,10 @@ class SNMPAgent(Agent):
             lookup_oid, self._asset_key, redis_script_sha
         )
 
-        with open(rec_public_path, "a") as pub:
+        with open(rec_public_path, "w") as pub:
             pub.write(snmpsim_config)
 
-        with open(rec_private_path, "a") as priv:
+        with open(rec_private_path, "w") as priv:
             priv.write(snmpsim_config)
 
     def start_agent(self):
@@ -85,7 +103,7 @@ class SNMPAgent(Agent):
             "--variation-module-options=" + var_opt,
             "--data-dir=" + self._snmp_rec_dir,
             "--cache-dir=" + self._snmp_rec_dir,
-            "--transport-id-offset=" + str(SNMPAgent.agent_num),
+            "--transport-id-offset=" + str(self.agent_num),
             "--logging-method=file:" + self.log_path,
         ]
 
@@ -3,22 +3,74 @@
 
 import os
 import logging
+import threading
 import time
+from collections import namedtuple
 from distutils import dir_util
-import select
 
-import json
-import socket
-import threading
 import copy
+import shutil
 from string import Template
 
+import redis
+
 from enginecore.model.graph_reference import GraphReference
+from enginecore.state.net.framed_server import FramedJSONServer
+from enginecore.state.storage_model import StorageModel
 from enginecore.tools.query_helpers import to_camelcase
+from enginecore.tools.utils import format_storage_version_key
 
 logger = logging.getLogger(__name__)
 
 
+class StorCLIOutputCache:
+    """Rendered storcli64 replies; an entry is served for as long as
+    storage version it was rendered at is current (and it has not expired)
+    """
+
+    Entry = namedtuple("Entry", "version reply expires")
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, command, version):
+        """Look up cached reply
+        Args:
+            command(tuple): storcli64 command line arguments
+            version(tuple): current version of the storage command queries
+        Returns:
+            dict: cached reply, None if there is no valid entry
+        """
+        with self._lock:
+            entry = self._entries.get(command)
+
+        if not entry or entry.version != version:
+            return None
+
+        if entry.expires is not None and time.time() >= entry.expires:
+            return None
+
+        return entry.reply
+
+    def put(self, command, version, reply, expires=None):
+        """Cache rendered reply
+        Args:
+            command(tuple): storcli64 command line arguments
+            version(tuple): version of the storage reply was rendered at
+            reply(dict): command output
+            expires(float): timestamp after which output becomes stale
+                            (e.g. once a drive finishes rebuilding)
+        """
+        with self._lock:
+            self._entries[command] = StorCLIOutputCache.Entry(version, reply, expires)
+
+    def clear(self):
+        """Drop all the entries"""
+        with self._lock:
+            self._entries.clear()
+
+
 class StorCLIEmulator:
     """This component emulates storcli behaviour
     - runs a websocket server that listens to any incoming commands from a vm
@@ -71,139 +123,161 @@ class StorCLIEmulator:
         "TR",  # transport ready
     ]
 
+    # number of storcli64 commands rendered concurrently
+    num_workers = 4
+
+    # dates are substituted when cached 'show all' output is served
+    date_placeholder = "\0storcli-date\0"
+    date_format = "%m/%d/%Y, %H:%M:%S"
+
     def __init__(self, asset_key, server_dir, socket_port):
         self._graph_ref = GraphReference()
         self._server_key = asset_key
-        self._serversocket = None
+        self._server = None
 
         with self._graph_ref.get_session() as session:
             self._storcli_details = GraphReference.get_storcli_details(
                 session, asset_key
             )
 
+        # storage components are queried in memory
+        self._storage = StorageModel.for_server(asset_key)
+        self._storage.load()
+
         self._storcli_dir = os.path.join(server_dir, "storcli")
 
-        os.makedirs(self._storcli_dir)
-        dir_util.copy_tree(os.environ.get("SIMENGINE_STORCLI_TEMPL"), self._storcli_dir)
+        self._init_storcli_dir()
+        self._templates = self._load_templates()
+
+        # replies are re-rendered only when storage gets updated
+        self._redis_store = redis.StrictRedis(host="localhost", port=6379)
+        self._output_cache = StorCLIOutputCache()
+        self._render_ctx = threading.local()
 
         self.start_server(asset_key, socket_port)
 
-    def start_server(self, asset_key, socket_port):
-        """Launch storcli thread"""
+    def _init_storcli_dir(self):
+        """Copy clean template files to the storcli work directory
+        (directory is kept between warm restarts, files rendered
+        by the previous engine run are removed)"""
+
+        shutil.rmtree(self._storcli_dir, ignore_errors=True)
+        os.makedirs(self._storcli_dir, exist_ok=True)
+
+        # a workaround: https://stackoverflow.com/a/28055993
+        # pylint: disable=W0212
+        dir_util._path_created = {}
+        # pylint: enable=W0212
+
+        dir_util.copy_tree(os.environ.get("SIMENGINE_STORCLI_TEMPL"), self._storcli_dir)
+
+    def _load_templates(self):
+        """Read & compile output templates once
+        Returns:
+            dict: templates keyed by their file names
+        """
+        templates = {}
+        for templ_name in os.listdir(self._storcli_dir):
+            templ_path = os.path.join(self._storcli_dir, templ_name)
+            if not os.path.isfile(templ_path):
+                continue
 
-        self._stop_event = threading.Event()
+            with open(templ_path) as templ_h:
+                templates[templ_name] = Template(templ_h.read())
 
-        self._socket_t = threading.Thread(
-            target=self._listen_cmds,
-            args=(socket_port,),
+        return templates
+
+    def start_server(self, asset_key, socket_port):
+        """Launch storcli server (commands are served by a pool of workers
+        so that multiple storcli64 clients can be connected at once)"""
+
+        self._server = FramedJSONServer(
+            socket_port,
+            self._handle_request,
+            self._handle_error,
+            num_workers=self.num_workers,
             name="storcli64:{}".format(asset_key),
         )
-
-        self._socket_t.daemon = True
-        self._socket_t.start()
+        self._server.start()
 
     def stop_server(self):
         """Stop"""
-        self._stop_event.set()
-        self._serversocket.close()
+        self._server.stop()
 
     # *** Responses to cli commands ***
     def _strcli_header(self, ctrl_num=0, status="Success", description="None"):
         """Reusable header for storcli output
         (this appears at the top of most CLI outputs)"""
 
-        with open(os.path.join(self._storcli_dir, "header")) as templ_h:
-            options = {
-                "cli_version": self._storcli_details["CLIVersion"],
-                "op_sys": self._storcli_details["operatingSystem"],
-                "status": status,
-                "description": description,
-                "controller_line": "Controller = {}\n".format(ctrl_num)
-                if ctrl_num
-                else "Status Code = 0\n",
-            }
+        options = {
+            "cli_version": self._storcli_details["CLIVersion"],
+            "op_sys": self._storcli_details["operatingSystem"],
+            "status": status,
+            "description": description,
+            "controller_line": "Controller = {}\n".format(ctrl_num)
+            if ctrl_num
+            else "Status Code = 0\n",
+        }
 
-            template = Template(templ_h.read())
-            return template.substitute(options)
+        return self._templates["header"].substitute(options)
 
     def _strcli_ctrlcount(self):
         """Number of adapters per server"""
 
-        template_f_path = os.path.join(self._storcli_dir, "adapter_count")
-        with open(template_f_path) as templ_h, self._graph_ref.get_session() as session:
-            options = {
-                "header": self._strcli_header(),
-                "ctrl_count": GraphReference.get_controller_count(
-                    session, self._server_key
-                ),
-            }
+        options = {
+            "header": self._strcli_header(),
+            "ctrl_count": self._storage.get_controller_count(),
+        }
 
-            template = Template(templ_h.read())
-            return template.substitute(options)
+        return self._templates["adapter_count"].substitute(options)
 
     def _strcli_ctrl_perf_mode(self, controller_num):
         """Current performance mode (hardcoded)"""
-        with open(os.path.join(self._storcli_dir, "performance_mode")) as templ_h:
-            options = {
-                "header": self._strcli_header(controller_num),
-                "mode_num": 0,
-                "mode_description": "tuned to provide Best IOPS",
-            }
+        options = {
+            "header": self._strcli_header(controller_num),
+            "mode_num": 0,
+            "mode_description": "tuned to provide Best IOPS",
+        }
 
-            template = Template(templ_h.read())
-            return template.substitute(options)
+        return self._templates["performance_mode"].substitute(options)
 
     def _strcli_ctrl_alarm_state(self, controller_num):
         """Get controller alarm state"""
 
-        alarm_state_f_path = os.path.join(self._storcli_dir, "alarm_state")
-        with open(
-            alarm_state_f_path
-        ) as templ_h, self._graph_ref.get_session() as session:
-            ctrl_info = GraphReference.get_controller_details(
-                session, self._server_key, controller_num
-            )
+        ctrl_info = self._storage.get_controller_details(controller_num)
 
-            options = {
-                "header": self._strcli_header(controller_num),
-                "alarm_state": ctrl_info["alarmState"],
-            }
+        options = {
+            "header": self._strcli_header(controller_num),
+            "alarm_state": ctrl_info["alarmState"],
+        }
 
-            template = Template(templ_h.read())
-            return template.substitute(options)
+        return self._templates["alarm_state"].substitute(options)
 
     def _strcli_ctrl_bbu(self, controller_num):
         """Battery backup unit output for storcli"""
 
-        with open(os.path.join(self._storcli_dir, "bbu_data")) as templ_h:
-            options = {
-                "header": self._strcli_header(controller_num, "Failure"),
-                "ctrl_num": controller_num,
-                "status": "Failed",
-                "property": "-",
-                "err_msg": "use /cx/cv",
-                "err_code": 255,
-            }
+        options = {
+            "header": self._strcli_header(controller_num, "Failure"),
+            "ctrl_num": controller_num,
+            "status": "Failed",
+            "property": "-",
+            "err_msg": "use /cx/cv",
+            "err_code": 255,
+        }
 
-            template = Template(templ_h.read())
-            return template.substitute(options)
+        return self._templates["bbu_data"].substitute(options)
 
     def _get_rate_prop(self, controller_num, rate_type):
         """Get controller rate property
         (rate type matches rate template file and the rate template value)"""
 
-        rate_file = os.path.join(self._storcli_dir, rate_type)
-        with open(rate_file) as templ_h, self._graph_ref.get_session() as session:
-            ctrl_info = GraphReference.get_controller_details(
-                session, self._server_key, controller_num
-            )
+        ctrl_info = self._storage.get_controller_details(controller_num)
 
-            options = {}
-            options["header"] = self._strcli_header(controller_num)
-            options[rate_type] = ctrl_info[to_camelcase(rate_type)]
+        options = {}
+        options["header"] = self._strcli_header(controller_num)
+        options[rate_type] = ctrl_info[to_camelcase(rate_type)]
 
-            template = Template(templ_h.read())
-            return template.substitute(options)
+        return self._templates[rate_type].substitute(options)
 
     def _check_vd_state(self, vd_state, physical_drives):
         """Determine status of the virtual drive based on the physical drives' states
@@ -226,6 +300,16 @@ class StorCLIEmulator:
             if p_drive["State"] == "Offln" or pd_rebuilding:
                 vd_state["numPdOffline"] += 1
 
+            if pd_rebuilding:
+                # output changes once the drive is rebuilt
+                self._expire_at(p_drive["timeStamp"] + p_drive["rebuildTime"])
+
+    def _expire_at(self, timestamp):
+        """Mark output being rendered as stale past the timestamp"""
+        expires = getattr(self._render_ctx, "expires", None)
+        if expires is None or timestamp < expires:
+            self._render_ctx.expires = timestamp
+
     def _format_pd_for_output(self, physical_drives):
         """Update a table of physical drives so it is formatted as storcli output"""
 
@@ -236,204 +320,180 @@ class StorCLIEmulator:
     def _strcli_ctrl_info(self, controller_num):
         """Return aggregated information for a particular controller (show all)"""
 
-        ctrl_info_f = os.path.join(self._storcli_dir, "controller_info")
-        ctrl_entry_f = os.path.join(self._storcli_dir, "controller_entry")
-
-        with open(ctrl_info_f) as info_h, open(
-            ctrl_entry_f
-        ) as entry_h, self._graph_ref.get_session() as session:
-            ctrl_info = GraphReference.get_controller_details(
-                session, self._server_key, controller_num
-            )
+        ctrl_info = self._storage.get_controller_details(controller_num)
+
+        topology_defaults = {
+            "DG": 0,
+            "Arr": "-",
+            "Row": "-",
+            "EID:Slot": "-",
+            "DID": "-",
+            "BT": "N",
+            "PDC": "dsbl",
+            "PI": "N",
+            "SED": "N",
+            "DS3": "none",
+            "FSpace": "N",
+            "TR": "N",
+        }
 
-            topology_defaults = {
-                "DG": 0,
-                "Arr": "-",
-                "Row": "-",
-                "EID:Slot": "-",
-                "DID": "-",
-                "BT": "N",
-                "PDC": "dsbl",
-                "PI": "N",
-                "SED": "N",
-                "DS3": "none",
-                "FSpace": "N",
-                "TR": "N",
-            }
+        # templated keys
+        ctrl_info_templ_keys = [
+            "serial_number",
+            "model",
+            "serial_number",
+            "mfg_date",
+            "SAS_address",
+            "PCI_address",
+            "rework_date",
+            "memory_correctable_errors",
+            "memory_uncorrectable_errors",
+            "rebuild_rate",
+            "pr_rate",
+            "bgi_rate",
+            "cc_rate",
+        ]
+
+        entry_options = {
+            "controller_num": controller_num,
+            "drive_groups_num": ctrl_info["numDriveGroups"],
+            "controller_date": StorCLIEmulator.date_placeholder,
+            "system_date": StorCLIEmulator.date_placeholder,
+            "status": "Optimal",
+        }
 
-            # templated keys
-            ctrl_info_templ_keys = [
-                "serial_number",
-                "model",
-                "serial_number",
-                "mfg_date",
-                "SAS_address",
-                "PCI_address",
-                "rework_date",
-                "memory_correctable_errors",
-                "memory_uncorrectable_errors",
-                "rebuild_rate",
-                "pr_rate",
-                "bgi_rate",
-                "cc_rate",
-            ]
+        # copy over controller details
+        for key in ctrl_info_templ_keys:
+            entry_options[key] = ctrl_info[to_camelcase(key)]
 
-            entry_options = {
-                "controller_num": controller_num,
-                "drive_groups_num": ctrl_info["numDriveGroups"],
-                "controller_date": time.strftime(
-                    "%m/%d/%Y, %H:%M:%S",
-                ),
-                "system_date": time.strftime("%m/%d/%Y, %H:%M:%S"),
-                "status": "Optimal",
-            }
+        # keep track of the issues associated with the controller
+        ctrl_state = copy.deepcopy(
+            self._storcli_details["stateConfig"]["controller"]["Optimal"]
+        )
+        ctrl_state["memoryCorrectableErrors"] = ctrl_info["memoryCorrectableErrors"]
+        ctrl_state["memoryUncorrectableErrors"] = ctrl_info["memoryUncorrectableErrors"]
 
-            # copy over controller details
-            for key in ctrl_info_templ_keys:
-                entry_options[key] = ctrl_info[to_camelcase(key)]
+        drives = self._storage.get_all_drives(controller_num)
 
-            # keep track of the issues associated with the controller
-            ctrl_state = copy.deepcopy(
-                self._storcli_details["stateConfig"]["controller"]["Optimal"]
-            )
-            ctrl_state["memoryCorrectableErrors"] = ctrl_info["memoryCorrectableErrors"]
-            ctrl_state["memoryUncorrectableErrors"] = ctrl_info[
-                "memoryUncorrectableErrors"
-            ]
+        # Add physical drive output (do some formatting plus check pd states)
+        drives["pd"].sort(key=lambda k: k["slotNum"])
+        topology = []
 
-            drives = GraphReference.get_all_drives(
-                session, self._server_key, controller_num
+        # analyze and format virtual drive output
+        for i, v_drive in enumerate(drives["vd"]):
+            vd_state = copy.deepcopy(
+                self._storcli_details["stateConfig"]["virtualDrive"]["Optl"]
             )
 
-            # Add physical drive output (do some formatting plus check pd states)
-            drives["pd"].sort(key=lambda k: k["slotNum"])
-            topology = []
-
-            # analyze and format virtual drive output
-            for i, v_drive in enumerate(drives["vd"]):
-                vd_state = copy.deepcopy(
-                    self._storcli_details["stateConfig"]["virtualDrive"]["Optl"]
-                )
+            # Add Virtual Drive output
+            v_drive["DG/VD"] = str(v_drive["DG"]) + "/" + str(i)
+            v_drive["Size"] = str(v_drive["Size"]) + " GB"
 
-                # Add Virtual Drive output
-                v_drive["DG/VD"] = str(v_drive["DG"]) + "/" + str(i)
-                v_drive["Size"] = str(v_drive["Size"]) + " GB"
+            # check pd states & determine virtual drive health status
+            self._check_vd_state(vd_state, drives["pd"])
+            v_drive["State"] = self._get_state_from_config(
+                "virtualDrive", vd_state, "Optl"
+            )
 
-                # check pd states & determine virtual drive health status
-                self._check_vd_state(vd_state, drives["pd"])
-                v_drive["State"] = self._get_state_from_config(
-                    "virtualDrive", vd_state, "Optl"
-                )
+            if v_drive["State"] != "Optl":
+                ctrl_state["vdDgd"] += 1
 
-                if v_drive["State"] != "Optl":
-                    ctrl_state["vdDgd"] += 1
-
-                topology.extend(
-                    [
-                        {
-                            **topology_defaults,
-                            **{
-                                "DG": v_drive["DG"],
-                                "Type": v_drive["TYPE"],
-                                "State": v_drive["State"],
-                                "Size": v_drive["Size"],
-                            },
+            topology.extend(
+                [
+                    {
+                        **topology_defaults,
+                        **{
+                            "DG": v_drive["DG"],
+                            "Type": v_drive["TYPE"],
+                            "State": v_drive["State"],
+                            "Size": v_drive["Size"],
+                        },
+                    },
+                    {
+                        **topology_defaults,
+                        **{
+                            "Arr": 0,
+                            "DG": v_drive["DG"],
+                            "Type": v_drive["TYPE"],
+                            "State": v_drive["State"],
+                            "Size": v_drive["Size"],
                         },
-                        {
-                            **topology_defaults,
-                            **{
-                                "Arr": 0,
-                                "DG": v_drive["DG"],
-                                "Type": v_drive["TYPE"],
-                                "State": v_drive["State"],
-                                "Size": v_drive["Size"],
-                            },
+                    },
+                ]
+            )
+
+            self._format_pd_for_output(v_drive["pd"])
+            for pdid, pd in enumerate(v_drive["pd"]):
+                topology.append(
+                    {
+                        **topology_defaults,
+                        **{
+                            "Arr": 0,
+                            "DG": v_drive["DG"],
+                            "Row": pdid,
+                            "EID:Slot": pd["EID:Slt"],
+                            "DID": pd["DID"],
+                            "Type": "DRIVE",
+                            "State": pd["State"],
+                            "Size": pd["Size"],
+                            "FSpace": "-",
                         },
-                    ]
+                    }
                 )
 
-                self._format_pd_for_output(v_drive["pd"])
-                for pdid, pd in enumerate(v_drive["pd"]):
-                    topology.append(
-                        {
-                            **topology_defaults,
-                            **{
-                                "Arr": 0,
-                                "DG": v_drive["DG"],
-                                "Row": pdid,
-                                "EID:Slot": pd["EID:Slt"],
-                                "DID": pd["DID"],
-                                "Type": "DRIVE",
-                                "State": pd["State"],
-                                "Size": pd["Size"],
-                                "FSpace": "-",
-                            },
-                        }
-                    )
-
-            self._format_pd_for_output(drives["pd"])
-
-            # determine overall controller status
-            entry_options["status"] = self._get_state_from_config(
-                "controller", ctrl_state, "Optimal"
-            )
+        self._format_pd_for_output(drives["pd"])
 
-            # get cachevault details:
-            cv_info = GraphReference.get_cachevault(
-                session, self._server_key, controller_num
-            )
-            cv_table = {
-                "Model": cv_info["model"],
-                "State": cv_info["state"],
-                "Temp": str(cv_info["temperature"]) + "C",
-                "Mode": "-",
-                "MfgDate": cv_info["mfgDate"],
-            }
+        # determine overall controller status
+        entry_options["status"] = self._get_state_from_config(
+            "controller", ctrl_state, "Optimal"
+        )
 
-            return Template(info_h.read()).substitute(
-                {
-                    "header": self._strcli_header(controller_num),
-                    "controller_entry": Template(entry_h.read()).substitute(
-                        entry_options
-                    ),
-                    "num_virt_drives": len(drives["vd"]),
-                    "num_phys_drives": len(drives["pd"]),
-                    "topology": self._format_as_table(
-                        StorCLIEmulator.topology_header, topology
-                    ),
-                    "virtual_drives": self._format_as_table(
-                        StorCLIEmulator.vd_header, drives["vd"]
-                    ),
-                    "physical_drives": self._format_as_table(
-                        StorCLIEmulator.pd_header, drives["pd"]
-                    ),
-                    "cachevault": self._format_as_table(cv_table.keys(), [cv_table]),
-                }
-            )
+        # get cachevault details:
+        cv_info = self._storage.get_cachevault(controller_num)
+        cv_table = {
+            "Model": cv_info["model"],
+            "State": cv_info["state"],
+            "Temp": str(cv_info["temperature"]) + "C",
+            "Mode": "-",
+            "MfgDate": cv_info["mfgDate"],
+        }
+
+        return self._templates["controller_info"].substitute(
+            {
+                "header": self._strcli_header(controller_num),
+                "controller_entry": self._templates["controller_entry"].substitute(
+                    entry_options
+                ),
+                "num_virt_drives": len(drives["vd"]),
+                "num_phys_drives": len(drives["pd"]),
+                "topology": self._format_as_table(
+                    StorCLIEmulator.topology_header, topology
+                ),
+                "virtual_drives": self._format_as_table(
+                    StorCLIEmulator.vd_header, drives["vd"]
+                ),
+                "physical_drives": self._format_as_table(
+                    StorCLIEmulator.pd_header, drives["pd"]
+                ),
+                "cachevault": self._format_as_table(cv_table.keys(), [cv_table]),
+            }
+        )
 
     def _strcli_ctrl_cachevault(self, controller_num):
         """Cachevault output for storcli"""
 
-        cv_f = os.path.join(self._storcli_dir, "cachevault_data")
-        with open(
-            os.path.join(self._storcli_dir, cv_f)
-        ) as templ_h, self._graph_ref.get_session() as session:
-            cv_info = GraphReference.get_cachevault(
-                session, self._server_key, controller_num
-            )
-            cv_info["mfgDate"] = "/".join(
-                reversed(cv_info["mfgDate"].split("/"))
-            )  # dumb storcli (change date format)
-            options = {**{"header": self._strcli_header(controller_num)}, **cv_info}
+        cv_info = self._storage.get_cachevault(controller_num)
 
-            template = Template(templ_h.read())
-            return template.substitute(options)
+        cv_info["mfgDate"] = "/".join(
+            reversed(cv_info["mfgDate"].split("/"))
+        )  # dumb storcli (change date format)
+        options = {**{"header": self._strcli_header(controller_num)}, **cv_info}
+
+        return self._templates["cachevault_data"].substitute(options)
 
     def _strcli_ctrl_phys_disks(self, controller_num):
         """Storcli physical drive details"""
 
-        pd_info_f = os.path.join(self._storcli_dir, "physical_disk_data")
-        pd_entry_f = os.path.join(self._storcli_dir, "physical_disk_entry")
         pd_output = []
 
         info_options = {
@@ -443,43 +503,37 @@ class StorCLIEmulator:
             "physical_drives": "",
         }
 
-        with open(pd_info_f) as info_h, open(
-            pd_entry_f
-        ) as entry_h, self._graph_ref.get_session() as session:
-            drives = GraphReference.get_all_drives(
-                session, self._server_key, controller_num
-            )
-            pd_template = entry_h.read()
+        drives = self._storage.get_all_drives(controller_num)
 
-            pd_drives = sorted(drives["pd"], key=lambda k: k["slotNum"])
-            self._format_pd_for_output(pd_drives)
+        pd_drives = sorted(drives["pd"], key=lambda k: k["slotNum"])
+        self._format_pd_for_output(pd_drives)
 
-            pd_drive_table = map(
-                lambda pd: {
-                    "drive_path": "/c{}/e{}/s{}".format(
-                        controller_num, pd["EID"], pd["slotNum"]
-                    ),
-                    "drive_table": self._format_as_table(
-                        StorCLIEmulator.pd_header, [pd]
-                    ),
-                    "media_error_count": pd["mediaErrorCount"],
-                    "other_error_count": pd["otherErrorCount"],
-                    "predictive_failure_count": pd["predictiveErrorCount"],
-                    "drive_temp_c": pd["temperature"],
-                    "drive_temp_f": (pd["temperature"] * 9 / 5) + 32,
-                    "drive_model": pd["Model"],
-                    "drive_size": pd["Size"],
-                    "drive_group": pd["DG"],
-                    "serial_number": pd["serialNumber"],
-                    "manufacturer_id": pd["manufacturerId"],
-                },
-                pd_drives,
-            )
+        pd_drive_table = map(
+            lambda pd: {
+                "drive_path": "/c{}/e{}/s{}".format(
+                    controller_num, pd["EID"], pd["slotNum"]
+                ),
+                "drive_table": self._format_as_table(StorCLIEmulator.pd_header, [pd]),
+                "media_error_count": pd["mediaErrorCount"],
+                "other_error_count": pd["otherErrorCount"],
+                "predictive_failure_count": pd["predictiveErrorCount"],
+                "drive_temp_c": pd["temperature"],
+                "drive_temp_f": (pd["temperature"] * 9 / 5) + 32,
+                "drive_model": pd["Model"],
+                "drive_size": pd["Size"],
+                "drive_group": pd["DG"],
+                "serial_number": pd["serialNumber"],
+                "manufacturer_id": pd["manufacturerId"],
+            },
+            pd_drives,
+        )
 
-            pd_output = map(Template(pd_template).substitute, pd_drive_table)
+        pd_output = map(
+            self._templates["physical_disk_entry"].substitute, pd_drive_table
+        )
 
-            info_options["physical_drives"] = "\n".join(pd_output)
-            return Template(info_h.read()).substitute(info_options)
+        info_options["physical_drives"] = "\n".join(pd_output)
+        return self._templates["physical_disk_data"].substitute(info_options)
 
     def _format_as_table(self, headers, table_options):
         """Formats data as storcli table
@@ -565,177 +619,176 @@ class StorCLIEmulator:
 
         drives = []
 
-        with self._graph_ref.get_session() as session:
-            vd_details = GraphReference.get_virtual_drive_details(
-                session, self._server_key, controller_num
-            )
-            cv_info = GraphReference.get_cachevault(
-                session, self._server_key, controller_num
-            )
+        vd_details = self._storage.get_virtual_drive_details(controller_num)
+        cv_info = self._storage.get_cachevault(controller_num)
 
-            # iterate over virtual drives
-            for i, v_drive in enumerate(vd_details):
-                vd_state = copy.deepcopy(
-                    self._storcli_details["stateConfig"]["virtualDrive"]["Optl"]
-                )
+        # iterate over virtual drives
+        for i, v_drive in enumerate(vd_details):
+            vd_state = copy.deepcopy(
+                self._storcli_details["stateConfig"]["virtualDrive"]["Optl"]
+            )
 
-                # Add Virtual Drive output
-                v_drive["DG/VD"] = "0/" + str(i)
-                v_drive["Size"] = str(v_drive["Size"]) + " GB"
+            # Add Virtual Drive output
+            v_drive["DG/VD"] = "0/" + str(i)
+            v_drive["Size"] = str(v_drive["Size"]) + " GB"
 
-                if cv_info["replacement"] == "Yes" and cv_info["writeThrough"]:
-                    v_drive["Cache"] = "RWTD"
+            if cv_info["replacement"] == "Yes" and cv_info["writeThrough"]:
+                v_drive["Cache"] = "RWTD"
 
-                # Add physical drive output (do some formatting plus check pd states)
-                self._format_pd_for_output(v_drive["pd"])
-                self._check_vd_state(vd_state, v_drive["pd"])
+            # Add physical drive output (do some formatting plus check pd states)
+            self._format_pd_for_output(v_drive["pd"])
+            self._check_vd_state(vd_state, v_drive["pd"])
 
-                v_drive["State"] = self._get_state_from_config(
-                    "virtualDrive", vd_state, "Optl"
-                )
+            v_drive["State"] = self._get_state_from_config(
+                "virtualDrive", vd_state, "Optl"
+            )
 
-                drives.append(
-                    {
-                        "physical_drives": self._format_as_table(
-                            StorCLIEmulator.pd_header, v_drive["pd"]
-                        ),
-                        "virtual_drives": self._format_as_table(
-                            StorCLIEmulator.vd_header, [v_drive]
-                        ),
-                        "virtual_drives_num": i,
-                    }
-                )
+            drives.append(
+                {
+                    "physical_drives": self._format_as_table(
+                        StorCLIEmulator.pd_header, v_drive["pd"]
+                    ),
+                    "virtual_drives": self._format_as_table(
+                        StorCLIEmulator.vd_header, [v_drive]
+                    ),
+                    "virtual_drives_num": i,
+                }
+            )
 
-            return drives
+        return drives
 
     def _strcli_ctrl_virt_disk(self, controller_num):
         """Display virtual disk details"""
 
-        vd_file = os.path.join(self._storcli_dir, "virtual_drive_data")
-        with open(vd_file) as templ_h:
-            template = Template(templ_h.read())
+        template = self._templates["virtual_drive_data"]
 
-            # get virtual & physical drive details
-            drives = self._get_virtual_drives(controller_num)
-            vd_output = map(
-                lambda d: template.substitute({**d, **{"controller": controller_num}}),
-                drives,
-            )
+        # get virtual & physical drive details
+        drives = self._get_virtual_drives(controller_num)
+        vd_output = map(
+            lambda d: template.substitute({**d, **{"controller": controller_num}}),
+            drives,
+        )
 
-            return self._strcli_header(controller_num) + "\n" + "\n".join(vd_output)
+        return self._strcli_header(controller_num) + "\n" + "\n".join(vd_output)
+
+    def _storage_version(self, argv):
+        """Version of the storage queried by the command
+        (changes whenever the server is powered up/down or
+        the controller & its drives get updated)"""
+        versions = self._redis_store.hgetall(
+            format_storage_version_key(self._server_key)
+        )
 
-    def _listen_cmds(self, socket_port):
-        """Start storcli websocket server
+        ctrl_version = None
+        if len(argv) > 3 and argv[1].startswith("/c"):
+            ctrl_version = versions.get(argv[1][-1].encode())
+
+        return (versions.get(b"power"), ctrl_version)
+
+    def _handle_request(self, received):
+        """Reply to a storcli64 command (output is rendered only if
+        storage was updated since the same command was last served)
+
+        Args:
+            received(dict): request containing command line arguments ('argv')
+        Returns:
+            dict: stdout, stderr & exit status of the command
+        """
+
+        argv = received["argv"]
+        command = tuple(argv[1:])
+
+        cacheable = True
+        try:
+            version = self._storage_version(argv)
+        except redis.RedisError as redis_err:
+            logger.warning("Storage version is unavailable: %s", redis_err)
+            version, cacheable = None, False
+
+        reply = self._output_cache.get(command, version) if cacheable else None
+        if reply is None:
+            self._render_ctx.expires = None
+            reply = self._render_request(argv)
+
+            # unsupported commands are not cached
+            if cacheable and reply["stdout"]:
+                self._output_cache.put(
+                    command, version, reply, self._render_ctx.expires
+                )
+
+        return {
+            **reply,
+            "stdout": reply["stdout"].replace(
+                StorCLIEmulator.date_placeholder,
+                time.strftime(StorCLIEmulator.date_format),
+            ),
+        }
+
+    def _render_request(self, argv):
+        """Render output of a storcli64 command
         for a list of supported storcli64 commands, see
         https://simengine.readthedocs.io/en/latest/Asset%20Management/#storage-simulation
+
+        Args:
+            argv(list): command line arguments
+        Returns:
+            dict: stdout, stderr & exit status of the command
         """
 
-        self._serversocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._serversocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self._serversocket.bind(("", socket_port))
-        self._serversocket.listen(5)
-
-        # Continue to accept connections until the ws server stops
-        while not self._stop_event.is_set():
-            try:
-                conn, _ = self._serversocket.accept()
-            except OSError:
-                logger.warning("Could not initialize socket server!")
-                return
-
-            with conn:
-                while not self._stop_event.is_set():
-                    scout_r, _, _ = select.select([conn], [], [])
-                    if not scout_r:
-                        logger.debug("Socket is not ready for reading")
-                        continue
-
-                    data = conn.recv(1024)
-                    if not data:
-                        logger.debug("Connection closed by remote end")
-                        break
-
-                    try:
-                        received = json.loads(data)
-                    except json.decoder.JSONDecodeError as parse_err:
-                        logger.warning(data)
-                        logger.warning("Invalid JSON: ")
-                        logger.warning(parse_err)
-
-                    argv = received["argv"]
-
-                    logger.debug("Data received: %s", str(received))
-
-                    reply = {"stdout": "", "stderr": "", "status": 0}
-
-                    # Process non-default return cases
-                    # (parse command request and return command output)
-                    if len(argv) == 2:
-                        if argv[1] == "--version":
-                            reply["stdout"] = "Version 0.01"
-
-                    elif len(argv) == 3:
-                        if argv[1] == "show" and argv[2] == "ctrlcount":
-                            reply["stdout"] = self._strcli_ctrlcount()
-
-                    # Controller Commands
-                    elif len(argv) == 4 and argv[1].startswith("/c"):
-                        if argv[2] == "show" and argv[3] == "perfmode":
-                            reply["stdout"] = self._strcli_ctrl_perf_mode(argv[1][-1])
-                        elif argv[2] == "show" and argv[3] == "bgirate":
-                            reply["stdout"] = self._get_rate_prop(
-                                argv[1][-1], "bgi_rate"
-                            )
-                        elif argv[2] == "show" and argv[3] == "ccrate":
-                            reply["stdout"] = self._get_rate_prop(
-                                argv[1][-1], "cc_rate"
-                            )
-                        elif argv[2] == "show" and argv[3] == "rebuildrate":
-                            reply["stdout"] = self._get_rate_prop(
-                                argv[1][-1], "rebuild_rate"
-                            )
-                        elif argv[2] == "show" and argv[3] == "prrate":
-                            reply["stdout"] = self._get_rate_prop(
-                                argv[1][-1], "pr_rate"
-                            )
-                        elif argv[2] == "show" and argv[3] == "alarm":
-                            reply["stdout"] = self._strcli_ctrl_alarm_state(argv[1][-1])
-                        elif argv[2] == "show" and argv[3] == "all":
-                            reply["stdout"] = self._strcli_ctrl_info(argv[1][-1])
-
-                    elif len(argv) == 5 and argv[1].startswith("/c"):
-                        if argv[2] == "/bbu" and argv[3] == "show" and argv[4] == "all":
-                            reply["stdout"] = self._strcli_ctrl_bbu(argv[1][-1])
-                        elif (
-                            argv[2] == "/cv" and argv[3] == "show" and argv[4] == "all"
-                        ):
-                            reply["stdout"] = self._strcli_ctrl_cachevault(argv[1][-1])
-                        elif (
-                            argv[2] == "/vall"
-                            and argv[3] == "show"
-                            and argv[4] == "all"
-                        ):
-                            reply["stdout"] = self._strcli_ctrl_virt_disk(argv[1][-1])
-                    elif len(argv) == 6 and argv[1].startswith("/c"):
-                        if (
-                            argv[2] == "/eall"
-                            and argv[3] == "/sall"
-                            and argv[4] == "show"
-                            and argv[5] == "all"
-                        ):
-                            reply["stdout"] = self._strcli_ctrl_phys_disks(argv[1][-1])
-                    else:
-                        reply = {
-                            "stdout": "",
-                            "stderr": "Usage: " + argv[0] + " --version",
-                            "status": 1,
-                        }
-
-                    # Send the message
-                    conn.sendall(bytes(json.dumps(reply) + "\n", "UTF-8"))
-
-            # Clean up connection when it gets closed by the remote end
-            conn.close()
-
-        # Final clean up when the ws server stops
-        self._serversocket.close()
+        reply = {"stdout": "", "stderr": "", "status": 0}
+
+        # Process non-default return cases
+        # (parse command request and return command output)
+        if len(argv) == 2:
+            if argv[1] == "--version":
+                reply["stdout"] = "Version 0.01"
+
+        elif len(argv) == 3:
+            if argv[1] == "show" and argv[2] == "ctrlcount":
+                reply["stdout"] = self._strcli_ctrlcount()
+
+        # Controller Commands
+        elif len(argv) == 4 and argv[1].startswith("/c"):
+            if argv[2] == "show" and argv[3] == "perfmode":
+                reply["stdout"] = self._strcli_ctrl_perf_mode(argv[1][-1])
+            elif argv[2] == "show" and argv[3] == "bgirate":
+                reply["stdout"] = self._get_rate_prop(argv[1][-1], "bgi_rate")
+            elif argv[2] == "show" and argv[3] == "ccrate":
+                reply["stdout"] = self._get_rate_prop(argv[1][-1], "cc_rate")
+            elif argv[2] == "show" and argv[3] == "rebuildrate":
+                reply["stdout"] = self._get_rate_prop(argv[1][-1], "rebuild_rate")
+            elif argv[2] == "show" and argv[3] == "prrate":
+                reply["stdout"] = self._get_rate_prop(argv[1][-1], "pr_rate")
+            elif argv[2] == "show" and argv[3] == "alarm":
+                reply["stdout"] = self._strcli_ctrl_alarm_state(argv[1][-1])
+            elif argv[2] == "show" and argv[3] == "all":
+                reply["stdout"] = self._strcli_ctrl_info(argv[1][-1])
+
+        elif len(argv) == 5 and argv[1].startswith("/c"):
+            if argv[2] == "/bbu" and argv[3] == "show" and argv[4] == "all":
+                reply["stdout"] = self._strcli_ctrl_bbu(argv[1][-1])
+            elif argv[2] == "/cv" and argv[3] == "show" and argv[4] == "all":
+                reply["stdout"] = self._strcli_ctrl_cachevault(argv[1][-1])
+            elif argv[2] == "/vall" and argv[3] == "show" and argv[4] == "all":
+                reply["stdout"] = self._strcli_ctrl_virt_disk(argv[1][-1])
+        elif len(argv) == 6 and argv[1].startswith("/c"):
+            if (
+                argv[2] == "/eall"
+                and argv[3] == "/sall"
+                and argv[4] == "show"
+                and argv[5] == "all"
+            ):
+                reply["stdout"] = self._strcli_ctrl_phys_disks(argv[1][-1])
+        else:
+            reply = {
+                "stdout": "",
+                "stderr": "Usage: " + argv[0] + " --version",
+                "status": 1,
+            }
+
+        return reply
+
+    @staticmethod
+    def _handle_error(error):
+        """Reply to a request that could not be processed"""
+        return {"stdout": "", "stderr": str(error), "status": 1}
@@ -3,10 +3,9 @@ import random
 import math
 import json
 
-import redis
-
 from enginecore.model.graph_reference import GraphReference
 from enginecore.state.redis_channels import RedisChannels
+from enginecore.state.redis_write_buffer import RedisWriteBuffer
 
 from enginecore.tools.recorder import RECORDER as record
 from enginecore.tools.randomizer import Randomizer
@@ -30,7 +29,8 @@ class ISystemEnvironment:
     def get_store(cls):
         """Get redis db handler"""
         if not cls.redis_store:
-            cls.redis_store = redis.StrictRedis(host="localhost", port=6379)
+            # writes are batched while engine iterations are in progress
+            cls.redis_store = RedisWriteBuffer.shared()
 
         return cls.redis_store
 
@@ -2,7 +2,9 @@
 import json
 from enum import Enum
 import math
+import os
 import random
+import threading
 import libvirt
 
 from enginecore.model.graph_reference import GraphReference
@@ -13,18 +15,47 @@ from enginecore.tools.recorder import RECORDER as record
 from enginecore.state.redis_channels import RedisChannels
 from enginecore.state.api.state import IStateManager
 from enginecore.tools.randomizer import Randomizer, ChainedArgs
+from enginecore.tools.utils import format_storage_version_key
 from enginecore.state.sensor.repository import SensorRepository
 from enginecore.state.sensor.sensor import SensorGroups
+from enginecore.state.storage_model import StorageModel
 
 
 @Randomizer.register
 class IServerStateManager(IStateManager):
     """Server managing a vm (libvirt domain)"""
 
+    # vm transitions initiated by simengine are marked for this long
+    # (so that lifecycle events they cause are not treated as external changes)
+    vm_transition_ttl = 30  # seconds
+
+    # libvirt connection shared by all the server state managers
+    _vm_conn = None
+    _vm_conn_lock = threading.Lock()
+
     def __init__(self, asset_info):
         super(IServerStateManager, self).__init__(asset_info)
-        self._vm_conn = libvirt.open("qemu:///system")
-        self._vm = self._vm_conn.lookupByName(asset_info["domainName"])
+        self._vm = self.get_vm_connection().lookupByName(asset_info["domainName"])
+
+    @classmethod
+    def get_vm_connection(cls):
+        """Get libvirt connection (re-opened if it was closed)
+        Returns:
+            libvirt.virConnect: connection to SIMENGINE_LIBVIRT_URI
+                                (qemu:///system by default)
+        """
+        with cls._vm_conn_lock:
+            if not cls._vm_conn or not cls._vm_conn.isAlive():
+                cls._vm_conn = libvirt.open(
+                    os.environ.get("SIMENGINE_LIBVIRT_URI", "qemu:///system")
+                )
+
+            return cls._vm_conn
+
+    @property
+    def domain_name(self) -> str:
+        """Name of the vm (libvirt domain) controlled by the server"""
+        return self._asset_info["domainName"]
 
     def vm_is_active(self):
         """Check if vm is powered up"""
@@ -37,12 +68,30 @@ class IServerStateManager(IStateManager):
         vm stuck)
         """
         if self._vm.isActive():
+            self._expect_vm_transition(active=False)
             self._vm.destroy()
 
+    def _expect_vm_transition(self, active):
+        """Mark upcoming vm state change as requested by simengine
+        Args:
+            active(bool): True if vm is about to be started
+        """
+        IStateManager.get_store().set(
+            self.redis_key + ":vm-transition", int(active), ex=self.vm_transition_ttl
+        )
+
+    def _storage_updated(self, controller):
+        """Invalidate rendered storcli64 output of the controller
+        (power state changes are tracked under 'power' controller)"""
+        IStateManager.get_store().hincrby(
+            format_storage_version_key(self.key), controller, 1
+        )
+
     @Randomizer.randomize_method()
     def shut_down(self):
         self._power_off_vm()
         self._update_load(0.0)
+        self._storage_updated("power")
 
         return super().shut_down()
 
@@ -50,6 +99,7 @@ class IServerStateManager(IStateManager):
     def power_off(self):
         self._power_off_vm()
         self._update_load(0.0)
+        self._storage_updated("power")
 
         return super().power_off()
 
@@ -58,6 +108,7 @@ class IServerStateManager(IStateManager):
         powered = self.status
 
         if powered and not self._vm.isActive():
+            self._expect_vm_transition(active=True)
             self._vm.create()
 
         if powered or math.isclose(self.input_voltage, 0.0):
@@ -65,8 +116,10 @@ class IServerStateManager(IStateManager):
 
         powered = super().power_up()
         if not self._vm.isActive() and powered:
+            self._expect_vm_transition(active=True)
             self._vm.create()
             self._update_load(self.power_consumption / self.input_voltage)
+            self._storage_updated("power")
         return powered
 
 
@@ -171,8 +224,7 @@ class IBMCServerStateManager(IServerStateManager):
 
     def get_server_drives(self, controller_num):
         """Get all the drives that are in the server"""
-        with self._graph_ref.get_session() as session:
-            return GraphReference.get_all_drives(session, self.key, controller_num)
+        return StorageModel.for_server(self.key).get_all_drives(controller_num)
 
     def get_fan_sensors(self):
         """Retrieve sensors of type "fan" """
@@ -240,10 +292,12 @@ class IBMCServerStateManager(IServerStateManager):
                     such as drive state ('state') or error counts
                     ('media_error_count', 'other_error_count', 'predictive_error_count')
         """
-        with self._graph_ref.get_session() as session:
-            return GraphReference.set_physical_drive_prop(
-                session, self.key, controller, did, properties
-            )
+        updated = StorageModel.for_server(self.key).set_physical_drive_prop(
+            controller, did, properties
+        )
+
+        self._storage_updated(controller)
+        return updated
 
     @record
     @Randomizer.randomize_method(
@@ -261,10 +315,12 @@ class IBMCServerStateManager(IServerStateManager):
             properties: controller props including "alarm", correctable & uncorrectable
                         errors as "mem_c_errors", "mem_uc_errors"
         """
-        with self._graph_ref.get_session() as session:
-            return GraphReference.set_controller_prop(
-                session, self.key, controller, properties
-            )
+        updated = StorageModel.for_server(self.key).set_controller_prop(
+            controller, properties
+        )
+
+        self._storage_updated(controller)
+        return updated
 
     @record
     @Randomizer.randomize_method(
@@ -278,10 +334,12 @@ class IBMCServerStateManager(IServerStateManager):
     )
     def set_cv_replacement(self, controller: int, repl_status: str, wt_on_fail: bool):
         """Update Cachevault replacement status"""
-        with self._graph_ref.get_session() as session:
-            return GraphReference.set_cv_replacement(
-                session, self.key, controller, repl_status, wt_on_fail
-            )
+        updated = StorageModel.for_server(self.key).set_cv_replacement(
+            controller, repl_status, wt_on_fail
+        )
+
+        self._storage_updated(controller)
+        return updated
 
     @property
     def cpu_load(self) -> int:
@@ -292,8 +350,7 @@ class IBMCServerStateManager(IServerStateManager):
     @property
     def controller_count(self) -> int:
         """Find number of RAID controllers"""
-        with self._graph_ref.get_session() as session:
-            return GraphReference.get_controller_count(session, self.key)
+        return StorageModel.for_server(self.key).get_controller_count()
 
     @classmethod
     def get_sensor_definitions(cls, asset_key):
@@ -303,12 +360,9 @@ class IBMCServerStateManager(IServerStateManager):
             return GraphReference.get_asset_sensors(session, asset_key)
 
     @classmethod
-    def update_thermal_sensor_target(cls, attr):
-        """Create new or update existing thermal relationship between 2 sensors"""
-        new_rel = sys_modeler.set_thermal_sensor_target(attr)
-        if not new_rel:
-            return
-
+    def _publish_thermal_sensor_target(cls, attr):
+        """Notify sensors that relationship between 2 sensors was
+        created, updated or deleted"""
         IStateManager.get_store().publish(
             RedisChannels.sensor_conf_th_channel,
             json.dumps(
@@ -324,13 +378,21 @@ class IBMCServerStateManager(IServerStateManager):
         )
 
     @classmethod
-    def update_thermal_storage_target(cls, attr):
-        """Add new storage entity affected by a sensor
-        Notify sensors if the relationship is new"""
+    def update_thermal_sensor_target(cls, attr):
+        """Create new or update existing thermal relationship between 2 sensors"""
+        sys_modeler.set_thermal_sensor_target(attr)
+        cls._publish_thermal_sensor_target(attr)
+
+    @classmethod
+    def delete_thermal_sensor_target(cls, attr):
+        """Remove existing relationship between 2 sensors"""
+        sys_modeler.delete_thermal_sensor_target(attr)
+        cls._publish_thermal_sensor_target(attr)
 
-        new_rel = sys_modeler.set_thermal_storage_target(attr)
-        if not new_rel:
-            return
+    @classmethod
+    def _publish_thermal_storage_target(cls, attr):
+        """Notify sensors that relationship between a sensor and
+        a storage element was created, updated or deleted"""
 
         target_data = {
             "key": attr["asset_key"],
@@ -346,23 +408,26 @@ class IBMCServerStateManager(IServerStateManager):
             target_data["relationship"]["drive"] = attr["drive"]
         else:
             channel = RedisChannels.str_cv_conf_th_channel
-            target_data["relationship"]["cv"] = attr["cache_vault"]
+            target_data["relationship"]["cache_v"] = attr["cache_vault"]
 
         IStateManager.get_store().publish(channel, json.dumps(target_data))
 
+    @classmethod
+    def update_thermal_storage_target(cls, attr):
+        """Add new or update existing storage entity affected by a sensor"""
+        sys_modeler.set_thermal_storage_target(attr)
+        cls._publish_thermal_storage_target(attr)
+
     @classmethod
     def delete_thermal_storage_target(cls, attr):
         """Remove existing relationship between a sensor and a storage element"""
-        return sys_modeler.delete_thermal_storage_target(attr)
+        sys_modeler.delete_thermal_storage_target(attr)
+        cls._publish_thermal_storage_target(attr)
 
     @classmethod
-    def update_thermal_cpu_target(cls, attr):
-        """Create new or update existing thermal
-        relationship between CPU usage and sensor"""
-        new_rel = sys_modeler.set_thermal_cpu_target(attr)
-        if not new_rel:
-            return
-
+    def _publish_thermal_cpu_target(cls, attr):
+        """Notify sensor that its relationship with CPU usage
+        was created, updated or deleted"""
         IStateManager.get_store().publish(
             RedisChannels.cpu_usg_conf_th_channel,
             json.dumps(
@@ -373,6 +438,19 @@ class IBMCServerStateManager(IServerStateManager):
             ),
         )
 
+    @classmethod
+    def update_thermal_cpu_target(cls, attr):
+        """Create new or update existing thermal
+        relationship between CPU usage and sensor"""
+        sys_modeler.set_thermal_cpu_target(attr)
+        cls._publish_thermal_cpu_target(attr)
+
+    @classmethod
+    def delete_thermal_cpu_target(cls, attr):
+        """Remove existing relationship between CPU usage and sensor"""
+        sys_modeler.delete_thermal_cpu_target(attr)
+        cls._publish_thermal_cpu_target(attr)
+
     @classmethod
     def get_thermal_cpu_details(cls, asset_key):
         """Query existing cpu->sensor relationship"""
@@ -11,9 +11,19 @@ from enginecore.tools.randomizer import Randomizer
 
 
 class ISnmpDeviceStateManager(IStateManager):
-    """Stores snmp-related interface features such as access to OIDs"""
+    """Stores snmp-related interface features such as access to OIDs;
+    OIDs of the asset are indexed by name (along with their redis keys &
+    data types) the first time they are accessed & after model reload
+    """
 
-    ObjectIdentity = namedtuple("ObjectIdentity", "oid specs")
+    ObjectIdentity = namedtuple(
+        "ObjectIdentity", "oid specs redis_key data_type", defaults=(None, None)
+    )
+
+    def __init__(self, asset_info):
+        super().__init__(asset_info)
+        self._oid_index = None
+        self._oid_index_generation = None
 
     @property
     def snmp_config(self):
@@ -92,12 +102,7 @@ class ISnmpDeviceStateManager(IStateManager):
             bool: true if oid was successfully updated
         """
 
-        with self._graph_ref.get_session() as db_s:
-            oid = ISnmpDeviceStateManager.ObjectIdentity(
-                *GraphReference.get_asset_oid_by_name(
-                    db_s, int(self._asset_key), oid_name
-                )
-            )
+        oid = self.get_oid_by_name(oid_name)
 
         if oid:
             new_oid_value = oid.specs[value] if use_spec and oid.specs else value
@@ -114,31 +119,68 @@ class ISnmpDeviceStateManager(IStateManager):
             oid_value(object): OID value in rfc1902 format
         """
         redis_store = IStateManager.get_store()
-        rkey = format_as_redis_key(
+        rkey = object_id.redis_key or format_as_redis_key(
             str(self._asset_key), object_id.oid, key_formatted=False
         )
 
-        data_type = int(redis_store.get(rkey).decode().split("|")[0])
+        data_type = object_id.data_type
+        if data_type is None:
+            data_type = redis_store.get(rkey).decode().split("|")[0]
+
         rvalue = "{}|{}".format(data_type, oid_value)
 
         redis_store.set(rkey, rvalue)
 
     def get_oid_value(self, object_id, key=None):
         """Retrieve value for a specific OID"""
-        if key is None:
-            key = self.key
+        if key is None and object_id.redis_key:
+            rkey = object_id.redis_key
+        else:
+            rkey = format_as_redis_key(
+                str(self.key if key is None else key),
+                object_id.oid,
+                key_formatted=False,
+            )
 
         redis_store = IStateManager.get_store()
-        rkey = format_as_redis_key(str(key), object_id.oid, key_formatted=False)
         return redis_store.get(rkey).decode().split("|")[1]
 
-    def get_oid_by_name(self, oid_name):
-        """Get oid by oid name"""
+    @property
+    def oid_index(self):
+        """OIDs of the asset (ObjectIdentity) keyed by OID name"""
+        if self._oid_index_generation != IStateManager.model_generation:
+            self._oid_index = self._load_oid_index()
+            self._oid_index_generation = IStateManager.model_generation
+
+        return self._oid_index
+
+    def _load_oid_index(self):
+        """Query all the OIDs of the asset & their data types
+        (in one graph query & one redis round-trip)"""
 
         with self._graph_ref.get_session() as db_s:
-            oid = ISnmpDeviceStateManager.ObjectIdentity(
-                *GraphReference.get_asset_oid_by_name(
-                    db_s, int(self._asset_key), oid_name
-                )
+            asset_oids = GraphReference.get_asset_oids(db_s, int(self._asset_key))
+
+        rkeys = [
+            format_as_redis_key(str(self._asset_key), oid, key_formatted=False)
+            for oid, _ in asset_oids.values()
+        ]
+        rvalues = IStateManager.get_store().mget(rkeys) if rkeys else []
+
+        oid_index = {}
+        for (oid_name, (oid, specs)), rkey, rvalue in zip(
+            asset_oids.items(), rkeys, rvalues
+        ):
+            data_type = rvalue.decode().split("|")[0] if rvalue else None
+            oid_index[oid_name] = ISnmpDeviceStateManager.ObjectIdentity(
+                oid, specs, rkey, data_type
             )
-        return oid
+
+        return oid_index
+
+    def get_oid_by_name(self, oid_name):
+        """Get oid by oid name
+        Returns:
+            ObjectIdentity: OID details, None if asset has no such OID
+        """
+        return self.oid_index.get(oid_name)
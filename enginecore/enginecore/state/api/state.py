@@ -7,10 +7,10 @@ import os
 import subprocess
 import json
 
-import redis
-
 from enginecore.model.graph_reference import GraphReference
 from enginecore.state.redis_channels import RedisChannels
+from enginecore.state.redis_write_buffer import RedisWriteBuffer
+from enginecore.state.battery_model import BatteryModel
 
 from enginecore.tools.recorder import RECORDER as record
 from enginecore.tools.randomizer import Randomizer
@@ -23,6 +23,15 @@ class IStateManager:
 
     redis_store = None
 
+    # system topology queried by get_system_status is cached
+    # (keyed by 'flatten'), model reload bumps topology version
+    topology_cache_ttl = 30
+    topology_version_key = "topology-version"
+    _topology_cache = {}
+    # incremented when model is reloaded (in this process),
+    # data cached by state managers is loaded again
+    model_generation = 0
+
     class PowerStateReason(Enum):
         """Describes reason behind asset power state"""
 
@@ -277,9 +286,10 @@ class IStateManager:
             bool: True if parents are available
         """
 
-        asset_keys, oid_keys = GraphReference.get_parent_keys(
-            self._graph_ref.get_session(), self._asset_key
-        )
+        with self._graph_ref.get_session() as session:
+            asset_keys, oid_keys = GraphReference.get_parent_keys(
+                session, self._asset_key
+            )
 
         # if wall-powered, check the mains
         if not asset_keys and not ISystemEnvironment.power_source_available():
@@ -316,49 +326,111 @@ class IStateManager:
     def get_store(cls):
         """Get redis db handler"""
         if not cls.redis_store:
-            cls.redis_store = redis.StrictRedis(host="localhost", port=6379)
+            # writes are batched while engine iterations are in progress
+            cls.redis_store = RedisWriteBuffer.shared()
 
         return cls.redis_store
 
     @classmethod
-    def _get_assets_states(cls, assets, flatten=True):
+    def _iter_assets(cls, assets):
+        """Walk assets & their nested child-components"""
+        for asset in assets.values():
+            yield asset
+            if isinstance(asset.get("children"), dict):
+                yield from cls._iter_assets(asset["children"])
+
+    @classmethod
+    def _copy_assets(cls, assets):
+        """Copy cached topology so that states can be added to it"""
+        assets = {key: dict(asset) for key, asset in assets.items()}
+        for asset in assets.values():
+            if isinstance(asset.get("children"), dict):
+                asset["children"] = cls._copy_assets(asset["children"])
+        return assets
+
+    @classmethod
+    def _get_assets_states(cls, assets, topology_version=None):
         """Query redis store and find states for each asset
+        (status, load & battery of all the assets are fetched in one round-trip)
 
         Args:
-            flatten(bool): If false, the returned assets in the dict
-                           will have their child-components nested
+            assets(dict): system topology, may contain nested child-components
+            topology_version(bytes): expected version of the topology,
+                                     states are not set if it is outdated
         Returns:
             dict: Current information on assets including their states, load etc.
+                  (None if there are no assets or topology is outdated)
         """
-        asset_keys = assets.keys()
+        asset_list = list(cls._iter_assets(assets))
 
-        if not asset_keys:
+        if not asset_list:
             return None
 
-        asset_values = cls.get_store().mget(
-            list(map(lambda k: "{}-{}:state".format(k, assets[k]["type"]), asset_keys))
-        )
+        redis_keys = []
+        for asset in asset_list:
+            rkey = "{key}-{type}".format(**asset)
+            redis_keys.extend([rkey + ":state", rkey + ":load"])
+            if asset["type"] == "ups":
+                redis_keys.extend([rkey + ":battery", rkey + ":battery-model"])
 
-        for rkey, rvalue in zip(assets, asset_values):
-            asset_state = cls.get_state_manager_by_key(rkey)
+        asset_values = cls.get_store().mget(redis_keys + [cls.topology_version_key])
+        if topology_version is not None and asset_values[-1] != topology_version:
+            return None
 
-            assets[rkey]["status"] = int(rvalue)
-            assets[rkey]["load"] = asset_state.load
+        asset_values = iter(asset_values)
+        for asset in asset_list:
+            status, load = next(asset_values), next(asset_values)
+            asset["status"] = int(status) if status else 0
+            asset["load"] = float(load) if load else 0.0
 
-            if assets[rkey]["type"] == "ups":
-                assets[rkey]["battery"] = asset_state.battery_level
+            if asset["type"] == "ups":
+                battery, battery_model = next(asset_values), next(asset_values)
+                asset["battery"] = int(battery.decode()) if battery else 0
 
-            if not flatten and "children" in assets[rkey]:
-                # call recursively on children
-                assets[rkey]["children"] = cls._get_assets_states(
-                    assets[rkey]["children"]
-                )
+                if battery_model:
+                    battery_model = BatteryModel.decode(battery_model)
+                    asset["battery"] = int(battery_model.level_at())
 
         return assets
 
+    @classmethod
+    def _get_topology(cls, flatten):
+        """Retrieve system topology from the graph db (cached for
+        'topology_cache_ttl' seconds or until model is reloaded)
+        Returns:
+            tuple: topology version & assets
+        """
+        cached = IStateManager._topology_cache.get(flatten)
+
+        if cached and time.time() - cached[0] < cls.topology_cache_ttl:
+            return cached[1:]
+
+        # version is read first so that model reload during the query
+        # invalidates the topology right away
+        version = cls.get_store().get(cls.topology_version_key) or b"0"
+
+        graph_ref = GraphReference()
+        with graph_ref.get_session() as session:
+            assets = GraphReference.get_assets_and_connections(session, flatten)
+
+        IStateManager._topology_cache[flatten] = (time.time(), version, assets)
+        return version, assets
+
+    @classmethod
+    def invalidate_topology_cache(cls):
+        """Discard system topology cached by get_system_status
+        (in all the processes sharing redis store) & state managers
+        cached by get_state_manager_by_key (in this process)"""
+        IStateManager._topology_cache.clear()
+        IStateManager.get_state_manager_by_key.cache_clear()
+        IStateManager.model_generation += 1
+        cls.get_store().incr(cls.topology_version_key)
+
     @classmethod
     def get_system_status(cls, flatten=True):
         """Get states of all system components
+        (snapshot of the states is consistent since all of them are
+        retrieved with a single MGET)
 
         Args:
             flatten(bool): If false, the returned assets in the dict
@@ -367,11 +439,20 @@ class IStateManager:
         Returns:
             dict: Current information on assets including their states, load etc.
         """
-        graph_ref = GraphReference()
-        with graph_ref.get_session() as session:
-            # cache assets
-            assets = GraphReference.get_assets_and_connections(session, flatten)
-            return cls._get_assets_states(assets, flatten)
+
+        version, assets = cls._get_topology(flatten)
+        if not assets:
+            return None
+
+        assets_states = cls._get_assets_states(cls._copy_assets(assets), version)
+
+        # model was reloaded since the topology got cached
+        if assets_states is None:
+            IStateManager._topology_cache.pop(flatten, None)
+            version, assets = cls._get_topology(flatten)
+            assets_states = cls._get_assets_states(cls._copy_assets(assets))
+
+        return assets_states
 
     @classmethod
     @lru_cache(maxsize=32)
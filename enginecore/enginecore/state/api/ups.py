@@ -4,6 +4,7 @@ import json
 from enum import Enum
 
 from enginecore.state.redis_channels import RedisChannels
+from enginecore.state.battery_model import BatteryModel
 from enginecore.state.api.state import IStateManager, ISystemEnvironment
 from enginecore.state.api.snmp_state import ISnmpDeviceStateManager
 from enginecore.tools.randomizer import Randomizer
@@ -85,7 +86,14 @@ class IUPSStateManager(ISnmpDeviceStateManager):
     @property
     def battery_level(self):
         """Get current level (high-precision)"""
-        battery_lvl = IStateManager.get_store().get(self.redis_key + ":battery")
+        battery_lvl, battery_model = IStateManager.get_store().mget(
+            [self.redis_key + ":battery", self.redis_key + ":battery-model"]
+        )
+
+        # battery is being charged/drained by the analytic battery model
+        if battery_model:
+            return int(BatteryModel.decode(battery_model).level_at())
+
         return int(battery_lvl.decode()) if battery_lvl else 0
 
     def _update_battery(self, charge_level):
@@ -98,6 +106,7 @@ class IUPSStateManager(ISnmpDeviceStateManager):
         charge_level = min(charge_level, self._max_battery_level)
 
         IStateManager.get_store().set(self.redis_key + ":battery", int(charge_level))
+        IStateManager.get_store().delete(self.redis_key + ":battery-model")
 
     @property
     def battery_max_level(self):
@@ -0,0 +1,110 @@
+"""Analytic model of a UPS battery;
+
+Battery level is stored as a linear function of time (level at t0 & rate)
+instead of being updated every second; capacity, runtime & time-on-battery
+OIDs are evaluated when polled by snmppub.lua (the same way sysUpTime is),
+the engine only needs to handle discrete events (e.g. battery reaching zero).
+
+Model is stored under '{ups-redis-key}:battery-model' as
+    level|rate|t0|max level|full power time left|on battery since
+and lazily evaluated OIDs store '{data type}|@battery:{ups-redis-key}:{kind}'
+where kind is one of the lazy_oid_kinds.
+"""
+import time
+
+
+class BatteryModel:
+    """Battery level changing at a constant rate since t0
+    (level is kept between 0 & max level)"""
+
+    # lazily evaluated OID kinds (see snmppub.lua)
+    lazy_oid_kinds = ["capacity", "hp_capacity", "time_left", "time_on_battery"]
+
+    def __init__(self, level, rate, t0, max_level, fp_time_left, on_battery_since=0):
+        """
+        Args:
+            level(float): battery level at t0 (between 0 & max level)
+            rate(float): level change per second (negative when draining)
+            t0(float): unix timestamp (seconds) the level was measured at
+            max_level(int): max battery level
+            fp_time_left(float): runtime (minutes) of the fully charged battery
+            on_battery_since(float): timestamp of transfer to battery
+                                     (0 if UPS is not running on battery)
+        """
+        self.level = level
+        self.rate = rate
+        self.t0 = t0
+        self.max_level = max_level
+        self.fp_time_left = fp_time_left
+        self.on_battery_since = on_battery_since
+
+    @classmethod
+    def decode(cls, value):
+        """Parse model stored in redis
+        Args:
+            value(bytes): encoded model
+        Returns:
+            BatteryModel: battery model (None if value is empty)
+        """
+        if not value:
+            return None
+
+        if isinstance(value, bytes):
+            value = value.decode()
+
+        return cls(*map(float, value.split("|")))
+
+    def encode(self):
+        """Represent model as redis value"""
+        return "|".join(
+            repr(float(v))
+            for v in (
+                self.level,
+                self.rate,
+                self.t0,
+                self.max_level,
+                self.fp_time_left,
+                self.on_battery_since,
+            )
+        )
+
+    @staticmethod
+    def lazy_oid_value(data_type, ups_redis_key, kind):
+        """OID value evaluated by snmppub.lua when polled"""
+        return "{}|@battery:{}:{}".format(data_type, ups_redis_key, kind)
+
+    def level_at(self, timestamp=None):
+        """Battery level at the given time (defaults to now)"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        level = self.level + self.rate * (timestamp - self.t0)
+        return min(max(level, 0), self.max_level)
+
+    def time_left_at(self, timestamp=None):
+        """Runtime estimation (timeticks) at the given time"""
+        return self.fp_time_left * self.level_at(timestamp) / self.max_level * 60 * 100
+
+    def time_on_battery_at(self, timestamp=None):
+        """Time on battery (timeticks) at the given time"""
+        if not self.on_battery_since:
+            return 0
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        return (timestamp - self.on_battery_since) * 100
+
+    def time_to_level(self, level):
+        """Time (unix timestamp) battery reaches the level
+        Returns:
+            float: timestamp or None if level won't be reached
+        """
+        if (
+            not self.rate
+            or not 0 <= level <= self.max_level
+            or (level - self.level) * self.rate < 0
+        ):
+            return None
+
+        return self.t0 + (level - self.level) / self.rate
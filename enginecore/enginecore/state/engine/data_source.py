@@ -3,7 +3,7 @@ from enginecore.model.graph_reference import GraphReference
 
 
 class HardwareDataSource:
-    graph_ref = GraphReference()
+    graph_ref = None
 
     @classmethod
     def get_all_assets(cls):
@@ -17,6 +17,10 @@ class HardwareDataSource:
     def get_mains_powered_assets(cls):
         return NotImplementedError()
 
+    @classmethod
+    def reload(cls):
+        return NotImplementedError()
+
 
 class HardwareGraphDataSource(HardwareDataSource):
     graph_ref = None
@@ -74,7 +78,127 @@ class HardwareGraphDataSource(HardwareDataSource):
         cls.get_parent_assets.cache_clear()
         cls.get_asset_oid_info.cache_clear()
 
+    @classmethod
+    def reload(cls):
+        """Topology has changed, drop any cached data"""
+        cls.cache_clear_all()
+
     @classmethod
     def close(cls):
         """Close down driver"""
         cls.graph_ref.close()
+
+
+class PowerTopology:
+    """In-memory snapshot of the power graph; keeps adjacency lists
+    (parents & children of every asset), mains-powered outlets
+    and OIDs controlling power of assets
+    """
+
+    def __init__(self, assets, power_connections, mains_outlets, oid_connections):
+        """Build topology indices
+        Args:
+            assets(list): asset details (see GraphReference.get_assets_and_children)
+            power_connections(list): (child key, parent key) tuples
+            mains_outlets(list): keys of outlets powered by the mains
+            oid_connections(list): OIDs powering assets
+                                   (see GraphReference.get_oid_power_connections)
+        """
+        self._assets = tuple(assets)
+
+        children, parents = {}, {}
+        for child_key, parent_key in power_connections:
+            children.setdefault(parent_key, []).append(child_key)
+            parents.setdefault(child_key, []).append(parent_key)
+
+        self._children = {k: tuple(v) for k, v in children.items()}
+        self._parents = {k: tuple(v) for k, v in parents.items()}
+        self._mains_outlets = tuple(mains_outlets)
+
+        self._oids = {
+            (o["owner_key"], o["oid"]): (o["asset_key"], o["info"])
+            for o in oid_connections
+        }
+
+    @property
+    def assets(self):
+        """All the assets in the topology (ordered by key)"""
+        return self._assets
+
+    @property
+    def mains_outlets(self):
+        """Keys of wall-powered outlets"""
+        return self._mains_outlets
+
+    def children(self, asset_key):
+        """Keys of assets powered by the asset"""
+        return self._children.get(asset_key, ())
+
+    def parents(self, asset_key):
+        """Keys of assets powering the asset"""
+        return self._parents.get(asset_key, ())
+
+    def oid_info(self, asset_key, oid):
+        """Key of the asset powered by the OID & OID details
+        (None, None if OID does not affect power of any asset)"""
+        return self._oids.get((asset_key, oid), (None, None))
+
+
+class HardwareTopologyDataSource(HardwareGraphDataSource):
+    """Loads the whole power topology from the graph db once
+    (on model reload) & serves lookups from memory so that
+    power/thermal iterations don't need to query the database
+    """
+
+    topology = None
+
+    @classmethod
+    def reload(cls):
+        """(Re-)build in-memory topology based on the graph reference"""
+        with cls.graph_ref.get_session() as session:
+            cls.topology = PowerTopology(
+                assets=GraphReference.get_assets_and_children(session),
+                power_connections=GraphReference.get_power_connections(session),
+                mains_outlets=GraphReference.get_mains_powered_outlets(session),
+                oid_connections=GraphReference.get_oid_power_connections(session),
+            )
+
+    @classmethod
+    def _get_topology(cls):
+        """Get topology snapshot (loading it if not initialized)"""
+        if cls.topology is None:
+            cls.reload()
+        return cls.topology
+
+    @classmethod
+    def get_all_assets(cls):
+        return list(cls._get_topology().assets)
+
+    @classmethod
+    def get_affected_assets(cls, asset_key):
+        topology = cls._get_topology()
+        return (list(topology.children(asset_key)), list(topology.parents(asset_key)))
+
+    @classmethod
+    def get_mains_powered_assets(cls):
+        return list(cls._get_topology().mains_outlets)
+
+    @classmethod
+    def get_parent_assets(cls, asset_key):
+        """Get parent asset keys (nodes that are powering the asset)
+        Args:
+            asset_key(int): child key
+        Returns:
+            list: parent asset keys
+        """
+        return list(cls._get_topology().parents(asset_key))
+
+    @classmethod
+    def get_asset_oid_info(cls, asset_key, oid):
+        """Get oid information based on provided asset key and object id"""
+        return cls._get_topology().oid_info(asset_key, oid)
+
+    @classmethod
+    def cache_clear_all(cls):
+        """clear all cached data"""
+        cls.topology = None
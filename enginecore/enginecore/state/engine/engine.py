@@ -1,41 +1,88 @@
 import logging
 
 import math
-from circuits import Component, Event
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from circuits import Component, Event, handler
 
 from enginecore.state.hardware.room import ServerRoom, Asset
 from enginecore.tools.recorder import RECORDER
-from enginecore.state.api import ISystemEnvironment
+from enginecore.state.api import ISystemEnvironment, IStateManager
 from enginecore.state.state_initializer import initialize, clear_temp
 
 from enginecore.state.engine.iteration import PowerIteration, ThermalIteration
 from enginecore.state.engine.iteration_consumer import EngineIterationConsumer
-from enginecore.state.engine.data_source import HardwareGraphDataSource
+from enginecore.state.engine.power_flow import PowerFlowIteration, PowerFlowSolver
+from enginecore.state.engine.data_source import HardwareTopologyDataSource
+from enginecore.model.graph_reference import DriverRegistry
+from enginecore.state.sensor.thermal_scheduler import ThermalScheduler
+from enginecore.state.hardware.battery_scheduler import BatteryScheduler
+from enginecore.state.hardware.vm_lifecycle import VMLifecycleMonitor
+from enginecore.state.hardware.cpu_sampler import CPULoadSampler
 from enginecore.state.engine import events
 
 logger = logging.getLogger(__name__)
 
+# events handled by the assets on behalf of engine iterations
+ITERATION_EVENTS = [
+    "PowerButtonOnEvent",
+    "PowerButtonOffEvent",
+    "SignalDownEvent",
+    "SignalUpEvent",
+    "SignalRebootEvent",
+    "InputVoltageUpEvent",
+    "InputVoltageDownEvent",
+    "ChildLoadUpEvent",
+    "ChildLoadDownEvent",
+    "AmbientUpEvent",
+    "AmbientDownEvent",
+    "PowerFlowSolved",
+]
+
 
 class AllThermalBranchesDone(Event):
     """Dispatched when all hardware assets finish
-    processing an ambient event"""
+    processing an ambient event
+    (completed iteration is passed as 'power_iter' keyword argument)"""
 
 
 class AllVoltageBranchesDone(Event):
     """Dispatched when power iteration finishes downstream
     voltage event propagation to all the leaf nodes that
-    are descendants of the iteration source event"""
+    are descendants of the iteration source event
+    (iteration is passed as 'power_iter' keyword argument)"""
 
     success = True
 
 
 class AllLoadBranchesDone(Event):
     """Dispatched when power iteration finishes upstream
-    load event propagation across all load branches"""
+    load event propagation across all load branches
+    (completed iteration is passed as 'power_iter' keyword argument)"""
 
     success = True
 
 
+class IterationMerged(Event):
+    """Dispatched when queued iteration is superseded by a newer one
+    (e.g. consecutive voltage fluctuations); the superseded iteration is never
+    launched & its effect is covered by the merged iteration which completes
+    on behalf of the newest queued iteration
+    (superseded iteration is passed as 'power_iter' keyword argument,
+    iteration replacing it as 'merged_iter'; 'merged_iter' is None if merged
+    changes cancel each other out & nothing is launched)"""
+
+
+class PowerFlowSolved(Event):
+    """Dispatched when power flow iteration solves the power model,
+    solution is applied to the assets by the event loop
+    (iteration is passed as 'power_iter' keyword argument,
+    its solution as 'solution')"""
+
+
 class Engine(Component):
     """Top-level component that initializes assets & handles state changes
     (thermal, power, oid) by dispatching events against hardware assets.
@@ -48,7 +95,7 @@ class Engine(Component):
         - Load updates due to voltage changes
     """
 
-    def __init__(self, force_snmp_init=True, data_source=HardwareGraphDataSource):
+    def __init__(self, force_snmp_init=True, data_source=HardwareTopologyDataSource):
         super(Engine, self).__init__()
 
         ### Set-up WebSocket & Redis listener ###
@@ -62,9 +109,16 @@ class Engine(Component):
 
         self._sys_environ = ServerRoom().register(self)
 
-        # track iterations (thermal/power) in separate threads
-        self._power_iter_handler = EngineIterationConsumer("power_worker")
-        self._thermal_iter_handler = EngineIterationConsumer("thermal_worker")
+        # track iterations (thermal/power) in separate threads,
+        # power iterations affecting unrelated assets can run concurrently
+        self._power_iter_handler = EngineIterationConsumer(
+            "power_worker",
+            concurrent=True,
+            on_iteration_merged=self._on_iteration_merged,
+        )
+        self._thermal_iter_handler = EngineIterationConsumer(
+            "thermal_worker", on_iteration_merged=self._on_iteration_merged
+        )
 
         data_source.init_connection()
 
@@ -72,6 +126,21 @@ class Engine(Component):
         PowerIteration.data_source = data_source
         ThermalIteration.data_source = data_source
 
+        # wallpower updates can be handled by steady-state solver
+        # instead of propagating power events through the system
+        # ('all' also solves topologies with UPSes & BMC servers)
+        power_flow = os.environ.get("SIMENGINE_POWER_FLOW")
+        self._power_flow_enabled = power_flow in ("1", "all")
+        self._power_flow_unverified = power_flow == "all"
+
+        # keep state & agents of the assets that haven't changed since last start
+        self._warm_start = os.environ.get("SIMENGINE_WARM_START") == "1"
+
+        # number of assets (agents) initialized concurrently on model reload
+        self._bootstrap_workers = int(
+            os.environ.get("SIMENGINE_BOOTSTRAP_WORKERS", "8")
+        )
+
         # Register assets and reset power state
         self.reload_model(force_snmp_init)
         logger.info("Physical Environment:\n%s", self._sys_environ)
@@ -81,31 +150,113 @@ class Engine(Component):
 
         RECORDER.enabled = False
 
-        ISystemEnvironment.set_ambient(0)
         logger.info("Initializing system topology...")
 
         self._assets = {}
 
         # init state
-        clear_temp()
-        initialize(force_snmp_init)
-
-        # get system topology
+        if self._warm_start:
+            Asset.warm_keys = frozenset(initialize(force_snmp_init, warm_start=True))
+        else:
+            ISystemEnvironment.set_ambient(0)
+            clear_temp()
+            initialize(force_snmp_init)
+
+        # get system topology (data source may cache it until the next reload)
+        self._data_source.reload()
         assets = self._data_source.get_all_assets()
+        IStateManager.invalidate_topology_cache()
 
-        for asset in assets:
-            self._assets[asset["key"]] = Asset.get_supported_assets()[asset["type"]](
-                asset
-            ).register(self)
+        self._bootstrap_assets(assets)
 
-        self._power_iter_handler.start(on_iteration_launched=self._chain_power_events)
+        PowerFlowIteration.solver = None
+        if self._power_flow_enabled:
+            self._init_power_flow_solver()
+
+        self._power_iter_handler.start(
+            on_iteration_launched=self._on_power_iteration_launched
+        )
         self._thermal_iter_handler.start(
-            on_iteration_launched=self._chain_thermal_events
+            on_iteration_launched=self._on_thermal_iteration_launched
         )
 
-        ISystemEnvironment.set_ambient(21)
+        # writes made while launching iterations are batched
+        for iter_handler in [self._power_iter_handler, self._thermal_iter_handler]:
+            ISystemEnvironment.get_store().add_batch_thread(iter_handler.worker_thread)
+
+        if not self._warm_start or not ISystemEnvironment.get_ambient():
+            ISystemEnvironment.set_ambient(21)
+
+        Asset.warm_keys = frozenset()
         RECORDER.enabled = True
 
+    def _bootstrap_assets(self, assets):
+        """Instantiate hardware assets (starting their agents) in a thread pool;
+        assets are registered with the engine in the main thread
+        Args:
+            assets(list): asset details as returned by the data source
+        """
+        supported_assets = Asset.get_supported_assets()
+        bootstrap_start = time.time()
+
+        def create_asset(asset_info):
+            start = time.time()
+            hw_asset = supported_assets[asset_info["type"]](asset_info)
+            return hw_asset, time.time() - start
+
+        # group assets by their bootstrap stage
+        stages = defaultdict(list)
+        for asset_info in assets:
+            stage = supported_assets[asset_info["type"]].bootstrap_stage
+            stages[stage].append(asset_info)
+
+        type_timings = defaultdict(list)
+        with ThreadPoolExecutor(max_workers=self._bootstrap_workers) as executor:
+            for stage in sorted(stages):
+                created_assets = executor.map(create_asset, stages[stage])
+
+                for asset_info, (hw_asset, elapsed) in zip(
+                    stages[stage], created_assets
+                ):
+                    self._assets[asset_info["key"]] = hw_asset.register(self)
+                    type_timings[asset_info["type"]].append(elapsed)
+
+        report = [
+            "  {:<12} x{:<4} total: {:.3f}s, max: {:.3f}s".format(
+                asset_type, len(timings), sum(timings), max(timings)
+            )
+            for asset_type, timings in sorted(
+                type_timings.items(), key=lambda item: -sum(item[1])
+            )
+        ]
+
+        logger.info(
+            "Initialized %s assets in %.3fs (%s workers):\n%s",
+            len(self._assets),
+            time.time() - bootstrap_start,
+            self._bootstrap_workers,
+            "\n".join(report),
+        )
+
+    def _init_power_flow_solver(self):
+        """Set up solver for the wallpower iterations"""
+
+        solver = PowerFlowSolver(
+            self._assets,
+            self._data_source,
+            notify=self._notify_trackers,
+            unverified=self._power_flow_unverified,
+        )
+
+        if not solver.supported:
+            logger.warning(
+                "Power flow solver does not support some of the assets, "
+                "using event propagation instead"
+            )
+            return
+
+        PowerFlowIteration.solver = solver
+
     @property
     def assets(self):
         """Hardware assets that are present in the system topology"""
@@ -117,6 +268,18 @@ class Engine(Component):
         for comp_tracker in self._completion_trackers:
             self.fire(event, comp_tracker)
 
+    @handler(*ITERATION_EVENTS, channel="*", priority=100)
+    def _enter_iteration_scope(self, *args, **kwargs):
+        """Batch writes made by the assets while handling iteration event
+        (called before asset handlers that are run by the event loop thread)"""
+        ISystemEnvironment.get_store().enter_batch_scope()
+
+    @handler(*ITERATION_EVENTS, channel="*", priority=-100)
+    def _exit_iteration_scope(self, *args, **kwargs):
+        """Writes made by the event loop thread outside of iteration events
+        (e.g. by client requests) are not held back"""
+        ISystemEnvironment.get_store().exit_batch_scope()
+
     def subscribe_tracker(self, tracker):
         """Subscribe external engine client to completion events"""
         self._completion_trackers.append(tracker.register(self))
@@ -126,16 +289,51 @@ class Engine(Component):
         self._completion_trackers.remove(tracker)
         tracker.unregister(self)
 
-    def _mark_load_branches_done(self):
+    def _mark_load_branches_done(self, power_iter):
         """Set status for all load branches as done
         (when all load branches are completed, power iteration
         worker thread is given permission to accept new power
         events)
         """
-        self._notify_trackers(AllLoadBranchesDone())
-        self._power_iter_handler.unfreeze_task_queue()
+        # state changes made by the iteration are written to redis
+        ISystemEnvironment.get_store().end_batch()
+        self._notify_trackers(AllLoadBranchesDone(power_iter=power_iter))
+        self._power_iter_handler.unfreeze_task_queue(power_iter)
+
+    def _on_iteration_merged(self, superseded_iter, merged_iter):
+        """Let trackers waiting for the superseded iteration know it won't
+        complete on its own"""
+        self._notify_trackers(
+            IterationMerged(power_iter=superseded_iter, merged_iter=merged_iter)
+        )
+
+    def _on_power_iteration_launched(self, power_iter, *launch_results):
+        """Buffer redis writes until power iteration is done"""
+        ISystemEnvironment.get_store().begin_batch()
+
+        if isinstance(power_iter, PowerFlowIteration):
+            (solution,) = launch_results
+            self.fire(PowerFlowSolved(power_iter=power_iter, solution=solution))
+            return
+
+        self._chain_power_events(power_iter, *launch_results)
+
+    @handler("PowerFlowSolved")
+    def _on_power_flow_solved(self, power_iter, solution):
+        """Update assets with the solved state
+        (asset handlers are run by the event loop thread)"""
+        try:
+            power_iter.apply(solution)
+        finally:
+            # iteration is completed even if some of the assets failed to update
+            self._chain_power_events(power_iter, [])
 
-    def _chain_power_events(self, volt_events, load_events=None):
+    def _on_thermal_iteration_launched(self, thermal_iter, *launch_results):
+        """Buffer redis writes until thermal iteration is done"""
+        ISystemEnvironment.get_store().begin_batch()
+        self._chain_thermal_events(thermal_iter, *launch_results)
+
+    def _chain_power_events(self, power_iter, volt_events, load_events=None):
         """Chain power events by dispatching input power events
         against children of the updated asset;
         Fire load events against parents of the updated asset if
@@ -143,10 +341,10 @@ class Engine(Component):
         """
 
         # reached the end of a stream of voltage updates
-        if self._power_iter_handler.current_iteration.all_voltage_branches_done:
-            self._notify_trackers(AllVoltageBranchesDone())
-            if self._power_iter_handler.current_iteration.all_load_branches_done:
-                self._mark_load_branches_done()
+        if power_iter.all_voltage_branches_done:
+            self._notify_trackers(AllVoltageBranchesDone(power_iter=power_iter))
+            if power_iter.all_load_branches_done:
+                self._mark_load_branches_done(power_iter)
 
         for child_key, event in volt_events:
             self.fire(event, self._assets[child_key])
@@ -155,13 +353,13 @@ class Engine(Component):
             for parent_key, event in load_events:
                 self.fire(event, self._assets[parent_key])
 
-    def _chain_load_events(self, load_events):
+    def _chain_load_events(self, power_iter, load_events):
         """Chain load events by dispatching more load events against
         parents of the updated child asset"""
 
         # load & voltage branches are completed
-        if self._power_iter_handler.current_iteration.iteration_done:
-            self._mark_load_branches_done()
+        if power_iter.iteration_done:
+            self._mark_load_branches_done(power_iter)
 
         if not load_events:
             return
@@ -169,12 +367,13 @@ class Engine(Component):
         for asset_key, event in load_events:
             self.fire(event, self._assets[asset_key])
 
-    def _chain_thermal_events(self, thermal_events):
+    def _chain_thermal_events(self, thermal_iter, thermal_events):
         """Chain thermal events by dispatching them against assets"""
 
-        if self._thermal_iter_handler.current_iteration.iteration_done:
-            self._notify_trackers(AllThermalBranchesDone())
-            self._thermal_iter_handler.unfreeze_task_queue()
+        if thermal_iter.iteration_done:
+            ISystemEnvironment.get_store().end_batch()
+            self._notify_trackers(AllThermalBranchesDone(power_iter=thermal_iter))
+            self._thermal_iter_handler.unfreeze_task_queue(thermal_iter)
 
         if not thermal_events:
             return
@@ -217,7 +416,10 @@ class Engine(Component):
                 events.MainsPowerEvent(mains=int(math.isclose(old_voltage, 0.0)))
             )
 
-        self._power_iter_handler.queue_iteration(PowerIteration(volt_event))
+        iteration_cls = (
+            PowerFlowIteration if PowerFlowIteration.solver else PowerIteration
+        )
+        self._power_iter_handler.queue_iteration(iteration_cls(volt_event))
 
     def handle_state_update(self, asset_key, old_state, new_state):
         """Asset state changes to a new value,
@@ -302,11 +504,26 @@ class Engine(Component):
         self._thermal_iter_handler.stop()
         self._sys_environ.stop()
 
+        for iter_handler in [self._power_iter_handler, self._thermal_iter_handler]:
+            ISystemEnvironment.get_store().discard_batch_thread(
+                iter_handler.worker_thread
+            )
+
         for asset_key in self._assets:
             self._assets[asset_key].stop()
 
-        HardwareGraphDataSource.cache_clear_all()
-        HardwareGraphDataSource.close()
+        ThermalScheduler.shared().stop()
+        BatteryScheduler.shared().stop()
+        VMLifecycleMonitor.shared().stop()
+        CPULoadSampler.shared().stop()
+
+        self._data_source.cache_clear_all()
+        self._data_source.close()
+
+        logger.info("Graph db usage: %s", DriverRegistry.stats())
+        DriverRegistry.close_all()
+
+        ISystemEnvironment.get_store().flush()
 
         super().stop(code)
 
@@ -315,28 +532,27 @@ class Engine(Component):
     # asset finishes processing incoming event)
 
     def _on_asset_power_event_success(self, asset_event):
-        """Notify current power iteration that hardware asset
+        """Notify power iteration the event belongs to that hardware asset
         finished processing power event"""
         self._notify_trackers(asset_event)
+        power_iter = asset_event.power_iter
         self._chain_power_events(
-            *self._power_iter_handler.current_iteration.process_power_event(asset_event)
+            power_iter, *power_iter.process_power_event(asset_event)
         )
 
     def _on_asset_load_event_success(self, asset_event):
-        """Notify current power iteration that hardware asset
+        """Notify power iteration the event belongs to that hardware asset
         finished processing load event"""
         self._notify_trackers(asset_event)
-        self._chain_load_events(
-            self._power_iter_handler.current_iteration.process_load_event(asset_event)
-        )
+        power_iter = asset_event.power_iter
+        self._chain_load_events(power_iter, power_iter.process_load_event(asset_event))
 
     def _on_asset_thermal_event_success(self, asset_event):
-        """Notify current thermal iteration that hardware asset
+        """Notify thermal iteration the event belongs to that hardware asset
         finished processing thermal changes"""
+        thermal_iter = asset_event.power_iter
         self._chain_thermal_events(
-            self._thermal_iter_handler.current_iteration.process_thermal_event(
-                asset_event
-            )
+            thermal_iter, thermal_iter.process_thermal_event(asset_event)
         )
 
     # **Events are camel-case
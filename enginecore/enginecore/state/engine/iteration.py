@@ -1,4 +1,6 @@
 """Tools for keeping track of the ongoing donwtream & upstream power event flow"""
+import math
+
 from enginecore.state.engine import events
 
 
@@ -98,6 +100,11 @@ class EngineIteration:
         self._src_event = src_event
         self._src_event.power_iter = self
 
+    @property
+    def src_event(self):
+        """Event that started this iteration"""
+        return self._src_event
+
     @property
     def iteration_done(self):
         """Indicates if iteration is completed or not (still in progress)"""
@@ -107,6 +114,30 @@ class EngineIteration:
         """Start iteration processing"""
         raise NotImplementedError()
 
+    def is_independent_of(self, other_iter):
+        """Iteration can run alongside the other one if they don't
+        affect the same part of the system
+        Args:
+            other_iter(EngineIteration): iteration in progress
+        """
+        return False
+
+    @property
+    def is_noop(self):
+        """True if launching iteration wouldn't change anything
+        (e.g. merged changes cancel each other out)"""
+        return False
+
+    def merge(self, next_iter):
+        """Coalesce this (still pending) iteration with the one queued right after it
+        Args:
+            next_iter(EngineIteration): iteration that supersedes this one
+        Returns:
+            EngineIteration: new iteration replacing both of them or
+                             None if the two cannot be merged
+        """
+        return None
+
 
 class ThermalIteration(EngineIteration):
     """Thermal Iteration is launched when room temperature either drops or
@@ -126,6 +157,27 @@ class ThermalIteration(EngineIteration):
     def launch(self):
         return self.process_thermal_event(self._src_event)
 
+    @property
+    def is_noop(self):
+        """Ambient is back where it was (e.g. 21 -> 22 -> 21)"""
+        return math.isclose(
+            self._src_event.temperature.old, self._src_event.temperature.new
+        )
+
+    def merge(self, next_iter):
+        """Collapse 2 consecutive ambient changes into one
+        (old temp of this iteration -> new temp of the next one)"""
+
+        if not isinstance(next_iter, ThermalIteration):
+            return None
+
+        old_temp = self._src_event.temperature.old
+        new_temp = next_iter._src_event.temperature.new
+
+        return ThermalIteration(
+            events.AmbientEvent(old_temp=old_temp, new_temp=new_temp)
+        )
+
     def process_thermal_event(self, event):
         """Process thermal event"""
 
@@ -173,6 +225,8 @@ class PowerIteration(EngineIteration):
         self._last_processed_volt_event = None
         self._last_processed_load_event = None
 
+        self._footprint = None
+
     def __str__(self):
         return (
             "Power Iteration due to incoming event:\n"
@@ -213,6 +267,92 @@ class PowerIteration(EngineIteration):
         """
         return self.process_power_event(self._src_event)
 
+    @property
+    def footprint(self):
+        """Keys of assets that can be affected by this iteration:
+        source asset & its descendants (voltage flows downstream) plus
+        all of their ancestors (load flows upstream);
+        None if iteration affects the whole system (e.g. wallpower update)
+        """
+
+        src_asset = self._src_event.kwargs.get("asset")
+        if not src_asset:
+            return None
+
+        if self._footprint is not None:
+            return self._footprint
+
+        downstream, next_keys = set(), [src_asset.key]
+        while next_keys:
+            key = next_keys.pop()
+            if key not in downstream:
+                downstream.add(key)
+                next_keys.extend(self.data_source.get_affected_assets(key)[0])
+
+        affected, next_keys = set(downstream), list(downstream)
+        while next_keys:
+            for parent_key in self.data_source.get_parent_assets(next_keys.pop()):
+                if parent_key not in affected:
+                    affected.add(parent_key)
+                    next_keys.append(parent_key)
+
+        self._footprint = frozenset(affected)
+        return self._footprint
+
+    def is_independent_of(self, other_iter):
+        """Power iterations are independent if their power flows
+        do not overlap (e.g. assets belong to different upstream
+        outlet/PDU/UPS chains)"""
+
+        if not isinstance(other_iter, PowerIteration):
+            return False
+
+        footprint, other_footprint = self.footprint, other_iter.footprint
+        if footprint is None or other_footprint is None:
+            return False
+
+        return footprint.isdisjoint(other_footprint)
+
+    @property
+    def is_voltage_fluctuation(self):
+        """True if iteration was caused by wallpower voltage change that does not
+        involve mains outage/restoration (e.g. 120V -> 118V)"""
+
+        event = self._src_event
+        return (
+            type(event) is events.AssetPowerEvent  # pylint: disable=C0123
+            and event.asset is None
+            and bool(event.out_volt.old)
+            and bool(event.out_volt.new)
+        )
+
+    @property
+    def is_noop(self):
+        """Wallpower voltage is back where it was (e.g. 120 -> 118 -> 120)"""
+        return self.is_voltage_fluctuation and math.isclose(
+            self._src_event.out_volt.old, self._src_event.out_volt.new
+        )
+
+    def merge(self, next_iter):
+        """Collapse 2 consecutive wallpower voltage fluctuations into one
+        (old voltage of this iteration -> new voltage of the next one);
+        iterations caused by power outage/restoration are never merged
+        """
+
+        if not isinstance(next_iter, PowerIteration):
+            return None
+
+        if not (self.is_voltage_fluctuation and next_iter.is_voltage_fluctuation):
+            return None
+
+        return type(self)(
+            events.AssetPowerEvent(
+                asset=None,
+                old_out_volt=self._src_event.out_volt.old,
+                new_out_volt=next_iter._src_event.out_volt.new,
+            )
+        )
+
     def process_power_event(self, event):
         """Retrieves events as a reaction to the passed source event
         Args:
@@ -1,8 +1,72 @@
 """An iteration-handling utility that watches for incoming events
 in a thread and launches an iteration"""
 
+import itertools
 import queue
 import threading
+import weakref
+
+
+class CoalescingQueue(queue.Queue):
+    """FIFO queue that merges newly added iteration into the last pending one
+    when iterations allow it (see EngineIteration.merge), e.g. a series of
+    wallpower voltage fluctuations becomes a single old->newest transition;
+
+    Merged iteration completes on behalf of the newest queued iteration,
+    older (superseded) iterations are reported through on_merged callback
+    so that every queued iteration is either completed or reported as merged.
+    If merged changes cancel each other out (e.g. 120V -> 118V -> 120V), both
+    iterations are dropped & reported as merged into None.
+    """
+
+    def __init__(self, maxsize=0, on_merged=None):
+        """
+        Args:
+            maxsize(int): see queue.Queue
+            on_merged(callable): called with superseded iteration & the iteration
+                                 replacing it (under the queue lock);
+                                 None if nothing replaces it
+        """
+        self._on_merged = on_merged
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self.num_merged = 0
+        # merged iteration -> queued iteration it completes on behalf of
+        self._represented = weakref.WeakKeyDictionary()
+
+    def _put(self, item):
+        last_iter = self.queue[-1] if self.queue else None
+        merged_iter = last_iter.merge(item) if last_iter and item else None
+
+        if not merged_iter:
+            super()._put(item)
+            return
+
+        self.num_merged += 1
+        superseded_iter = self._represented.pop(last_iter, last_iter)
+
+        # put() counts every item as an unfinished task,
+        # merged iteration does not add any new work
+        self.unfinished_tasks -= 1
+
+        if merged_iter.is_noop:
+            self.queue.pop()
+            self.num_merged += 1
+            self.unfinished_tasks -= 1
+            self._report_merged(superseded_iter, None)
+            self._report_merged(item, None)
+            return
+
+        self.queue[-1] = merged_iter
+        self._represented[merged_iter] = item
+        self._report_merged(superseded_iter, merged_iter)
+
+    def _report_merged(self, superseded_iter, merged_iter):
+        """Notify callback of the iteration that won't be launched"""
+        if self._on_merged:
+            self._on_merged(superseded_iter, merged_iter)
 
 
 class EngineIterationConsumer:
@@ -10,27 +74,72 @@ class EngineIterationConsumer:
     and launches a processing iteration (e.g. a chain of power events
     that occurred due to power outage)"""
 
-    def __init__(self, iteration_worker_name="unspecified"):
+    def __init__(
+        self,
+        iteration_worker_name="unspecified",
+        coalesce=True,
+        concurrent=False,
+        on_iteration_merged=None,
+    ):
+        """
+        Args:
+            iteration_worker_name(str): name of the consumer thread
+            coalesce(bool): merge superseded iterations waiting in the queue
+            concurrent(bool): launch queued iteration while others are still
+                              in progress as long as they are independent
+                              (see EngineIteration.is_independent_of)
+            on_iteration_merged(callable): called with queued iteration that
+                                           was superseded & merged iteration
+                                           replacing it (see CoalescingQueue)
+        """
         # queue of engine events waiting to be processed
-        self._event_queue = queue.Queue()
-        self._iteration_done_event = threading.Event()
+        self._event_queue = (
+            CoalescingQueue(on_merged=on_iteration_merged)
+            if coalesce
+            else queue.Queue()
+        )
+        self._iteration_done = threading.Condition()
         # work-in-progress
-        self._current_iteration = None
+        self._running_iterations = []
+        self._concurrent = concurrent
         self._worker_thread = None
         self._on_iteration_launched = None
         self._iteration_worker_name = iteration_worker_name
 
     @property
     def current_iteration(self):
-        """Iteration that is in progress/not yet completed
+        """Most recently launched iteration that is in progress/not yet completed
         (e.g. power downstream update still going on)"""
-        return self._current_iteration
+        with self._iteration_done:
+            return self._running_iterations[-1] if self._running_iterations else None
+
+    @property
+    def running_iterations(self):
+        """All the iterations currently in progress"""
+        with self._iteration_done:
+            return list(self._running_iterations)
+
+    @property
+    def worker_thread(self):
+        """Thread launching queued iterations"""
+        return self._worker_thread
+
+    @property
+    def num_merged_iterations(self):
+        """Number of queued iterations that were coalesced with newer ones"""
+        return getattr(self._event_queue, "num_merged", 0)
+
+    @property
+    def num_pending_iterations(self):
+        """Number of iterations waiting in the queue"""
+        return self._event_queue.qsize()
 
     def start(self, on_iteration_launched=None):
         """Launches consumer thread
         Args:
-            on_iteration_launched(callable): called when event queue returns
-                                             new iteration
+            on_iteration_launched(callable): called with the launched iteration
+                                             & its launch results when event queue
+                                             returns new iteration
         """
         self._on_iteration_launched = on_iteration_launched
 
@@ -40,61 +149,101 @@ class EngineIterationConsumer:
         )
         self._worker_thread.daemon = True
         self._worker_thread.start()
-        self._iteration_done_event.set()
 
     def stop(self):
         """Join consumer thread (stop processing power queued power iterations)"""
-        if self._current_iteration:
-            self._complete_task()
+        running_iterations = self.running_iterations
+        for iteration in running_iterations:
+            self._complete_task(iteration)
+
+        if running_iterations:
             self._event_queue.join()
 
         self.queue_iteration(None)
-        self._iteration_done_event.set()
         self._worker_thread.join()
 
     def queue_iteration(self, iteration):
         """Queue an iteration for later processing;
-        it will get dequeued once current_iteration is completed
+        it will get launched once it does not conflict with
+        iterations in progress
         Args:
             iteration(EngineIteration): to be queued, event consumer will stop
                                         if None is supplied
         """
         self._event_queue.put(iteration)
-        if not self._current_iteration:
-            self._iteration_done_event.set()
 
-    def unfreeze_task_queue(self):
-        """Signal that current iteration is done (so handler can process
-        next event in a queue if available)"""
+        with self._iteration_done:
+            self._iteration_done.notify_all()
 
-        assert self.current_iteration.iteration_done
-        self._complete_task()
+    def unfreeze_task_queue(self, iteration):
+        """Signal that iteration is done (so handler can process
+        next event in a queue if available)
+        Args:
+            iteration(EngineIteration): completed iteration
+        """
+
+        assert iteration.iteration_done
+        self._complete_task(iteration)
+
+    def _complete_task(self, iteration):
+        """Removes iteration from the ones in progress and
+        signals _worker to accept new queued tasks"""
+        with self._iteration_done:
+            self._running_iterations.remove(iteration)
+            self._event_queue.task_done()
+            self._iteration_done.notify_all()
+
+    def _can_launch(self, iteration):
+        """True if iteration does not interfere with the ones in progress"""
+        if not self._concurrent:
+            return not self._running_iterations
+
+        return all(iteration.is_independent_of(r) for r in self._running_iterations)
+
+    def _pop_launchable(self):
+        """Take the first queued iteration that can be launched right away;
+        iterations conflicting with the ones in progress are left in the queue
+        (so they can still be merged) & iterations queued after them are
+        launched only if they are independent of the skipped ones
+        Returns:
+            tuple: containing launchable iteration (None if consumer should stop)
+                   or None if nothing can be launched at the moment
+        """
+        with self._event_queue.mutex:
+            pending = self._event_queue.queue
+
+            for idx, iteration in enumerate(pending):
+                if iteration is None:
+                    # stop once queued iterations are launched
+                    return None if idx or self._running_iterations else (None,)
 
-    def _complete_task(self):
-        """Resets current iteration and signals _worker to accept new queued tasks"""
-        self._current_iteration = None
-        self._event_queue.task_done()
-        self._iteration_done_event.set()
+                skipped = itertools.islice(pending, idx)
+                if self._can_launch(iteration) and all(
+                    iteration.is_independent_of(s) for s in skipped
+                ):
+                    del pending[idx]
+                    return (iteration,)
+
+                # sequential consumer launches iterations in order
+                if not self._concurrent:
+                    return None
+
+        return None
 
     def _worker(self):
         """Consumer processing event queue, calls a callback supplied in
         start()"""
 
         while True:
-            self._iteration_done_event.wait()
+            with self._iteration_done:
+                (next_iter,) = self._iteration_done.wait_for(self._pop_launchable)
 
-            # new processing iteration/loop was initialized
-            next_iter = self._event_queue.get()
+                if not next_iter:
+                    return
 
-            if not next_iter:
-                return
+                self._running_iterations.append(next_iter)
 
-            assert self._current_iteration is None
-
-            self._current_iteration = next_iter
-            launch_results = self._current_iteration.launch()
+            launch_results = next_iter.launch()
 
             if self._on_iteration_launched:
-                self._on_iteration_launched(*launch_results)
-
-            self._iteration_done_event.clear()
+                self._on_iteration_launched(next_iter, *launch_results)
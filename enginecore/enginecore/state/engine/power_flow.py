@@ -0,0 +1,491 @@
+"""Steady-state power flow solver;
+
+Instead of propagating voltage & load changes one hop at a time
+(InputVoltageEvent -> AssetPowerEvent -> ChildLoadEvent ...), the solver computes
+resulting state of every asset powered by the mains in one pass:
+    - input voltages & power states are calculated top-down (level by level)
+    - loads are accumulated bottom-up
+
+Assets with their own power source (UPS) are settled by their voltage handlers
+(battery transfers etc.), the rest of the system is solved with their outputs.
+Model is solved by the iteration worker thread, solution is then applied by
+the engine's event loop (like any other asset event handling): states are
+written through state managers & asset hooks (see Asset.power_flow_solved)
+so that OIDs, sensors & agents are kept up to date.
+
+Power graph is stored as an edge list (child->parent index arrays),
+every level of the graph is processed with vectorized scatter operations.
+"""
+import functools
+import logging
+import math
+
+import numpy as np
+
+from enginecore.state.engine import events
+from enginecore.state.engine.iteration import PowerIteration
+
+logger = logging.getLogger(__name__)
+
+
+class PowerFlowModel:
+    """Vectorized representation of the power topology"""
+
+    def __init__(self, keys, power_connections, mains_outlets):
+        """
+        Args:
+            keys(list): asset keys
+            power_connections(list): of (child_key, parent_key) tuples
+            mains_outlets(list): keys of assets powered by the wallpower
+        """
+
+        self._keys = list(keys)
+        index = {key: i for i, key in enumerate(self._keys)}
+
+        edges = [
+            (index[c_key], index[p_key])
+            for c_key, p_key in power_connections
+            if c_key in index and p_key in index
+        ]
+
+        self._child_idx = np.array([c for c, _ in edges], dtype=int)
+        self._parent_idx = np.array([p for _, p in edges], dtype=int)
+
+        self._mains = np.zeros(len(self._keys), dtype=bool)
+        self._mains[[index[k] for k in mains_outlets if k in index]] = True
+
+        self._depth = self._calc_depth()
+        self._reachable = self._calc_reachable()
+
+    @property
+    def keys(self):
+        """Asset keys (in the order used by the model arrays)"""
+        return self._keys
+
+    @property
+    def depth(self):
+        """Distance of every asset from the power source
+        (children are always deeper than their parents)"""
+        return self._depth
+
+    @property
+    def reachable(self):
+        """Mask of assets that are powered by the mains (directly or downstream)"""
+        return self._reachable
+
+    def _calc_depth(self):
+        """Longest path from a root node to every asset"""
+
+        depth = np.zeros(len(self._keys), dtype=int)
+
+        for _ in self._keys:
+            new_depth = depth.copy()
+            np.maximum.at(new_depth, self._child_idx, depth[self._parent_idx] + 1)
+            if np.array_equal(new_depth, depth):
+                break
+            depth = new_depth
+
+        return depth
+
+    def _calc_reachable(self):
+        """Find assets that are descendants of mains-powered outlets"""
+
+        reachable = self._mains.copy()
+
+        for _ in range(self._depth.max(initial=0)):
+            reachable[self._child_idx[reachable[self._parent_idx]]] = True
+
+        return reachable
+
+    def solve(self, wall_voltage, status, min_voltage, power_consumption, **kwargs):
+        """Compute resulting state of assets for the new wallpower voltage
+        Args:
+            wall_voltage(float): new mains voltage
+            status(numpy.ndarray): current power states (1 or 0)
+            min_voltage(numpy.ndarray): voltage required to stay online
+            power_consumption(numpy.ndarray): wattage drawn by assets
+            draw(numpy.ndarray, optional): draw percentages of assets
+                                           powering multi-source devices (PSUs)
+            power_on_ac(numpy.ndarray, optional): power up on AC restored mask
+            user_off(numpy.ndarray, optional): turned off by a user mask
+            fixed(numpy.ndarray, optional): mask of assets with their own
+                                            power source (UPS), their power
+                                            states are not changed & output
+                                            voltages are taken from fixed_volt
+            fixed_volt(numpy.ndarray, optional): output voltages of fixed assets
+            load_cut(numpy.ndarray, optional): mask of assets not drawing power
+                                               from their parents (UPS on battery)
+        Returns:
+            tuple: input voltages, power states & loads of all assets
+                   (values for assets not powered by the mains are meaningless)
+        """
+
+        num_assets = len(self._keys)
+        draw = kwargs.get("draw", np.ones(num_assets))
+        power_on_ac = kwargs.get("power_on_ac", np.ones(num_assets, dtype=bool))
+        user_off = kwargs.get("user_off", np.zeros(num_assets, dtype=bool))
+        fixed = kwargs.get("fixed", np.zeros(num_assets, dtype=bool))
+        fixed_volt = kwargs.get("fixed_volt", np.zeros(num_assets))
+        load_cut = kwargs.get("load_cut", np.zeros(num_assets, dtype=bool))
+
+        in_volt = np.where(self._mains, float(wall_voltage), 0.0)
+        new_status = np.array(status, dtype=int)
+        solved = self._reachable & ~fixed
+
+        # voltage goes downstream: parents are settled before their children
+        for level in range(self._depth.max(initial=-1) + 1):
+            at_level = solved & (self._depth == level)
+
+            if level:
+                out_volt = np.where(fixed, fixed_volt, in_volt * new_status)
+                edges = (self._reachable & (self._depth == level))[self._child_idx]
+                np.maximum.at(
+                    in_volt,
+                    self._child_idx[edges],
+                    out_volt[self._parent_idx[edges]],
+                )
+
+            powered = in_volt > min_voltage
+            new_status[at_level & ~powered] = 0
+            new_status[at_level & powered & (status == 0) & power_on_ac & ~user_off] = 1
+
+        out_volt = np.where(fixed, fixed_volt, in_volt * new_status)
+        online = self._reachable & (out_volt > 0)
+        # assets running on their own power source supply the output voltage
+        supply_volt = np.where(fixed, out_volt, in_volt)
+        load = np.where(
+            online, power_consumption / np.where(online, supply_volt, 1.0), 0.0
+        )
+
+        # load of a multi-source asset is split among online parents
+        # (draw of offline parents is taken over by the ones still online)
+        parent_on = out_volt[self._parent_idx] > 0
+        edge_draw = draw[self._parent_idx]
+        num_parents = np.bincount(self._child_idx, minlength=num_assets)
+        num_parents_on = np.bincount(
+            self._child_idx, weights=parent_on, minlength=num_assets
+        )
+        offline_draw = np.bincount(
+            self._child_idx, weights=edge_draw * ~parent_on, minlength=num_assets
+        )
+
+        share = edge_draw + offline_draw[self._child_idx] / np.maximum(
+            num_parents_on[self._child_idx], 1
+        )
+        share[num_parents[self._child_idx] == 1] = 1.0
+        share[~parent_on | load_cut[self._child_idx]] = 0.0
+
+        # load goes upstream: children are settled before their parents
+        for level in range(self._depth.max(initial=0), 0, -1):
+            edges = self._reachable[self._child_idx] & (
+                self._depth[self._child_idx] == level
+            )
+            np.add.at(
+                load,
+                self._parent_idx[edges],
+                load[self._child_idx[edges]] * share[edges],
+            )
+
+        return in_volt, new_status, load
+
+
+class PowerFlowSolver:
+    """Applies steady-state solution of the power model to the hardware assets"""
+
+    # assets that can be handled by the solver
+    solvable_types = [
+        "outlet",
+        "pdu",
+        "ups",
+        "staticasset",
+        "lamp",
+        "server",
+        "serverwithbmc",
+        "psu",
+    ]
+
+    # assets with their own power source, voltage handlers of these assets
+    # decide on their output (e.g. UPS transferring to battery)
+    source_types = ["ups"]
+
+    # assets (UPSes & BMC servers) that are yet to be checked against event
+    # propagation on the behave features, solved only if enabled explicitly
+    unverified_types = ["ups", "serverwithbmc"]
+
+    def __init__(self, assets, data_source, notify=None, unverified=False):
+        """
+        Args:
+            assets(dict): hardware assets managed by the engine
+            data_source(HardwareDataSource): topology provider
+            notify(callable): called with AssetPowerEvent for every updated asset
+            unverified(bool): solve topologies with unverified asset types
+        """
+
+        self._assets = assets
+        self._notify = notify
+        self._unverified = unverified
+
+        keys = list(assets)
+        self._model = PowerFlowModel(
+            keys,
+            [(k, p_key) for k in keys for p_key in data_source.get_parent_assets(k)],
+            data_source.get_mains_powered_assets(),
+        )
+
+        asset_states = [assets[k].state for k in keys]
+        self._min_voltage = np.array([s.min_voltage_prop() for s in asset_states])
+        self._power_consumption = np.array([s.power_consumption for s in asset_states])
+        self._draw = np.array([s.draw_percentage for s in asset_states])
+        self._power_on_ac = np.array([s.power_on_ac_restored for s in asset_states])
+        self._is_source = np.array(
+            [s.asset_type in self.source_types for s in asset_states], dtype=bool
+        )
+
+    @property
+    def supported(self):
+        """True if all of the mains-powered assets can be handled by the solver"""
+
+        def solvable(state):
+            if self._unverified:
+                return state.asset_type in self.solvable_types
+
+            return (
+                state.asset_type in self.solvable_types
+                and state.asset_type not in self.unverified_types
+                and not getattr(state, "supports_bmc", False)
+            )
+
+        keys = np.array(self._model.keys)[self._model.reachable]
+        return all(solvable(self._assets[k].state) for k in keys)
+
+    @staticmethod
+    def _switch_source(asset, old_in_volt, new_in_volt):
+        """Let asset with its own power source react to input voltage change
+        (UPS handlers transfer to/from battery, update OIDs etc.)
+        Returns:
+            tuple: new power state, output voltage & True if asset
+                   no longer draws power from its parents (on battery)
+        """
+
+        if math.isclose(old_in_volt, new_in_volt):
+            return (
+                asset.state.status,
+                asset.state.output_voltage,
+                asset.state.on_battery,
+            )
+
+        volt_event = events.AssetPowerEvent(
+            asset=None, old_out_volt=old_in_volt, new_out_volt=new_in_volt
+        ).get_next_voltage_event()
+
+        if isinstance(volt_event, events.InputVoltageUpEvent):
+            asset_event = asset.on_input_voltage_up(volt_event)
+        else:
+            asset_event = asset.on_input_voltage_down(volt_event)
+
+        new_state = asset_event.state.old
+        if not asset_event.state.unchanged():
+            new_state = asset_event.state.new
+
+        return new_state, asset_event.out_volt.new, asset.state.on_battery
+
+    def solve(self, wall_voltage):
+        """Solve power model for the new wallpower voltage
+        (assets are not updated, see apply)
+        Args:
+            wall_voltage(float): new mains voltage
+        Returns:
+            PowerFlowSolution: solved state of the assets, None if there are
+                               no assets to solve
+        """
+
+        keys = self._model.keys
+        if not keys:
+            return None
+
+        assets = [self._assets[k] for k in keys]
+        redis_keys = [a.state.redis_key for a in assets]
+        store = assets[0].state.get_store()
+
+        # current state of the system in one round-trip
+        values = store.mget(
+            [k + ":state" for k in redis_keys]
+            + [k + ":in-voltage" for k in redis_keys]
+            + [k + ":load" for k in redis_keys]
+        )
+
+        as_float = lambda v: float(v) if v else 0.0
+        num_assets = len(keys)
+        status = np.array([int(as_float(v)) for v in values[:num_assets]])
+        in_volt = np.array([as_float(v) for v in values[num_assets:-num_assets]])
+        load = np.array([as_float(v) for v in values[-num_assets:]])
+
+        user_off = np.array(
+            [a.state_reason == a.state.PowerStateReason.turned_off for a in assets],
+            dtype=bool,
+        )
+
+        # assets with their own power source keep their current output
+        # until their handlers react to the new input voltage (see apply)
+        fixed = self._is_source & self._model.reachable
+        fixed_volt = np.array(
+            [a.state.output_voltage if f else 0.0 for a, f in zip(assets, fixed)]
+        )
+        load_cut = np.array(
+            [bool(f and a.state.on_battery) for a, f in zip(assets, fixed)]
+        )
+
+        return PowerFlowSolution(
+            functools.partial(
+                self._model.solve,
+                wall_voltage,
+                min_voltage=self._min_voltage,
+                power_consumption=self._power_consumption,
+                draw=self._draw,
+                power_on_ac=self._power_on_ac,
+                user_off=user_off,
+            ),
+            assets,
+            (status, in_volt, load),
+            (fixed, fixed_volt, load_cut),
+        )
+
+    def apply(self, solution):
+        """Update assets with the solved state
+        (calls asset handlers so it must be run by the engine's event loop)
+        Args:
+            solution(PowerFlowSolution): as returned by solve
+        """
+        self._settle_sources(solution)
+        self._update_assets(solution)
+
+    def _settle_sources(self, solution):
+        """Let assets with their own power source react to the solved input
+        voltages top-down (input voltage of a UPS depends on the UPSes upstream);
+        the model is re-solved every time one of them changes its output
+        """
+
+        sources = np.flatnonzero(solution.fixed)
+        for i in sorted(sources, key=lambda i: self._model.depth[i]):
+            new_state, out_volt, on_battery = self._switch_source(
+                solution.assets[i], solution.old_in_volt[i], solution.in_volt[i]
+            )
+
+            if (
+                new_state == solution.status[i]
+                and on_battery == solution.load_cut[i]
+                and math.isclose(out_volt, solution.fixed_volt[i])
+            ):
+                continue
+
+            solution.status[i] = new_state
+            solution.fixed_volt[i] = out_volt
+            solution.load_cut[i] = on_battery
+            solution.resolve()
+
+    def _update_assets(self, solution):
+        """Write solved state to the assets"""
+
+        assets = solution.assets
+        old_status, new_status = solution.old_status, solution.status
+        old_in_volt, new_in_volt = solution.old_in_volt, solution.in_volt
+
+        updated = np.flatnonzero(self._model.reachable)
+        new_out_volt = solution.out_volt
+
+        asset_events = {}
+        for i in updated:
+            asset_event = events.AssetPowerEvent(
+                asset=assets[i],
+                old_out_volt=float(old_in_volt[i] * old_status[i]),
+                new_out_volt=float(new_out_volt[i]),
+                old_state=int(old_status[i]),
+                new_state=int(new_status[i]),
+            )
+            asset_event.load.old = float(solution.old_load[i])
+            asset_event.load.new = float(solution.load[i])
+            asset_events[i] = asset_event
+
+            if not math.isclose(old_in_volt[i], new_in_volt[i]):
+                assets[i].state.update_input_voltage(max(new_in_volt[i], 0.0))
+
+        # power state changes have side effects (vms, agents etc.),
+        # power up parents before children
+        for i in sorted(updated, key=lambda i: self._model.depth[i]):
+            if solution.fixed[i] or new_status[i] == old_status[i]:
+                continue
+
+            asset = assets[i]
+            power_action = asset.power_up if new_status[i] else asset.power_off
+            if power_action() != new_status[i]:
+                logger.warning(
+                    "Asset [%s] did not reach solved power state %s",
+                    asset.key,
+                    new_status[i],
+                )
+
+        for i in updated:
+            assets[i].power_flow_solved(asset_events[i], float(new_in_volt[i]))
+
+            if self._notify and not (
+                asset_events[i].state.unchanged() and asset_events[i].load.unchanged()
+            ):
+                self._notify(asset_events[i])
+
+
+class PowerFlowSolution:
+    """Solved state of the assets (in model order) along with their state
+    at the time the model was solved"""
+
+    def __init__(self, solve, assets, old_state, sources):
+        """
+        Args:
+            solve(callable): solves the model for the given power states
+                             & sources (see PowerFlowModel.solve)
+            assets(list): hardware assets in model order
+            old_state(tuple): power states, input voltages & loads
+            sources(tuple): masks of assets with their own power source,
+                            their output voltages & on-battery mask
+        """
+        self._solve = solve
+        self.assets = assets
+        self.old_status, self.old_in_volt, self.old_load = old_state
+        self.fixed, self.fixed_volt, self.load_cut = sources
+
+        self.status = self.old_status.copy()
+        self.in_volt, self.load = None, None
+        self.resolve()
+
+    @property
+    def out_volt(self):
+        """Solved output voltages"""
+        return np.where(self.fixed, self.fixed_volt, self.in_volt * self.status)
+
+    def resolve(self):
+        """Solve the model again (e.g. once sources change their output)"""
+        self.in_volt, self.status, self.load = self._solve(
+            np.where(self.fixed, self.status, self.old_status),
+            fixed=self.fixed,
+            fixed_volt=self.fixed_volt,
+            load_cut=self.load_cut,
+        )
+
+
+class PowerFlowIteration(PowerIteration):
+    """Wallpower iteration that computes resulting state of all the assets
+    in one pass (see PowerFlowSolver) instead of chaining power events"""
+
+    solver = None
+
+    def launch(self):
+        """Solve the power model, no power branches are created
+        so the iteration is completed once the solution is applied
+        Returns:
+            tuple: consisting of PowerFlowSolution
+        """
+        return (self.solver.solve(self._src_event.out_volt.new),)
+
+    def apply(self, solution):
+        """Update assets with the solved state (see PowerFlowSolver.apply)"""
+        if solution:
+            self.solver.apply(solution)
@@ -18,15 +18,32 @@ class Asset(Component):
     among all hardware devices; (all hardware assets must derive
     from here)"""
 
+    # keys of the assets that keep their state & agents on warm start
+    # (assets that did not change since the last engine start)
+    warm_keys = frozenset()
+
+    # assets are constructed concurrently, stage by stage
+    # (assets that depend on others are placed in later stages)
+    bootstrap_stage = 0
+
     def __init__(self, state):
         super(Asset, self).__init__()
         self._state = state
         self._state_reason = None
+
+        if self.warm_start:
+            return
+
         self.state.update_input_voltage(0)
 
         self.state.reset_boot_time()
         self.state.update_load(0.0)
 
+    @property
+    def warm_start(self):
+        """True if asset is re-using its state from the previous engine run"""
+        return self.key in Asset.warm_keys
+
     @property
     def key(self):
         """Get ID assigned to the asset"""
@@ -50,6 +67,16 @@ class Asset(Component):
         """Update load for this asset"""
         return self.state.update_load(new_load)
 
+    def power_flow_solved(self, asset_event, in_volt):
+        """Apply changes computed by the power flow solver
+        (called once input voltage & power state of the asset are updated)
+        Args:
+            asset_event(AssetPowerEvent): solved state & load changes
+            in_volt(float): new input voltage
+        """
+        if not asset_event.load.unchanged():
+            self._update_load(asset_event.load.new)
+
     def power_up(self, state_reason=None):
         """Power up this asset
         Args:
@@ -0,0 +1,522 @@
+"""Battery scheduler charges & drains batteries of all the UPS assets
+in a single thread;
+
+Once per tick, state of every UPS that is charging or draining is fetched with
+a single MGET, new battery levels & runtime estimates are calculated for all
+of them at once and the resulting OID updates are sent in one redis pipeline
+(battery updates are published only when battery level changes).
+
+If SIMENGINE_ANALYTIC_BATTERY env var is set to 1, batteries are not updated
+every tick; battery state is stored as an analytic model (see BatteryModel)
+evaluated by snmppub.lua when OIDs are polled, and the scheduler only handles
+discrete events (battery getting low/empty/full, min restore level reached etc.)
+or changes in load & speed factors.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from enginecore.state.battery_model import BatteryModel
+from enginecore.state.redis_channels import RedisChannels
+from enginecore.state.redis_write_buffer import RedisWriteBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class _BatteryJob:
+    """Battery charge or drain of a single UPS"""
+
+    def __init__(self, ups, charging, callbacks, analytic=False):
+        self.ups = ups
+        self.charging = charging
+        self.callbacks = callbacks
+
+        self.level = ups.state.battery_level
+        self.start_time = time.time()
+
+        # momentary line failure was escalated (when draining)
+        self.outage = False
+        # UPS was powered up on min charge level (when charging)
+        self.powered = False
+
+        # analytic battery model & its upcoming (timestamp, event) pairs
+        self.analytic = analytic
+        self.model = None
+        self.events = [(self.start_time, "anchor")] if analytic else []
+
+    def is_due(self, timestamp):
+        """True if analytic model needs to be re-evaluated"""
+        return bool(self.events) and self.events[0][0] <= timestamp
+
+
+class BatteryScheduler:
+    """Advances batteries of all the UPS assets once per interval
+    (or at discrete events when analytic battery model is used);
+
+    UPS assets managed by the scheduler provide:
+        ups.key
+        ups.state.battery_level, battery_max_level, min_restore_charge_level,
+            momentary_event_period
+        ups.state.battery_snapshot_keys() - redis keys fetched every tick
+        ups.state.parse_battery_snapshot(values) - dict with 'status', 'on_battery',
+            'wattage', 'input_voltage' & 'low_threshold'
+        ups.battery_rates(snapshot) - full power time left (minutes),
+            drain & charge per second (speed factors included)
+        ups.state.battery_oid_values(level, old_level, time_left, time_on_battery)
+            - redis key/values to be set for the new battery level
+        ups.state.battery_model_values(model, old_level)
+            - redis key/values of the analytic battery model
+    """
+
+    interval = 1  # seconds
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, redis_store, analytic=False):
+        """
+        Args:
+            redis_store: redis client (or RedisWriteBuffer) battery state is kept in
+            analytic(bool): use analytic battery model instead of per-tick updates
+        """
+        self._redis_store = redis_store
+        self._analytic = analytic
+
+        self._cond = threading.Condition(threading.RLock())
+        self._jobs = {}
+
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def shared(cls):
+        """Scheduler instance shared by all the UPS assets managed by the engine"""
+        with cls._shared_lock:
+            if not cls._shared:
+                cls._shared = cls(
+                    RedisWriteBuffer.shared(),
+                    analytic=os.environ.get("SIMENGINE_ANALYTIC_BATTERY") == "1",
+                )
+
+            return cls._shared
+
+    def drain(self, ups, on_outage=None, on_depleted=None):
+        """Start draining UPS battery (replaces battery charge)
+        Args:
+            ups(UPS): asset running on battery
+            on_outage(callable): called once UPS was on battery for
+                                 longer than momentary event period
+            on_depleted(callable): called when battery reaches 0
+                                   while UPS is still on & running on battery
+        """
+        self._add_job(ups, charging=False, on_outage=on_outage, on_depleted=on_depleted)
+
+    def charge(self, ups, on_min_charge=None):
+        """Start charging UPS battery (replaces battery drain)
+        Args:
+            ups(UPS): asset powered by its input
+            on_min_charge(callable): called once battery level exceeds min restore
+                                     charge level, returns True if UPS was powered
+        """
+        self._add_job(ups, charging=True, on_min_charge=on_min_charge)
+
+    def refresh(self, ups):
+        """Re-evaluate analytic battery model of the UPS
+        (e.g. when its load, power state or speed factors change)"""
+        with self._cond:
+            job = self._jobs.get(ups.key)
+            if job and job.analytic:
+                job.events.insert(0, (time.time(), "anchor"))
+                self._cond.notify()
+
+    def is_draining(self, ups):
+        """True if UPS battery is being drained"""
+        with self._cond:
+            job = self._jobs.get(ups.key)
+            return job is not None and not job.charging
+
+    def is_charging(self, ups):
+        """True if UPS battery is getting re-charged"""
+        with self._cond:
+            job = self._jobs.get(ups.key)
+            return job is not None and job.charging
+
+    def is_analytic(self, ups):
+        """True if UPS battery is evaluated by the analytic model at the moment
+        (battery OIDs including runtime are then written by the scheduler)"""
+        with self._cond:
+            job = self._jobs.get(ups.key)
+            return job is not None and job.analytic
+
+    def remove(self, ups):
+        """Stop charging/draining UPS battery (no-op if battery is idle)"""
+        with self._cond:
+            job = self._jobs.pop(ups.key, None)
+            if job:
+                self._release([job])
+
+    def stop(self):
+        """Stop the scheduler thread & discard all the jobs"""
+        with self._cond:
+            self._running = False
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+            self._cond.notify_all()
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+        with self._cond:
+            self._release(jobs)
+
+    def _release(self, jobs):
+        """Stop analytic battery models of the discarded jobs at their current
+        level (snmppub.lua would keep charging/draining the batteries otherwise)"""
+        jobs = [job for job in jobs if job.analytic]
+        if not jobs:
+            return
+
+        now = time.time()
+        try:
+            snapshots = self._fetch_snapshots(jobs)
+            pipeline = self._redis_store.pipeline(transaction=False)
+
+            for job, snapshot in zip(jobs, snapshots):
+                model = BatteryModel(
+                    job.model.level_at(now) if job.model else job.level,
+                    0,
+                    now,
+                    job.ups.state.battery_max_level,
+                    job.ups.battery_rates(snapshot)[0],
+                )
+                pipeline.mset(job.ups.state.battery_model_values(model, job.level))
+
+            pipeline.execute()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to stop battery models")
+
+    def _add_job(self, ups, charging, **callbacks):
+        with self._cond:
+            self._jobs[ups.key] = _BatteryJob(ups, charging, callbacks, self._analytic)
+            self._start()
+            self._cond.notify()
+
+    def _start(self):
+        """Launch scheduler thread (if not running)"""
+        if self._running:
+            return
+
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name="battery_scheduler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _next_wakeup(self, next_step):
+        """Time of the next tick (None if there are no jobs)"""
+        wakeups = [job.events[0][0] for job in self._jobs.values() if job.events]
+
+        if any(not job.analytic for job in self._jobs.values()):
+            wakeups.append(next_step)
+
+        return min(wakeups, default=None)
+
+    def _worker(self):
+        """Run ticks while there are any jobs"""
+        next_step = time.time()
+
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+
+                    wakeup = self._next_wakeup(next_step)
+                    timeout = None if wakeup is None else wakeup - time.time()
+                    if timeout is not None and timeout <= 0:
+                        break
+
+                    self._cond.wait(timeout)
+
+            step = time.time() >= next_step
+            if step:
+                next_step = time.time() + self.interval
+
+            try:
+                self.tick(step)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Battery update failed")
+
+    def tick(self, step=True):
+        """Charge/drain batteries by one interval & handle analytic model events
+        Args:
+            step(bool): advance batteries that are updated every interval
+        """
+
+        with self._cond:
+            now = time.time()
+            jobs = [
+                job
+                for job in self._jobs.values()
+                if job.is_due(now) or (step and not job.analytic)
+            ]
+            if not jobs:
+                return
+
+            snapshots = self._fetch_snapshots(jobs)
+            rates = np.array(
+                [job.ups.battery_rates(s) for job, s in zip(jobs, snapshots)],
+                dtype=float,
+            ).reshape(-1, 3)
+
+            pipeline = self._redis_store.pipeline(transaction=False)
+            callbacks = []
+
+            stepwise = np.array([not job.analytic for job in jobs])
+            if stepwise.any():
+                callbacks += self._step(
+                    [job for job, s in zip(jobs, stepwise) if s],
+                    [snapshot for snapshot, s in zip(snapshots, stepwise) if s],
+                    rates[stepwise],
+                    pipeline,
+                )
+
+            for job, snapshot, job_rates, is_stepwise in zip(
+                jobs, snapshots, rates.tolist(), stepwise
+            ):
+                if not is_stepwise:
+                    callbacks += self._evaluate_model(
+                        job, snapshot, job_rates, now, pipeline
+                    )
+
+            pipeline.execute()
+
+        # callbacks may trigger other state changes (run them without the lock)
+        for job, callback in callbacks:
+            if callback:
+                self._run_callback(job, callback)
+
+    def _fetch_snapshots(self, jobs):
+        """Get state of all UPSes with a single MGET"""
+        keys = [job.ups.state.battery_snapshot_keys() for job in jobs]
+        values = iter(self._redis_store.mget([k for u_keys in keys for k in u_keys]))
+
+        return [
+            job.ups.state.parse_battery_snapshot([next(values) for _ in u_keys])
+            for job, u_keys in zip(jobs, keys)
+        ]
+
+    def _step(self, jobs, snapshots, rates, pipeline):
+        """Advance batteries by one interval (all of them at once)
+        Returns:
+            list: job callbacks that are due
+        """
+        fp_time_left, drain_rate, charge_rate = rates.T
+        charging = np.array([job.charging for job in jobs])
+        status = np.array([s["status"] for s in snapshots], dtype=bool)
+        on_battery = np.array([s["on_battery"] for s in snapshots], dtype=bool)
+
+        max_level = np.array([job.ups.state.battery_max_level for job in jobs])
+        old_level = np.array([job.level for job in jobs], dtype=float)
+        seconds_on_battery = np.array(
+            [int(time.time() - job.start_time) for job in jobs]
+        )
+
+        # charge while on input power & not full,
+        # drain while on battery, powered & not empty
+        active = np.where(
+            charging,
+            (old_level < max_level) & ~on_battery,
+            (old_level > 0) & status & on_battery,
+        )
+
+        new_level = old_level + self.interval * np.where(
+            charging, charge_rate, -drain_rate
+        )
+        new_level = np.clip(new_level, 0, max_level)
+        time_left = fp_time_left * new_level / max_level * 60 * 100
+
+        callbacks = self._update_batteries(
+            [job for job, is_active in zip(jobs, active) if is_active],
+            new_level[active],
+            time_left[active],
+            seconds_on_battery[active],
+            pipeline,
+        )
+
+        for job, snapshot, is_active in zip(jobs, snapshots, active):
+            if not is_active:
+                callbacks += self._finish(job, snapshot)
+
+        return callbacks
+
+    def _finish(self, job, snapshot):
+        """Battery is full/empty or UPS state changed
+        Returns:
+            list: job callbacks that are due
+        """
+        del self._jobs[job.ups.key]
+
+        # battery is empty but UPS is still running on battery
+        if not job.charging and snapshot["status"] and snapshot["on_battery"]:
+            return [(job, job.callbacks.get("on_depleted"))]
+
+        return []
+
+    def _publish_battery(self, job, level, pipeline):
+        """Publish battery update if battery level has changed"""
+        if int(job.level) == int(level):
+            return
+
+        pipeline.publish(
+            RedisChannels.battery_update_channel,
+            json.dumps(
+                {
+                    "key": job.ups.key,
+                    "old_battery": int(job.level),
+                    "new_battery": int(level),
+                }
+            ),
+        )
+
+    def _update_batteries(
+        self, jobs, new_level, time_left, seconds_on_battery, pipeline
+    ):
+        """Queue new battery levels in the pipeline
+        Returns:
+            list: job callbacks that are due
+        """
+        callbacks = []
+        oid_values = {}
+
+        for job, level, job_time_left, job_seconds in zip(
+            jobs, new_level.tolist(), time_left.tolist(), seconds_on_battery.tolist()
+        ):
+            ups, old_level = job.ups, job.level
+
+            if int(old_level * 0.1) != int(level * 0.1):
+                logger.info(
+                    "%s battery: %s %%",
+                    "charging" if job.charging else "on",
+                    int(level * 0.1),
+                )
+
+            oid_values.update(
+                ups.state.battery_oid_values(
+                    level,
+                    old_level,
+                    job_time_left,
+                    None if job.charging else job_seconds * 100,
+                )
+            )
+
+            self._publish_battery(job, level, pipeline)
+            job.level = level
+
+            if job.charging:
+                if (
+                    not job.powered
+                    and level > ups.state.min_restore_charge_level
+                    and job.callbacks.get("on_min_charge")
+                ):
+                    callbacks.append((job, job.callbacks["on_min_charge"]))
+            elif not job.outage and job_seconds >= ups.state.momentary_event_period:
+                job.outage = True
+                callbacks.append((job, job.callbacks.get("on_outage")))
+
+        if oid_values:
+            pipeline.mset(oid_values)
+
+        return callbacks
+
+    def _evaluate_model(self, job, snapshot, rates, now, pipeline):
+        """Re-anchor analytic battery model at the current battery level
+        & schedule its next events
+        Returns:
+            list: job callbacks that are due
+        """
+        ups = job.ups
+        fp_time_left, drain_rate, charge_rate = rates
+        max_level = ups.state.battery_max_level
+
+        level = job.model.level_at(now) if job.model else job.level
+        # events are scheduled at the exact time level is reached
+        level = round(level, 6)
+
+        due_events = {event for timestamp, event in job.events if timestamp <= now}
+        job.events = []
+        callbacks = []
+
+        if job.charging:
+            active = level < max_level and not snapshot["on_battery"]
+        else:
+            active = level > 0 and snapshot["status"] and snapshot["on_battery"]
+
+        model = BatteryModel(
+            level,
+            0,
+            now,
+            max_level,
+            fp_time_left,
+            0 if job.charging else job.start_time,
+        )
+
+        if active:
+            model.rate = charge_rate if job.charging else -drain_rate
+
+        pipeline.mset(ups.state.battery_model_values(model, job.level))
+        self._publish_battery(job, level, pipeline)
+        job.level, job.model = level, model
+
+        if not active:
+            return self._finish(job, snapshot)
+
+        if job.charging:
+            min_level = ups.state.min_restore_charge_level
+            # battery status becomes normal above 100
+            events = [
+                (model.time_to_level(101), "low"),
+                (model.time_to_level(max_level), "full"),
+            ]
+
+            if job.callbacks.get("on_min_charge") and not job.powered:
+                if "min_charge" in due_events or level > min_level:
+                    callbacks.append((job, job.callbacks["on_min_charge"]))
+                    # check if UPS was powered up
+                    events.append((now + self.interval, "anchor"))
+                else:
+                    events.append((model.time_to_level(min_level), "min_charge"))
+        else:
+            outage_time = job.start_time + ups.state.momentary_event_period
+            events = [
+                (model.time_to_level(100), "low"),
+                (model.time_to_level(0), "empty"),
+            ]
+
+            if not job.outage and now >= outage_time:
+                job.outage = True
+                callbacks.append((job, job.callbacks.get("on_outage")))
+            elif not job.outage:
+                events.append((outage_time, "outage"))
+
+        job.events = sorted(
+            (timestamp, event)
+            for timestamp, event in events
+            if timestamp is not None and timestamp > now
+        )
+
+        return callbacks
+
+    def _run_callback(self, job, callback):
+        try:
+            result = callback()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Battery callback failed for UPS '%s'", job.ups.key)
+            return
+
+        if callback is job.callbacks.get("on_min_charge"):
+            job.powered = bool(result)
@@ -0,0 +1,170 @@
+"""CPU load sampler collects cpu stats of all the server VMs
+with a single libvirt call per sample interval;
+
+Loads are calculated from the cpu time spent by a domain between two samples,
+published to redis in one write & kept in memory for the thermal model
+(cpu load -> sensor relationships).
+"""
+import logging
+import os
+import threading
+import time
+
+import libvirt
+
+from enginecore.state.api import IStateManager, IServerStateManager
+
+logger = logging.getLogger(__name__)
+
+
+class CPULoadSampler:
+    """Samples cpu load of the registered servers in a thread"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, get_connection=None, redis_store=None, sample_interval=None):
+        """
+        Args:
+            get_connection(callable): returns libvirt connection
+                                      (connection shared by server states by default)
+            redis_store: redis client loads are written to
+            sample_interval(float): seconds between samples, defaults to
+                                    SIMENGINE_CPU_SAMPLE_INTERVAL or 5
+        """
+        self._get_connection = get_connection or IServerStateManager.get_vm_connection
+        self._redis_store = redis_store
+
+        if sample_interval is None:
+            sample_interval = float(
+                os.environ.get("SIMENGINE_CPU_SAMPLE_INTERVAL", "5")
+            )
+        self.sample_interval = sample_interval
+
+        self._lock = threading.Lock()
+        # domain name -> server state manager
+        self._servers = {}
+        # domain name -> (cpu time in seconds, time of the sample)
+        self._cpu_times = {}
+        # server key -> latest cpu load
+        self._cpu_loads = {}
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def shared(cls):
+        """Sampler instance shared by all the server assets managed by the engine"""
+        with cls._shared_lock:
+            if not cls._shared:
+                cls._shared = cls()
+
+            return cls._shared
+
+    @property
+    def redis_store(self):
+        """Redis client cpu loads are published to"""
+        return self._redis_store or IStateManager.get_store()
+
+    def add_server(self, server_sm):
+        """Start sampling cpu load of the server's vm
+        (sampling thread is launched on the first request)
+        Args:
+            server_sm(IBMCServerStateManager): state manager of the server
+        """
+        with self._lock:
+            self._servers[server_sm.domain_name] = server_sm
+            self._cpu_loads[server_sm.key] = 0
+
+            if not self._thread:
+                self._stop_event.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="cpu_load_sampler"
+                )
+                self._thread.daemon = True
+                self._thread.start()
+
+    def remove_server(self, server_key):
+        """Stop sampling cpu load of the server"""
+        with self._lock:
+            for domain_name, server_sm in list(self._servers.items()):
+                if server_sm.key == server_key:
+                    del self._servers[domain_name]
+                    self._cpu_times.pop(domain_name, None)
+
+            self._cpu_loads.pop(server_key, None)
+
+    def cpu_load(self, server_key):
+        """Latest cpu load of the server (0 if vm is not running)"""
+        return self._cpu_loads.get(server_key, 0)
+
+    def stop(self):
+        """Stop the sampling thread"""
+        self._stop_event.set()
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.sample_interval):
+            try:
+                self.sample()
+            except libvirt.libvirtError as stats_err:
+                logger.warning("Could not sample cpu stats: %s", stats_err)
+            except Exception as sample_err:  # pylint: disable=broad-except
+                logger.exception(sample_err)
+
+    def sample(self):
+        """Collect cpu stats of all the active domains & update cpu loads
+        Returns:
+            dict: server keys mapped to their cpu loads
+        """
+        dom_stats = self._get_connection().getAllDomainStats(
+            libvirt.VIR_DOMAIN_STATS_CPU_TOTAL,
+            libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE,
+        )
+        sampled_at = time.monotonic()
+
+        with self._lock:
+            cpu_times = {}
+            cpu_loads = {server_sm.key: 0 for server_sm in self._servers.values()}
+
+            for domain, stats in dom_stats:
+                domain_name = domain.name()
+                if domain_name not in self._servers:
+                    continue
+
+                # more details on libvirt api:
+                # https://stackoverflow.com/questions/40468370/what-does-cpu-time-represent-exactly-in-libvirt
+                cpu_time = (
+                    stats.get("cpu.time", 0)
+                    - (stats.get("cpu.user", 0) + stats.get("cpu.system", 0))
+                ) / 1e9
+                cpu_times[domain_name] = (cpu_time, sampled_at)
+
+                # skip if first sample is not set yet
+                if domain_name not in self._cpu_times:
+                    continue
+
+                prev_cpu_time, prev_sampled_at = self._cpu_times[domain_name]
+                cpu_loads[self._servers[domain_name].key] = min(
+                    100
+                    * abs(cpu_time - prev_cpu_time)
+                    / max(sampled_at - prev_sampled_at, 1e-9),
+                    100,
+                )
+
+            self._cpu_times = cpu_times
+            self._cpu_loads = cpu_loads
+
+            load_updates = {
+                server_sm.redis_key + ":cpu_load": str(int(cpu_loads[server_sm.key]))
+                for server_sm in self._servers.values()
+            }
+
+        if load_updates:
+            self.redis_store.mset(load_updates)
+
+        logger.debug("Sampled CPU loads: %s", cpu_loads)
+        return cpu_loads
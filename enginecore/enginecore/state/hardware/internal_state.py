@@ -11,8 +11,12 @@ from enginecore.model.graph_reference import GraphReference
 
 from enginecore.state.redis_channels import RedisChannels
 import enginecore.state.api as state_api
+from enginecore.state.storage_model import StorageModel
 
-from enginecore.tools.utils import convert_voltage_to_high_prec
+from enginecore.tools.utils import (
+    convert_voltage_to_high_prec,
+    format_storage_version_key,
+)
 
 
 class StateManager(state_api.IStateManager, state_api.ISystemEnvironment):
@@ -185,6 +189,114 @@ class UPSStateManager(state_api.IUPSStateManager, StateManager):
             norm_bat_value = oid_basic.specs["batteryNormal"]
             self._update_oid_value(oid_basic, snmp_data_types.Integer32(norm_bat_value))
 
+    def battery_snapshot_keys(self):
+        """Redis keys battery scheduler needs to charge/drain the battery"""
+        return [
+            self.redis_key + ":state",
+            self.redis_key + ":load",
+            self.redis_key + ":in-voltage",
+            self.oid_index["AdvConfigLowTransferVolt"].redis_key,
+            self.oid_index["InputLineFailCause"].redis_key,
+        ]
+
+    def parse_battery_snapshot(self, values):
+        """Parse values of the battery_snapshot_keys
+        Returns:
+            dict: power status, wattage, input voltage,
+                  low transfer voltage & if UPS is on battery
+        """
+        status, load, in_volt, low_th, t_reason = values
+        oid_value = lambda rvalue: rvalue.decode().split("|")[1]
+
+        return {
+            "status": int(status),
+            "wattage": float(load) * self._asset_info["powerSource"],
+            "input_voltage": float(in_volt) if in_volt else 0.0,
+            "low_threshold": int(oid_value(low_th)),
+            "on_battery": (
+                int(oid_value(t_reason)) != self.InputLineFailCause.noTransfer.value
+            ),
+        }
+
+    def battery_oid_values(self, charge_level, old_level, time_left, time_on_battery):
+        """Redis values of the battery level & battery OIDs
+        (same as update_battery, update_time_left & update_time_on_battery)
+
+        Args:
+            charge_level(float): new battery level (between 0 & 1000)
+            old_level(float): previous battery level
+            time_left(float): runtime estimation (timeticks)
+            time_on_battery(int): time-on battery (timeticks), ignored if None
+        Returns:
+            dict: redis key/values
+        """
+        oids = self.oid_index
+        rvalues = {self.redis_key + ":battery": int(charge_level)}
+
+        def set_oid_value(oid_name, value):
+            if oid_name in oids:
+                oid = oids[oid_name]
+                rvalues[oid.redis_key] = "{}|{}".format(oid.data_type, int(value))
+
+        set_oid_value("AdvBatteryCapacity", charge_level / 10)
+        set_oid_value("HighPrecBatteryCapacity", charge_level)
+        set_oid_value("BatteryRunTimeRemaining", time_left)
+
+        if time_on_battery is not None:
+            set_oid_value("TimeOnBattery", time_on_battery)
+
+        rvalues.update(self._battery_status_value(charge_level, old_level))
+        return rvalues
+
+    def battery_model_values(self, model, old_level):
+        """Redis values of the analytic battery model (see BatteryModel);
+        capacity, runtime & time-on-battery OIDs are evaluated by snmppub.lua
+
+        Args:
+            model(BatteryModel): battery state starting now
+            old_level(float): previous battery level
+        Returns:
+            dict: redis key/values
+        """
+        oids = self.oid_index
+        rvalues = {
+            self.redis_key + ":battery": int(model.level),
+            self.redis_key + ":battery-model": model.encode(),
+        }
+
+        lazy_oids = {
+            "AdvBatteryCapacity": "capacity",
+            "HighPrecBatteryCapacity": "hp_capacity",
+            "BatteryRunTimeRemaining": "time_left",
+            "TimeOnBattery": "time_on_battery",
+        }
+
+        for oid_name, kind in lazy_oids.items():
+            if oid_name in oids:
+                oid = oids[oid_name]
+                rvalues[oid.redis_key] = model.lazy_oid_value(
+                    oid.data_type, self.redis_key, kind
+                )
+
+        rvalues.update(self._battery_status_value(model.level, old_level))
+        return rvalues
+
+    def _battery_status_value(self, charge_level, old_level):
+        """Redis value of the BasicBatteryStatus OID
+        (empty if the status has not changed)"""
+        oid = self.get_oid_by_name("BasicBatteryStatus")
+        if not oid:
+            return {}
+
+        if charge_level <= 100:
+            status = oid.specs["batteryLow"]
+        elif old_level <= 100:
+            status = oid.specs["batteryNormal"]
+        else:
+            return {}
+
+        return {oid.redis_key: "{}|{}".format(oid.data_type, int(status))}
+
     def process_voltage(self, voltage):
         """Update oids associated with UPS voltage
         Args:
@@ -364,6 +476,19 @@ class StaticDeviceStateManager(state_api.IStaticDeviceStateManager, StateManager
 class ServerStateManager(state_api.IServerStateManager, StaticDeviceStateManager):
     """Server state manager offers control over VM's state"""
 
+    def pop_vm_transition(self):
+        """Retrieve & clear vm state change requested by simengine
+        Returns:
+            int: expected vm state (1 if started), None if nothing was requested
+        """
+        transition_key = self.redis_key + ":vm-transition"
+
+        expected = StateManager.get_store().get(transition_key)
+        if expected is not None:
+            StateManager.get_store().delete(transition_key)
+
+        return int(expected) if expected is not None else None
+
 
 class BMCServerStateManager(state_api.IBMCServerStateManager, ServerStateManager):
     """Manage Server with BMC"""
@@ -373,30 +498,34 @@ class BMCServerStateManager(state_api.IBMCServerStateManager, ServerStateManager
         StateManager.get_store().set(self.redis_key + ":cpu_load", str(int(value)))
 
     def update_storage_temperature(self, old_ambient, new_ambient):
-        with self._graph_ref.get_session() as db_s:
-            hd_elements = GraphReference.get_all_hd_thermal_elements(db_s, self.key)
-
-            for hd_e in hd_elements:
-                if "DID" in hd_e["component"]:
-                    target_attr = "DID"
-                    target_value = hd_e["component"]["DID"]
-                    target_type = "PhysicalDrive"
-                else:
-                    target_attr = "serialNumber"
-                    target_value = '"{}"'.format(hd_e["component"]["serialNumber"])
-                    target_type = "CacheVault"
-
-                updated, new_temp = GraphReference.add_to_hd_component_temperature(
-                    db_s,
-                    target={
-                        "server_key": self.key,
-                        "controller": hd_e["controller"]["controllerNum"],
-                        "attribute": target_attr,
-                        "value": target_value,
-                        "hd_type": target_type,
-                    },
-                    temp_change=new_ambient - old_ambient,
-                    limit={"lower": new_ambient, "upper": None},
+        storage = StorageModel.for_server(self.key)
+
+        for hd_e in storage.get_all_hd_thermal_elements():
+            if "DID" in hd_e["component"]:
+                target_attr = "DID"
+                target_value = hd_e["component"]["DID"]
+                target_type = "PhysicalDrive"
+            else:
+                target_attr = "serialNumber"
+                target_value = '"{}"'.format(hd_e["component"]["serialNumber"])
+                target_type = "CacheVault"
+
+            updated, _ = storage.add_to_hd_component_temperature(
+                target={
+                    "controller": hd_e["controller"]["controllerNum"],
+                    "attribute": target_attr,
+                    "value": target_value,
+                    "hd_type": target_type,
+                },
+                temp_change=new_ambient - old_ambient,
+                limit={"lower": new_ambient, "upper": None},
+            )
+
+            if updated:
+                StateManager.get_store().hincrby(
+                    format_storage_version_key(self.key),
+                    hd_e["controller"]["controllerNum"],
+                    1,
                 )
 
 
@@ -8,7 +8,6 @@ Both server types have a unique VM (domain) assigned to them
 import logging
 import operator
 import math
-from threading import Thread, Event
 
 from circuits import handler
 
@@ -16,10 +15,13 @@ from enginecore.state.hardware.static_asset import StaticAsset
 from enginecore.state.api.state import IStateManager
 
 from enginecore.state.hardware.asset_definition import register_asset
+from enginecore.state.hardware.vm_lifecycle import VMLifecycleMonitor
+from enginecore.state.hardware.cpu_sampler import CPULoadSampler
 import enginecore.state.hardware.internal_state as in_state
 
 from enginecore.state.agent import IPMIAgent, StorCLIEmulator
 from enginecore.state.sensor.repository import SensorRepository
+from enginecore.state.storage_model import StorageModel
 from enginecore.state.engine.events import EventDataPair
 
 logger = logging.getLogger(__name__)
@@ -32,6 +34,9 @@ class Server(StaticAsset):
     channel = "engine-server"
     StateManagerCls = in_state.ServerStateManager
 
+    # servers are created once their PSUs are initialized
+    bootstrap_stage = 1
+
     def __init__(self, asset_info):
         super(Server, self).__init__(asset_info)
         self._psu_sm = {}
@@ -51,6 +56,32 @@ class Server(StaticAsset):
 
         self.state.power_up()
 
+        # detect vm state changes happening outside of simengine
+        # (for example, if someone powers off vm manually)
+        self._domain_name = asset_info["domainName"]
+        VMLifecycleMonitor.shared().watch(self._domain_name, self._on_vm_lifecycle)
+
+        if not self.state.vm_is_active():
+            self._on_vm_lifecycle(False)
+
+    def _on_vm_lifecycle(self, active):
+        """Notify main event loop of power update if vm was started or stopped
+        by something other than simengine (called by vm lifecycle monitor)
+        Args:
+            active(bool): True if vm was started
+        """
+        expected = self.state.pop_vm_transition()
+
+        if expected == int(active) or self.state.status == int(active):
+            return
+
+        logger.info(
+            "Server[%s] vm was %s outside of simengine",
+            self.key,
+            "started" if active else "stopped",
+        )
+        self.state.publish_power(old_state=int(not active), new_state=int(active))
+
     def _psu_out_voltage(self):
         """Find server input voltage
         (by finding a psu powering this asset that outputs voltage)
@@ -289,8 +320,14 @@ class Server(StaticAsset):
         return asset_event
 
     def stop(self, code=None):
+        VMLifecycleMonitor.shared().unwatch(self._domain_name)
+
         if self._storcli_emu is not None:
             self._storcli_emu.stop_server()
+
+        # write back storage changes made in memory
+        StorageModel.discard(self.key)
+
         super().stop(code)
 
 
@@ -305,10 +342,14 @@ class ServerWithBMC(Server):
         super(ServerWithBMC, self).__init__(asset_info)
 
         server_dir = self._create_asset_workplace_dir()
-        self._stop_event = Event()
 
         self._sensor_repo = SensorRepository(asset_info["key"], enable_thermal=True)
 
+        # ipmi_sim left by the previous engine run would hold the lan port
+        agent_info = self.state.agent
+        if agent_info and agent_info[1]:
+            IPMIAgent.stop_stale_agent(agent_info[0])
+
         # set up agents
         ipmi_conf = {
             k: asset_info[k] for k in asset_info if k in IPMIAgent.lan_conf_attributes
@@ -319,75 +360,11 @@ class ServerWithBMC(Server):
         logger.info(self._ipmi_agent)
 
         self.state.update_cpu_load(0)
-        self._vm_monitor_t = None
-        self._launch_monitor_vm()
-
-    def _launch_monitor_vm(self):
-        """Start vm monitoring in a thread"""
-
-        # launch a thread
-        self._vm_monitor_t = Thread(
-            target=self._monitor_vm, name="vm-tracker:{}".format(self.key)
-        )
-
-        self._vm_monitor_t.daemon = True
-        self._vm_monitor_t.start()
-
-    def _monitor_vm(self):
-        """Samples cpu load every 5 seconds, detects changes to VM state
-        that occur outside of engine's control
-        & notifies main event loop of power update.
-        Note that this only tracks down when a vm is powered off.
-
-        This method should be run in a thread,
-        monitoring can be stopped by setting stop event;
-        """
-
-        cpu_time_1 = 0
-        sample_rate_sec = 5
-
-        # get the delta between two samples
-        # nanoseconds to seconds
-        ns_to_sec = lambda x: x / 1e9
-        calc_cpu_load = lambda t1, t2: min(
-            100 * (abs(ns_to_sec(t2) - ns_to_sec(t1)) / sample_rate_sec), 100
-        )
-
-        while not self._stop_event.is_set():
-            # get a sample of CPU load if vm is up & running
-            if self.state.status and self.state.vm_is_active():
-                # more details on libvirt api:
-                # https://stackoverflow.com/questions/40468370/what-does-cpu-time-represent-exactly-in-libvirt
-                cpu_stats = self.state.get_cpu_stats()[0]
-                cpu_time_2 = cpu_stats["cpu_time"] - (
-                    cpu_stats["user_time"] + cpu_stats["system_time"]
-                )
-
-                # skip if first sample is not set yet
-                if cpu_time_1:
-                    self.state.update_cpu_load(calc_cpu_load(cpu_time_1, cpu_time_2))
-                    cpu_i = "server[{0.key}] CPU load:{0.cpu_load}%".format(self.state)
-                    logger.debug(cpu_i)
-
-                cpu_time_1 = cpu_time_2
-
-            # either VM is offline or hardware asset status is off
-            else:
-                # detect state changes happening outside of simengine
-                # (for example, if someone powers off vm manually)
-                if self.state.status and not self.state.vm_is_active():
-                    self.state.publish_power(old_state=1, new_state=0)
-
-                cpu_time_1 = 0
-                self.state.update_cpu_load(0)
-
-            self._stop_event.wait(sample_rate_sec)
+        CPULoadSampler.shared().add_server(self.state)
 
     def add_sensor_thermal_impact(self, source, target, event):
         """Add new thermal relationship at the runtime"""
-        self._sensor_repo.get_sensor_by_name(source).add_sensor_thermal_impact(
-            target, event
-        )
+        self._sensor_repo.add_sensor_thermal_impact(source, target, event)
 
     def add_cpu_thermal_impact(self, target):
         """Add new thermal cpu load & sensor relationship"""
@@ -452,10 +429,7 @@ class ServerWithBMC(Server):
     def stop(self, code=None):
         self._ipmi_agent.stop_agent()
         self._sensor_repo.stop()
-        self._stop_event.set()
-
-        if self._vm_monitor_t is not None and self._vm_monitor_t.isAlive():
-            self._vm_monitor_t.join()
+        CPULoadSampler.shared().remove_server(self.key)
 
         super().stop(code)
 
@@ -471,6 +445,17 @@ class ServerWithBMC(Server):
             logger.debug("Stopping IPMI agent; key=%d", self.key)
             self._ipmi_agent.stop_agent()
 
+    def power_flow_solved(self, asset_event, in_volt):
+        """BMC is running as long as the server has input power"""
+        super().power_flow_solved(asset_event, in_volt)
+
+        if in_volt and not self._ipmi_agent.process_running():
+            logger.debug("Starting IPMI agent; key=%d", self.key)
+            self._ipmi_agent.start_agent()
+        elif not in_volt:
+            logger.debug("Stopping IPMI agent; key=%d", self.key)
+            self._ipmi_agent.stop_agent()
+
 
 @register_asset
 class PSU(StaticAsset):
@@ -594,3 +579,19 @@ class PSU(StaticAsset):
             self._power_off_sequence()
 
         return asset_event
+
+    def power_flow_solved(self, asset_event, in_volt):
+        """Update BMC sensors of the PSU (status, fan & load)"""
+        super().power_flow_solved(asset_event, in_volt)
+
+        if not self._state.supports_bmc:
+            return
+
+        if not asset_event.state.unchanged():
+            if asset_event.state.new:
+                self._power_on_sequence()
+            else:
+                self._power_off_sequence()
+
+        if not asset_event.load.unchanged():
+            self._update_load_sensors(asset_event.load.new)
@@ -12,7 +12,16 @@ class SNMPSim:
     """Snmp simulator running snmpsim program"""
 
     def __init__(self, state):
-        self._snmp_agent = SNMPAgent(state.key, state.snmp_config)
+        # agent left running by the previous engine run
+        # is re-used if the asset definition has not changed
+        agent_info = state.agent
+        running_pid = agent_info[0] if agent_info and agent_info[1] else None
+
+        if running_pid and not self.warm_start:
+            SNMPAgent.stop_stale_agent(running_pid)
+            running_pid = None
+
+        self._snmp_agent = SNMPAgent(state.key, state.snmp_config, running_pid)
 
         self._state = state
         self._state.update_agent(self._snmp_agent.pid)
@@ -8,14 +8,14 @@ For example, it switches to battery if upstream power is offline or voltage is t
 import logging
 import json
 import math
-from datetime import datetime as dt
 
-from threading import Thread, Event
 from circuits import handler
 import enginecore.state.hardware.internal_state as in_state
 from enginecore.state.hardware.asset import Asset
 from enginecore.state.hardware.snmp_asset import SNMPSim
+from enginecore.state.hardware.battery_scheduler import BatteryScheduler
 from enginecore.state.api.environment import ISystemEnvironment
+from enginecore.tools.interpolation import LookupTable
 
 from enginecore.state.hardware.asset_definition import register_asset
 
@@ -48,21 +48,15 @@ class UPS(Asset, SNMPSim):
         self._low_volt_th_oid = self.state.get_oid_by_name("AdvConfigLowTransferVolt")
 
         # Store known { wattage: time_remaining } key/value pairs (runtime graph)
-        self._runtime_details = json.loads(asset_info["runtime"])
+        self._runtime_details = LookupTable(json.loads(asset_info["runtime"]))
 
         # Track upstream power availability
         self._charge_speed_factor = 1
         self._drain_speed_factor = 1
 
-        # Threads responsible for battery charge/discharge
-        self._battery_drain_t = None
-        self._battery_charge_t = None
-        self._stop_event = Event()
-
-        self._start_time_battery = None
-
-        # set battery level to max
-        self.state.update_battery(self.state.battery_max_level)
+        # set battery level to max (battery level is kept on warm start)
+        if not self.warm_start:
+            self.state.update_battery(self.state.battery_max_level)
 
         # get charge per second using full recharge time (hrs)
         self._charge_per_second = self.state.battery_max_level / (
@@ -75,39 +69,51 @@ class UPS(Asset, SNMPSim):
             self._calc_full_power_time_left(wattage) * self.state.battery_level
         ) / self.state.battery_max_level
 
-    def _calc_full_power_time_left(self, wattage):
-        """Approximate runtime estimation for the fully-charged battery"""
+    def _calc_full_power_time_left(
+        self, wattage, in_voltage=None, lower_threshold=None
+    ):
+        """Approximate runtime estimation for the fully-charged battery
+        Args:
+            wattage(float): current power draw
+            in_voltage(float): input voltage (queried if not provided)
+            lower_threshold(int): low transfer voltage (queried if not provided)
+        """
 
         # Prevent from TimeTick value failing bounding constraints
         if wattage < 0.1:
             wattage = 0.1
 
-        close_wattage = min(self._runtime_details, key=lambda x: abs(int(x) - wattage))
-        close_timeleft = self._runtime_details[close_wattage]
-
         # inverse proportion, calculate full power time left
-        fp_time_left = (close_timeleft * int(close_wattage)) / wattage
+        fp_time_left = self._runtime_details.approx(wattage, inverse=True)
 
         # see if input voltage is present -> adjust time left
-        lower_threshold = int(self.state.get_oid_value(self._low_volt_th_oid))
-        in_voltage = self.state.input_voltage
+        if lower_threshold is None:
+            lower_threshold = int(self.state.get_oid_value(self._low_volt_th_oid))
+        if in_voltage is None:
+            in_voltage = self.state.input_voltage
 
         if 0 < in_voltage <= lower_threshold:
             fp_time_left += fp_time_left * (in_voltage / lower_threshold)
 
         return fp_time_left
 
-    def _calc_battery_discharge(self):
-        """Approximate battery discharge per second based on
-        the runtime model & current wattage draw
-
+    def battery_rates(self, snapshot):
+        """Battery charge/drain rates used by the battery scheduler
+        Args:
+            snapshot(dict): UPS state (see UPSStateManager.parse_battery_snapshot)
         Returns:
-            float: discharge per second
+            tuple: full power time left (minutes), discharge & charge per second
         """
+        fp_time_left = self._calc_full_power_time_left(
+            snapshot["wattage"], snapshot["input_voltage"], snapshot["low_threshold"]
+        )
 
-        wattage = self.state.wattage
-        fp_estimated_timeleft = self._calc_full_power_time_left(wattage)
-        return self.state.battery_max_level / (fp_estimated_timeleft * 60)
+        discharge = self.state.battery_max_level / (fp_time_left * 60)
+        return (
+            fp_time_left,
+            discharge * self._drain_speed_factor,
+            self._charge_per_second * self._charge_speed_factor,
+        )
 
     def _increase_transfer_severity(self):
         """Increase severity of the input power event
@@ -128,132 +134,50 @@ class UPS(Asset, SNMPSim):
 
         self.state.update_transfer_reason(new_reason)
 
-    def _drain_battery(self):
-        """When parent is not available -> drain battery"""
-
-        battery_level = self.state.battery_level
-        old_battery_lvl = -1
-
-        outage = False
-        to_adv_percentage = lambda x: int(x * 0.1)
-
-        # keep draining battery while its level remains above 0
-        # UPS is on and parent is down
-        while (
-            battery_level > 0
-            and self.state.status
-            and self.state.on_battery
-            and not self._stop_event.is_set()
-        ):
-            # calculate new battery level
-            battery_level = battery_level - (
-                self._calc_battery_discharge() * self._drain_speed_factor
-            )
-
-            if to_adv_percentage(battery_level) != to_adv_percentage(old_battery_lvl):
-                logger.info("on battery: %s %%", to_adv_percentage(battery_level))
-
-            seconds_on_battery = (dt.now() - self._start_time_battery).seconds
-
-            # update state details
-            self.state.update_battery(battery_level)
-            self.state.update_time_left(
-                self._cacl_time_left(self.state.wattage) * 60 * 100
-            )
-            self.state.update_time_on_battery(seconds_on_battery * 100)
-
-            if seconds_on_battery >= self.state.momentary_event_period and not outage:
-                outage = True
-                self._increase_transfer_severity()
-
-            old_battery_lvl = battery_level
-            self._stop_event.wait(1)
-
+    def _on_battery_depleted(self):
+        """Battery was drained while UPS was running on battery"""
         # kill the thing if still breathing
-        if self.state.status and self.state.on_battery:
-            self._snmp_agent.stop_agent()
-            self.state.publish_power(old_state=1, new_state=0)
-
-    def _charge_battery(self, power_up_on_charge=False):
-        """Charge battery when there's upstream power source & battery is not full
-
-        Args:
-            power_up_on_charge(boolean): indicates if the asset should be powered up
-                                         when min charge level is achieved
+        self._snmp_agent.stop_agent()
+        self.state.publish_power(old_state=1, new_state=0)
 
+    def _power_up_on_charge(self):
+        """Power up on min charge level
+        Returns:
+            bool: True if UPS was powered up
         """
-
-        battery_level = self.state.battery_level
-        old_battery_lvl = -1
-        powered = False
-
-        to_adv_percentage = lambda x: int(x * 0.1)
-
-        # keep charging battery while its level is less than max & parent is up
-        while (
-            battery_level < self.state.battery_max_level
-            and not self.state.on_battery
-            and not self._stop_event.is_set()
-        ):
-            # calculate new battery level
-            battery_level = battery_level + (
-                self._charge_per_second * self._charge_speed_factor
-            )
-
-            if to_adv_percentage(battery_level) != to_adv_percentage(old_battery_lvl):
-                logger.info("charging battery: %s %%", to_adv_percentage(battery_level))
-
-            # update state details
-            self.state.update_battery(battery_level)
-            self.state.update_time_left(
-                self._cacl_time_left(self.state.wattage) * 60 * 100
-            )
-
-            # power up on min charge level
-            if (not powered and power_up_on_charge) and (
-                battery_level > self.state.min_restore_charge_level
-            ):
-                old_state = self.state.status
-                powered = self.power_up()
-                self.state.publish_power(old_state, self.state.status)
-
-            old_battery_lvl = battery_level
-            self._stop_event.wait(1)
+        old_state = self.state.status
+        powered = self.power_up()
+        self.state.publish_power(old_state, self.state.status)
+        return powered
 
     def _launch_battery_drain(
         self, t_reason=in_state.UPSStateManager.InputLineFailCause.deepMomentarySag
     ):
-        """Start a thread that will decrease battery level"""
+        """Start decreasing battery level (see BatteryScheduler)"""
 
-        if self._battery_drain_t and self._battery_drain_t.isAlive():
+        if self.draining_battery:
             logger.warning("Battery drain is already running!")
             self.state.update_transfer_reason(t_reason)
             self._increase_transfer_severity()
             return
 
-        self._start_time_battery = dt.now()
-
         # update state details
         self.state.update_ups_output_status(
             in_state.UPSStateManager.OutputStatus.onBattery
         )
         self.state.update_transfer_reason(t_reason)
 
-        # wait for other thread to finish
-        if self._battery_charge_t:
-            self._battery_charge_t.join()
-
-        # launch a thread
-        self._battery_drain_t = Thread(
-            target=self._drain_battery, name="battery_drain:{}".format(self.key)
+        # replaces battery charge (if any)
+        BatteryScheduler.shared().drain(
+            self,
+            on_outage=self._increase_transfer_severity,
+            on_depleted=self._on_battery_depleted,
         )
-        self._battery_drain_t.daemon = True
-        self._battery_drain_t.start()
 
     def _launch_battery_charge(self, power_up_on_charge=False):
-        """Start a thread that will charge battery level"""
+        """Start charging battery (see BatteryScheduler)"""
 
-        if self._battery_charge_t and self._battery_charge_t.isAlive():
+        if self.charging_battery:
             logger.warning("Battery is already charging!")
             return
 
@@ -267,18 +191,10 @@ class UPS(Asset, SNMPSim):
             in_state.UPSStateManager.InputLineFailCause.noTransfer
         )
 
-        # wait for battery drain thread to wrap up before charging
-        if self._battery_drain_t:
-            self._battery_drain_t.join()
-
-        # launch a thread
-        self._battery_charge_t = Thread(
-            target=self._charge_battery,
-            args=(power_up_on_charge,),
-            name="battery_charge:{}".format(self.key),
+        # replaces battery drain (if any)
+        BatteryScheduler.shared().charge(
+            self, on_min_charge=self._power_up_on_charge if power_up_on_charge else None
         )
-        self._battery_charge_t.daemon = True
-        self._battery_charge_t.start()
 
     @handler("SignalDownEvent")
     def on_signal_down_received(self, event, *args, **kwargs):
@@ -291,6 +207,7 @@ class UPS(Asset, SNMPSim):
             e_result = self.power_off()
 
         event.success = e_result.new_state != e_result.old_state
+        BatteryScheduler.shared().refresh(self)
 
         return e_result
 
@@ -311,6 +228,8 @@ class UPS(Asset, SNMPSim):
 
         if event.name == "PowerButtonOnEvent" and self.state.on_battery:
             self._launch_battery_drain(t_reason=self.state.transfer_reason)
+        else:
+            BatteryScheduler.shared().refresh(self)
 
         return asset_event
 
@@ -422,15 +341,20 @@ class UPS(Asset, SNMPSim):
 
         return asset_event
 
+    def power_flow_solved(self, asset_event, in_volt):
+        """Solved load replaces the one set by voltage handlers
+        (see PowerFlowSolver), battery runtime is re-calculated"""
+        self._update_load(asset_event.load.new)
+
     @property
     def draining_battery(self):
         """Returns true if UPS battery is being drained"""
-        return self._battery_drain_t is not None and self._battery_drain_t.isAlive()
+        return BatteryScheduler.shared().is_draining(self)
 
     @property
     def charging_battery(self):
         """Returns true if UPS battery is getting re-charged"""
-        return self._battery_charge_t is not None and self._battery_charge_t.isAlive()
+        return BatteryScheduler.shared().is_charging(self)
 
     @property
     def charge_speed_factor(self):
@@ -440,6 +364,7 @@ class UPS(Asset, SNMPSim):
     @charge_speed_factor.setter
     def charge_speed_factor(self, speed):
         self._charge_speed_factor = speed
+        BatteryScheduler.shared().refresh(self)
 
     @property
     def drain_speed_factor(self):
@@ -449,33 +374,36 @@ class UPS(Asset, SNMPSim):
     @drain_speed_factor.setter
     def drain_speed_factor(self, speed):
         self._drain_speed_factor = speed
+        BatteryScheduler.shared().refresh(self)
 
     def _update_load(self, new_load):
         """Ups needs to update runtime left for battery when load is updated"""
         upd_result = self.state.update_load(new_load)
+        scheduler = BatteryScheduler.shared()
+
         # re-calculate time left based on updated load
-        if not math.isclose(self.state.wattage, 0):
+        # (analytic battery model evaluates runtime itself)
+        if not scheduler.is_analytic(self) and not math.isclose(self.state.wattage, 0):
             self.state.update_time_left(
                 self._cacl_time_left(self.state.wattage) * 60 * 100
             )
+
+        # battery runtime depends on the load
+        scheduler.refresh(self)
         return upd_result
 
     def __str__(self):
         return super().__str__() + (
             " [charge-state]\n"
-            "   - thread active: {0.charging_battery}\n"
+            "   - active: {0.charging_battery}\n"
             "   - speed factor: {0.charge_speed_factor}\n"
             " [drain-state]\n"
-            "   - thread active: {0.draining_battery}\n"
+            "   - active: {0.draining_battery}\n"
             "   - speed factor: {0.drain_speed_factor}\n"
         ).format(self)
 
     def stop(self, code=None):
         self._snmp_agent.stop_agent()
-        self._stop_event.set()
-
-        for thread in [self._battery_charge_t, self._battery_drain_t]:
-            if thread is not None and thread.isAlive():
-                thread.join()
+        BatteryScheduler.shared().remove(self)
 
         super().stop(code)
@@ -0,0 +1,225 @@
+"""VM lifecycle monitor tracks domains of all the server assets
+through libvirt lifecycle events (instead of polling every VM);
+
+A single libvirt connection & event loop thread is shared by the engine,
+server assets register a callback for their domain & are notified as soon
+as the domain is started or stopped (including changes made outside of
+simengine, e.g. 'virsh destroy'). Domain states are re-synced after
+the connection to libvirt is re-established.
+"""
+import logging
+import os
+import threading
+import time
+
+import libvirt
+
+logger = logging.getLogger(__name__)
+
+
+class VMLifecycleMonitor:
+    """Dispatches domain lifecycle events to the watchers of the domains"""
+
+    # event loop checks if it should exit/reconnect this often
+    wakeup_interval = 0.5  # seconds
+    reconnect_interval = 5  # seconds
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    # libvirt event implementation can only be registered once per process
+    _event_impl_registered = False
+
+    def __init__(self, uri=None):
+        """
+        Args:
+            uri(str): libvirt connection uri, defaults to SIMENGINE_LIBVIRT_URI
+                      or qemu:///system
+        """
+        self._uri = uri or os.environ.get("SIMENGINE_LIBVIRT_URI", "qemu:///system")
+
+        self._lock = threading.RLock()
+        # domain name -> callable accepting new domain state (True if active)
+        self._watchers = {}
+
+        self._conn = None
+        self._callback_id = None
+        self._last_connect = 0
+
+        self._running = False
+        self._thread = None
+        self._timer_id = None
+
+    @classmethod
+    def shared(cls):
+        """Monitor instance shared by all the server assets managed by the engine"""
+        with cls._shared_lock:
+            if not cls._shared:
+                cls._shared = cls()
+
+            return cls._shared
+
+    @classmethod
+    def _register_event_impl(cls):
+        with cls._shared_lock:
+            if not cls._event_impl_registered:
+                libvirt.virEventRegisterDefaultImpl()
+                cls._event_impl_registered = True
+
+    def watch(self, domain_name, on_state_change):
+        """Start tracking a domain (event loop is launched on the first request)
+        Args:
+            domain_name(str): name of the libvirt domain
+            on_state_change(callable): called with True when domain is started
+                                       & with False when it stops
+                                       (runs in the event loop thread)
+        """
+        with self._lock:
+            self._watchers[domain_name] = on_state_change
+            self._start()
+
+    def unwatch(self, domain_name):
+        """Stop tracking a domain"""
+        with self._lock:
+            self._watchers.pop(domain_name, None)
+
+    def stop(self):
+        """Stop the event loop & close libvirt connection"""
+        with self._lock:
+            self._running = False
+            self._watchers.clear()
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _start(self):
+        """Connect to libvirt & launch event loop thread (if not running)"""
+        if self._running:
+            return
+
+        # event implementation must be registered before opening the connection
+        self._register_event_impl()
+        self._connect()
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="vm_lifecycle")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _connect(self):
+        """Open read-only connection & subscribe to lifecycle events
+        Returns:
+            bool: True if connected
+        """
+        self._last_connect = time.time()
+
+        try:
+            conn = libvirt.openReadOnly(self._uri)
+            conn.registerCloseCallback(self._on_connection_closed, None)
+            self._callback_id = conn.domainEventRegisterAny(
+                None,
+                libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE,
+                self._on_lifecycle_event,
+                None,
+            )
+        except libvirt.libvirtError as conn_err:
+            logger.warning("Could not connect to libvirt (%s): %s", self._uri, conn_err)
+            return False
+
+        try:
+            conn.setKeepAlive(5, 3)
+        except libvirt.libvirtError:
+            # keepalive is not supported by local drivers
+            pass
+
+        self._conn = conn
+        return True
+
+    def _disconnect(self):
+        """Unsubscribe from lifecycle events & close the connection"""
+        conn, self._conn = self._conn, None
+        if not conn:
+            return
+
+        try:
+            conn.domainEventDeregisterAny(self._callback_id)
+            conn.unregisterCloseCallback()
+            conn.close()
+        except libvirt.libvirtError as conn_err:
+            logger.debug("Error while closing libvirt connection: %s", conn_err)
+
+    def _run(self):
+        """Event loop (libvirt callbacks are dispatched from this thread)"""
+
+        # makes sure the loop wakes up to check for stop/reconnect
+        self._timer_id = libvirt.virEventAddTimeout(
+            int(self.wakeup_interval * 1000), self._on_wakeup, None
+        )
+
+        try:
+            while self._running:
+                if libvirt.virEventRunDefaultImpl() < 0:
+                    logger.error("Failed to run libvirt event loop iteration")
+                    time.sleep(self.wakeup_interval)
+        finally:
+            libvirt.virEventRemoveTimeout(self._timer_id)
+            self._disconnect()
+
+    def _on_wakeup(self, *_):
+        """Re-connect if connection to libvirt was lost"""
+        if self._conn or not self._running:
+            return
+
+        if time.time() - self._last_connect < self.reconnect_interval:
+            return
+
+        if self._connect():
+            logger.info("Re-connected to libvirt (%s)", self._uri)
+            self._resync()
+
+    def _resync(self):
+        """Notify watchers of the current domain states
+        (events may have been missed while connection was down)"""
+        with self._lock:
+            watchers = dict(self._watchers)
+
+        for domain_name, on_state_change in watchers.items():
+            try:
+                active = bool(self._conn.lookupByName(domain_name).isActive())
+            except libvirt.libvirtError as dom_err:
+                logger.warning("Could not query domain '%s': %s", domain_name, dom_err)
+                continue
+
+            self._notify(on_state_change, active)
+
+    def _on_connection_closed(self, _conn, reason, _opaque):
+        """Connection was closed (e.g. libvirtd was restarted)"""
+        logger.warning("Connection to libvirt was closed (reason: %s)", reason)
+        self._conn = None
+
+    def _on_lifecycle_event(self, _conn, domain, event, _detail, _opaque):
+        """Domain state changed"""
+
+        if event == libvirt.VIR_DOMAIN_EVENT_STARTED:
+            active = True
+        elif event == libvirt.VIR_DOMAIN_EVENT_STOPPED:
+            active = False
+        else:
+            return
+
+        with self._lock:
+            on_state_change = self._watchers.get(domain.name())
+
+        if on_state_change:
+            logger.debug(
+                "Domain '%s' %s", domain.name(), "started" if active else "stopped"
+            )
+            self._notify(on_state_change, active)
+
+    @staticmethod
+    def _notify(on_state_change, active):
+        try:
+            on_state_change(active)
+        except Exception as cb_err:  # pylint: disable=broad-except
+            logger.exception(cb_err)
@@ -0,0 +1,306 @@
+"""TCP server exchanging JSON frames with its clients
+(used by storcli64 emulator); connections are multiplexed by a single
+selector thread while requests are processed by a pool of workers
+"""
+import collections
+import json
+import logging
+import selectors
+import socket
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class FrameDecoder:
+    """Splits a byte stream into JSON requests;
+    requests are expected to be newline-delimited though unterminated
+    JSON objects (as sent by older storcli64 clients) are accepted as well
+    """
+
+    # drop unterminated data exceeding this size
+    max_frame_size = 1024 * 1024
+
+    def __init__(self):
+        self._buffer = b""
+        self._json_decoder = json.JSONDecoder()
+
+    def feed(self, data):
+        """Add received data to the stream"""
+        self._buffer += data
+
+    def next_frame(self):
+        """Decode the next complete request
+        Returns:
+            object: decoded JSON request, None if more data is needed
+        Raises:
+            ValueError: if data preceding the next newline is not valid JSON
+                        (invalid data is discarded)
+        """
+        buffer = self._buffer.lstrip()
+        self._buffer = buffer
+        if not buffer:
+            return None
+
+        # surrogateescape maps bytes back & forth without loss
+        # (frames can be split in the middle of a multi-byte character)
+        text = buffer.decode("utf-8", errors="surrogateescape")
+        try:
+            request, end = self._json_decoder.raw_decode(text)
+        except ValueError:
+            request, end = None, None
+
+        if end is not None:
+            self._buffer = text[end:].encode("utf-8", errors="surrogateescape")
+            return request
+
+        newline_idx = buffer.find(b"\n")
+        if newline_idx != -1:
+            self._buffer = buffer[newline_idx + 1 :]
+            raise ValueError("Invalid JSON frame: {!r}".format(buffer[:newline_idx]))
+
+        if len(buffer) > self.max_frame_size:
+            self._buffer = b""
+            raise ValueError("Frame exceeds {} bytes".format(self.max_frame_size))
+
+        return None
+
+
+class _Connection:
+    """Client connection & its pending replies"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = FrameDecoder()
+        # replies are sent in the order requests were received
+        self.pending = collections.deque()
+        self.out_buffer = bytearray()
+
+
+class FramedJSONServer:
+    """Serves many simultaneous connections; each newline-delimited
+    JSON request is handled in a worker thread and answered with
+    a JSON reply terminated by a newline
+    """
+
+    def __init__(
+        self, port, handle_request, handle_error, host="", num_workers=4, name=None
+    ):
+        """
+        Args:
+            port(int): port to listen on (0 picks a free port)
+            handle_request(callable): returns reply (JSON-serializable) to a request
+            handle_error(callable): returns reply given an exception raised while
+                                    decoding or handling a request
+            host(str): interface to bind to
+            num_workers(int): max number of requests processed concurrently
+            name(str): name of the server thread
+        """
+        self._address = (host, port)
+        self._handle_request = handle_request
+        self._handle_error = handle_error
+        self._num_workers = num_workers
+        self._name = name or "framed-server:{}".format(port)
+
+        self._selector = None
+        self._server_sock = None
+        self._executor = None
+        self._server_t = None
+        self._stop_event = threading.Event()
+
+        # wakes up selector when a worker completes a request
+        self._wakeup_r, self._wakeup_w = None, None
+        self._connections = {}
+
+    @property
+    def address(self):
+        """Address server is listening on"""
+        return self._server_sock.getsockname() if self._server_sock else None
+
+    def start(self):
+        """Bind to the port & launch the server thread
+        Returns:
+            bool: False if server socket could not be initialized
+        """
+        try:
+            self._server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._server_sock.bind(self._address)
+            self._server_sock.listen(128)
+            self._server_sock.setblocking(False)
+        except OSError as sock_err:
+            logger.warning("Could not initialize socket server: %s", sock_err)
+            if self._server_sock:
+                self._server_sock.close()
+                self._server_sock = None
+            return False
+
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server_sock, selectors.EVENT_READ, self._accept)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, self._on_wakeup)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._num_workers, thread_name_prefix=self._name
+        )
+
+        self._server_t = threading.Thread(target=self._serve, name=self._name)
+        self._server_t.daemon = True
+        self._server_t.start()
+        return True
+
+    def stop(self):
+        """Stop serving & close all the connections"""
+        self._stop_event.set()
+        self._wakeup()
+        if self._server_t:
+            self._server_t.join()
+
+    def _serve(self):
+        """Selector loop"""
+        try:
+            while not self._stop_event.is_set():
+                for key, mask in self._selector.select(timeout=1):
+                    key.data(key.fileobj, mask)
+        finally:
+            for conn in list(self._connections.values()):
+                self._close(conn)
+
+            self._executor.shutdown(wait=False)
+            self._selector.close()
+            self._server_sock.close()
+            self._wakeup_r.close()
+            self._wakeup_w.close()
+
+    def _wakeup(self):
+        """Interrupt selector (called from worker threads)"""
+        try:
+            self._wakeup_w.send(b"\0")
+        except (BlockingIOError, OSError, AttributeError):
+            pass
+
+    def _on_wakeup(self, wakeup_sock, _):
+        """Send replies to requests completed by workers"""
+        try:
+            while wakeup_sock.recv(1024):
+                pass
+        except BlockingIOError:
+            pass
+
+        for conn in list(self._connections.values()):
+            self._flush_replies(conn)
+
+    def _accept(self, server_sock, _):
+        """Accept new client connection"""
+        try:
+            sock, _ = server_sock.accept()
+        except BlockingIOError:
+            return
+
+        sock.setblocking(False)
+        conn = _Connection(sock)
+        self._connections[sock.fileno()] = conn
+        self._selector.register(sock, selectors.EVENT_READ, self._on_ready)
+
+    def _on_ready(self, sock, mask):
+        """Handle readable/writable client socket"""
+        conn = self._connections.get(sock.fileno())
+        if not conn:
+            return
+
+        if mask & selectors.EVENT_WRITE:
+            self._send(conn)
+
+        if mask & selectors.EVENT_READ:
+            self._read(conn)
+
+    def _read(self, conn):
+        """Read requests & submit them to the workers"""
+        try:
+            data = conn.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+
+        if not data:
+            logger.debug("Connection closed by remote end")
+            self._close(conn)
+            return
+
+        conn.decoder.feed(data)
+        while True:
+            try:
+                request = conn.decoder.next_frame()
+            except ValueError as frame_err:
+                logger.warning(frame_err)
+                conn.pending.append(self._error_reply(frame_err))
+                continue
+
+            if request is None:
+                break
+
+            logger.debug("Data received: %s", str(request))
+            future = self._executor.submit(self._handle_request, request)
+            future.add_done_callback(lambda _: self._wakeup())
+            conn.pending.append(future)
+
+        self._flush_replies(conn)
+
+    def _error_reply(self, error):
+        """Completed future containing error reply"""
+        future = Future()
+        future.set_result(self._handle_error(error))
+        return future
+
+    def _flush_replies(self, conn):
+        """Move completed replies (in order) to the output buffer"""
+        while conn.pending and conn.pending[0].done():
+            future = conn.pending.popleft()
+            try:
+                reply = future.result()
+            except Exception as handle_err:  # pylint: disable=broad-except
+                logger.exception(handle_err)
+                reply = self._handle_error(handle_err)
+
+            conn.out_buffer += (json.dumps(reply) + "\n").encode()
+
+        self._send(conn)
+
+    def _send(self, conn):
+        """Write as much of the output buffer as possible"""
+        if conn.sock.fileno() == -1:
+            return
+
+        if conn.out_buffer:
+            try:
+                sent = conn.sock.send(conn.out_buffer)
+                del conn.out_buffer[:sent]
+            except BlockingIOError:
+                pass
+            except OSError:
+                self._close(conn)
+                return
+
+        events = selectors.EVENT_READ
+        if conn.out_buffer:
+            events |= selectors.EVENT_WRITE
+
+        self._selector.modify(conn.sock, events, self._on_ready)
+
+    def _close(self, conn):
+        """Clean up client connection"""
+        fileno = conn.sock.fileno()
+        if fileno == -1:
+            return
+
+        self._connections.pop(fileno, None)
+        self._selector.unregister(conn.sock)
+        conn.sock.close()
+
+        for future in conn.pending:
+            future.cancel()
@@ -10,6 +10,7 @@ from circuits import Component, Debugger, handler
 import redis
 
 from enginecore.state.redis_channels import RedisChannels
+from enginecore.state.engine.iteration import ThermalIteration
 from enginecore.state.net.ws_server import WebSocket
 
 logger = logging.getLogger(__name__)
@@ -27,6 +28,12 @@ class EngineStateTracker(Component):
         """Handler waits for engine to complete a power iteration"""
         self._load_done_queue.put(event)
 
+    @handler("IterationMerged")
+    def on_iteration_merged(self, event, *args, **kwargs):
+        """Superseded power iteration completes as part of the merged one"""
+        if not isinstance(kwargs["power_iter"], ThermalIteration):
+            self._load_done_queue.put(event)
+
     def wait_load_queue(self):
         """Block execution until load iteration is completed"""
         try:
@@ -131,26 +138,26 @@ class RedisStateHandler(Component):
 
     @handler(RedisChannels.sensor_conf_th_channel)
     def on_new_sensor_thermal_impact(self, data):
-        """Add new thermal impact (sensor to sensor)"""
+        """Thermal impact (sensor to sensor) was added, updated or deleted"""
         self._engine.assets[data["key"]].add_sensor_thermal_impact(
             **data["relationship"]
         )
 
     @handler(RedisChannels.cpu_usg_conf_th_channel)
     def on_new_cpu_thermal_impact(self, data):
-        """Add new thermal impact (cpu load to sensor)"""
+        """Thermal impact (cpu load to sensor) was added, updated or deleted"""
         self._engine.assets[data["key"]].add_cpu_thermal_impact(**data["relationship"])
 
     @handler(RedisChannels.str_cv_conf_th_channel)
     def on_new_cv_thermal_impact(self, data):
-        """Add new thermal impact (sensor to cv)"""
+        """Thermal impact (sensor to cv) was added, updated or deleted"""
         self._engine.assets[data["key"]].add_storage_cv_thermal_impact(
             **data["relationship"]
         )
 
     @handler(RedisChannels.str_drive_conf_th_channel)
     def on_new_hd_thermal_impact(self, data):
-        """Add new thermal impact (sensor to physical drive)"""
+        """Thermal impact (sensor to physical drive) was added, updated or deleted"""
         self._engine.assets[data["key"]].add_storage_pd_thermal_impact(
             **data["relationship"]
         )
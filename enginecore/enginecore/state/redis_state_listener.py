@@ -4,6 +4,8 @@ to the Redis state handler for further processing;
 import json
 import logging
 import os
+import threading
+import time
 
 from circuits import Component, Event, Timer
 import redis
@@ -14,6 +16,10 @@ from enginecore.state.state_initializer import configure_env
 
 logger = logging.getLogger(__name__)
 REDIS_LISTENER_SLEEP_TIME = 0.5
+# warn when this many received messages are still waiting to be dispatched
+REDIS_BACKLOG_WARN_SIZE = 100
+# how often (in seconds) backlog details are logged (if messages were received)
+REDIS_BACKLOG_REPORT_INTERVAL = 60
 
 
 class StateListener(Component):
@@ -27,7 +33,18 @@ class StateListener(Component):
         ...
     """
 
-    def __init__(self, engine_cls, debug=False, force_snmp_init=False):
+    # snmp channel publishes raw redis keys (not json)
+    stream_formats = {"power": True, "thermal": True, "battery": True, "snmp": False}
+
+    def __init__(self, engine_cls, debug=False, force_snmp_init=False, poll=False):
+        """
+        Args:
+            engine_cls: engine to be initialized by the state handler
+            debug(bool): enable circuits debugger
+            force_snmp_init(bool): reload state data from .snmprec files
+            poll(bool): poll pubsub channels with timers (one message per tick)
+                        instead of blocking on them in reader threads
+        """
         super(StateListener, self).__init__()
 
         # env space configuration
@@ -43,9 +60,25 @@ class StateListener(Component):
         self._redis_store = redis.StrictRedis(**redis_conf)
 
         self._pubsub_streams = {}
-        for stream_name in ["power", "thermal", "battery", "snmp"]:
+        for stream_name in StateListener.stream_formats:
             self._pubsub_streams[stream_name] = self._redis_store.pubsub()
 
+        self._poll = poll
+        self._stop_event = threading.Event()
+        self._reader_threads = []
+
+        # keep track of messages received but not yet dispatched
+        self._backlog_lock = threading.Lock()
+        self._backlog_reported = 0
+        self._backlog = {
+            "queue_depth": 0,
+            "received": 0,
+            "dispatched": 0,
+            "merged": 0,
+            "last_lag": 0.0,
+            "max_lag": 0.0,
+        }
+
         self._subscribe_to_channels()
         self._redis_state_handler = RedisStateHandler(
             engine_cls, debug, force_snmp_init
@@ -67,11 +100,13 @@ class StateListener(Component):
         # Thermal Channels
         self._pubsub_streams["thermal"].psubscribe(
             RedisChannels.ambient_update_channel,  # on ambient changes
-            RedisChannels.sensor_conf_th_channel,  # new sensor->sensor relationship
-            RedisChannels.cpu_usg_conf_th_channel,  # new cpu_usage->sensor relationship
-            # new sensor->cache_vault relationship
+            # sensor->sensor relationship added/updated/deleted
+            RedisChannels.sensor_conf_th_channel,
+            # cpu_usage->sensor relationship added/updated/deleted
+            RedisChannels.cpu_usg_conf_th_channel,
+            # sensor->cache_vault relationship added/updated/deleted
             RedisChannels.str_cv_conf_th_channel,
-            # new sensor->phys_drive relationship
+            # sensor->phys_drive relationship added/updated/deleted
             RedisChannels.str_drive_conf_th_channel,
         )
 
@@ -87,14 +122,162 @@ class StateListener(Component):
             RedisChannels.oid_update_channel  # snmp oid updates
         )
 
+    @property
+    def backlog(self):
+        """Pub/sub backlog details: number of messages waiting to be handled
+        (queue depth), message counts (duplicate snmp updates are merged)
+        and lag (seconds between a batch of messages being read from redis
+        and the state handler being done with it)"""
+        with self._backlog_lock:
+            return dict(self._backlog)
+
     def monitor_redis(self, pubsub_group, json_format=True):
         """Monitors redis pubsub channels for new messages & dispatches
         corresponding events to the Engine
         Args:
             pubsub_group (redis.client.PubSub): group of pubsub channels to be monitored
         """
+        self._dispatch_message(pubsub_group.get_message(), json_format)
+
+    def dispatch_redis_batch(self, batch, json_format=True):
+        """Dispatch a batch of messages drained from a pubsub stream
+        Args:
+            batch(list): of (time received, message) tuples
+            json_format(bool): messages in the batch contain json data
+        """
+
+        messages = [message for _, message in batch]
+        if not json_format:
+            messages = self._merge_duplicates(messages)
+
+        for message in messages:
+            self._dispatch_message(message, json_format)
+
+        # events are handled in order, batch is done once this one is handled
+        self.fire(
+            Event.create(
+                "redis_batch_handled",
+                batch[0][0],
+                batch_size=len(batch),
+                num_merged=len(batch) - len(messages),
+            )
+        )
+
+    def redis_batch_handled(self, received_at, batch_size, num_merged=0):
+        """Update backlog once the state handler is done with a batch
+        Args:
+            received_at(float): time the first message of the batch was read
+            batch_size(int): number of messages read from redis
+            num_merged(int): number of duplicates that were not dispatched
+        """
+
+        lag = time.time() - received_at
+
+        with self._backlog_lock:
+            self._backlog["queue_depth"] -= batch_size
+            self._backlog["dispatched"] += batch_size - num_merged
+            self._backlog["merged"] += num_merged
+            self._backlog["last_lag"] = lag
+            self._backlog["max_lag"] = max(self._backlog["max_lag"], lag)
+            queue_depth = self._backlog["queue_depth"]
+
+        logger.debug(
+            "Handled %s message(s), lag: %.3f sec, queue depth: %s",
+            batch_size,
+            lag,
+            queue_depth,
+        )
+
+        if queue_depth >= REDIS_BACKLOG_WARN_SIZE:
+            logger.warning(
+                "Redis messages are backing up, queue depth: %s, lag: %.3f sec",
+                queue_depth,
+                lag,
+            )
+
+    def report_redis_backlog(self):
+        """Log backlog details (if any messages were received since last report)"""
+
+        backlog = self.backlog
+        if backlog["received"] == self._backlog_reported:
+            return
+
+        self._backlog_reported = backlog["received"]
+        logger.info(
+            "Redis pub/sub: %s received, %s dispatched, %s merged, "
+            "queue depth: %s, lag: %.3f sec (max %.3f sec)",
+            backlog["received"],
+            backlog["dispatched"],
+            backlog["merged"],
+            backlog["queue_depth"],
+            backlog["last_lag"],
+            backlog["max_lag"],
+        )
+
+    @staticmethod
+    def _merge_duplicates(messages):
+        """Drop repeated messages in a batch keeping the last occurrence
+        (snmp messages only carry redis key of the updated OID,
+        handler reads its latest value)
+        Args:
+            messages(list): pubsub messages
+        Returns:
+            list: messages in their original order without the duplicates
+        """
+        msg_ids = [(m.get("channel"), m.get("data")) for m in messages]
+        last_idx = {msg_id: i for i, msg_id in enumerate(msg_ids)}
+
+        return [m for i, m in enumerate(messages) if last_idx[msg_ids[i]] == i]
+
+    def _read_stream(self, stream_name):
+        """Block on a pubsub stream until new messages arrive,
+        drain all of the pending messages & pass them on as one batch
+        (this method should be run in a thread)
+        Args:
+            stream_name(str): name of the pubsub stream to be monitored
+        """
+
+        pubsub_group = self._pubsub_streams[stream_name]
+        json_format = StateListener.stream_formats[stream_name]
+
+        while not self._stop_event.is_set():
+            batch = []
+            message = pubsub_group.get_message(timeout=REDIS_LISTENER_SLEEP_TIME)
+
+            while message:
+                batch.append((time.time(), message))
+                message = pubsub_group.get_message()
+
+            if not batch:
+                continue
+
+            with self._backlog_lock:
+                self._backlog["queue_depth"] += len(batch)
+                self._backlog["received"] += len(batch)
 
-        message = pubsub_group.get_message()
+            self.fire(
+                Event.create("dispatch_redis_batch", batch, json_format=json_format)
+            )
+
+    def _launch_stream_readers(self):
+        """Start a reader thread per pubsub stream"""
+
+        for stream_name in self._pubsub_streams:
+            thread = threading.Thread(
+                target=self._read_stream,
+                args=(stream_name,),
+                name="redis_reader:{}".format(stream_name),
+            )
+            thread.daemon = True
+            thread.start()
+            self._reader_threads.append(thread)
+
+    def _dispatch_message(self, message, json_format=True):
+        """Translate pubsub message into an event & pass it to the state handler
+        Args:
+            message(dict): message received from a pubsub channel
+            json_format(bool): message data is in json format
+        """
         # validate message
         if (
             (not message)
@@ -121,20 +304,36 @@ class StateListener(Component):
 
         logger.info("Initializing pub/sub event handlers...")
 
+        Timer(
+            REDIS_BACKLOG_REPORT_INTERVAL,
+            Event.create("report_redis_backlog"),
+            persist=True,
+        ).register(self)
+
+        if not self._poll:
+            self._launch_stream_readers()
+            return
+
         # timers will be monitoring new published messages every .5 seconds
-        for stream_name in ["power", "thermal", "battery"]:
-            stream = self._pubsub_streams[stream_name]
+        for stream_name, json_format in StateListener.stream_formats.items():
             Timer(
                 REDIS_LISTENER_SLEEP_TIME,
-                Event.create("monitor_redis", pubsub_group=stream),
+                Event.create(
+                    "monitor_redis",
+                    pubsub_group=self._pubsub_streams[stream_name],
+                    json_format=json_format,
+                ),
                 persist=True,
             ).register(self)
 
-        # configure snmp channel:
-        snmp_event = Event.create(
-            "monitor_redis", self._pubsub_streams["snmp"], json_format=False
-        )
-        Timer(REDIS_LISTENER_SLEEP_TIME, snmp_event, persist=True).register(self)
+    def stopped(self, _):
+        """
+        Called on stop: shut down pubsub reader threads
+        """
+
+        self._stop_event.set()
+        for thread in self._reader_threads:
+            thread.join()
 
 
 if __name__ == "__main__":
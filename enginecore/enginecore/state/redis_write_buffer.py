@@ -0,0 +1,238 @@
+"""Write-batching layer shared by state managers;
+
+While engine iterations are in progress, SET/MSET/PUBLISH commands issued on
+behalf of the iterations (by the threads launching iterations, see
+add_batch_thread, or by event handlers processing iteration events, see
+enter_batch_scope) are buffered in a redis pipeline (instead of one round-trip
+per command) and flushed once the iterations complete; any other writes are
+sent right away unless they target keys with pending writes (these are queued
+after the pending ones so that writes are applied in the order they were issued).
+Reads see values of the pending writes.
+Batching can be disabled by setting SIMENGINE_REDIS_BATCHING env var to 0.
+"""
+import logging
+import os
+import threading
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class RedisWriteBuffer:
+    """Wraps redis client & buffers writes issued during a batch
+    (any other redis command issued by a batch thread flushes pending writes
+    first so that order of operations is preserved)"""
+
+    # flush pending writes early if this many commands were buffered
+    max_pending = 1000
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, redis_store, enabled=True):
+        """
+        Args:
+            redis_store(redis.StrictRedis): redis client writes are forwarded to
+            enabled(bool): buffer writes during a batch if set to True
+        """
+        self._redis_store = redis_store
+        self._enabled = enabled
+
+        self._lock = threading.RLock()
+        self._pipeline = None
+        self._num_pending = 0
+        # values set by the buffered commands (as stored by redis)
+        self._pending_values = {}
+        self._num_batches = 0
+        # idents of the threads whose writes are buffered during batch
+        self._batch_threads = set()
+        # depth of batch scopes entered by the current thread
+        self._scope = threading.local()
+
+    @classmethod
+    def shared(cls):
+        """Buffer instance shared by all the state managers"""
+        with cls._shared_lock:
+            if not cls._shared:
+                cls._shared = cls(
+                    redis.StrictRedis(host="localhost", port=6379),
+                    enabled=os.environ.get("SIMENGINE_REDIS_BATCHING", "1") != "0",
+                )
+
+            return cls._shared
+
+    @property
+    def batching(self):
+        """True if writes issued by the current thread are buffered at the moment"""
+        return self._enabled and self._num_batches > 0 and self._in_batch_thread()
+
+    def _in_batch_thread(self):
+        """True if current thread writes on behalf of the iterations"""
+        return (
+            threading.get_ident() in self._batch_threads
+            or getattr(self._scope, "depth", 0) > 0
+        )
+
+    def add_batch_thread(self, thread=None):
+        """Buffer writes made by the thread while batch is in progress
+        Args:
+            thread(threading.Thread): thread processing engine iterations
+                                      (defaults to the current thread)
+        """
+        with self._lock:
+            self._batch_threads.add((thread or threading.current_thread()).ident)
+
+    def discard_batch_thread(self, thread=None):
+        """Stop buffering writes made by the thread"""
+        with self._lock:
+            self._batch_threads.discard((thread or threading.current_thread()).ident)
+
+    def enter_batch_scope(self):
+        """Buffer writes made by the current thread until the scope is exited
+        (e.g. while event loop thread is handling an iteration event)"""
+        self._scope.depth = getattr(self._scope, "depth", 0) + 1
+
+    def exit_batch_scope(self):
+        """Stop buffering writes made by the current thread"""
+        self._scope.depth = max(getattr(self._scope, "depth", 0) - 1, 0)
+
+    def begin_batch(self):
+        """Start buffering writes (batches can be nested,
+        e.g. when multiple iterations are in progress)"""
+        with self._lock:
+            self._num_batches += 1
+
+    def end_batch(self):
+        """Flush pending writes once the last batch is completed"""
+        with self._lock:
+            self._num_batches = max(self._num_batches - 1, 0)
+            if not self._num_batches:
+                self.flush()
+
+    def flush(self):
+        """Send buffered commands to redis"""
+        with self._lock:
+            if not self._pipeline:
+                return
+
+            logger.debug("Flushing %s buffered redis command(s)", self._num_pending)
+
+            pipeline, self._pipeline = self._pipeline, None
+            self._num_pending = 0
+            try:
+                pipeline.execute()
+            finally:
+                self._pending_values.clear()
+
+    def _buffer(self, command, *args):
+        """Add command to the pipeline"""
+        if not self._pipeline:
+            self._pipeline = self._redis_store.pipeline(transaction=False)
+
+        getattr(self._pipeline, command)(*args)
+        self._num_pending += 1
+
+    def _flush_own(self, names=()):
+        """Send pending writes before a command that is not buffered
+        (only if the command comes from a batch thread or touches keys with
+        pending writes, unrelated threads don't flush writes of the iterations
+        in progress otherwise)"""
+        if self._in_batch_thread() or self._is_pending(names):
+            self.flush()
+
+    def _is_pending(self, names):
+        """True if any of the keys has a buffered write"""
+        return any(
+            isinstance(name, (str, bytes)) and name in self._pending_values
+            for name in names
+        )
+
+    def _flush_if_full(self):
+        """Flush pending writes early so that long batches don't grow unbounded"""
+        if self._num_pending >= self.max_pending:
+            self.flush()
+
+    def _encode(self, value):
+        """Represent value the way redis-py stores it"""
+        if isinstance(value, bytes):
+            return value
+        if isinstance(value, float):
+            return repr(value).encode()
+        return str(value).encode()
+
+    def set(self, name, value, *args, **kwargs):
+        """Set the value at key name (buffered during batch)"""
+        with self._lock:
+            if args or kwargs or not (self.batching or self._is_pending([name])):
+                self._flush_own([name])
+                return self._redis_store.set(name, value, *args, **kwargs)
+
+            self._buffer("set", name, value)
+            self._pending_values[name] = self._encode(value)
+            self._flush_if_full()
+
+            return True
+
+    def mset(self, mapping):
+        """Set key/values based on a mapping (buffered during batch)"""
+        with self._lock:
+            if not (self.batching or self._is_pending(mapping)):
+                self._flush_own()
+                return self._redis_store.mset(mapping)
+
+            self._buffer("mset", mapping)
+            for name, value in mapping.items():
+                self._pending_values[name] = self._encode(value)
+            self._flush_if_full()
+
+            return True
+
+    def publish(self, channel, message):
+        """Publish message on channel (buffered during batch)"""
+        with self._lock:
+            if not self.batching:
+                self._flush_own()
+                return self._redis_store.publish(channel, message)
+
+            self._buffer("publish", channel, message)
+            self._flush_if_full()
+
+            return None
+
+    def get(self, name):
+        """Get value of key (including pending writes)"""
+        with self._lock:
+            if name in self._pending_values:
+                return self._pending_values[name]
+
+        return self._redis_store.get(name)
+
+    def mget(self, keys, *args):
+        """Get values of keys (including pending writes)"""
+        keys = list(keys) + list(args)
+
+        with self._lock:
+            pending = [self._pending_values.get(k) for k in keys]
+            missing = [k for k, v in zip(keys, pending) if v is None]
+
+        if not missing:
+            return pending
+
+        fetched = iter(self._redis_store.mget(missing))
+        return [v if v is not None else next(fetched) for v in pending]
+
+    def __getattr__(self, name):
+        """Other redis commands are executed right away
+        (after pending writes of the batch thread or writes to the same keys
+        are sent)"""
+        attr = getattr(self._redis_store, name)
+        if not callable(attr):
+            return attr
+
+        def flush_and_call(*args, **kwargs):
+            with self._lock:
+                self._flush_own(args)
+            return attr(*args, **kwargs)
+
+        return flush_and_call
@@ -5,50 +5,97 @@ import os
 import logging
 
 from enginecore.state.state_initializer import get_temp_workplace_dir
+from enginecore.state.api.environment import ISystemEnvironment
 from enginecore.model.graph_reference import GraphReference
 
-from enginecore.state.sensor.file_locks import SensorFileLocks
+from enginecore.state.sensor.storage import SensorFileStorage, SensorTableStorage
 from enginecore.state.sensor.sensor import Sensor, SensorGroups
+from enginecore.state.sensor.thermal_relationships import ThermalRelationships
+from enginecore.state.sensor.thermal_model import SensorThermalEngine
+from enginecore.state.sensor.thermal_scheduler import ThermalScheduler
 
 logger = logging.getLogger(__name__)
 
 
 class SensorRepository:
-    """A sensor repository for a particular IPMI device"""
+    """A sensor repository for a particular IPMI device;
+    Sensor values are kept in a memory-mapped table (exported to the sensor files
+    polled by ipmi_sim) unless SIMENGINE_SENSOR_FILES env var is set to 1
+    """
 
     def __init__(self, server_key, enable_thermal=False):
         self._server_key = server_key
 
         self._graph_ref = GraphReference()
-        self._sensor_file_locks = SensorFileLocks()
 
-        self._sensor_dir = os.path.join(
-            get_temp_workplace_dir(), str(server_key), "sensor_dir"
-        )
+        server_dir = os.path.join(get_temp_workplace_dir(), str(server_key))
+        self._sensor_dir = os.path.join(server_dir, "sensor_dir")
+        self._sensor_table_path = os.path.join(server_dir, "sensor_values.tbl")
 
         self._sensors = {}
 
         with self._graph_ref.get_session() as session:
             sensors = GraphReference.get_asset_sensors(session, server_key)
-            for sensor_info in sensors:
-                sensor = Sensor(
-                    self._sensor_dir,
-                    server_key,
-                    sensor_info,
-                    self._sensor_file_locks,
-                    graph_ref=self._graph_ref,
-                )
-                self._sensors[sensor.name] = sensor
+
+        self._sensor_storage = self._init_sensor_storage(
+            [s_info["specs"]["name"] for s_info in sensors], create=enable_thermal
+        )
+
+        for sensor_info in sensors:
+            sensor = Sensor(
+                self._sensor_dir,
+                server_key,
+                sensor_info,
+                self._sensor_storage,
+                graph_ref=self._graph_ref,
+            )
+            self._sensors[sensor.name] = sensor
+
+        self._thermal_engine = None
 
         if enable_thermal:
             self._load_thermal = True
 
+            # sensor->sensor relationships are updated all at once
+            self._thermal_engine = SensorThermalEngine(
+                self._sensors.keys(),
+                self._sensor_storage,
+                ThermalRelationships.for_server(server_key),
+                get_ambient=ISystemEnvironment.get_ambient,
+                approx_value=Sensor.calc_approx_value,
+            )
+
             if not os.path.isdir(self._sensor_dir):
                 os.mkdir(self._sensor_dir)
 
             for s_name in self._sensors:
                 self._sensors[s_name].set_to_defaults()
 
+            if isinstance(self._sensor_storage, SensorTableStorage):
+                self._sensor_storage.start_exporter(self._sensor_dir)
+
+    def _init_sensor_storage(self, sensor_names, create):
+        """Choose backend for sensor values
+        Args:
+            sensor_names(list): names of the sensors belonging to the server
+            create(bool): create a new table (engine owns sensor values)
+                          rather than attaching to the existing one
+        """
+
+        if os.environ.get("SIMENGINE_SENSOR_FILES") == "1":
+            return SensorFileStorage(self._sensor_dir, sensor_names)
+
+        if create:
+            os.makedirs(os.path.dirname(self._sensor_table_path), exist_ok=True)
+            return SensorTableStorage.create(self._sensor_table_path, sensor_names)
+
+        # fall back to files if engine is not using the table
+        table = SensorTableStorage.open(self._sensor_table_path)
+        if table and set(sensor_names) <= set(table.sensor_names):
+            return table
+
+        return SensorFileStorage(self._sensor_dir, sensor_names)
+
     def __str__(self):
         repo_str = []
         repo_str.append("Sensor Repository for Server {}".format(self._server_key))
@@ -63,10 +110,39 @@ class SensorRepository:
     def enable_thermal_impact(self):
         """Set thermal event switch"""
         list(map(lambda sn: self._sensors[sn].enable_thermal_impact(), self._sensors))
+        ThermalScheduler.shared().enable(self)
 
     def disable_thermal_impact(self):
         """Clear thermal event switch"""
         list(map(lambda sn: self._sensors[sn].disable_thermal_impact(), self._sensors))
+        ThermalScheduler.shared().disable(self)
+
+    def _schedule_thermal_engine(self):
+        """Run sensor->sensor thermal updates (if there are any relationships)"""
+        scheduler = ThermalScheduler.shared()
+        job_name = "s:[sensors]->t:[sensors]"
+
+        if self._thermal_engine and not scheduler.has_job(self, job_name):
+            scheduler.add_job(self, job_name, self._thermal_engine.tick)
+
+    def add_sensor_thermal_impact(self, source, target, event):
+        """Reload relationship between 2 sensors (added, updated or deleted
+        at runtime) & apply it to the thermal engine
+        Args:
+            source(str): name of the source sensor
+            target(str): name of the target sensor
+            event(str): source event causing the thermal impact to trigger
+        """
+        if not self._thermal_engine:
+            return
+
+        ThermalRelationships.for_server(self._server_key).reload_sensor_rel(
+            source, "name", target, event
+        )
+        self._thermal_engine.reload()
+
+        if not self._load_thermal:
+            self._schedule_thermal_engine()
 
     def shut_down_sensors(self):
         """Set all sensors to offline"""
@@ -103,7 +179,7 @@ class SensorRepository:
         for s_name in self._sensors:
             sensor = self._sensors[s_name]
             if sensor.group == SensorGroups.temperature:
-                with self._sensor_file_locks.get_lock(sensor.name):
+                with self._sensor_storage.lock(sensor.name):
                     old_sensor_value = int(sensor.sensor_value)
                     new_sensor_value = (
                         old_sensor_value - old_ambient + new_ambient
@@ -128,6 +204,9 @@ class SensorRepository:
             for s_name in self._sensors:
                 self._sensors[s_name].start_thermal_impact()
 
+            self._schedule_thermal_engine()
+            ThermalScheduler.shared().enable(self)
+
     @property
     def sensor_dir(self):
         """Get temp IPMI state dir"""
@@ -144,5 +223,14 @@ class SensorRepository:
         return self._server_key
 
     def stop(self):
-        """Closes all the open connections"""
+        """Closes all the open connections & unschedules thermal updates"""
+        for s_name in self._sensors:
+            self._sensors[s_name].stop_thermal_impact()
+
+        ThermalScheduler.shared().remove_group(self)
+        ThermalRelationships.discard(self._server_key)
+
+        if isinstance(self._sensor_storage, SensorTableStorage):
+            self._sensor_storage.stop_exporter()
+
         self._graph_ref.close()
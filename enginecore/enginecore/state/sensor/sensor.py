@@ -3,16 +3,18 @@ sensors & sensors, sensors & storage components, cpu & sensors
 """
 
 import os
-import threading
 import logging
-import time
-import json
 import operator
 from collections import OrderedDict
 from enum import Enum
 
 from enginecore.state.api.environment import ISystemEnvironment
 from enginecore.model.graph_reference import GraphReference
+from enginecore.state.sensor.thermal_scheduler import ThermalScheduler
+from enginecore.state.sensor.thermal_relationships import ThermalRelationships
+from enginecore.state.storage_model import StorageModel
+from enginecore.tools.interpolation import LookupTable
+from enginecore.tools.utils import format_storage_version_key
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +43,7 @@ class Sensor:
 
     thresholds_types = ["lnr", "lcr", "lnc", "unc", "ucr", "unr"]
 
-    def __init__(self, sensor_dir, server_key, s_details, s_locks, graph_ref):
+    def __init__(self, sensor_dir, server_key, s_details, s_storage, graph_ref):
         self._s_dir = sensor_dir
         self._server_key = server_key
 
@@ -53,11 +55,11 @@ class Sensor:
 
         self._s_group = SensorGroups[self._s_specs["group"]]
 
-        self._th_sensor_t = {}
-        self._th_storage_t = {}
-        self._th_cpu_t = None
+        # thermal relationships are updated by the scheduler shared among sensors
+        # (updates are paused until thermal impact is enabled)
+        self._th_scheduler = ThermalScheduler.shared()
+        self._th_relationships = ThermalRelationships.for_server(server_key)
 
-        self._th_sensor_t_name_fmt = "({event})s:[{source}]->t:[{target}]"
         self._th_storage_t_name_fmt = (
             "({event})s:[{source}]->STORAGE:t:[c{ctrl}/{target}]"
         )
@@ -73,11 +75,8 @@ class Sensor:
         else:
             self._s_addr = self._s_specs["address"]
 
-        s_locks.add_sensor_file_lock(self._s_name)
-
-        # save file locks
-        self._s_file_locks = s_locks
-        self._s_thermal_event = threading.Event()
+        # sensor values backend (files or memory-mapped table)
+        self._s_storage = s_storage
 
     def __str__(self):
         with self._graph_ref.get_session() as session:
@@ -125,71 +124,33 @@ class Sensor:
 
             return "\n".join(s_str)
 
-    def _launch_thermal_sensor_thread(self, target, event):
-        """Add a new impact thread
-        Args:
-            target(str): name of the target sensor current sensor is affecting
-            event(str): name of the source event affecting target sensor
-        """
-
-        if target not in self._th_sensor_t:
-            self._th_sensor_t[target] = {}
-
-        self._th_sensor_t[target][event] = threading.Thread(
-            target=self._target_sensor,
-            args=(target, event),
-            name=self._th_sensor_t_name_fmt.format(
-                source=self._s_name, target=target, event=event
-            ),
-        )
-
-        self._th_sensor_t[target][event].daemon = True
-        self._th_sensor_t[target][event].start()
-
-    def _launch_thermal_cpu_thread(self):
+    def _schedule_cpu_impact(self):
         """Enable CPU impact upon the sensor"""
-        self._th_cpu_t = threading.Thread(
-            target=self._cpu_impact,
-            name=self._th_cpu_t_name_fmt.format(target=self.name),
-        )
+        job_name = self._th_cpu_t_name_fmt.format(target=self.name)
 
-        self._th_cpu_t.daemon = True
-        self._th_cpu_t.start()
+        if not self._th_scheduler.has_job(self, job_name):
+            self._th_scheduler.add_job(self, job_name, self._cpu_impact())
 
-    def _launch_thermal_storage_thread(self, controller, hd_element, hd_type, event):
-        thread_name = "{}-{}".format(hd_type.name, hd_element)
-        if (
-            thread_name in self._th_storage_t
-            and event in self._th_storage_t[thread_name]
-        ):
-            raise ValueError("Thread already exists")
-        if hd_element not in self._th_storage_t:
-            self._th_storage_t[hd_element] = {}
-
-        self._th_storage_t[hd_element][event] = threading.Thread(
-            target=self._target_storage,
-            args=(controller, hd_element, hd_type, event),
-            name=self._th_storage_t_name_fmt.format(
-                ctrl=controller, source=self._s_name, target=hd_element, event=event
-            ),
+    def _schedule_storage_impact(self, controller, hd_element, hd_type, event):
+        """Schedule a new storage (cache vault/physical drive) impact
+        (if not scheduled yet)"""
+
+        job_name = self._th_storage_t_name_fmt.format(
+            ctrl=controller, source=self._s_name, target=hd_element, event=event
         )
 
-        self._th_storage_t[hd_element][event].daemon = True
-        self._th_storage_t[hd_element][event].start()
+        if not self._th_scheduler.has_job(self, job_name):
+            self._th_scheduler.add_job(
+                self,
+                job_name,
+                lambda: self._target_storage(controller, hd_element, hd_type, event),
+            )
 
     def _init_thermal_impact(self):
         """Initialize thermal imact based on the saved inter-connections"""
 
+        # (sensor->sensor impact is handled by the repository's thermal engine)
         with self._graph_ref.get_session() as session:
-            thermal_sensor_rel_details = GraphReference.get_affected_sensors(
-                session, self._server_key, self._s_name
-            )
-
-            # for each target & for each set of relationships with the target
-            for target in thermal_sensor_rel_details["targets"]:
-                for rel in target["rel"]:
-                    self._launch_thermal_sensor_thread(target["name"], rel["event"])
-
             thermal_storage_rel_details = GraphReference.get_affected_hd_elements(
                 session, self._server_key, self._s_name
             )
@@ -203,20 +164,32 @@ class Sensor:
                     hd_element = target["serialNumber"]
 
                 for rel in target["rel"]:
-                    self._launch_thermal_storage_thread(
+                    self._schedule_storage_impact(
                         target["controller"]["controllerNum"],
                         hd_element,
                         hd_type,
                         rel["event"],
                     )
 
-        self._launch_thermal_cpu_thread()
+        self._schedule_cpu_impact()
+
+    @staticmethod
+    def calc_approx_value(model, current_value, inverse=False):
+        """Approximate value based on the model provided
+        Args:
+            model(LookupTable): compiled model (dict models are compiled on the fly)
+            current_value(int): value to look up
+            inverse(bool): approximated value is inversely proportional to the key
+        """
+
+        if not isinstance(model, LookupTable):
+            model = LookupTable(model)
 
-    def _calc_approx_value(self, model, current_value, inverse=False):
-        """Approximate value based on the model provided"""
+        if model.interpolate:
+            return int(model.interp(current_value))
 
-        nbr_model_key = min(model, key=lambda x: abs(int(x) - current_value))
-        nbr_value = int(model[nbr_model_key])
+        nbr_model_key, nbr_value = model.nearest(current_value)
+        nbr_value = int(nbr_value)
 
         multiplier = int(nbr_model_key if inverse else current_value)
         divisor = int(current_value if inverse else nbr_model_key)
@@ -224,216 +197,122 @@ class Sensor:
         return int((nbr_value * multiplier) / int(divisor))
 
     def _cpu_impact(self):
-        """Keep updating *this sensor based on cpu load changes
-        This function waits for the thermal event switch and exits when the connection between this sensor & cpu load
-        is removed;
+        """Create a task updating *this sensor based on cpu load changes
+        (the task is run by the thermal scheduler while thermal impact is enabled
+        and stops when the connection between this sensor & cpu load is removed)
+        Returns:
+            callable: returns delay until the next update
+                      or None if relationship was deleted
         """
 
         # avoid circular imports with the server
-        from enginecore.state.api import IBMCServerStateManager
-
-        with self._graph_ref.get_session() as session:
-            asset_info = GraphReference.get_asset_and_components(
-                session, self._server_key
-            )
-            server_sm = IBMCServerStateManager(asset_info)
-
-            cpu_impact_degrees_1 = 0
-            cpu_impact_degrees_2 = 0
-
-            while True:
-                self._s_thermal_event.wait()
+        from enginecore.state.hardware.cpu_sampler import CPULoadSampler
 
-                rel_details = GraphReference.get_cpu_thermal_rel(
-                    session, self._server_key, self.name
-                )
-
-                # relationship was deleted
-                if not rel_details:
-                    return
-
-                with self._s_file_locks.get_lock(self.name):
-                    current_cpu_load = server_sm.cpu_load
+        # cpu loads of all the servers are sampled in one pass
+        cpu_sampler = CPULoadSampler.shared()
+        cpu_impact = {"degrees": 0}
 
-                    # calculate cpu impact based on the model
-                    cpu_impact_degrees_2 = self._calc_approx_value(
-                        json.loads(rel_details["model"]), current_cpu_load
-                    )
-                    new_calc_value = (
-                        int(self.sensor_value)
-                        + cpu_impact_degrees_2
-                        - cpu_impact_degrees_1
-                    )
+        def update_sensor():
+            rel_details = self._th_relationships.get_cpu_rel(self.name)
 
-                    # meaning update is needed
-                    if cpu_impact_degrees_1 != cpu_impact_degrees_2:
-                        ambient = ISystemEnvironment.get_ambient()
-                        self.sensor_value = (
-                            new_calc_value if new_calc_value > ambient else int(ambient)
-                        )
+            # relationship was deleted
+            if not rel_details:
+                return None
 
-                        logger.debug(
-                            "Thermal impact of CPU load at (%s%%) updated: (%s°)->(%s°)",
-                            current_cpu_load,
-                            cpu_impact_degrees_1,
-                            cpu_impact_degrees_2,
-                        )
+            cpu_impact_degrees_1 = cpu_impact["degrees"]
 
-                    cpu_impact_degrees_1 = cpu_impact_degrees_2
-                    time.sleep(5)
+            with self._s_storage.lock(self.name):
+                current_cpu_load = int(cpu_sampler.cpu_load(self._server_key))
 
-    def _target_storage(self, controller, target, hd_type, event):
-        with self._graph_ref.get_session() as session:
-            while True:
-                self._s_thermal_event.wait()
-
-                # target
-                if hd_type == HDComponents.CacheVault:
-                    target_attr = "serialNumber"
-                    target_value = '"{}"'.format(target)
-                elif hd_type == HDComponents.PhysicalDrive:
-                    target_attr = "DID"
-                    target_value = target
-                else:
-                    raise ValueError("Unknown hardware component!")
-
-                rel_details = GraphReference.get_sensor_thermal_rel(
-                    session,
-                    self._server_key,
-                    relationship={
-                        "source": self._s_name,
-                        "target": {"attribute": target_attr, "value": target_value},
-                        "event": event,
-                    },
+                # calculate cpu impact based on the model
+                cpu_impact_degrees_2 = self.calc_approx_value(
+                    rel_details["model"], current_cpu_load
                 )
-
-                if not rel_details:
-                    del self._th_storage_t[target][event]
-                    return
-
-                rel = rel_details["rel"]
-                causes_heating = rel["action"] == "increase"
-                source_sensor_status = (
-                    operator.eq if rel["event"] == "down" else operator.ne
+                new_calc_value = (
+                    int(self.sensor_value) + cpu_impact_degrees_2 - cpu_impact_degrees_1
                 )
 
-                # if model is specified -> use the runtime mappings
-                if "model" in rel and rel["model"]:
-                    rel["degrees"] = self._calc_approx_value(
-                        json.loads(rel["model"]), int(self.sensor_value) * 10
+                # meaning update is needed
+                if cpu_impact_degrees_1 != cpu_impact_degrees_2:
+                    ambient = ISystemEnvironment.get_ambient()
+                    self.sensor_value = (
+                        new_calc_value if new_calc_value > ambient else int(ambient)
                     )
 
-                    source_sensor_status = operator.ne
-
-                if source_sensor_status(int(self.sensor_value), 0):
-                    updated, new_temp = GraphReference.add_to_hd_component_temperature(
-                        session,
-                        target={
-                            "server_key": self._server_key,
-                            "controller": controller,
-                            "attribute": target_attr,
-                            "value": target_value,
-                            "hd_type": hd_type.name,
-                        },
-                        temp_change=rel["degrees"] * 1 if causes_heating else -1,
-                        limit={
-                            "lower": ISystemEnvironment.get_ambient(),
-                            "upper": rel["pauseAt"] if causes_heating else None,
-                        },
+                    logger.debug(
+                        "Thermal impact of CPU load at (%s%%) updated: (%s°)->(%s°)",
+                        current_cpu_load,
+                        cpu_impact_degrees_1,
+                        cpu_impact_degrees_2,
                     )
 
-                    if updated:
-                        logger.info("temperature sensor was updated to %s°", new_temp)
-
-                time.sleep(rel["rate"])
-
-    def _target_sensor(self, target, event):
-        """Keep updating the target sensor based on the relationship between this sensor and the target;
-        This function waits for the thermal event switch and exits when the connection between source & target
-        is removed;
-        Args:
-            target(str): name of the target sensor
-            event(str): name of the event that enables thermal impact
-        """
-
-        with self._graph_ref.get_session() as session:
-            while True:
-                self._s_thermal_event.wait()
-
-                rel_details = GraphReference.get_sensor_thermal_rel(
-                    session,
-                    self._server_key,
-                    relationship={
-                        "source": self.name,
-                        "target": {"attribute": "name", "value": '"{}"'.format(target)},
-                        "event": event,
-                    },
-                )
-
-                # shut down thread upon relationship removal
-                if not rel_details:
-                    del self._th_sensor_t[target][event]
-                    return
+                cpu_impact["degrees"] = cpu_impact_degrees_2
 
-                rel = rel_details["rel"]
-                causes_heating = rel["action"] == "increase"
+            return cpu_sampler.sample_interval
 
-                source_sensor_status = (
-                    operator.eq if rel["event"] == "down" else operator.ne
-                )
-                bound_op = operator.lt if causes_heating else operator.gt
-                arith_op = operator.add if causes_heating else operator.sub
-
-                # if model is specified -> use the runtime mappings
-                if "model" in rel and rel["model"]:
-                    calc_new_sv = arith_op
-                    arith_op = lambda sv, _: calc_new_sv(
-                        sv,
-                        self._calc_approx_value(
-                            json.loads(rel["model"]), int(self.sensor_value) * 10
-                        ),
-                    )
+        return update_sensor
 
-                    source_sensor_status = operator.ne
+    def _target_storage(self, controller, target, hd_type, event):
+        """Update temperature of the storage component based on the relationship
+        between this sensor and the target (run by the thermal scheduler)
+        Returns:
+            float: delay until the next update or None if relationship was deleted
+        """
 
-                # verify that sensor value doesn't go below room temp
-                if causes_heating or rel["pauseAt"] > ISystemEnvironment.get_ambient():
-                    pause_at = rel["pauseAt"]
-                else:
-                    pause_at = ISystemEnvironment.get_ambient()
-
-                # update target sensor value
-                with self._s_file_locks.get_lock(target), open(
-                    os.path.join(self._s_dir, target), "r+"
-                ) as sf_handler:
-                    current_value = int(sf_handler.read())
-
-                    change_by = (
-                        int(rel["degrees"])
-                        if "degrees" in rel and rel["degrees"]
-                        else 0
-                    )
-                    new_sensor_value = arith_op(current_value, change_by)
+        # target
+        if hd_type == HDComponents.CacheVault:
+            target_attr = "serialNumber"
+            target_value = '"{}"'.format(target)
+        elif hd_type == HDComponents.PhysicalDrive:
+            target_attr = "DID"
+            target_value = target
+        else:
+            raise ValueError("Unknown hardware component!")
 
-                    # Source sensor status activated thermal impact
-                    if source_sensor_status(int(self.sensor_value), 0):
-                        needs_update = bound_op(new_sensor_value, pause_at)
-                        if not needs_update and bound_op(current_value, pause_at):
-                            needs_update = True
-                            new_sensor_value = int(pause_at)
+        rel_details = self._th_relationships.get_sensor_rel(
+            self._s_name, target_attr, target, event
+        )
 
-                        if needs_update:
-                            logger.info(
-                                "Current sensor value (%s°) will be updated to %s°",
-                                current_value,
-                                int(new_sensor_value),
-                            )
+        if not rel_details:
+            return None
+
+        rel = rel_details["rel"]
+        causes_heating = rel["action"] == "increase"
+        source_sensor_status = operator.eq if rel["event"] == "down" else operator.ne
+        degrees = rel.get("degrees")
+
+        # if model is specified -> use the runtime mappings
+        if "model" in rel and rel["model"]:
+            degrees = self.calc_approx_value(rel["model"], int(self.sensor_value) * 10)
+
+            source_sensor_status = operator.ne
+
+        if not source_sensor_status(int(self.sensor_value), 0):
+            return rel["rate"]
+
+        # temperature is updated in memory (& written back to the db later)
+        storage = StorageModel.for_server(self._server_key)
+        updated, new_temp = storage.add_to_hd_component_temperature(
+            target={
+                "controller": controller,
+                "attribute": target_attr,
+                "value": target_value,
+                "hd_type": hd_type.name,
+            },
+            temp_change=degrees * 1 if causes_heating else -1,
+            limit={
+                "lower": ISystemEnvironment.get_ambient(),
+                "upper": rel["pauseAt"] if causes_heating else None,
+            },
+        )
 
-                            sf_handler.seek(0)
-                            sf_handler.truncate()
-                            sf_handler.write(str(new_sensor_value))
+        if updated:
+            logger.info("temperature sensor was updated to %s°", new_temp)
+            ISystemEnvironment.get_store().hincrby(
+                format_storage_version_key(self._server_key), controller, 1
+            )
 
-                time.sleep(int(rel["rate"]))
+        return rel["rate"]
 
     def _get_sensor_file_path(self):
         """Full path to the sensor file"""
@@ -444,41 +323,28 @@ class Sensor:
         return self.name
 
     def add_cv_thermal_impact(self, controller, cv, event):
-        self._launch_thermal_storage_thread(
-            controller, cv, HDComponents.CacheVault, event
-        )
+        """Set a cachevault that will be affected by the current source sensor values
+        (relationship is reloaded if it was updated & unscheduled if deleted)"""
+        if self._th_relationships.reload_sensor_rel(
+            self.name, "serialNumber", cv, event
+        ):
+            self._schedule_storage_impact(
+                controller, cv, HDComponents.CacheVault, event
+            )
 
     def add_pd_thermal_impact(self, controller, pd, event):
-        self._launch_thermal_storage_thread(
-            controller, pd, HDComponents.PhysicalDrive, event
-        )
-
-    def add_sensor_thermal_impact(self, target, event):
-        """Set a target sensor that will be affected by the current source sensor values
-        Args:
-            target(str): Name of the target sensor
-            event(str): Source event causing the thermal impact to trigger
-        """
-        if target in self._th_sensor_t and event in self._th_sensor_t[target]:
-            raise ValueError("Thread already exists")
-
-        with self._graph_ref.get_session() as session:
-            rel_details = GraphReference.get_sensor_thermal_rel(
-                session,
-                self._server_key,
-                relationship={
-                    "source": self.name,
-                    "target": {"attribute": "name", "value": '"{}"'.format(target)},
-                    "event": event,
-                },
+        """Set a physical drive that will be affected by the current source sensor
+        values (relationship is reloaded if it was updated & unscheduled if deleted)"""
+        if self._th_relationships.reload_sensor_rel(self.name, "DID", pd, event):
+            self._schedule_storage_impact(
+                controller, pd, HDComponents.PhysicalDrive, event
             )
 
-            if rel_details:
-                self._launch_thermal_sensor_thread(target, rel_details["rel"]["event"])
-
     def add_cpu_thermal_impact(self):
-        """Set this sensor as one affected by the CPU-load"""
-        self._launch_thermal_cpu_thread()
+        """Set this sensor as one affected by the CPU-load
+        (relationship is reloaded if it was updated & unscheduled if deleted)"""
+        if self._th_relationships.reload_cpu_rel(self.name):
+            self._schedule_cpu_impact()
 
     @property
     def name(self):
@@ -498,8 +364,7 @@ class Sensor:
     @property
     def sensor_value(self):
         """Current sensor reading value"""
-        with open(self._get_sensor_file_path()) as sf_handler:
-            return sf_handler.read()
+        return self._s_storage.get(self.name)
 
     @property
     def thresholds(self):
@@ -544,36 +409,39 @@ class Sensor:
 
     @sensor_value.setter
     def sensor_value(self, new_value):
-        with open(self._get_sensor_file_path(), "w+") as filein:
-            filein.write(str(new_value))
+        self._s_storage.set(self.name, new_value)
 
     def start_thermal_impact(self):
-        """Enable thread execution responsible for thermal updates"""
+        """Schedule thermal updates based on the saved inter-connections"""
         self._init_thermal_impact()
         self.enable_thermal_impact()
 
     def enable_thermal_impact(self):
-        self._s_thermal_event.set()
+        """Resume thermal updates scheduled by this sensor"""
+        self._th_scheduler.enable(self)
 
     def disable_thermal_impact(self):
-        """Disable thread execution responsible for thermal updates"""
-        self._s_thermal_event.clear()
+        """Pause thermal updates scheduled by this sensor"""
+        self._th_scheduler.disable(self)
+
+    def stop_thermal_impact(self):
+        """Remove all thermal updates scheduled by this sensor"""
+        self._th_scheduler.remove_group(self)
 
     def set_to_off(self):
-        with open(self._get_sensor_file_path(), "w+") as filein:
-            off_value = self._s_specs["offValue"] if "offValue" in self._s_specs else 0
-            filein.write(str(off_value))
+        """Set sensor value to the specified off value"""
+        off_value = self._s_specs["offValue"] if "offValue" in self._s_specs else 0
+        self.sensor_value = off_value
 
     def set_to_defaults(self):
         """Reset the sensor value to the specified default value"""
 
-        with open(self._get_sensor_file_path(), "w+") as filein:
-            if self.group == SensorGroups.fan:
-                default_value = int(self._s_specs["defaultValue"] * 0.1)
-            else:
-                default_value = self._s_specs["defaultValue"]
+        if self.group == SensorGroups.fan:
+            default_value = int(self._s_specs["defaultValue"] * 0.1)
+        else:
+            default_value = self._s_specs["defaultValue"]
 
-            off_value = self._s_specs["offValue"] if "offValue" in self._s_specs else 0
-            filein.write(
-                str(default_value if "defaultValue" in self._s_specs else off_value)
-            )
+        off_value = self._s_specs["offValue"] if "offValue" in self._s_specs else 0
+        self.sensor_value = (
+            default_value if "defaultValue" in self._s_specs else off_value
+        )
@@ -0,0 +1,326 @@
+"""Storage backends for sensor values;
+
+SensorFileStorage keeps every value in its own file (polled by ipmi_sim).
+SensorTableStorage keeps all sensor values of a server in a single
+memory-mapped table with a fixed layout:
+
+    header: magic, number of slots, slot names (NAME_SIZE bytes each)
+    slots:  version (uint64), value length (uint8), value (VALUE_SIZE bytes)
+
+Slot updates are serialized by per-slot locks (threads & processes),
+readers use slot versions (odd while update is in progress) to get
+a consistent value without locking (falling back to the slot lock
+if the update takes too long, e.g. writer died half-way through). Optional exporter writes values
+to the sensor files read by ipmi_sim when they change.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from enginecore.state.sensor.file_locks import SensorFileLocks
+
+logger = logging.getLogger(__name__)
+
+
+class SensorFileStorage:
+    """Sensor values are stored in files (one file per sensor)"""
+
+    def __init__(self, sensor_dir, sensor_names):
+        self._s_dir = sensor_dir
+        self._s_file_locks = SensorFileLocks()
+
+        for s_name in sensor_names:
+            self._s_file_locks.add_sensor_file_lock(s_name)
+
+    def get(self, sensor_name):
+        """Current sensor value (as string)"""
+        with open(os.path.join(self._s_dir, sensor_name)) as sf_handler:
+            return sf_handler.read()
+
+    def set(self, sensor_name, value):
+        """Update sensor value"""
+        with open(os.path.join(self._s_dir, sensor_name), "w+") as sf_handler:
+            sf_handler.write(str(value))
+
+    def lock(self, sensor_name):
+        """Lock guarding read-modify-write updates of a sensor"""
+        return self._s_file_locks.get_lock(sensor_name)
+
+
+class _SlotLock:
+    """Re-entrant lock of a table slot shared by threads & processes"""
+
+    def __init__(self, fd, offset, length):
+        self._fd = fd
+        self._offset = offset
+        self._length = length
+
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        self._depth += 1
+        if self._depth == 1:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self._length, self._offset)
+
+    def __exit__(self, *_):
+        self._depth -= 1
+        if not self._depth:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self._length, self._offset)
+        self._thread_lock.release()
+
+
+class SensorTableStorage:
+    """Sensor values of a server stored in a memory-mapped table"""
+
+    MAGIC = b"SIMSENS1"
+    NAME_SIZE = 64
+    VALUE_SIZE = 23
+
+    # lock-free reads of a slot being updated: number of immediate retries,
+    # then retries with exponential backoff (in seconds) before locking the slot
+    READ_SPINS = 100
+    READ_BACKOFF = (0.0001, 0.01)
+    READ_MAX_SLEEPS = 20
+
+    _header_fmt = struct.Struct("<8sI")
+    _slot_fmt = struct.Struct("<QB{}s".format(VALUE_SIZE))
+
+    # tables opened by this process (keyed by path)
+    _tables = {}
+    _tables_lock = threading.Lock()
+
+    def __init__(self, path, fd, sensor_names):
+        """Use create() or open() instead"""
+        self._path = path
+        self._fd = fd
+        self._inode = os.fstat(fd).st_ino
+
+        self._names = list(sensor_names)
+        self._slots_offset = self._header_fmt.size + self.NAME_SIZE * len(self._names)
+        self._mm = mmap.mmap(
+            fd, self._slots_offset + self._slot_fmt.size * len(self._names)
+        )
+
+        self._index = {name: i for i, name in enumerate(self._names)}
+        self._locks = [
+            _SlotLock(fd, self._slot_offset(i), self._slot_fmt.size)
+            for i in range(len(self._names))
+        ]
+
+        self._exporter = None
+        self._exporter_stop = threading.Event()
+
+    @classmethod
+    def _registered(cls, path):
+        """Table opened by this process, None if it was removed/re-created"""
+        table = cls._tables.get(path)
+        try:
+            if table and os.stat(path).st_ino == table._inode:
+                return table
+        except FileNotFoundError:
+            pass
+        return None
+
+    @classmethod
+    def create(cls, path, sensor_names):
+        """Create a new table (or reuse one with the same layout)
+        Args:
+            path(str): table file location
+            sensor_names(list): names of sensors stored in the table
+        """
+        with cls._tables_lock:
+            table = cls._registered(path)
+            if table and table.sensor_names == list(sensor_names):
+                return table
+
+            header = cls._header_fmt.pack(cls.MAGIC, len(sensor_names)) + b"".join(
+                name.encode().ljust(cls.NAME_SIZE, b"\0")[: cls.NAME_SIZE]
+                for name in sensor_names
+            )
+
+            # new file replaces the old one so that readers notice the change
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as tbl_handler:
+                tbl_handler.write(header)
+                tbl_handler.write(b"\0" * cls._slot_fmt.size * len(sensor_names))
+            os.replace(tmp_path, path)
+
+            table = cls(path, os.open(path, os.O_RDWR), sensor_names)
+            cls._tables[path] = table
+            return table
+
+    @classmethod
+    def open(cls, path):
+        """Open table created by the engine
+        Returns:
+            SensorTableStorage: table or None if it does not exist
+        """
+        with cls._tables_lock:
+            table = cls._registered(path)
+            if table:
+                return table
+
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except FileNotFoundError:
+                return None
+
+            # read with pread: closing another descriptor of the file would
+            # release all the slot locks held by this process
+            magic, num_slots = cls._header_fmt.unpack(
+                os.pread(fd, cls._header_fmt.size, 0)
+            )
+            if magic != cls.MAGIC:
+                os.close(fd)
+                raise ValueError("Not a sensor table: '{}'".format(path))
+
+            names_data = os.pread(fd, cls.NAME_SIZE * num_slots, cls._header_fmt.size)
+            names = [
+                names_data[i : i + cls.NAME_SIZE].rstrip(b"\0").decode()
+                for i in range(0, len(names_data), cls.NAME_SIZE)
+            ]
+
+            table = cls(path, fd, names)
+            cls._tables[path] = table
+            return table
+
+    @property
+    def sensor_names(self):
+        """Names of the sensors (in slot order)"""
+        return self._names
+
+    def _slot_offset(self, idx):
+        return self._slots_offset + idx * self._slot_fmt.size
+
+    def _read_slot(self, idx):
+        """Read slot without locking (retry if update is in progress)
+        Returns:
+            tuple: slot version & value
+        """
+        offset = self._slot_offset(idx)
+        delay, max_delay = self.READ_BACKOFF
+
+        for attempt in range(self.READ_SPINS + self.READ_MAX_SLEEPS):
+            version, length, value = self._slot_fmt.unpack_from(self._mm, offset)
+
+            # value was not updated while being read
+            if not version % 2 and (
+                struct.unpack_from("<Q", self._mm, offset)[0] == version
+            ):
+                return version, value[:length].decode()
+
+            if attempt >= self.READ_SPINS:
+                time.sleep(delay)
+                delay = min(delay * 2, max_delay)
+
+        return self._read_slot_locked(idx)
+
+    def _read_slot_locked(self, idx):
+        """Read slot while holding its lock; slot left with odd version
+        by an interrupted update is repaired
+        Returns:
+            tuple: slot version & value
+        """
+        offset = self._slot_offset(idx)
+
+        with self._locks[idx]:
+            version, length, value = self._slot_fmt.unpack_from(self._mm, offset)
+            value = value[:length].decode(errors="replace")
+
+            # writers hold the lock for the whole update
+            if version % 2:
+                logger.warning(
+                    "Update of sensor '%s' was interrupted, keeping value '%s'",
+                    self._names[idx],
+                    value,
+                )
+                version += 1
+                struct.pack_into("<Q", self._mm, offset, version)
+
+            return version, value
+
+    def get(self, sensor_name):
+        """Current sensor value (as string)"""
+        return self._read_slot(self._index[sensor_name])[1]
+
+    def version(self, sensor_name):
+        """Number of updates of the sensor value (times 2)"""
+        return self._read_slot(self._index[sensor_name])[0]
+
+    def set(self, sensor_name, value):
+        """Update sensor value"""
+        idx = self._index[sensor_name]
+        value = str(value).encode()
+
+        if len(value) > self.VALUE_SIZE:
+            raise ValueError(
+                "Sensor value '{}' exceeds {} bytes".format(value, self.VALUE_SIZE)
+            )
+
+        offset = self._slot_offset(idx)
+        with self._locks[idx]:
+            version = struct.unpack_from("<Q", self._mm, offset)[0]
+            # odd version indicates that the slot is being updated
+            struct.pack_into("<Q", self._mm, offset, version + 1)
+            self._slot_fmt.pack_into(self._mm, offset, version + 1, len(value), value)
+            struct.pack_into("<Q", self._mm, offset, version + 2)
+
+    def lock(self, sensor_name):
+        """Lock guarding read-modify-write updates of a sensor"""
+        return self._locks[self._index[sensor_name]]
+
+    def export(self, sensor_dir, versions=None):
+        """Write values that changed to the sensor files
+        Args:
+            sensor_dir(str): directory with the sensor files
+            versions(dict): slot versions written during the last export
+                            (updated in place)
+        """
+        versions = {} if versions is None else versions
+
+        for idx, name in enumerate(self._names):
+            version, value = self._read_slot(idx)
+            if versions.get(name) == version:
+                continue
+
+            s_path = os.path.join(sensor_dir, name)
+            with open(s_path + ".tmp", "w") as sf_handler:
+                sf_handler.write(value)
+            os.replace(s_path + ".tmp", s_path)
+
+            versions[name] = version
+
+    def start_exporter(self, sensor_dir, interval=0.5):
+        """Keep sensor files in sync with the table (in a background thread)"""
+        if self._exporter and self._exporter.is_alive():
+            return
+
+        versions = {}
+        self.export(sensor_dir, versions)
+
+        def export_changes():
+            while not self._exporter_stop.wait(interval):
+                try:
+                    self.export(sensor_dir, versions)
+                except OSError as error:
+                    logger.warning("Could not export sensor values: %s", error)
+
+        self._exporter_stop.clear()
+        self._exporter = threading.Thread(
+            target=export_changes, name="sensor_exporter:{}".format(self._path)
+        )
+        self._exporter.daemon = True
+        self._exporter.start()
+
+    def stop_exporter(self):
+        """Stop updating sensor files"""
+        self._exporter_stop.set()
+        if self._exporter:
+            self._exporter.join()
+        self._exporter = None
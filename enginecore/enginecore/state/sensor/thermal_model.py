@@ -0,0 +1,237 @@
+"""Vectorized sensor->sensor thermal impact;
+
+Instead of updating sensors one relationship at a time, thermal relationships
+between sensors of a server are stored as edge arrays (source, target) with
+per-edge action (heating/cooling), degrees, rate, pauseAt bound and event
+(up/down) and all the relationships that are due are applied to the vector
+of sensor values with a handful of array operations.
+
+Relationships sharing the same target are split into layers (k-th relationship
+of every target goes to layer k) so that the result matches applying them
+one after another.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SensorThermalModel:
+    """Thermal relationships between sensors of a server as edge arrays"""
+
+    def __init__(self, sensor_names, relationships, approx_value):
+        """
+        Args:
+            sensor_names(list): names of all sensors (order of the value vector)
+            relationships(list): relationship details in format returned by
+                                 ThermalRelationships.get_sensor_rel
+            approx_value(callable): maps source value to degrees using
+                                    relationship model (model, value) -> degrees
+        """
+
+        self._approx_value = approx_value
+        self._index = {name: i for i, name in enumerate(sensor_names)}
+
+        relationships = [
+            r
+            for r in relationships
+            if r["source"]["name"] in self._index and r["target"]["name"] in self._index
+        ]
+        rels = [r["rel"] for r in relationships]
+
+        self.source = np.array(
+            [self._index[r["source"]["name"]] for r in relationships], dtype=int
+        )
+        self.target = np.array(
+            [self._index[r["target"]["name"]] for r in relationships], dtype=int
+        )
+
+        # +1 for heating, -1 for cooling
+        self.sign = np.array([1 if r["action"] == "increase" else -1 for r in rels])
+        self.degrees = np.array(
+            [int(r["degrees"]) if r.get("degrees") else 0 for r in rels], dtype=float
+        )
+        self.rate = np.array([int(r["rate"]) for r in rels], dtype=float)
+        self.pause_at = np.array([r["pauseAt"] for r in rels], dtype=float)
+        self.on_down = np.array([r["event"] == "down" for r in rels], dtype=bool)
+
+        # runtime mappings (source value -> degrees) replace fixed degrees
+        self.models = [r["model"] if r.get("model") else None for r in rels]
+        self.has_model = np.array([m is not None for m in self.models], dtype=bool)
+
+        self.layer = np.zeros(len(rels), dtype=int)
+        seen = {}
+        for i, target in enumerate(self.target.tolist()):
+            self.layer[i] = seen.get(target, 0)
+            seen[target] = self.layer[i] + 1
+
+    def __len__(self):
+        return len(self.source)
+
+    def step(self, values, ambient, due=None):
+        """Apply relationships that are due to sensor values
+        Args:
+            values(numpy.ndarray): current sensor values (nan if not numeric)
+            ambient(float): room temperature (sensors are not cooled below it)
+            due(numpy.ndarray): mask of relationships that should be applied
+        Returns:
+            numpy.ndarray: updated sensor values
+        """
+
+        values = np.array(values, dtype=float)
+        due = np.ones(len(self), dtype=bool) if due is None else due
+
+        # cooling stops at ambient unless relationship bound is above it
+        pause_at = np.where(
+            (self.sign > 0) | (self.pause_at > ambient), self.pause_at, ambient
+        )
+
+        for layer in range(self.layer.max(initial=-1) + 1):
+            edges = np.flatnonzero(due & (self.layer == layer))
+            if not edges.size:
+                continue
+
+            src_value = values[self.source[edges]]
+            current = values[self.target[edges]]
+
+            change = self.degrees[edges].copy()
+            for i in np.flatnonzero(self.has_model[edges]):
+                if not np.isnan(src_value[i]):
+                    change[i] = self._approx_value(
+                        self.models[edges[i]], int(src_value[i]) * 10
+                    )
+
+            # source sensor status activates thermal impact
+            active = np.where(
+                self.on_down[edges] & ~self.has_model[edges],
+                src_value == 0,
+                src_value != 0,
+            ) & ~np.isnan(src_value)
+
+            sign, bound = self.sign[edges], pause_at[edges]
+            new_value = current + sign * change
+
+            # update until the bound is reached (then snap to the bound)
+            below_bound = sign * (new_value - bound) < 0
+            was_below_bound = sign * (current - bound) < 0
+
+            values[self.target[edges]] = np.where(
+                active & below_bound,
+                new_value,
+                np.where(active & was_below_bound, np.trunc(bound), current),
+            )
+
+        return values
+
+
+class SensorThermalEngine:
+    """Runs vectorized thermal updates of all the sensors in a repository"""
+
+    def __init__(self, sensor_names, storage, relationships, **kwargs):
+        """
+        Args:
+            sensor_names(list): names of the sensors belonging to the repository
+            storage: sensor values backend (see sensor.storage)
+            relationships(ThermalRelationships): cached thermal relationships
+            get_ambient(callable): returns current room temperature
+            approx_value(callable): see SensorThermalModel
+        """
+        self._names = list(sensor_names)
+        self._storage = storage
+        self._relationships = relationships
+
+        self._get_ambient = kwargs["get_ambient"]
+        self._approx_value = kwargs["approx_value"]
+
+        self._model = None
+        self._next_due = None
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """Re-build model from the cached relationships
+        (relationships that were already scheduled keep their timing)"""
+        with self._lock:
+            self._reload()
+
+    def _reload(self):
+        old_due = {}
+        if self._model is not None:
+            old_due = dict(zip(self._edge_keys(self._model), self._next_due.tolist()))
+
+        self._model = SensorThermalModel(
+            self._names,
+            self._relationships.get_sensor_to_sensor_rels(),
+            self._approx_value,
+        )
+
+        now = time.monotonic()
+        self._next_due = np.array(
+            [old_due.get(key, now) for key in self._edge_keys(self._model)],
+            dtype=float,
+        )
+
+    def _edge_keys(self, model):
+        """Identify relationships by source, target & event"""
+        return list(
+            zip(model.source.tolist(), model.target.tolist(), model.on_down.tolist())
+        )
+
+    def _read_values(self):
+        """Current sensor values as a vector"""
+        raw_values = [self._storage.get(name) for name in self._names]
+
+        values = np.full(len(raw_values), np.nan)
+        for i, raw_value in enumerate(raw_values):
+            try:
+                values[i] = int(raw_value)
+            except ValueError:
+                pass
+
+        return raw_values, values
+
+    def tick(self):
+        """Apply relationships that are due
+        Returns:
+            float: delay until the next relationship is due
+                   (None if there are no relationships)
+        """
+
+        with self._lock:
+            if self._model is None:
+                self._reload()
+
+            if not len(self._model):
+                return None
+
+            return self._tick()
+
+    def _tick(self):
+        """Update sensor values with relationships that are due"""
+        now = time.monotonic()
+        due = self._next_due <= now
+
+        if due.any():
+            raw_values, values = self._read_values()
+            new_values = self._model.step(values, self._get_ambient(), due)
+
+            for i in np.flatnonzero(~np.isnan(values) & (new_values != values)):
+                name = self._names[i]
+
+                with self._storage.lock(name):
+                    # sensor was updated by someone else in the meantime
+                    if self._storage.get(name) != raw_values[i]:
+                        continue
+
+                    logger.info(
+                        "Current sensor value (%s°) will be updated to %s°",
+                        int(values[i]),
+                        int(new_values[i]),
+                    )
+                    self._storage.set(name, int(new_values[i]))
+
+            self._next_due[due] = now + self._model.rate[due]
+
+        return max(self._next_due.min() - time.monotonic(), 0)
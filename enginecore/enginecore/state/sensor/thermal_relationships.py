@@ -0,0 +1,205 @@
+"""Thermal relationships of a server (sensor->sensor, sensor->storage, cpu->sensor)
+cached in memory so that periodic thermal updates don't query the graph db;
+
+Relationships are loaded once per server, relationship models are pre-compiled
+into lookup tables.
+Cached entries are reloaded one at a time when relationship configuration
+changes (see thermal channels in RedisChannels).
+"""
+import json
+import threading
+
+from enginecore.model.graph_reference import GraphReference
+from enginecore.tools.interpolation import LookupTable
+
+
+class ThermalRelationships:
+    """In-memory view of the thermal relationships belonging to a server"""
+
+    # attributes identifying thermal targets (sensors, cachevaults, drives)
+    target_attributes = ["name", "serialNumber", "DID"]
+
+    _servers = {}
+    _servers_lock = threading.Lock()
+
+    def __init__(self, server_key, graph_ref=None):
+        self._server_key = server_key
+        self._graph_ref = graph_ref if graph_ref else GraphReference()
+
+        self._lock = threading.Lock()
+        self._sensor_rels = None
+        self._cpu_rels = None
+
+    @classmethod
+    def for_server(cls, server_key):
+        """Relationships cache shared by all the sensors of a server"""
+        with cls._servers_lock:
+            if server_key not in cls._servers:
+                cls._servers[server_key] = cls(server_key)
+
+            return cls._servers[server_key]
+
+    @classmethod
+    def discard(cls, server_key):
+        """Drop cached relationships of a server (e.g. on model reload)"""
+        with cls._servers_lock:
+            cls._servers.pop(server_key, None)
+
+    @staticmethod
+    def _parse_rel(rel):
+        """Decode relationship model (if any) & compile it into a lookup table"""
+        rel = dict(rel)
+        if rel.get("model") and isinstance(rel["model"], str):
+            rel["model"] = json.loads(rel["model"])
+        if rel.get("model") and isinstance(rel["model"], dict):
+            rel["model"] = LookupTable(rel["model"])
+        return rel
+
+    @staticmethod
+    def _sensor_rel_key(source, target_attr, target_value, event):
+        return (source, target_attr, str(target_value).strip('"'), event)
+
+    def _load(self):
+        """Query all thermal relationships of the server"""
+
+        sensor_rels, cpu_rels = {}, {}
+
+        with self._graph_ref.get_session() as session:
+            results = session.run(
+                """
+                MATCH (:ServerWithBMC { key: $server })-[:HAS_SENSOR]->(source:Sensor)
+                MATCH (source)<-[rel :COOLED_BY|:HEATED_BY]-(target)
+                RETURN source, target, rel
+                """,
+                server=self._server_key,
+            )
+
+            for record in results:
+                source, target = dict(record["source"]), dict(record["target"])
+                rel = {
+                    "source": source,
+                    "target": target,
+                    "rel": self._parse_rel(record["rel"]),
+                }
+
+                for attr in self.target_attributes:
+                    if attr not in target:
+                        continue
+                    key = self._sensor_rel_key(
+                        source["name"], attr, target[attr], rel["rel"]["event"]
+                    )
+                    sensor_rels.setdefault(key, rel)
+
+            results = session.run(
+                """
+                MATCH (:ServerWithBMC { key: $server })-[:HAS_SENSOR]->(sensor:Sensor)
+                MATCH (:CPU)<-[rel:HEATED_BY]-(sensor)
+                RETURN sensor.name as name, rel
+                """,
+                server=self._server_key,
+            )
+
+            for record in results:
+                cpu_rels[record["name"]] = self._parse_rel(record["rel"])
+
+        self._sensor_rels, self._cpu_rels = sensor_rels, cpu_rels
+
+    def _ensure_loaded(self):
+        if self._sensor_rels is None:
+            self._load()
+
+    def get_sensor_rel(self, source, target_attr, target_value, event):
+        """Get thermal relationship between a source sensor & a target
+        Args:
+            source(str): name of the source sensor
+            target_attr(str): attribute identifying target (one of target_attributes)
+            target_value: value of the target attribute
+            event(str): source event causing the thermal impact
+        Returns:
+            dict: source, target & relationship details
+                  (same format as GraphReference.get_sensor_thermal_rel),
+                  None if relationship does not exist
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return self._sensor_rels.get(
+                self._sensor_rel_key(source, target_attr, target_value, event)
+            )
+
+    def get_sensor_to_sensor_rels(self):
+        """Get all thermal relationships between sensors of the server
+        Returns:
+            list: relationship details (see get_sensor_rel)
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return [
+                rel
+                for key, rel in self._sensor_rels.items()
+                if key[1] == "name" and "name" in rel["source"]
+            ]
+
+    def get_cpu_rel(self, sensor_name):
+        """Get thermal relationship between CPU load and a sensor
+        Returns:
+            dict: relationship details, None if it does not exist
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return self._cpu_rels.get(sensor_name)
+
+    def reload_sensor_rel(self, source, target_attr, target_value, event):
+        """Re-query single sensor->sensor or sensor->storage relationship
+        (after it was created, updated or deleted)
+        Returns:
+            dict: relationship details, None if it no longer exists
+        """
+
+        if isinstance(target_value, str):
+            target_value = '"{}"'.format(target_value.strip('"'))
+
+        with self._graph_ref.get_session() as session:
+            rel_details = GraphReference.get_sensor_thermal_rel(
+                session,
+                self._server_key,
+                relationship={
+                    "source": source,
+                    "target": {"attribute": target_attr, "value": target_value},
+                    "event": event,
+                },
+            )
+
+        if rel_details:
+            rel_details["rel"] = self._parse_rel(rel_details["rel"])
+
+        key = self._sensor_rel_key(source, target_attr, target_value, event)
+        with self._lock:
+            self._ensure_loaded()
+            if rel_details:
+                self._sensor_rels[key] = rel_details
+            else:
+                self._sensor_rels.pop(key, None)
+
+        return rel_details
+
+    def reload_cpu_rel(self, sensor_name):
+        """Re-query relationship between CPU load and a sensor
+        Returns:
+            dict: relationship details, None if it no longer exists
+        """
+
+        with self._graph_ref.get_session() as session:
+            rel = GraphReference.get_cpu_thermal_rel(
+                session, self._server_key, sensor_name
+            )
+
+        rel = self._parse_rel(rel) if rel else None
+
+        with self._lock:
+            self._ensure_loaded()
+            if rel:
+                self._cpu_rels[sensor_name] = rel
+            else:
+                self._cpu_rels.pop(sensor_name, None)
+
+        return rel
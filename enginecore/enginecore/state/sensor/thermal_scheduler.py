@@ -0,0 +1,201 @@
+"""Thermal scheduler runs updates of all the thermal relationships
+(sensor->sensor, sensor->storage, cpu->sensor) in a single thread;
+
+Relationship updates are stored in a timer heap ordered by the time of the next run,
+every update returns delay until its next run (relationship rate)
+or None if the relationship no longer exists.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ThermalScheduler:
+    """Timer heap running periodic thermal updates;
+    Jobs are registered under groups (e.g. sensors) that can be
+    enabled & disabled at runtime (groups are disabled by default,
+    jobs belonging to disabled groups are parked and run as soon as
+    their group is enabled)
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._cond = threading.Condition()
+
+        # (due time, sequence number, job id, job token) entries
+        self._heap = []
+        self._seq = itertools.count()
+
+        # job id -> (task, token); token invalidates stale heap entries
+        self._jobs = {}
+        self._enabled_groups = set()
+        self._parked_jobs = {}
+
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def shared(cls):
+        """Scheduler instance shared by all the sensors managed by the engine"""
+        with cls._shared_lock:
+            if not cls._shared:
+                cls._shared = cls()
+
+            return cls._shared
+
+    @property
+    def num_jobs(self):
+        """Number of scheduled updates (parked ones included)"""
+        with self._cond:
+            return len(self._jobs)
+
+    def has_job(self, group, name):
+        """Check if job is scheduled"""
+        with self._cond:
+            return (group, name) in self._jobs
+
+    def add_job(self, group, name, task, delay=0):
+        """Schedule a periodic update
+        Args:
+            group(object): hashable group (thermal switch) job belongs to
+            name(str): job name, unique within the group
+            task(callable): called with no arguments, returns delay (in seconds)
+                            until the next run or None to stop the job
+            delay(float): run task after this many seconds
+        Raises:
+            ValueError: if the job already exists
+        """
+        job_id = (group, name)
+
+        with self._cond:
+            if job_id in self._jobs:
+                raise ValueError("Thermal job '{}' already exists".format(name))
+
+            token = object()
+            self._jobs[job_id] = (task, token)
+            self._push(job_id, token, delay)
+            self._start()
+
+    def remove_job(self, group, name):
+        """Unschedule job (no-op if job does not exist)"""
+        job_id = (group, name)
+
+        with self._cond:
+            self._jobs.pop(job_id, None)
+            self._parked_jobs.get(group, set()).discard(job_id)
+
+    def remove_group(self, group):
+        """Unschedule all jobs belonging to the group"""
+        with self._cond:
+            for job_id in [j for j in self._jobs if j[0] == group]:
+                del self._jobs[job_id]
+
+            self._parked_jobs.pop(group, None)
+            self._enabled_groups.discard(group)
+
+    def enable(self, group):
+        """Resume jobs belonging to the group (parked jobs are run right away)"""
+        with self._cond:
+            self._enabled_groups.add(group)
+
+            for job_id in self._parked_jobs.pop(group, set()):
+                if job_id in self._jobs:
+                    self._push(job_id, self._jobs[job_id][1], 0)
+
+    def disable(self, group):
+        """Pause jobs belonging to the group"""
+        with self._cond:
+            self._enabled_groups.discard(group)
+
+    def stop(self):
+        """Stop the scheduler thread & discard all the jobs"""
+        with self._cond:
+            self._running = False
+            self._heap.clear()
+            self._jobs.clear()
+            self._parked_jobs.clear()
+            self._enabled_groups.clear()
+            self._cond.notify_all()
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _push(self, job_id, token, delay):
+        """Add heap entry & wake up the scheduler thread"""
+        heapq.heappush(
+            self._heap, (time.monotonic() + delay, next(self._seq), job_id, token)
+        )
+        self._cond.notify()
+
+    def _start(self):
+        """Launch scheduler thread (if not running)"""
+        if self._running:
+            return
+
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name="thermal_scheduler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _next_job(self):
+        """Wait for the next job that is due
+        Returns:
+            tuple: job id & job details, None if scheduler was stopped
+        """
+        with self._cond:
+            while self._running:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                due_time, _, job_id, token = self._heap[0]
+                timeout = due_time - time.monotonic()
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                    continue
+
+                heapq.heappop(self._heap)
+                job = self._jobs.get(job_id)
+
+                # job was removed or re-added since the entry was pushed
+                if not job or job[1] is not token:
+                    continue
+
+                if job_id[0] not in self._enabled_groups:
+                    self._parked_jobs.setdefault(job_id[0], set()).add(job_id)
+                    continue
+
+                return job_id, job
+
+            return None
+
+    def _worker(self):
+        """Run thermal updates as they become due"""
+        while True:
+            next_job = self._next_job()
+            if not next_job:
+                return
+
+            job_id, (task, token) = next_job
+
+            try:
+                delay = task()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Thermal job '%s' failed", job_id[1])
+                delay = None
+
+            with self._cond:
+                if self._jobs.get(job_id, (None, None))[1] is not token:
+                    continue
+
+                if delay is None:
+                    del self._jobs[job_id]
+                else:
+                    self._push(job_id, token, delay)
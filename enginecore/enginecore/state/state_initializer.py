@@ -1,14 +1,25 @@
 """Initialize redis state based on reference model """
 import os
+import hashlib
+import json
+import logging
 import subprocess
 import tempfile
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import redis
 
 from enginecore.model.graph_reference import GraphReference
 from enginecore.tools.utils import format_as_redis_key
 
+logger = logging.getLogger(__name__)
+
+# redis hash storing definition hashes of the assets initialized on the last start
+TOPOLOGY_HASH_KEY = "topology-hash"
+
 
 def get_temp_workplace_dir():
     """Get location of the temp directory"""
@@ -87,8 +98,163 @@ def clear_temp():
         os.makedirs(simengine_temp)
 
 
-def initialize(force_snmp_init=False):
-    """Initialize redis state using topology defined in the graph db"""
+def load_snmprec(static_oid_path):
+    """Parse a static .snmprec file
+    Args:
+        static_oid_path(str): path to the .snmprec file
+    Returns:
+        list: tuples of oid, data type & value (one per line)
+    """
+    with open(static_oid_path, "r") as sfile_handler:
+        return [
+            tuple(line.replace("\n", "").split("|"))
+            for line in sfile_handler
+            if line.strip()
+        ]
+
+
+def snmprec_to_redis(formatted_key, snmprec, graph_oids):
+    """Convert parsed .snmprec data into SNMPSim redis format
+    (OIDs defined in the graph db override static values)
+
+    Args:
+        formatted_key(str): zero-padded asset key
+        snmprec(list): oid, data type & value tuples (see load_snmprec)
+        graph_oids(dict): oids defined in the graph db
+                          mapped to their data types & default values
+    Returns:
+        tuple: redis key/values for the OIDs & alphabetically sorted
+               redis keys (oids ordering used by snmppub.lua)
+    """
+    oid_values = {}
+    for oid, dtype, value in snmprec:
+        if oid in graph_oids:
+            dtype = graph_oids[oid]["dtype"]
+            value = graph_oids[oid]["value"]
+
+        oid_values[format_as_redis_key(formatted_key, oid)] = "{}|{}".format(
+            dtype, value
+        )
+
+    return oid_values, sorted(oid_values)
+
+
+def asset_fingerprint(labels, props, oids, parent_keys):
+    """Hash of the asset definition (used to detect assets that changed
+    since the last engine start)
+
+    Args:
+        labels(iterable): graph labels of the asset
+        props(dict): asset properties
+        oids(list): properties of the OIDs belonging to the asset
+        parent_keys(iterable): keys of the assets powering this asset
+    Returns:
+        str: hex digest of the asset definition
+    """
+    definition = {
+        "labels": sorted(labels),
+        "props": props,
+        "oids": sorted(json.dumps(oid, sort_keys=True, default=str) for oid in oids),
+        "parents": sorted(parent_keys),
+    }
+
+    return hashlib.sha1(
+        json.dumps(definition, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _record_fingerprint(record):
+    """Hash of the asset definition queried from the graph db"""
+    return asset_fingerprint(
+        record["asset"].labels,
+        dict(record["asset"]),
+        [dict(oid) for oid in record["oids"]],
+        record["parents"],
+    )
+
+
+class _SnmprecCache:
+    """Parses each distinct .snmprec file only once per initialization
+    (many assets share the same static data)"""
+
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def get(self, static_oid_path):
+        """Get parsed file contents"""
+        with self._lock:
+            if static_oid_path not in self._files:
+                self._files[static_oid_path] = load_snmprec(static_oid_path)
+            return self._files[static_oid_path]
+
+
+def _init_asset(redis_store, record, snmprec_cache, force_snmp_init):
+    """Initialize redis state of a single asset
+    Returns:
+        float: time spent parsing .snmprec data (seconds)
+    """
+    asset_type = record["asset"].get("type")
+    asset_key = str(record["asset"].get("key"))
+    state_key = "{}-{}:state".format(asset_key, asset_type)
+
+    init_from_snmprec = (not redis_store.exists(state_key)) or force_snmp_init
+
+    # Set-up in the SNMPSim format
+    if not (
+        "SNMPSim" in record["asset"].labels and record["oids"] and init_from_snmprec
+    ):
+        redis_store.set(state_key, 1)
+        return 0
+
+    formatted_key = asset_key.zfill(10)
+
+    graph_oids = {}
+    for oid in record["oids"]:  # loop over oids that are defined in the graph db
+        graph_oids[oid.get("OID")] = {
+            "dtype": oid.get("dataType"),
+            "value": oid.get("defaultValue"),
+        }
+
+    # Read a file containing static .snmprec data
+    static_oid_path = os.path.join(
+        os.environ.get("SIMENGINE_STATIC_DATA"), record["asset"].get("staticOidFile")
+    )
+
+    parse_start = time.time()
+    oid_values, oids_ordering = snmprec_to_redis(
+        formatted_key, snmprec_cache.get(static_oid_path), graph_oids
+    )
+    parse_time = time.time() - parse_start
+
+    ordering_key = formatted_key + "-oids_ordering"
+
+    pipe = redis_store.pipeline(transaction=False)
+    pipe.set(state_key, 1)
+    pipe.delete(ordering_key)
+    if oid_values:
+        pipe.mset(oid_values)
+        pipe.rpush(ordering_key, *oids_ordering)
+    pipe.rpush(asset_key, formatted_key)
+    pipe.execute()
+
+    return parse_time
+
+
+def initialize(force_snmp_init=False, max_workers=8, warm_start=False):
+    """Initialize redis state using topology defined in the graph db
+
+    Args:
+        force_snmp_init(bool): re-load OIDs from .snmprec even if state exists
+        max_workers(int): number of assets initialized in parallel
+        warm_start(bool): keep redis state of the assets that haven't changed
+                          since the last start (see TOPOLOGY_HASH_KEY),
+                          assets that did change are re-initialized
+    Returns:
+        set: keys of the assets whose state was kept
+    """
+
+    init_start = time.time()
 
     graph_ref = GraphReference()
     redis_store = redis.StrictRedis(host="localhost", port=6379)
@@ -96,53 +262,71 @@ def initialize(force_snmp_init=False):
     with graph_ref.get_session() as session:
         results = session.run(
             """
-            MATCH (asset:Asset) OPTIONAL MATCH (asset:Asset)-[:HAS_OID]->(oid)
-            return asset, collect(oid) as oids
+            MATCH (asset:Asset)
+            OPTIONAL MATCH (asset)-[:HAS_OID]->(oid)
+            OPTIONAL MATCH (asset)-[:POWERED_BY]->(parent:Asset)
+            RETURN asset, collect(DISTINCT oid) as oids,
+                   collect(DISTINCT parent.key) as parents
             """
         )
+        records = list(results)
 
-    for record in results:
-        asset_type = record["asset"].get("type")
-        asset_key = str(record["asset"].get("key"))
-
-        init_from_snmprec = (
-            not redis_store.exists("{}-{}:state".format(asset_key, asset_type))
-        ) or force_snmp_init
-        redis_store.set("{}-{}:state".format(asset_key, asset_type), 1)
-        formatted_key = asset_key.zfill(10)
-        temp_ordering_key = formatted_key + "-temp_oids_ordering"
-
-        graph_oids = {}
-        for oid in record["oids"]:  # loop over oids that are defined in the graph db
-            graph_oids[oid.get("OID")] = {
-                "dtype": oid.get("dataType"),
-                "value": oid.get("defaultValue"),
-            }
-
-        # Set-up in the SNMPSim format
-        if "SNMPSim" in record["asset"].labels and record["oids"] and init_from_snmprec:
-            # Read a file containing static .snmprec data
-            static_oid_file = record["asset"].get("staticOidFile")
-            static_oid_path = os.path.join(
-                os.environ.get("SIMENGINE_STATIC_DATA"), static_oid_file
-            )
+    query_time = time.time() - init_start
+
+    fingerprints = {
+        str(record["asset"].get("key")): _record_fingerprint(record)
+        for record in records
+    }
+    stored_fingerprints = {
+        k.decode(): v.decode()
+        for k, v in redis_store.hgetall(TOPOLOGY_HASH_KEY).items()
+    }
 
-            with open(static_oid_path, "r") as sfile_handler:
-                for line in sfile_handler:
-                    oid, dtype, value = line.replace("\n", "").split("|")
-                    if oid in graph_oids:
-                        dtype = graph_oids[oid]["dtype"]
-                        value = graph_oids[oid]["value"]
+    # assets that did not change since the last start keep their state
+    warm_keys = set()
+    if warm_start:
+        pipe = redis_store.pipeline(transaction=False)
+        for record in records:
+            pipe.exists("{key}-{type}:state".format(**dict(record["asset"])))
+        state_exists = pipe.execute()
 
-                    key_and_oid = format_as_redis_key(formatted_key, oid)
-                    redis_store.lpush(temp_ordering_key, key_and_oid)
-                    redis_store.set(key_and_oid, "{}|{}".format(dtype, value))
+        for record, exists in zip(records, state_exists):
+            asset_key = str(record["asset"].get("key"))
+            if exists and stored_fingerprints.get(asset_key) == fingerprints[asset_key]:
+                warm_keys.add(int(asset_key))
 
-            redis_store.sort(
-                temp_ordering_key, store=formatted_key + "-oids_ordering", alpha=True
+    cold_records = [r for r in records if r["asset"].get("key") not in warm_keys]
+    snmprec_cache = _SnmprecCache()
+
+    redis_start = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        parse_times = list(
+            executor.map(
+                lambda r: _init_asset(
+                    redis_store, r, snmprec_cache, force_snmp_init or warm_start
+                ),
+                cold_records,
             )
-            redis_store.delete(temp_ordering_key)
-            redis_store.rpush(asset_key, formatted_key)
+        )
+
+    pipe = redis_store.pipeline()
+    pipe.delete(TOPOLOGY_HASH_KEY)
+    if fingerprints:
+        pipe.hmset(TOPOLOGY_HASH_KEY, fingerprints)
+    pipe.execute()
+
+    logger.info(
+        "Initialized state of %s assets (%s kept) in %.3fs "
+        "(graph query: %.3fs, .snmprec parsing: %.3fs, redis: %.3fs)",
+        len(records),
+        len(warm_keys),
+        time.time() - init_start,
+        query_time,
+        sum(parse_times),
+        time.time() - redis_start,
+    )
+
+    return warm_keys
 
 
 if __name__ == "__main__":
@@ -0,0 +1,530 @@
+"""In-memory model of server storage (RAID controllers, physical & virtual drives,
+cachevaults) so that storcli64 queries & storage thermal updates don't have to
+wait on the graph db;
+
+Storage components of a server are loaded from the graph db once (into compact
+records with a fixed set of properties), updates (CLI requests, temperature
+changes) are applied in memory and properties that changed are written back to
+the graph db in batches by a single background thread (every flush_interval
+seconds, see SIMENGINE_STORAGE_FLUSH_INTERVAL env var).
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from enginecore.model.graph_reference import GraphReference
+from enginecore.tools.query_helpers import to_camelcase
+
+logger = logging.getLogger(__name__)
+
+
+class _StorageRecord:
+    """Properties of a storage component (as stored in the graph db);
+    properties that are not set are None"""
+
+    __slots__ = ()
+    label = None
+
+    def __init__(self, props):
+        for prop in self.__slots__:
+            setattr(self, prop, props.get(prop))
+
+    def as_dict(self):
+        """Component properties in the same format as graph db nodes"""
+        return {
+            prop: getattr(self, prop)
+            for prop in self.__slots__
+            if getattr(self, prop) is not None
+        }
+
+    def update(self, props):
+        """Set new property values (None values are ignored)
+        Returns:
+            dict: properties that changed
+        """
+        changed = {}
+        for prop, value in props.items():
+            if value is not None and getattr(self, prop) != value:
+                setattr(self, prop, value)
+                changed[prop] = value
+
+        return changed
+
+
+class Controller(_StorageRecord):
+    """RAID controller"""
+
+    __slots__ = (
+        "controllerNum",
+        "model",
+        "serialNumber",
+        "SASAddress",
+        "PCIAddress",
+        "mfgDate",
+        "reworkDate",
+        "memoryCorrectableErrors",
+        "memoryUncorrectableErrors",
+        "alarmState",
+        "numDriveGroups",
+        "bgiRate",
+        "prRate",
+        "rebuildRate",
+        "ccRate",
+        # set by storage cli
+        "memCErrors",
+        "memUcErrors",
+        "alarm",
+    )
+    label = "Controller"
+
+
+class PhysicalDrive(_StorageRecord):
+    """Physical drive attached to a controller"""
+
+    __slots__ = (
+        "EID",
+        "DID",
+        "State",
+        "DG",
+        "Size",
+        "Intf",
+        "Med",
+        "SED",
+        "PI",
+        "SeSz",
+        "Model",
+        "Sp",
+        "Type",
+        "PDC",
+        "slotNum",
+        "temperature",
+        "mediaErrorCount",
+        "otherErrorCount",
+        "predictiveErrorCount",
+        "rebuildTime",
+        "timeStamp",
+        "manufacturerId",
+        "serialNumber",
+    )
+    label = "PhysicalDrive"
+
+
+class VirtualDrive(_StorageRecord):
+    """Virtual drive (RAID array) built of physical drives"""
+
+    __slots__ = (
+        "TYPE",
+        "DG",
+        "State",
+        "Access",
+        "Cac",
+        "Cache",
+        "Name",
+        "Consist",
+        "sCC",
+        "Size",
+        "vdNum",
+    )
+    label = "VirtualDrive"
+
+
+class CacheVault(_StorageRecord):
+    """Controller cachevault"""
+
+    __slots__ = (
+        "model",
+        "replacement",
+        "state",
+        "temperature",
+        "mfgDate",
+        "serialNumber",
+        "writeThrough",
+    )
+    label = "CacheVault"
+
+
+class _ControllerStorage:
+    """Controller & the components attached to it"""
+
+    def __init__(self, storage):
+        """
+        Args:
+            storage(dict): controller storage as returned by GraphReference.get_storage
+        """
+        self.controller = Controller(storage["controller"])
+        self.cachevault = (
+            CacheVault(storage["cachevault"]) if storage["cachevault"] else None
+        )
+
+        self.virtual_drives = sorted(
+            map(VirtualDrive, storage["virtual_drives"]), key=lambda vd: vd.vdNum
+        )
+
+        # physical drives keyed by DID & DIDs of virtual drive members
+        self.physical_drives = {}
+        self.vd_members = {vd.vdNum: [] for vd in self.virtual_drives}
+
+        for pd_details in storage["physical_drives"]:
+            p_drive = PhysicalDrive(pd_details["drive"])
+            self.physical_drives.setdefault(p_drive.DID, p_drive)
+
+            if pd_details["vdNum"] in self.vd_members:
+                self.vd_members[pd_details["vdNum"]].append(p_drive.DID)
+
+    def get_physical_drive(self, attr, value):
+        """Find physical drive by DID or serial number"""
+        if attr == "DID":
+            return self.physical_drives.get(int(value))
+
+        return next(
+            (pd for pd in self.physical_drives.values() if pd.serialNumber == value),
+            None,
+        )
+
+
+class StorageModel:
+    """Storage components of a server kept in memory
+    (query & update methods mirror the storage queries of GraphReference)
+    """
+
+    flush_interval = 1  # seconds
+
+    _servers = {}
+    _servers_lock = threading.Lock()
+    _writer_t = None
+
+    def __init__(self, server_key, graph_ref=None):
+        self._server_key = server_key
+        self._graph_ref = graph_ref if graph_ref else GraphReference()
+
+        self._lock = threading.RLock()
+        self._controllers = None
+
+        # properties waiting to be written back keyed by (label, controller, DID)
+        self._pending = {}
+
+    @classmethod
+    def for_server(cls, server_key):
+        """Storage model shared by all the components of a server
+        (write-back thread is launched on first request)"""
+        with cls._servers_lock:
+            if server_key not in cls._servers:
+                cls._servers[server_key] = cls(server_key)
+
+            if not cls._writer_t:
+                cls._writer_t = threading.Thread(
+                    target=cls._write_back, name="storage_write_back"
+                )
+                cls._writer_t.daemon = True
+                cls._writer_t.start()
+                atexit.register(cls.flush_all)
+
+            return cls._servers[server_key]
+
+    @classmethod
+    def discard(cls, server_key):
+        """Write back pending changes & drop storage model of a server
+        (e.g. on model reload)"""
+        with cls._servers_lock:
+            storage = cls._servers.pop(server_key, None)
+
+        if storage:
+            storage.safe_flush()
+
+    @classmethod
+    def flush_all(cls):
+        """Write back pending changes of all the servers"""
+        with cls._servers_lock:
+            servers = list(cls._servers.values())
+
+        for storage in servers:
+            storage.safe_flush()
+
+    @classmethod
+    def _write_back(cls):
+        """Flush storage changes periodically"""
+        interval = float(
+            os.environ.get("SIMENGINE_STORAGE_FLUSH_INTERVAL", cls.flush_interval)
+        )
+
+        while True:
+            time.sleep(interval)
+            cls.flush_all()
+
+    def load(self):
+        """Query storage components of the server"""
+
+        with self._graph_ref.get_session() as session:
+            storage = GraphReference.get_storage(session, self._server_key)
+
+        controllers = {}
+        for ctrl_storage in map(_ControllerStorage, storage):
+            controllers[ctrl_storage.controller.controllerNum] = ctrl_storage
+
+        with self._lock:
+            self._controllers = controllers
+            self._pending.clear()
+
+    def _get_controller(self, controller):
+        """Controller storage by number (None if it does not exist)"""
+        if self._controllers is None:
+            self.load()
+
+        return self._controllers.get(int(controller))
+
+    def _record_changes(self, controller, record, changed):
+        """Schedule updated properties to be written back"""
+        if not changed:
+            return
+
+        did = record.DID if isinstance(record, PhysicalDrive) else None
+        self._pending.setdefault((record.label, int(controller), did), {}).update(
+            changed
+        )
+
+    def flush(self):
+        """Write back properties that changed since the last flush
+        (changes are kept for the next flush if db is unavailable)"""
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return
+
+        updates = {}
+        for (label, controller, did), props in pending.items():
+            update = {"controller": controller, "props": props}
+            if did is not None:
+                update["DID"] = did
+            updates.setdefault(label, []).append(update)
+
+        try:
+            with self._graph_ref.get_session() as session:
+                GraphReference.update_storage(session, self._server_key, updates)
+        except Exception:
+            with self._lock:
+                # newer changes take precedence
+                for key, props in pending.items():
+                    self._pending[key] = {**props, **self._pending.get(key, {})}
+            raise
+
+        logger.debug(
+            "Storage of server[%s]: %s component update(s) written back",
+            self._server_key,
+            len(pending),
+        )
+
+    def safe_flush(self):
+        """Write back changes logging (instead of raising) db errors"""
+        try:
+            self.flush()
+        except Exception as flush_err:  # pylint: disable=broad-except
+            logger.error(
+                "Could not write back storage of server[%s]: %s",
+                self._server_key,
+                flush_err,
+            )
+
+    @property
+    def pending_changes(self):
+        """Number of components with changes that were not written back"""
+        with self._lock:
+            return len(self._pending)
+
+    def get_controller_count(self):
+        """Number of controllers of the server"""
+        with self._lock:
+            if self._controllers is None:
+                self.load()
+            return len(self._controllers)
+
+    def get_controller_details(self, controller):
+        """Controller specs (None if controller does not exist)"""
+        with self._lock:
+            ctrl_storage = self._get_controller(controller)
+            return ctrl_storage.controller.as_dict() if ctrl_storage else None
+
+    def get_virtual_drive_details(self, controller):
+        """Virtual drives (with their member physical drives as 'pd')
+        ordered by virtual drive number"""
+        with self._lock:
+            ctrl_storage = self._get_controller(controller)
+            if not ctrl_storage:
+                return []
+
+            vd_details = []
+            for v_drive in ctrl_storage.virtual_drives:
+                members = sorted(
+                    (
+                        ctrl_storage.physical_drives[did]
+                        for did in ctrl_storage.vd_members[v_drive.vdNum]
+                    ),
+                    key=lambda pd: pd.slotNum,
+                )
+
+                # virtual drives without physical drives are not reported
+                if members:
+                    vd_details.append(
+                        {**v_drive.as_dict(), "pd": [pd.as_dict() for pd in members]}
+                    )
+
+            return vd_details
+
+    def get_all_drives(self, controller):
+        """Both virtual ('vd') & physical ('pd') drives of a controller"""
+        with self._lock:
+            ctrl_storage = self._get_controller(controller)
+            if not ctrl_storage:
+                return {"vd": [], "pd": []}
+
+            return {
+                "vd": self.get_virtual_drive_details(controller),
+                "pd": [pd.as_dict() for pd in ctrl_storage.physical_drives.values()],
+            }
+
+    def get_cachevault(self, controller):
+        """Cachevault details (None if controller has no cachevault)"""
+        with self._lock:
+            ctrl_storage = self._get_controller(controller)
+            if not ctrl_storage or not ctrl_storage.cachevault:
+                return None
+            return ctrl_storage.cachevault.as_dict()
+
+    def get_all_hd_thermal_elements(self):
+        """Storage components that support temperature sensors
+        (as 'component' along with its 'controller')"""
+        with self._lock:
+            if self._controllers is None:
+                self.load()
+
+            hd_thermal_elements = []
+            for ctrl_storage in self._controllers.values():
+                components = list(ctrl_storage.physical_drives.values())
+                if ctrl_storage.cachevault:
+                    components.append(ctrl_storage.cachevault)
+
+                hd_thermal_elements.extend(
+                    {
+                        "controller": ctrl_storage.controller.as_dict(),
+                        "component": component.as_dict(),
+                    }
+                    for component in components
+                )
+
+            return hd_thermal_elements
+
+    def set_physical_drive_prop(self, controller, did, properties):
+        """Update physical drive properties (such as error counts or state)
+        Args:
+            controller(int): controller number
+            did(int): drive id
+            properties(dict): e.g. 'media_error_count', 'other_error_count'
+                                   'predictive_error_count' or 'state'
+        Returns:
+            bool: True if properties were updated,
+                  False if controller and/or did are invalid
+        """
+        s_attr = [
+            "media_error_count",
+            "other_error_count",
+            "predictive_error_count",
+            "time_stamp",
+            "rebuild_time",
+        ]
+
+        props = {to_camelcase(k): properties[k] for k in s_attr if k in properties}
+        props["State"] = properties.get("state")
+
+        # record uptime so that the rebuilding process gets simulated
+        if props["State"] == "Onln":
+            props["timeStamp"] = time.time()
+
+        with self._lock:
+            ctrl_storage = self._get_controller(controller)
+            p_drive = (
+                ctrl_storage.get_physical_drive("DID", did) if ctrl_storage else None
+            )
+            if not p_drive:
+                return False
+
+            self._record_changes(controller, p_drive, p_drive.update(props))
+            return True
+
+    def set_controller_prop(self, controller, properties):
+        """Update controller state
+        Args:
+            controller(int): controller number
+            properties(dict): settable controller props e.g. 'mem_c_errors', 'mem_uc_errors', 'alarm'
+        Returns:
+            bool: True if properties were updated, False if controller number is invalid
+        """
+        s_attr = ["mem_c_errors", "mem_uc_errors", "alarm"]
+        props = {to_camelcase(k): properties[k] for k in s_attr if k in properties}
+
+        with self._lock:
+            ctrl_storage = self._get_controller(controller)
+            if not ctrl_storage:
+                return False
+
+            record = ctrl_storage.controller
+            self._record_changes(controller, record, record.update(props))
+            return True
+
+    def set_cv_replacement(self, controller, repl_status, wt_on_fail):
+        """Update cachevault replacement status
+        Returns:
+            bool: True if properties were updated, False if controller number is invalid
+        """
+        with self._lock:
+            ctrl_storage = self._get_controller(controller)
+            if not ctrl_storage or not ctrl_storage.cachevault:
+                return False
+
+            record = ctrl_storage.cachevault
+            changed = record.update(
+                {"replacement": repl_status, "writeThrough": wt_on_fail}
+            )
+            self._record_changes(controller, record, changed)
+            return True
+
+    def add_to_hd_component_temperature(self, target, temp_change, limit):
+        """Add to temperature of a cachevault or a physical drive
+        Args:
+            target(dict): target attributes such as controller, 'attribute'
+                          ('DID' or 'serialNumber'), 'value' & 'hd_type'
+            temp_change(int): value to be added to the target temperature
+            limit(dict): target temp cannot go beyond this limit (upper & lower)
+        Returns:
+            tuple: True if the temp value was updated & current temp value (updated)
+        """
+        with self._lock:
+            ctrl_storage = self._get_controller(target["controller"])
+            if not ctrl_storage:
+                raise KeyError("Unknown controller: {}".format(target["controller"]))
+
+            value = str(target["value"]).strip('"')
+            if target["hd_type"] == CacheVault.label:
+                record = ctrl_storage.cachevault
+                if record and str(record.serialNumber) != value:
+                    record = None
+            else:
+                record = ctrl_storage.get_physical_drive(target["attribute"], value)
+
+            if not record:
+                raise KeyError("Unknown storage component: {}".format(target))
+
+            current_temp = record.temperature
+            new_temp = max(current_temp + temp_change, limit["lower"])
+
+            if "upper" in limit and limit["upper"]:
+                new_temp = min(new_temp, limit["upper"])
+
+            if new_temp == current_temp:
+                return False, current_temp
+
+            changed = record.update({"temperature": new_temp})
+            self._record_changes(target["controller"], record, changed)
+            return True, new_temp
@@ -0,0 +1,83 @@
+"""Lookup tables for the value mappings used by the simulation models
+(thermal relationship models, UPS runtime graphs etc.);
+
+Models are stored as json objects with numeric string keys, e.g. { wattage: minutes }
+and used to be searched linearly on every lookup. LookupTable compiles a model
+into sorted arrays once so that every lookup is a binary search.
+"""
+import bisect
+import os
+
+import numpy as np
+
+
+class LookupTable:
+    """Model { x: y } compiled into sorted x/y arrays;
+
+    By default the nearest known point is used & value is approximated
+    as proportional to it (y * value / x); in interpolation mode
+    y is interpolated linearly between the neighbouring points instead
+    (and clamped at the ends of the table).
+    """
+
+    # piecewise-linear interpolation can be enabled for all models
+    interpolate_default = os.environ.get("SIMENGINE_INTERPOLATE_MODELS") == "1"
+
+    def __init__(self, model, interpolate=None):
+        """
+        Args:
+            model(dict): known points as { x: y }, keys can be numeric strings
+            interpolate(bool): use piecewise-linear interpolation
+                               (defaults to interpolate_default)
+        Raises:
+            ValueError: if model is empty
+        """
+        if not model:
+            raise ValueError("Lookup table needs at least one point")
+
+        points = sorted((int(x), y) for x, y in model.items())
+
+        self._x = [x for x, _ in points]
+        self._y = [y for _, y in points]
+        self._x_arr = np.array(self._x, dtype=float)
+        self._y_arr = np.array(self._y, dtype=float)
+
+        self.interpolate = (
+            self.interpolate_default if interpolate is None else interpolate
+        )
+
+    def __len__(self):
+        return len(self._x)
+
+    def nearest(self, value):
+        """Find the closest known point (ties resolve to the lower x)
+        Returns:
+            tuple: x & y of the point
+        """
+        idx = bisect.bisect_left(self._x, value)
+
+        if idx == len(self._x) or (
+            idx > 0 and value - self._x[idx - 1] <= self._x[idx] - value
+        ):
+            idx -= 1
+
+        return self._x[idx], self._y[idx]
+
+    def interp(self, value):
+        """Linearly interpolated y for the value"""
+        return float(np.interp(value, self._x_arr, self._y_arr))
+
+    def approx(self, value, inverse=False):
+        """Approximate y for the value
+        Args:
+            value(float): x to look up
+            inverse(bool): y is inversely proportional to x
+                           (e.g. runtime of a battery for wattage)
+        """
+        if self.interpolate:
+            return self.interp(value)
+
+        nbr_x, nbr_y = self.nearest(value)
+        if inverse:
+            return (nbr_y * nbr_x) / value
+        return (nbr_y * value) / nbr_x
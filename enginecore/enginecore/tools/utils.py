@@ -23,6 +23,17 @@ def format_as_redis_key(key, oid, key_formatted=True):
     return key_and_oid
 
 
+def format_storage_version_key(server_key):
+    """Redis hash tracking storage updates of a server
+    (one counter per controller number, incremented on every change)
+    Args:
+        server_key(int): key of the server storage belongs to
+    Returns:
+        str: Redis key of the storage version hash
+    """
+    return "{}-storage-version".format(server_key)
+
+
 def convert_voltage_to_high_prec(voltage_value):
     """Convert voltage value into high precision.
     Args:
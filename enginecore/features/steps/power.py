@@ -17,6 +17,7 @@ from hamcrest import *
 
 from enginecore.state.state_initializer import configure_env
 from enginecore.state.engine.engine import Engine
+from enginecore.state.engine.iteration import ThermalIteration
 from enginecore.state.api.environment import ISystemEnvironment
 
 
@@ -49,6 +50,15 @@ class TestCompletionTracker(Component):
     def on_th_branch_done(self, event, *args, **kwargs):
         self.th_done_queue.put(event)
 
+    @handler("IterationMerged")
+    def on_iteration_merged(self, event, *args, **kwargs):
+        """Superseded iteration completes as part of the merged one"""
+        if isinstance(kwargs["power_iter"], ThermalIteration):
+            self.th_done_queue.put(event)
+        else:
+            self.volt_done_queue.put(event)
+            self.load_done_queue.put(event)
+
     # pylint: enable=unused-argument
 
     def wait_load_queue(self):
@@ -62,6 +72,7 @@ class TestCompletionTracker(Component):
 @given("Engine is up and running")
 def step_impl(context):
     os.environ["SIMENGINE_WORKPLACE_TEMP"] = context.config.userdata["tmp_simengine"]
+    os.environ["SIMENGINE_POWER_FLOW"] = context.config.userdata.get("power_flow", "0")
 
     # Start up simengine (in a thread)
     configure_env(relative=True)
@@ -1,3 +1,35 @@
+-- evaluate battery OID using the analytic battery model (see battery_model.py)
+local function battery_oid(data_type, ups_key, kind)
+    local model = redis.call('get', ups_key..":battery-model")
+    if not model then
+        return data_type.."|0"
+    end
+
+    local level, rate, t0, max_level, fp_time_left, since =
+        model:match("^([^|]+)|([^|]+)|([^|]+)|([^|]+)|([^|]+)|([^|]+)$")
+    level, rate, t0 = tonumber(level), tonumber(rate), tonumber(t0)
+    max_level, fp_time_left, since = tonumber(max_level), tonumber(fp_time_left), tonumber(since)
+
+    local now = redis.call('TIME')
+    local timestamp = tonumber(now[1]) + tonumber(now[2]) / 1000000
+
+    local value = math.min(math.max(level + rate * (timestamp - t0), 0), max_level)
+
+    if kind == "capacity" then
+        value = value / 10
+    elseif kind == "time_left" then
+        value = fp_time_left * value / max_level * 60 * 100
+    elseif kind == "time_on_battery" then
+        if since > 0 then
+            value = (timestamp - since) * 100
+        else
+            value = 0
+        end
+    end
+
+    return data_type.."|"..tostring(math.floor(value))
+end
+
 if table.getn(ARGV) > 0 then
     redis.call('PUBLISH', 'oid-upd', KEYS[1])
     return redis.call('set', KEYS[1], ARGV[1])
@@ -5,13 +37,23 @@ else
     local rkey = KEYS[1]
     local key, oid = rkey:match("(.*)%-(.*)")
     oid = oid:gsub("%s+", "")
-    
+
     if oid == "1.3.6.1.2.1.1.3.0" then
         local formatted_key, _ = key:gsub('0', '')
         local start_time = redis.call('get', (tonumber(formatted_key)..":start_time"))
         local now = redis.call('TIME')
         return "67".."|"..tostring(100*(now[1] - start_time))
     else
-        return redis.call('get', KEYS[1])
+        local value = redis.call('get', rkey)
+
+        -- value is evaluated on read (e.g. UPS battery capacity)
+        if value then
+            local data_type, ups_key, kind = value:match("^(%d+)|@battery:(.+):([%w_]+)$")
+            if data_type then
+                return battery_oid(data_type, ups_key, kind)
+            end
+        end
+
+        return value
     end
 end
@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+
+""" Load test for the storcli64 emulator server of a BMC-enabled server;
+Opens a number of concurrent connections & sends storcli64 commands
+(newline-delimited JSON requests) measuring commands per second & latency
+
+Usage:
+  ./script/storcli_load_test.py -p 50001 -c 8 -n 200 "/c0 show all"
+"""
+
+import argparse
+import json
+import socket
+import threading
+import time
+
+
+def run_client(host, port, argv, num_requests, pipeline, latencies, errors):
+    """Send requests over a single connection
+    (up to 'pipeline' requests are in flight at a time)"""
+
+    request = (json.dumps({"argv": argv}) + "\n").encode()
+    sent_at = []
+
+    with socket.create_connection((host, port)) as conn:
+        reader = conn.makefile("r")
+        num_sent = num_received = 0
+
+        while num_received < num_requests:
+            while num_sent < num_requests and num_sent - num_received < pipeline:
+                sent_at.append(time.time())
+                conn.sendall(request)
+                num_sent += 1
+
+            reply = json.loads(reader.readline())
+            latencies.append(time.time() - sent_at[num_received])
+            if reply["status"]:
+                errors.append(reply["stderr"])
+            num_received += 1
+
+
+if __name__ == "__main__":
+    # parse cli option
+    argparser = argparse.ArgumentParser(
+        description="Measure throughput of storcli64 emulator"
+    )
+
+    argparser.add_argument("-H", "--host", help="Server host", default="localhost")
+    argparser.add_argument(
+        "-p", "--port", help="StorCLI websocket port", type=int, required=True
+    )
+    argparser.add_argument(
+        "-c", "--connections", help="Concurrent connections", type=int, default=4
+    )
+    argparser.add_argument(
+        "-n", "--requests", help="Requests per connection", type=int, default=100
+    )
+    argparser.add_argument(
+        "--pipeline", help="Requests in flight per connection", type=int, default=1
+    )
+    argparser.add_argument(
+        "command", help="storcli64 command", nargs="?", default="/c0 show all"
+    )
+
+    args = vars(argparser.parse_args())
+
+    latencies, errors = [], []
+    clients = [
+        threading.Thread(
+            target=run_client,
+            args=(
+                args["host"],
+                args["port"],
+                ["storcli64"] + args["command"].split(),
+                args["requests"],
+                args["pipeline"],
+                latencies,
+                errors,
+            ),
+        )
+        for _ in range(args["connections"])
+    ]
+
+    start = time.time()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.time() - start
+
+    latencies.sort()
+    print("commands:    {}".format(len(latencies)))
+    print("errors:      {}".format(len(errors)))
+    print("elapsed:     {:.3f}s".format(elapsed))
+    print("throughput:  {:.1f} commands/s".format(len(latencies) / elapsed))
+    if latencies:
+        print(
+            "latency:     p50 {:.2f}ms, p99 {:.2f}ms, max {:.2f}ms".format(
+                latencies[len(latencies) // 2] * 1000,
+                latencies[int(len(latencies) * 0.99)] * 1000,
+                latencies[-1] * 1000,
+            )
+        )
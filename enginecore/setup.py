@@ -13,6 +13,7 @@ setup(
         "pysnmp",
         "libvirt-python",
         "websocket-client",
+        "numpy",
     ],
     author="Seneca OSTEP & Alteeve",
     author_email="olga.belavina@senecacollege.ca",
@@ -0,0 +1,37 @@
+"""Graph database reference answering queries with canned records
+(shared by the unittests)"""
+
+
+class FakeResult(list):
+    """Query result (list of records)"""
+
+    def single(self):
+        return self[0] if self else None
+
+
+class FakeGraphRef:
+    """Graph reference & its session in one object;
+    queries that succeeded are recorded along with their parameters"""
+
+    def __init__(self, respond):
+        """
+        Args:
+            respond(callable): called with query & its parameters,
+                               returns records (may raise to simulate db errors)
+        """
+        self._respond = respond
+        self.queries = []
+
+    def get_session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+    def run(self, query, **params):
+        records = self._respond(query, params)
+        self.queries.append((query, params))
+        return FakeResult(records)
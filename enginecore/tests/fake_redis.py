@@ -0,0 +1,61 @@
+"""In-memory stand-in for redis client shared by the unittests"""
+
+
+class DictStore:
+    """Minimal in-memory redis client (keeps values as they were set
+    & counts round-trips)"""
+
+    def __init__(self):
+        self.data = {}
+        # (channel, message) pairs
+        self.published = []
+        self.round_trips = 0
+
+    def set(self, name, value):
+        self.round_trips += 1
+        self.data[name] = value
+
+    def get(self, name):
+        self.round_trips += 1
+        return self.data.get(name)
+
+    def mset(self, mapping):
+        self.round_trips += 1
+        self.data.update(mapping)
+
+    def mget(self, keys):
+        self.round_trips += 1
+        return [self.data.get(k) for k in keys]
+
+    def publish(self, channel, message):
+        self.round_trips += 1
+        self.published.append((channel, message))
+
+    def exists(self, name):
+        self.round_trips += 1
+        return name in self.data
+
+    def delete(self, *names):
+        self.round_trips += 1
+        for name in names:
+            self.data.pop(name, None)
+
+    def pipeline(self, transaction=True):
+        return DictPipeline(self)
+
+
+class DictPipeline:
+    """Pipeline executing queued commands in one round-trip"""
+
+    def __init__(self, store):
+        self._store = store
+        self._commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self._commands.append((name, args))
+
+    def execute(self):
+        round_trips = self._store.round_trips
+        for name, args in self._commands:
+            getattr(self._store, name)(*args)
+        self._store.round_trips = round_trips + 1
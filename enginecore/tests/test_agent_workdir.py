@@ -0,0 +1,93 @@
+"""Unittests for agent work directories & processes kept between warm restarts"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from enginecore.state.agent import IPMIAgent, SNMPAgent, StorCLIEmulator
+
+
+class AgentWorkDirTests(unittest.TestCase):
+    """Work directories are re-initialized on warm reload
+    (temp workplace is not cleared in warm-start mode)"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server_dir = os.path.join(self.tmp_dir, "1")
+
+        self.templ_dir = os.path.join(self.tmp_dir, "templates")
+        os.makedirs(self.templ_dir)
+        with open(os.path.join(self.templ_dir, "controller_info"), "w") as templ_h:
+            templ_h.write("Controller = $controller_num")
+
+        env = {
+            "SIMENGINE_STORCLI_TEMPL": self.templ_dir,
+            "SIMENGINE_IPMI_TEMPL": self.templ_dir,
+        }
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_storcli_warm_reload(self):
+        """Storcli directory left by the previous run is re-used"""
+        storcli_emu = StorCLIEmulator.__new__(StorCLIEmulator)
+        storcli_emu._storcli_dir = os.path.join(self.server_dir, "storcli")
+
+        storcli_emu._init_storcli_dir()
+        stale_path = os.path.join(storcli_emu._storcli_dir, "rendered_output")
+        with open(stale_path, "w") as stale_h:
+            stale_h.write("stale")
+
+        # engine restarted in warm mode
+        storcli_emu._init_storcli_dir()
+
+        self.assertFalse(os.path.exists(stale_path))
+        self.assertIn("controller_info", storcli_emu._load_templates())
+
+    def test_ipmi_warm_reload(self):
+        """Emulator state left by the previous run is removed"""
+        ipmi_agent = IPMIAgent.__new__(IPMIAgent)
+        ipmi_agent._ipmi_dir = self.server_dir
+
+        ipmi_agent._init_ipmi_dir()
+        os.makedirs(os.path.dirname(ipmi_agent.sdr_main_path))
+        with open(ipmi_agent.sdr_main_path, "w") as sdr_h:
+            sdr_h.write("stale")
+
+        ipmi_agent._init_ipmi_dir()
+
+        self.assertFalse(os.path.exists(ipmi_agent.emu_state_dir_path))
+        self.assertTrue(
+            os.path.exists(os.path.join(self.server_dir, "controller_info"))
+        )
+
+
+class AgentExitTests(unittest.TestCase):
+    """Agents that cannot be adopted by the next run are stopped at exit"""
+
+    def _registered_at_exit(self, agent_cls, warm_start):
+        agent = agent_cls.__new__(agent_cls)
+        env = {"SIMENGINE_WARM_START": "1" if warm_start else "0"}
+
+        with mock.patch.dict(os.environ, env), mock.patch("atexit.register") as reg:
+            agent.register_process(mock.Mock(pid=1))
+
+        return reg.called
+
+    def test_warm_start(self):
+        """Only snmpsimd outlives the engine in warm-start mode"""
+        self.assertTrue(self._registered_at_exit(IPMIAgent, warm_start=True))
+        self.assertFalse(self._registered_at_exit(SNMPAgent, warm_start=True))
+
+    def test_cold_start(self):
+        """All agents are stopped at exit"""
+        self.assertTrue(self._registered_at_exit(IPMIAgent, warm_start=False))
+        self.assertTrue(self._registered_at_exit(SNMPAgent, warm_start=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
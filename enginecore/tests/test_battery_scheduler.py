@@ -0,0 +1,271 @@
+"""Unittests for the scheduler charging & draining UPS batteries"""
+import json
+import unittest
+from unittest import mock
+
+from enginecore.state.battery_model import BatteryModel
+from enginecore.state.hardware.battery_scheduler import BatteryScheduler
+
+from fake_redis import DictStore
+
+
+class FakeUPSState:
+    """UPS state manager keeping its state in the dict store"""
+
+    battery_max_level = 1000
+    min_restore_charge_level = 300
+    momentary_event_period = 2
+
+    def __init__(self, key, store):
+        self.key = key
+        self._store = store
+        store.data.update({key: b"1|1", "{}:battery".format(key): 500})
+
+    @property
+    def battery_level(self):
+        return self._store.data["{}:battery".format(self.key)]
+
+    def battery_snapshot_keys(self):
+        return [self.key]
+
+    def parse_battery_snapshot(self, values):
+        status, on_battery = values[0].decode().split("|")
+        return {"status": int(status), "on_battery": on_battery == "1"}
+
+    def battery_oid_values(self, level, old_level, time_left, time_on_battery):
+        return {
+            "{}:battery".format(self.key): int(level),
+            "{}:time-left".format(self.key): int(time_left),
+            "{}:time-on-battery".format(self.key): time_on_battery,
+        }
+
+    def battery_model_values(self, model, old_level):
+        return {
+            "{}:battery".format(self.key): int(model.level),
+            "{}:battery-model".format(self.key): model.encode(),
+        }
+
+
+class FakeUPS:
+    """UPS draining 10 levels & charging 100 levels per second"""
+
+    def __init__(self, key, store):
+        self.key = key
+        self.state = FakeUPSState(key, store)
+        self.drain_speed_factor = 1
+
+    def battery_rates(self, _):
+        return 100, 10 * self.drain_speed_factor, 100
+
+
+class ManualBatteryScheduler(BatteryScheduler):
+    """Scheduler without a thread (ticks are triggered manually)"""
+
+    def _start(self):
+        pass
+
+
+class BatterySchedulerTests(unittest.TestCase):
+    """Tests battery updates of multiple UPSes"""
+
+    def setUp(self):
+        self.store = DictStore()
+        self.scheduler = ManualBatteryScheduler(self.store)
+        self.ups = [FakeUPS(key, self.store) for key in (1, 2, 3)]
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_single_round_trip(self):
+        """All the batteries are updated with one read & one write"""
+        self.ups[2].drain_speed_factor = 5
+        self.scheduler.drain(self.ups[0])
+        self.scheduler.drain(self.ups[2])
+
+        self.scheduler.tick()
+        self.assertEqual(2, self.store.round_trips)
+        self.assertEqual(490, self.store.data["1:battery"])
+        self.assertEqual(500, self.store.data["2:battery"])
+        self.assertEqual(450, self.store.data["3:battery"])
+        self.assertEqual(294000, self.store.data["1:time-left"])
+
+        self.assertEqual(2, len(self.store.published))
+        self.assertEqual(
+            {"key": 1, "old_battery": 500, "new_battery": 490},
+            json.loads(self.store.published[0][1]),
+        )
+
+    def test_publish_on_change(self):
+        """Battery updates are published only when battery level changes"""
+        self.ups[0].drain_speed_factor = 0.25
+        self.scheduler.drain(self.ups[0])
+
+        for _ in range(4):
+            self.scheduler.tick()
+
+        self.assertEqual(490, self.store.data["1:battery"])
+        self.assertEqual(
+            [(500, 497), (497, 495), (495, 492), (492, 490)],
+            [
+                (m["old_battery"], m["new_battery"])
+                for m in (json.loads(message) for _, message in self.store.published)
+            ],
+        )
+
+    def test_charge_replaces_drain(self):
+        """Battery charge stops battery drain & powers UPS up on min level"""
+        powered = []
+        self.store.data[1] = b"0|0"
+        self.store.data["1:battery"] = 150
+
+        self.scheduler.drain(self.ups[0])
+        self.scheduler.charge(self.ups[0], on_min_charge=lambda: powered.append(1))
+        self.assertTrue(self.scheduler.is_charging(self.ups[0]))
+        self.assertFalse(self.scheduler.is_draining(self.ups[0]))
+
+        self.scheduler.tick()
+        self.assertEqual([], powered)
+        self.scheduler.tick()
+        self.assertEqual([1], powered)
+        self.assertEqual(350, self.store.data["1:battery"])
+        self.assertIsNone(self.store.data["1:time-on-battery"])
+
+    def test_depleted(self):
+        """Drain stops once battery is empty"""
+        depleted, outage = [], []
+        self.store.data["1:battery"] = 15
+
+        self.scheduler.drain(
+            self.ups[0],
+            on_outage=lambda: outage.append(1),
+            on_depleted=lambda: depleted.append(1),
+        )
+
+        for _ in range(3):
+            self.scheduler.tick()
+
+        self.assertEqual(0, self.store.data["1:battery"])
+        self.assertEqual([1], depleted)
+        self.assertEqual([], outage)
+        self.assertFalse(self.scheduler.is_draining(self.ups[0]))
+
+
+class AnalyticBatteryTests(unittest.TestCase):
+    """Tests event-based updates of the analytic battery model"""
+
+    def setUp(self):
+        self.store = DictStore()
+        self.scheduler = ManualBatteryScheduler(self.store, analytic=True)
+        self.ups = FakeUPS(1, self.store)
+
+        patcher = mock.patch("time.time", return_value=1000.0)
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _model(self):
+        return BatteryModel.decode(self.store.data["1:battery-model"])
+
+    def test_drain_events(self):
+        """Battery is only updated on discrete events"""
+        events = []
+        self.scheduler.drain(
+            self.ups,
+            on_outage=lambda: events.append("outage"),
+            on_depleted=lambda: events.append("depleted"),
+        )
+
+        self.scheduler.tick()
+        self.assertEqual(-10, self._model().rate)
+        self.assertEqual(470, self._model().level_at(1003))
+        self.assertEqual(2, self.store.round_trips)
+
+        # nothing is due until the outage
+        self.time.return_value = 1001.0
+        self.scheduler.tick()
+        self.assertEqual(2, self.store.round_trips)
+
+        self.time.return_value = 1002.0
+        self.scheduler.tick()
+        self.assertEqual(["outage"], events)
+        self.assertEqual(480, self.store.data["1:battery"])
+
+        # battery is low, then empty
+        self.time.return_value = 1050.0
+        self.scheduler.tick()
+        self.scheduler.tick()
+        self.assertEqual(["outage", "depleted"], events)
+        self.assertEqual(0, self._model().level_at(2000))
+        self.assertFalse(self.scheduler.is_draining(self.ups))
+
+    def test_refresh(self):
+        """Model is re-anchored when speed factor changes"""
+        self.scheduler.drain(self.ups)
+        self.scheduler.tick()
+
+        self.time.return_value = 1010.0
+        self.ups.drain_speed_factor = 2
+        self.scheduler.refresh(self.ups)
+        self.scheduler.tick()
+
+        self.assertEqual(400, self._model().level)
+        self.assertEqual(-20, self._model().rate)
+        self.assertEqual(
+            [{"key": 1, "old_battery": 500, "new_battery": 400}],
+            [json.loads(message) for _, message in self.store.published],
+        )
+
+    def test_remove(self):
+        """Battery stops changing once UPS is removed from the scheduler"""
+        self.scheduler.drain(self.ups)
+        self.scheduler.tick()
+        self.assertTrue(self.scheduler.is_analytic(self.ups))
+
+        self.time.return_value = 1010.0
+        self.scheduler.remove(self.ups)
+
+        self.assertFalse(self.scheduler.is_analytic(self.ups))
+        self.assertEqual(0, self._model().rate)
+        self.assertEqual(400, self._model().level_at(2000))
+
+    def test_stop(self):
+        """Battery stops changing once the scheduler is stopped"""
+        self.store.data[1] = b"1|0"
+        self.scheduler.charge(self.ups)
+        self.scheduler.tick()
+        self.assertEqual(100, self._model().rate)
+
+        self.time.return_value = 1002.0
+        self.scheduler.stop()
+
+        self.assertEqual(0, self._model().rate)
+        self.assertEqual(700, self._model().level_at(2000))
+
+
+class BatteryModelTests(unittest.TestCase):
+    """Tests evaluation of the analytic battery model"""
+
+    def test_level(self):
+        """Level changes linearly within the bounds"""
+        model = BatteryModel(500, -10, 100, 1000, 20, on_battery_since=90)
+        self.assertEqual(400, model.level_at(110))
+        self.assertEqual(0, model.level_at(1000))
+        self.assertEqual(1000, model.level_at(0))
+        self.assertEqual(2000, model.time_on_battery_at(110))
+        self.assertEqual(20 * 0.4 * 6000, model.time_left_at(110))
+
+    def test_time_to_level(self):
+        """Time level is reached (None if it won't be reached)"""
+        model = BatteryModel(500, 25, 100, 1000, 20)
+        self.assertEqual(120, model.time_to_level(1000))
+        self.assertIsNone(model.time_to_level(100))
+        self.assertIsNone(BatteryModel(500, 0, 100, 1000, 20).time_to_level(1000))
+
+    def test_encode(self):
+        """Model can be stored in redis"""
+        model = BatteryModel(499.5, -0.25, 1571000000.125, 1000, 35.5, 1570999990)
+        decoded = BatteryModel.decode(model.encode().encode())
+        self.assertEqual(vars(model), vars(decoded))
+
+
+if __name__ == "__main__":
+    unittest.main()
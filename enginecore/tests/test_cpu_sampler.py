@@ -0,0 +1,81 @@
+"""Unittests for the bulk cpu load sampler"""
+import unittest
+from collections import namedtuple
+
+try:
+    import libvirt
+    from enginecore.state.hardware.cpu_sampler import CPULoadSampler
+except ImportError:
+    libvirt = None
+
+
+FakeServerState = namedtuple("FakeServerState", ["key", "redis_key", "domain_name"])
+
+
+class FakeRedisStore:
+    """Records bulk writes"""
+
+    def __init__(self):
+        self.writes = []
+
+    def mset(self, mapping):
+        self.writes.append(mapping)
+
+
+@unittest.skipIf(libvirt is None, "libvirt python bindings are not installed")
+class CPULoadSamplerTests(unittest.TestCase):
+    """Tests sampling using libvirt test driver
+    (test:///default has a single running domain named 'test')"""
+
+    uri = "test:///default"
+
+    def setUp(self):
+        self.conn = libvirt.open(self.uri)
+        self.domain = self.conn.lookupByName("test")
+        if not self.domain.isActive():
+            self.domain.create()
+
+        self.redis_store = FakeRedisStore()
+        self.sampler = CPULoadSampler(
+            get_connection=lambda: self.conn,
+            redis_store=self.redis_store,
+            sample_interval=60,
+        )
+        self.sampler.add_server(FakeServerState(1, "1-serverwithbmc", "test"))
+        self.sampler.add_server(FakeServerState(2, "2-serverwithbmc", "missing"))
+
+    def tearDown(self):
+        self.sampler.stop()
+        if not self.domain.isActive():
+            self.domain.create()
+        self.conn.close()
+
+    def test_sample(self):
+        """Loads of all the servers are written at once"""
+        self.assertEqual({1: 0, 2: 0}, self.sampler.sample())
+        loads = self.sampler.sample()
+
+        self.assertTrue(0 <= loads[1] <= 100)
+        self.assertEqual(0, loads[2])
+        self.assertEqual(loads[1], self.sampler.cpu_load(1))
+
+        self.assertEqual(2, len(self.redis_store.writes))
+        self.assertEqual(
+            {"1-serverwithbmc:cpu_load", "2-serverwithbmc:cpu_load"},
+            set(self.redis_store.writes[-1]),
+        )
+
+    def test_inactive(self):
+        """Servers with inactive VMs or removed servers are not loaded"""
+        self.sampler.sample()
+        self.domain.destroy()
+
+        self.assertEqual({1: 0, 2: 0}, self.sampler.sample())
+
+        self.sampler.remove_server(2)
+        self.assertEqual({1: 0}, self.sampler.sample())
+        self.assertEqual(0, self.sampler.cpu_load(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
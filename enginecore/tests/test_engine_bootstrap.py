@@ -0,0 +1,96 @@
+"""Unittests for staged (multi-threaded) initialization of hardware assets"""
+import threading
+import unittest
+from unittest import mock
+
+try:
+    from enginecore.state.engine.engine import Engine
+except ImportError:
+    Engine = None
+
+
+class StubAsset:
+    """Hardware asset recording where & when it was created/registered"""
+
+    bootstrap_stage = 0
+    # events in order: (event name, asset key, thread id)
+    history = []
+    history_lock = threading.Lock()
+
+    def __init__(self, asset_info):
+        self.key = asset_info["key"]
+        self._record("created")
+
+    def _record(self, event_name):
+        with StubAsset.history_lock:
+            StubAsset.history.append((event_name, self.key, threading.get_ident()))
+
+    def register(self, _):
+        self._record("registered")
+        return self
+
+
+class StubServer(StubAsset):
+    """Asset depending on the ones created at stage 0"""
+
+    bootstrap_stage = 1
+
+
+@unittest.skipIf(Engine is None, "engine dependencies are not installed")
+class BootstrapAssetsTests(unittest.TestCase):
+    """Tests initialization order & registration of the assets"""
+
+    def setUp(self):
+        StubAsset.history = []
+
+        # no redis/neo4j connections
+        self.engine = Engine.__new__(Engine)
+        self.engine._assets = {}
+        self.engine._bootstrap_workers = 4
+
+        patcher = mock.patch(
+            "enginecore.state.engine.engine.Asset.get_supported_assets",
+            return_value={"outlet": StubAsset, "server": StubServer},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        assets = [{"key": 3, "type": "server"}, {"key": 4, "type": "server"}]
+        assets += [{"key": k, "type": "outlet"} for k in range(1, 3)]
+
+        with self.assertLogs("enginecore.state.engine.engine") as self.logs:
+            self.engine._bootstrap_assets(assets)
+
+    def test_stages(self):
+        """Servers are created once all the stage 0 assets are registered"""
+        # outlets are assets 1 & 2, servers 3 & 4
+        is_server = [key > 2 for _, key, _ in StubAsset.history]
+
+        self.assertEqual([False] * 4 + [True] * 4, is_server)
+        self.assertEqual([1, 2, 3, 4], sorted(self.engine._assets))
+
+    def test_registered_in_calling_thread(self):
+        """Only asset creation is handed over to the worker threads"""
+        registered_by = {
+            thread_id
+            for name, _, thread_id in StubAsset.history
+            if name == "registered"
+        }
+        created_by = {
+            thread_id for name, _, thread_id in StubAsset.history if name == "created"
+        }
+
+        self.assertEqual({threading.get_ident()}, registered_by)
+        self.assertNotIn(threading.get_ident(), created_by)
+
+    def test_timing_report(self):
+        """Initialization time is reported per asset type"""
+        (report,) = self.logs.output
+
+        self.assertIn("Initialized 4 assets", report)
+        self.assertIn("outlet       x2", report)
+        self.assertIn("server       x2", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""Unittests for the JSON frame server used by storcli64 emulator"""
+import json
+import socket
+import threading
+import unittest
+
+from enginecore.state.net.framed_server import FrameDecoder, FramedJSONServer
+
+
+class FrameDecoderTests(unittest.TestCase):
+    """Tests splitting of the byte stream into requests"""
+
+    def setUp(self):
+        self.decoder = FrameDecoder()
+
+    def frames(self):
+        """All complete frames"""
+        frames = []
+        request = self.decoder.next_frame()
+        while request is not None:
+            frames.append(request)
+            request = self.decoder.next_frame()
+        return frames
+
+    def test_newline_delimited(self):
+        """Multiple frames can be received in one read"""
+        self.decoder.feed(b'{"argv": [1]}\n{"argv": [2]}\n{"argv"')
+        self.assertEqual(self.frames(), [{"argv": [1]}, {"argv": [2]}])
+
+        self.decoder.feed(b": [3]}\n")
+        self.assertEqual(self.frames(), [{"argv": [3]}])
+
+    def test_large_frame(self):
+        """Frames larger than a single read are re-assembled"""
+        request = {"argv": ["storcli64"] + ["x" * 100] * 100}
+        data = (json.dumps(request) + "\n").encode()
+
+        for i in range(0, len(data), 1024):
+            self.assertEqual(self.frames(), [])
+            self.decoder.feed(data[i : i + 1024])
+
+        self.assertEqual(self.frames(), [request])
+
+    def test_unterminated(self):
+        """JSON objects without trailing newline are accepted"""
+        self.decoder.feed(b'{"argv": ["a"]}{"argv": ["\xc3')
+        self.assertEqual(self.frames(), [{"argv": ["a"]}])
+
+        self.decoder.feed(b'\xa9"]}')
+        self.assertEqual(self.frames(), [{"argv": ["é"]}])
+
+    def test_invalid_frame(self):
+        """Invalid frame is discarded & reported"""
+        self.decoder.feed(b'not json\n{"argv": []}\n')
+
+        with self.assertRaises(ValueError):
+            self.decoder.next_frame()
+
+        self.assertEqual(self.frames(), [{"argv": []}])
+
+
+class FramedJSONServerTests(unittest.TestCase):
+    """Tests serving multiple clients at once"""
+
+    def setUp(self):
+        self.release = threading.Event()
+
+        def handle_request(request):
+            if request["argv"] == ["block"]:
+                self.release.wait(5)
+            if request["argv"] == ["fail"]:
+                raise RuntimeError("failed")
+            return {"stdout": " ".join(request["argv"]), "status": 0}
+
+        def handle_error(error):
+            return {"stdout": "", "stderr": str(error), "status": 1}
+
+        self.server = FramedJSONServer(
+            0, handle_request, handle_error, host="127.0.0.1", num_workers=2
+        )
+        self.assertTrue(self.server.start())
+
+    def tearDown(self):
+        self.release.set()
+        self.server.stop()
+
+    def connect(self):
+        """Open client connection"""
+        client = socket.create_connection(self.server.address, timeout=5)
+        self.addCleanup(client.close)
+        return client, client.makefile("r")
+
+    def test_concurrent_clients(self):
+        """Slow command does not block other connections"""
+        slow_client, slow_reader = self.connect()
+        slow_client.sendall(b'{"argv": ["block"]}\n')
+
+        client, reader = self.connect()
+        client.sendall(b'{"argv": ["show", "ctrlcount"]}\n')
+        self.assertEqual(json.loads(reader.readline())["stdout"], "show ctrlcount")
+
+        self.release.set()
+        self.assertEqual(json.loads(slow_reader.readline())["stdout"], "block")
+
+    def test_replies_in_order(self):
+        """Replies follow the order of requests sent over a connection"""
+        client, reader = self.connect()
+        client.sendall(
+            b'{"argv": ["block"]}\n{"argv": ["fail"]}\nbad\n{"argv": ["last"]}\n'
+        )
+        self.release.set()
+
+        replies = [json.loads(reader.readline()) for _ in range(4)]
+        self.assertEqual(replies[0]["stdout"], "block")
+        self.assertEqual(replies[1]["stderr"], "failed")
+        self.assertEqual(replies[2]["status"], 1)
+        self.assertEqual(replies[3]["stdout"], "last")
+
+
+if __name__ == "__main__":
+    unittest.main()
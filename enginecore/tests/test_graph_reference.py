@@ -0,0 +1,60 @@
+"""Unittests for neo4j drivers shared by graph references"""
+import unittest
+from unittest import mock
+
+from enginecore.model.graph_reference import DriverRegistry, GraphReference
+
+
+class DriverRegistryTests(unittest.TestCase):
+    """Tests sharing & usage counters of the drivers"""
+
+    def setUp(self):
+        patcher = mock.patch(
+            "enginecore.model.graph_reference.GraphDatabase.driver",
+            side_effect=lambda *_, **__: mock.MagicMock(),
+        )
+        self.driver_factory = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(DriverRegistry.close_all)
+
+        DriverRegistry.close_all()
+
+    def test_shared_per_config(self):
+        """One driver is created for every db config"""
+        driver = DriverRegistry.get_driver("bolt://localhost", "simengine")
+
+        self.assertIs(driver, DriverRegistry.get_driver("bolt://localhost", "simengine"))
+        self.assertIsNot(driver, DriverRegistry.get_driver("bolt://localhost", "neo4j"))
+        self.assertEqual(2, self.driver_factory.call_count)
+
+    def test_graph_refs_share_driver(self):
+        """Graph references open sessions on the same driver"""
+        with GraphReference().get_session(), GraphReference().get_session():
+            pass
+
+        self.assertEqual(1, self.driver_factory.call_count)
+
+    def test_close_all(self):
+        """Drivers are closed & re-created on the next request"""
+        driver = DriverRegistry.get_driver()
+        DriverRegistry.close_all()
+
+        driver.close.assert_called_once_with()
+        self.assertIsNot(driver, DriverRegistry.get_driver())
+
+    def test_stats(self):
+        """Counters keep track of the sessions & queries"""
+        before = DriverRegistry.stats()
+
+        with GraphReference().get_session() as session:
+            session.run("MATCH (asset:Asset) RETURN asset")
+            GraphReference.get_parent_assets(session, 1)
+
+        after = DriverRegistry.stats()
+        self.assertEqual(1, after["drivers_created"] - before["drivers_created"])
+        self.assertEqual(1, after["sessions_opened"] - before["sessions_opened"])
+        self.assertEqual(2, after["queries_run"] - before["queries_run"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Unittests for the compiled model lookup tables"""
+import random
+import unittest
+
+from enginecore.tools.interpolation import LookupTable
+
+
+def linear_search(model, value, inverse=False):
+    """Nearest point lookup the way models used to be searched"""
+    nbr_key = min(model, key=lambda x: abs(int(x) - value))
+    if inverse:
+        return (model[nbr_key] * int(nbr_key)) / value
+    return (model[nbr_key] * value) / int(nbr_key)
+
+
+class LookupTableTests(unittest.TestCase):
+    """Tests nearest point & interpolated lookups"""
+
+    runtime = {"100": 60, "200": 30, "400": 12, "800": 4}
+
+    def test_matches_linear_search(self):
+        """Nearest point lookups match the linear search (ties included)"""
+        rnd = random.Random(42)
+        table = LookupTable(self.runtime, interpolate=False)
+
+        values = [rnd.uniform(0.1, 1000) for _ in range(500)] + [150, 300, 600, 50]
+        for value in values:
+            for inverse in (True, False):
+                self.assertAlmostEqual(
+                    table.approx(value, inverse),
+                    linear_search(self.runtime, value, inverse),
+                )
+
+    def test_unsorted_model(self):
+        """Keys are sorted numerically, not as strings"""
+        table = LookupTable({"90": 9, "100": 10, "5": 1}, interpolate=False)
+        self.assertEqual(table.nearest(96), (100, 10))
+        self.assertEqual(table.nearest(0), (5, 1))
+        self.assertEqual(table.nearest(10 ** 6), (100, 10))
+
+    def test_interpolation(self):
+        """Values between points are interpolated, clamped at the ends"""
+        table = LookupTable(self.runtime, interpolate=True)
+        self.assertEqual(table.approx(150, inverse=True), 45)
+        self.assertEqual(table.approx(300), 21)
+        self.assertEqual(table.approx(10), 60)
+        self.assertEqual(table.approx(1000), 4)
+
+    def test_empty_model(self):
+        """Table needs at least one point"""
+        with self.assertRaises(ValueError):
+            LookupTable({})
+
+
+if __name__ == "__main__":
+    unittest.main()
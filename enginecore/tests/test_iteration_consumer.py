@@ -0,0 +1,200 @@
+"""Unittests for coalescing & concurrent launching of queued engine iterations"""
+import queue
+import unittest
+from types import SimpleNamespace
+
+from enginecore.state.engine import events
+from enginecore.state.engine.data_source import (
+    HardwareTopologyDataSource,
+    PowerTopology,
+)
+from enginecore.state.engine.iteration import PowerIteration, ThermalIteration
+from enginecore.state.engine.iteration_consumer import (
+    CoalescingQueue,
+    EngineIterationConsumer,
+)
+
+
+def wallpower_iter(old_volt, new_volt):
+    """Power iteration caused by wallpower voltage change"""
+    return PowerIteration(
+        events.AssetPowerEvent(asset=None, old_out_volt=old_volt, new_out_volt=new_volt)
+    )
+
+
+def button_iter(asset_key):
+    """Power iteration caused by asset being powered down by a user"""
+    return PowerIteration(
+        events.PowerButtonOffEvent(
+            old_state=1, new_state=0, asset=SimpleNamespace(key=asset_key)
+        )
+    )
+
+
+def ambient_iter(old_temp, new_temp):
+    """Thermal iteration caused by ambient change"""
+    return ThermalIteration(events.AmbientEvent(old_temp=old_temp, new_temp=new_temp))
+
+
+class CoalescingQueueTests(unittest.TestCase):
+    """Tests merging of pending iterations"""
+
+    def setUp(self):
+        self.queue = CoalescingQueue()
+
+    def test_voltage_fluctuations(self):
+        """Consecutive voltage changes collapse into old->newest transition"""
+        for old_volt, new_volt in [(120, 118), (118, 121), (121, 119)]:
+            self.queue.put(wallpower_iter(old_volt, new_volt))
+
+        self.assertEqual(1, self.queue.qsize())
+        self.assertEqual(2, self.queue.num_merged)
+        self.assertEqual(1, self.queue.unfinished_tasks)
+
+        src_event = self.queue.get()._src_event
+        self.assertEqual((120, 119), src_event.out_volt())
+
+    def test_mains_outage_not_merged(self):
+        """Blackout & power restoration must be processed separately"""
+        for old_volt, new_volt in [(120, 118), (118, 0), (0, 120), (120, 119)]:
+            self.queue.put(wallpower_iter(old_volt, new_volt))
+
+        self.assertEqual(4, self.queue.qsize())
+        self.assertEqual(0, self.queue.num_merged)
+
+    def test_ambient_changes(self):
+        """Repeated ambient changes are merged"""
+        for old_temp, new_temp in [(21, 22), (22, 23), (23, 22)]:
+            self.queue.put(ambient_iter(old_temp, new_temp))
+
+        self.assertEqual(1, self.queue.qsize())
+        src_event = self.queue.get()._src_event
+        self.assertEqual((21, 22), src_event.temperature())
+
+    def test_merges_reported(self):
+        """Every queued iteration either completes or is reported as merged"""
+        merges = []
+        merging_queue = CoalescingQueue(on_merged=lambda *m: merges.append(m))
+
+        queued = [wallpower_iter(120, 118), wallpower_iter(118, 121)]
+        queued.append(wallpower_iter(121, 119))
+        for iteration in queued:
+            merging_queue.put(iteration)
+
+        merged_iter = merging_queue.get()
+
+        # the newest iteration completes as the merged one
+        self.assertEqual(queued[:2], [superseded for superseded, _ in merges])
+        self.assertIs(merged_iter, merges[-1][1])
+        self.assertEqual((120, 119), merged_iter.src_event.out_volt())
+
+    def test_changes_cancel_out(self):
+        """Iterations are dropped if merged change is a no-op"""
+        merges = []
+        merging_queue = CoalescingQueue(on_merged=lambda *m: merges.append(m))
+
+        queued = [button_iter(1), wallpower_iter(120, 118), wallpower_iter(118, 120)]
+        queued += [ambient_iter(21, 22), ambient_iter(22, 21)]
+        for iteration in queued:
+            merging_queue.put(iteration)
+
+        self.assertEqual(1, merging_queue.qsize())
+        self.assertEqual(1, merging_queue.unfinished_tasks)
+        self.assertIs(queued[0], merging_queue.get())
+
+        # nothing completes on behalf of the dropped iterations
+        self.assertEqual([(i, None) for i in queued[1:]], merges)
+
+    def test_stop_sentinel(self):
+        """Nothing gets merged into queue's stop signal"""
+        self.queue.put(wallpower_iter(120, 118))
+        self.queue.put(None)
+        self.queue.put(wallpower_iter(118, 119))
+
+        self.assertEqual(3, self.queue.qsize())
+
+
+class ConcurrentIterationsTests(unittest.TestCase):
+    """Tests launching of independent power iterations"""
+
+    def setUp(self):
+        # outlet(1) -> pdu(2) -> outlets(21, 22) -> psus(31, 32) -> server(3)
+        # outlet(4) -> psu(41)
+        HardwareTopologyDataSource.topology = PowerTopology(
+            assets=[{"key": k} for k in [1, 2, 21, 22, 3, 31, 32, 4, 41]],
+            power_connections=[
+                (2, 1),
+                (21, 2),
+                (22, 2),
+                (31, 21),
+                (32, 22),
+                (3, 31),
+                (3, 32),
+                (41, 4),
+            ],
+            mains_outlets=[1, 4],
+            oid_connections=[],
+        )
+        PowerIteration.data_source = HardwareTopologyDataSource
+
+        self.launched = queue.Queue()
+        self.consumer = EngineIterationConsumer("test_worker", concurrent=True)
+        self.consumer.start(lambda i, *_: self.launched.put(i))
+
+    def tearDown(self):
+        HardwareTopologyDataSource.topology = None
+        PowerIteration.data_source = None
+
+    def test_footprint(self):
+        """Footprint includes descendants & their ancestors"""
+        self.assertEqual({31, 3, 32, 21, 22, 2, 1}, button_iter(31).footprint)
+        self.assertEqual({41, 4}, button_iter(41).footprint)
+        self.assertIsNone(wallpower_iter(120, 118).footprint)
+
+    def test_independent_iterations(self):
+        """Iterations touching disjoint assets are launched right away"""
+        first_iter, second_iter = button_iter(3), button_iter(41)
+        self.consumer.queue_iteration(first_iter)
+        self.consumer.queue_iteration(second_iter)
+
+        self.assertIs(first_iter, self.launched.get(timeout=1))
+        self.assertIs(second_iter, self.launched.get(timeout=1))
+        self.assertEqual(2, len(self.consumer.running_iterations))
+
+    def test_dependent_iterations(self):
+        """Wallpower iteration waits for iterations in progress"""
+        self.consumer.queue_iteration(button_iter(41))
+        self.consumer.queue_iteration(wallpower_iter(120, 0))
+
+        self.launched.get(timeout=1)
+        self.assertRaises(queue.Empty, self.launched.get, timeout=0.2)
+        self.assertEqual(1, len(self.consumer.running_iterations))
+
+    def test_conflicting_iteration_pending(self):
+        """Conflicting iteration stays queued without blocking independent ones"""
+        self.consumer.queue_iteration(button_iter(3))
+        self.launched.get(timeout=1)
+
+        self.consumer.queue_iteration(button_iter(31))
+        independent_iter = button_iter(41)
+        self.consumer.queue_iteration(independent_iter)
+
+        self.assertIs(independent_iter, self.launched.get(timeout=1))
+        self.assertEqual(1, self.consumer.num_pending_iterations)
+
+    def test_pending_order(self):
+        """Iterations don't overtake pending ones affecting the same assets"""
+        self.consumer.queue_iteration(button_iter(41))
+        self.launched.get(timeout=1)
+
+        # waits for the running iteration
+        self.consumer.queue_iteration(wallpower_iter(120, 0))
+        # independent of the running iteration but not of the pending one
+        self.consumer.queue_iteration(button_iter(3))
+
+        self.assertRaises(queue.Empty, self.launched.get, timeout=0.2)
+        self.assertEqual(2, self.consumer.num_pending_iterations)
+
+
+if __name__ == "__main__":
+    unittest.main()
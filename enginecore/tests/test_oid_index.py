@@ -0,0 +1,97 @@
+"""Unittests for the per state manager index of SNMP OIDs"""
+import unittest
+from unittest import mock
+
+from enginecore.model.graph_reference import GraphReference
+from enginecore.tools.utils import format_as_redis_key
+
+try:
+    from enginecore.state.api.state import IStateManager
+    from enginecore.state.api.snmp_state import ISnmpDeviceStateManager
+except ImportError:
+    ISnmpDeviceStateManager = None
+
+
+class FakeStore:
+    """Redis store holding OID values"""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    def incr(self, name):
+        self.data[name] = self.data.get(name, 0) + 1
+
+
+@unittest.skipIf(
+    ISnmpDeviceStateManager is None, "state api dependencies are not installed"
+)
+class OIDIndexTests(unittest.TestCase):
+    """Tests loading & refreshing of the OID index"""
+
+    def setUp(self):
+        self.store = FakeStore()
+        self.asset_oids = {"OutletStatus": ("1.3.6.1.4.1.1", {"on": 1, "off": 2})}
+
+        patchers = [
+            mock.patch.object(IStateManager, "redis_store", self.store),
+            mock.patch.object(
+                GraphReference,
+                "get_asset_oids",
+                side_effect=lambda *_: dict(self.asset_oids),
+            ),
+            # no connection to the graph db
+            mock.patch.object(GraphReference, "__init__", return_value=None),
+            mock.patch.object(GraphReference, "get_session", mock.MagicMock()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.state = ISnmpDeviceStateManager({"key": 1, "type": "outlet"})
+
+    def test_index(self):
+        """OIDs are indexed by name on first access"""
+        rkey = format_as_redis_key("1", "1.3.6.1.4.1.1", key_formatted=False)
+        self.store.data[rkey] = b"2|1"
+
+        outlet_status = self.state.get_oid_by_name("OutletStatus")
+        self.assertEqual("1.3.6.1.4.1.1", outlet_status.oid)
+        self.assertEqual(rkey, outlet_status.redis_key)
+        self.assertEqual("2", outlet_status.data_type)
+        self.assertIsNone(self.state.get_oid_by_name("OutletName"))
+        self.assertEqual(1, GraphReference.get_asset_oids.call_count)
+
+    def test_model_reload(self):
+        """Index is refreshed once the model is reloaded"""
+        self.assertIsNone(self.state.get_oid_by_name("OutletName"))
+
+        self.asset_oids["OutletName"] = ("1.3.6.1.4.1.2", None)
+        IStateManager.invalidate_topology_cache()
+
+        self.assertEqual("1.3.6.1.4.1.2", self.state.get_oid_by_name("OutletName").oid)
+        self.assertEqual(2, GraphReference.get_asset_oids.call_count)
+
+    def test_state_managers_reloaded(self):
+        """State managers cached by key are discarded on model reload"""
+        outlet_cls = mock.Mock(StateManagerCls=ISnmpDeviceStateManager)
+
+        with mock.patch.object(
+            GraphReference,
+            "get_asset_and_components",
+            return_value={"key": 1, "type": "outlet"},
+        ), mock.patch(
+            "enginecore.state.hardware.room.Asset.get_supported_assets",
+            return_value={"outlet": outlet_cls},
+        ):
+            state = IStateManager.get_state_manager_by_key(1)
+            self.assertIs(state, IStateManager.get_state_manager_by_key(1))
+
+            IStateManager.invalidate_topology_cache()
+            self.assertIsNot(state, IStateManager.get_state_manager_by_key(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
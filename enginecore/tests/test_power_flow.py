@@ -0,0 +1,293 @@
+"""Unittests for the steady-state power flow model"""
+import unittest
+from enum import Enum
+
+import numpy as np
+
+from enginecore.state.engine.power_flow import PowerFlowModel, PowerFlowSolver
+
+
+class PowerFlowModelTests(unittest.TestCase):
+    """Tests voltage/state propagation & load accumulation"""
+
+    # outlet(1) -> pdu(2) -> outlets(21, 22) -> psus(31, 32) -> server(3)
+    # outlet(4) -> lamp(5); static(6) is not connected to anything
+    keys = [1, 2, 21, 22, 31, 32, 3, 4, 5, 6]
+
+    def setUp(self):
+        self.model = PowerFlowModel(
+            self.keys,
+            [(2, 1), (21, 2), (22, 2), (31, 21), (32, 22), (3, 31), (3, 32), (5, 4)],
+            mains_outlets=[1, 4],
+        )
+
+        self.specs = {
+            "min_voltage": self._values({3: 90}),
+            "power_consumption": self._values({2: 24, 31: 6, 32: 6, 3: 480, 5: 120}),
+            "draw": self._values({31: 0.5, 32: 0.5}, default=1.0),
+        }
+
+    def _values(self, values, default=0.0):
+        """Model array with values set for some of the assets"""
+        return np.array([values.get(k, default) for k in self.keys], dtype=float)
+
+    def _solve(self, wall_voltage, status, **kwargs):
+        in_volt, new_status, load = self.model.solve(
+            wall_voltage, np.array(status), **self.specs, **kwargs
+        )
+        as_dict = lambda values: dict(zip(self.keys, values.tolist()))
+        return as_dict(in_volt), as_dict(new_status), as_dict(load)
+
+    def test_reachable(self):
+        """Assets not powered by the mains are left alone"""
+        self.assertEqual([6], np.array(self.keys)[~self.model.reachable].tolist())
+        self.assertEqual(4, self.model.depth[self.keys.index(3)])
+
+    def test_power_restored(self):
+        """All assets power up & load is split equally among PSUs"""
+        in_volt, status, load = self._solve(120, [0] * len(self.keys))
+
+        self.assertEqual(120, in_volt[3])
+        self.assertEqual([1] * 9 + [0], list(status.values()))
+
+        self.assertAlmostEqual(4.0, load[3])
+        self.assertAlmostEqual(2.05, load[31])
+        self.assertAlmostEqual(2.05, load[22])
+        self.assertAlmostEqual(4.3, load[2])
+        self.assertAlmostEqual(4.3, load[1])
+        self.assertAlmostEqual(1.0, load[4])
+
+    def test_outlet_turned_off(self):
+        """Online PSU takes over load of the offline one"""
+        status = [1] * len(self.keys)
+        status[self.keys.index(22)] = 0
+
+        _, status, load = self._solve(
+            120, status, user_off=self._values({22: True}).astype(bool)
+        )
+
+        self.assertEqual(0, status[32])
+        self.assertEqual(1, status[3])
+        self.assertAlmostEqual(0.0, load[32])
+        self.assertAlmostEqual(4.05, load[31])
+        self.assertAlmostEqual(4.25, load[2])
+
+    def test_power_outage(self):
+        """Mains-powered assets go offline & drop their load"""
+        in_volt, status, load = self._solve(0, [1] * len(self.keys))
+
+        self.assertEqual(0, in_volt[3])
+        self.assertEqual([0] * 9 + [1], list(status.values()))
+        self.assertEqual([0.0] * 10, list(load.values()))
+
+    def test_low_voltage(self):
+        """Server powers down when voltage drops below its minimum"""
+        _, status, load = self._solve(80, [1] * len(self.keys))
+
+        self.assertEqual(0, status[3])
+        self.assertEqual(1, status[31])
+        self.assertAlmostEqual(0.075, load[31])
+
+    def test_own_power_source(self):
+        """Assets downstream of UPS on battery stay online"""
+        fixed = self._values({2: True}).astype(bool)
+
+        in_volt, status, load = self._solve(
+            0,
+            [1] * len(self.keys),
+            fixed=fixed,
+            fixed_volt=self._values({2: 120}),
+            load_cut=fixed,
+        )
+
+        self.assertEqual(0, in_volt[2])
+        self.assertEqual(120, in_volt[3])
+        self.assertEqual(1, status[2])
+        self.assertEqual(1, status[3])
+        # load is supplied by the battery
+        self.assertAlmostEqual(4.3, load[2])
+        self.assertAlmostEqual(0.0, load[1])
+
+
+class FakeStore:
+    """Redis store of the asset states"""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+
+class FakeState:
+    """State manager keeping its values in the fake store"""
+
+    PowerStateReason = Enum("PowerStateReason", "ac_restored ac_lost turned_off")
+
+    def __init__(self, store, key, asset_type, **specs):
+        self._store = store
+        self.redis_key = "{}-{}".format(key, asset_type)
+        self.asset_type = asset_type
+        self.power_consumption = specs.get("power_consumption", 0)
+        self.draw_percentage = 1
+        self.power_on_ac_restored = True
+        self.on_battery = False
+
+        self._set("state", specs.get("status", 1))
+        self._set("in-voltage", specs.get("in_volt", 120.0))
+        self._set("load", specs.get("load", 0.0))
+
+    def _set(self, name, value):
+        self._store.data["{}:{}".format(self.redis_key, name)] = str(value).encode()
+
+    def _get(self, name):
+        return float(self._store.data["{}:{}".format(self.redis_key, name)])
+
+    def get_store(self):
+        return self._store
+
+    def min_voltage_prop(self):
+        return 0
+
+    @property
+    def status(self):
+        return int(self._get("state"))
+
+    @property
+    def output_voltage(self):
+        return 120.0 * self.status if self.on_battery else self._get("in-voltage")
+
+    def update_input_voltage(self, voltage):
+        self._set("in-voltage", voltage)
+
+    def update_load(self, load):
+        self._set("load", load)
+
+
+class FakeAsset:
+    """Hardware asset recording solver updates"""
+
+    def __init__(self, state):
+        self.state = state
+        self.state_reason = None
+        self.key = int(state.redis_key.split("-")[0])
+        self.solved = None
+
+    def power_up(self):
+        self.state._set("state", 1)
+        return 1
+
+    def power_off(self):
+        self.state._set("state", 0)
+        return 0
+
+    def power_flow_solved(self, asset_event, in_volt):
+        self.solved = (asset_event, in_volt)
+        self.state.update_load(asset_event.load.new)
+
+
+class FakeUPS(FakeAsset):
+    """UPS transferring to battery when input power is lost"""
+
+    def on_input_voltage_up(self, event):
+        self.state.on_battery = False
+        return event.get_next_power_event(self)
+
+    def on_input_voltage_down(self, event):
+        asset_event = event.get_next_power_event(self)
+        if not event.in_volt.new:
+            self.state.on_battery = True
+            asset_event.out_volt.new = 120.0
+        return asset_event
+
+
+class FakeDataSource:
+    """Power topology of the fake assets"""
+
+    # outlet(1) -> ups(2) -> outlet(3) -> lamp(4); outlet(5) -> lamp(6)
+    parents = {2: [1], 3: [2], 4: [3], 6: [5]}
+
+    @classmethod
+    def get_parent_assets(cls, key):
+        return cls.parents.get(key, [])
+
+    @classmethod
+    def get_mains_powered_assets(cls):
+        return [1, 5]
+
+
+class PowerFlowSolverTests(unittest.TestCase):
+    """Tests applying solved states to the assets"""
+
+    def setUp(self):
+        self.store = FakeStore()
+        asset_types = {1: "outlet", 2: "ups", 3: "outlet", 4: "lamp", 5: "outlet"}
+        asset_types[6] = "lamp"
+
+        self.assets = {}
+        for key, asset_type in asset_types.items():
+            state = FakeState(
+                self.store,
+                key,
+                asset_type,
+                power_consumption=120 if asset_type == "lamp" else 0,
+                load=1.0,
+            )
+            asset_cls = FakeUPS if asset_type == "ups" else FakeAsset
+            self.assets[key] = asset_cls(state)
+
+        self.notified = []
+        self.solver = PowerFlowSolver(
+            self.assets, FakeDataSource, notify=self.notified.append, unverified=True
+        )
+
+    def test_supported(self):
+        """UPS is handled by the solver only if enabled explicitly"""
+        self.assertTrue(self.solver.supported)
+        self.assertFalse(PowerFlowSolver(self.assets, FakeDataSource).supported)
+
+    def _apply(self, wall_voltage):
+        """Solve the model & update the assets"""
+        self.solver.apply(self.solver.solve(wall_voltage))
+
+    def test_solve(self):
+        """Solving the model does not touch the assets"""
+        solution = self.solver.solve(0)
+
+        self.assertEqual([0, 1, 1, 1, 0, 0], solution.status.tolist())
+        self.assertFalse(self.assets[2].state.on_battery)
+        self.assertIsNone(self.assets[4].solved)
+        self.assertEqual([], self.notified)
+
+    def test_power_outage(self):
+        """UPS switches to battery & keeps its outlets powered"""
+        self._apply(0)
+
+        statuses = {k: a.state.status for k, a in self.assets.items()}
+        self.assertEqual({1: 0, 2: 1, 3: 1, 4: 1, 5: 0, 6: 0}, statuses)
+
+        self.assertTrue(self.assets[2].state.on_battery)
+        self.assertEqual(0.0, self.assets[2].solved[1])
+        self.assertEqual(120.0, self.assets[3].solved[1])
+
+        loads = {k: a.state._get("load") for k, a in self.assets.items()}
+        self.assertEqual({1: 0.0, 2: 1.0, 3: 1.0, 4: 1.0, 5: 0.0, 6: 0.0}, loads)
+
+        # only assets affected by the outage are reported
+        self.assertEqual([1, 5, 6], sorted(e.asset.key for e in self.notified))
+
+    def test_power_restored(self):
+        """UPS transfers back to input power & its load goes upstream"""
+        self._apply(0)
+        self._apply(120)
+
+        statuses = {k: a.state.status for k, a in self.assets.items()}
+        self.assertEqual({1: 1, 2: 1, 3: 1, 4: 1, 5: 1, 6: 1}, statuses)
+
+        self.assertFalse(self.assets[2].state.on_battery)
+        self.assertEqual(120.0, self.assets[2].state.output_voltage)
+        self.assertEqual(1.0, self.assets[1].state._get("load"))
+
+
+if __name__ == "__main__":
+    unittest.main()
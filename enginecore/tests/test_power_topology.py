@@ -0,0 +1,51 @@
+"""Unittests for the in-memory power topology used by the engine data source"""
+import unittest
+
+from enginecore.state.engine.data_source import PowerTopology
+
+
+class PowerTopologyTests(unittest.TestCase):
+    """Tests topology lookups (children, parents, mains & oids)"""
+
+    def setUp(self):
+        # outlet(1) -> pdu(2) -> outlets(21, 22) -> server psus(31, 32)
+        self.topology = PowerTopology(
+            assets=[{"key": k} for k in [1, 2, 21, 22, 3, 31, 32]],
+            power_connections=[(2, 1), (21, 2), (22, 2), (31, 21), (32, 22)],
+            mains_outlets=[1],
+            oid_connections=[
+                {
+                    "owner_key": 2,
+                    "asset_key": 21,
+                    "oid": "1.3.6.1.4.1.318.1.1.4.4.2.1.3.1",
+                    "info": {"name": "OutletState", "specs": {"1": "switchOn"}},
+                }
+            ],
+        )
+
+    def test_children(self):
+        """Children are assets powered by the parent"""
+        self.assertEqual((21, 22), self.topology.children(2))
+        self.assertEqual((), self.topology.children(31))
+
+    def test_parents(self):
+        """Parents are assets powering the child"""
+        self.assertEqual((2,), self.topology.parents(22))
+        self.assertEqual((), self.topology.parents(1))
+
+    def test_mains_outlets(self):
+        """Wall-powered outlets are kept"""
+        self.assertEqual((1,), self.topology.mains_outlets)
+
+    def test_oid_info(self):
+        """OID lookup returns powered asset & OID details"""
+        asset_key, details = self.topology.oid_info(
+            2, "1.3.6.1.4.1.318.1.1.4.4.2.1.3.1"
+        )
+        self.assertEqual(21, asset_key)
+        self.assertEqual("OutletState", details["name"])
+        self.assertEqual((None, None), self.topology.oid_info(2, "1.3.6"))
+
+
+if __name__ == "__main__":
+    unittest.main()
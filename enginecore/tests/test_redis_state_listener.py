@@ -0,0 +1,114 @@
+"""Unittests for draining redis pub/sub streams & keeping track of the backlog"""
+import threading
+import unittest
+from unittest import mock
+
+try:
+    from enginecore.state.redis_state_listener import StateListener
+except ImportError:
+    StateListener = None
+
+
+class FakePubSub:
+    """Pubsub stream returning pre-published messages"""
+
+    def __init__(self, messages, stop_event):
+        self._messages = list(messages)
+        self._stop_event = stop_event
+
+    def get_message(self, timeout=0):
+        if self._messages:
+            return self._messages.pop(0)
+
+        # reader is blocked on an empty stream
+        if timeout:
+            self._stop_event.set()
+        return None
+
+
+def snmp_message(redis_key):
+    """Message published by snmpsimd when OID gets updated"""
+    return {"type": "pmessage", "channel": b"oid-upd", "data": redis_key}
+
+
+@unittest.skipIf(StateListener is None, "state handler dependencies are not installed")
+class StateListenerTests(unittest.TestCase):
+    """Tests batching of the pubsub messages"""
+
+    def setUp(self):
+        # no connection to redis or the engine
+        self.listener = StateListener.__new__(StateListener)
+        self.listener._stop_event = threading.Event()
+        self.listener._backlog_lock = threading.Lock()
+        self.listener._backlog_reported = 0
+        self.listener._backlog = {
+            "queue_depth": 0,
+            "received": 0,
+            "dispatched": 0,
+            "merged": 0,
+            "last_lag": 0.0,
+            "max_lag": 0.0,
+        }
+
+        self.fired = []
+        self.listener.fire = lambda event, *_: self.fired.append(event)
+
+    def _read(self, messages):
+        """Read snmp stream until it's drained"""
+        self.listener._pubsub_streams = {
+            "snmp": FakePubSub(messages, self.listener._stop_event)
+        }
+        self.listener._read_stream("snmp")
+
+    def test_stream_drained(self):
+        """Pending messages are passed on in one batch"""
+        self._read([snmp_message(b"1-1.3"), snmp_message(b"1-1.4")])
+
+        (batch_event,) = self.fired
+        batch, json_format = batch_event.args[0], batch_event.kwargs["json_format"]
+
+        self.assertEqual("dispatch_redis_batch", batch_event.name)
+        self.assertEqual([b"1-1.3", b"1-1.4"], [m["data"] for _, m in batch])
+        self.assertFalse(json_format)
+        self.assertEqual(2, self.listener.backlog["queue_depth"])
+        self.assertEqual(2, self.listener.backlog["received"])
+
+    def test_backlog(self):
+        """Messages leave backlog once the batch is handled"""
+        self._read([snmp_message(k) for k in [b"1-1.3", b"1-1.4", b"1-1.3"]])
+        batch_event = self.fired.pop()
+
+        with mock.patch.object(self.listener, "_dispatch_message") as dispatch:
+            self.listener.dispatch_redis_batch(*batch_event.args, json_format=False)
+
+        # repeated oid update is dispatched once
+        self.assertEqual(
+            [b"1-1.4", b"1-1.3"], [c.args[0]["data"] for c in dispatch.call_args_list]
+        )
+        self.assertEqual(3, self.listener.backlog["queue_depth"])
+
+        (done_event,) = self.fired
+        self.assertEqual("redis_batch_handled", done_event.name)
+        self.listener.redis_batch_handled(*done_event.args, **done_event.kwargs)
+
+        backlog = self.listener.backlog
+        self.assertEqual(0, backlog["queue_depth"])
+        self.assertEqual(3, backlog["received"])
+        self.assertEqual(2, backlog["dispatched"])
+        self.assertEqual(1, backlog["merged"])
+        self.assertGreaterEqual(backlog["max_lag"], backlog["last_lag"])
+
+    def test_report(self):
+        """Backlog is logged only when new messages come in"""
+        self._read([snmp_message(b"1-1.3")])
+
+        with self.assertLogs("enginecore.state.redis_state_listener") as logs:
+            self.listener.report_redis_backlog()
+            self.listener.report_redis_backlog()
+
+        self.assertEqual(1, len(logs.output))
+        self.assertIn("1 received", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
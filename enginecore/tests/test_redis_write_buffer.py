@@ -0,0 +1,160 @@
+"""Unittests for batching of redis writes issued by state managers"""
+import threading
+import unittest
+
+from enginecore.state.redis_write_buffer import RedisWriteBuffer
+
+from fake_redis import DictStore
+
+
+class RedisWriteBufferTests(unittest.TestCase):
+    """Tests buffering & flushing of the writes"""
+
+    def setUp(self):
+        self.store = DictStore()
+        self.buffer = RedisWriteBuffer(self.store)
+        # test thread processes iterations
+        self.buffer.add_batch_thread()
+
+    def test_no_batch(self):
+        """Writes go straight to redis outside of a batch"""
+        self.buffer.set("1-outlet:load", 0.5)
+        self.assertEqual(0.5, self.store.data["1-outlet:load"])
+
+    def test_batch_flushed(self):
+        """Writes are sent in one round-trip when batch ends"""
+        self.buffer.begin_batch()
+        for key in range(10):
+            self.buffer.set("{}-outlet:load".format(key), 1.5)
+        self.buffer.publish("state-upd", "{}")
+
+        self.assertEqual(0, self.store.round_trips)
+        self.buffer.end_batch()
+
+        self.assertEqual(1, self.store.round_trips)
+        self.assertEqual(1.5, self.store.data["9-outlet:load"])
+        self.assertEqual([("state-upd", "{}")], self.store.published)
+
+    def test_read_pending(self):
+        """Reads see buffered values"""
+        self.store.data["2-pdu:state"] = b"0"
+
+        self.buffer.begin_batch()
+        self.buffer.set("1-outlet:state", 1)
+        self.buffer.set("1-outlet:load", 2.25)
+
+        self.assertEqual(b"1", self.buffer.get("1-outlet:state"))
+        self.assertEqual(
+            [b"2.25", b"0", None],
+            self.buffer.mget(["1-outlet:load", "2-pdu:state", "3-ups:state"]),
+        )
+        self.assertNotIn("1-outlet:state", self.store.data)
+
+    def test_nested_batches(self):
+        """Writes are flushed when the last batch is done"""
+        self.buffer.begin_batch()
+        self.buffer.begin_batch()
+        self.buffer.set("1-outlet:state", 0)
+
+        self.buffer.end_batch()
+        self.assertNotIn("1-outlet:state", self.store.data)
+
+        self.buffer.end_batch()
+        self.assertEqual(0, self.store.data["1-outlet:state"])
+
+    def test_other_commands_flush(self):
+        """Commands that are not buffered see the pending writes"""
+        self.buffer.begin_batch()
+        self.buffer.set("1-outlet:state", 1)
+        self.assertTrue(self.buffer.exists("1-outlet:state"))
+
+    def test_other_threads(self):
+        """Writes made by unrelated threads are not held back"""
+        self.buffer.begin_batch()
+        self.buffer.set("1-outlet:state", 1)
+
+        writer = threading.Thread(
+            target=lambda: self.buffer.mset({"2-ups:battery": 1000})
+        )
+        writer.start()
+        writer.join()
+
+        self.assertEqual(1000, self.store.data["2-ups:battery"])
+        self.assertNotIn("1-outlet:state", self.store.data)
+
+        self.buffer.discard_batch_thread()
+        self.buffer.publish("state-upd", "{}")
+        self.assertEqual([("state-upd", "{}")], self.store.published)
+
+    def _write_from_thread(self, write):
+        """Issue write from a thread that is not processing iterations"""
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer.join()
+
+    def test_other_threads_pending_keys(self):
+        """Writes to keys with pending writes are applied in issue order"""
+        self.buffer.begin_batch()
+        self.buffer.set("2-ups:battery", "static")
+        self.buffer.set("2-ups:load", 1.5)
+
+        self._write_from_thread(
+            lambda: self.buffer.set("2-ups:battery", "@battery:lazy")
+        )
+        self._write_from_thread(lambda: self.buffer.mset({"2-ups:load": 2.5}))
+        self.assertNotIn("2-ups:battery", self.store.data)
+        self.assertEqual(b"@battery:lazy", self.buffer.get("2-ups:battery"))
+
+        self.buffer.end_batch()
+        self.assertEqual("@battery:lazy", self.store.data["2-ups:battery"])
+        self.assertEqual(2.5, self.store.data["2-ups:load"])
+
+    def test_other_threads_flush_pending_keys(self):
+        """Other commands touching keys with pending writes flush them first"""
+        self.buffer.begin_batch()
+        self.buffer.set("2-ups:battery-model", "0.5")
+
+        self._write_from_thread(lambda: self.buffer.delete("2-ups:battery-model"))
+        self.buffer.end_batch()
+
+        self.assertNotIn("2-ups:battery-model", self.store.data)
+
+    def test_batch_scope(self):
+        """Only writes made within batch scope are buffered"""
+        self.buffer.discard_batch_thread()
+        self.buffer.begin_batch()
+
+        self.buffer.enter_batch_scope()
+        self.buffer.set("1-outlet:state", 1)
+        self.buffer.exit_batch_scope()
+
+        self.buffer.set("1-outlet:load", 0.5)
+        self.assertEqual(0.5, self.store.data["1-outlet:load"])
+        self.assertNotIn("1-outlet:state", self.store.data)
+
+        self.buffer.end_batch()
+        self.assertEqual(1, self.store.data["1-outlet:state"])
+
+    def test_max_pending(self):
+        """Long batches are flushed early"""
+        self.buffer.max_pending = 3
+        self.buffer.begin_batch()
+
+        self.buffer.mset({"1-outlet:state": 1})
+        self.buffer.publish("state-upd", "{}")
+        self.assertEqual(0, self.store.round_trips)
+
+        self.buffer.publish("state-upd", "{}")
+        self.assertEqual(1, self.store.round_trips)
+        self.assertEqual(1, self.store.data["1-outlet:state"])
+
+    def test_disabled(self):
+        """Batching can be turned off"""
+        buffer = RedisWriteBuffer(self.store, enabled=False)
+        buffer.begin_batch()
+        buffer.set("1-outlet:state", 1)
+        self.assertEqual(1, self.store.data["1-outlet:state"])
+
+
+if __name__ == "__main__":
+    unittest.main()
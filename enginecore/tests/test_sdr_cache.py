@@ -0,0 +1,70 @@
+"""Unittests for the compiled SDR cache shared by ipmi agents"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from enginecore.state.agent.ipmi_agent import CompiledSDRCache
+
+
+class CompiledSDRCacheTests(unittest.TestCase):
+    """Tests cache keys & storing/fetching compiled SDRs"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.templ_dir = os.path.join(self.work_dir, "ipmi_template")
+        os.makedirs(self.templ_dir)
+
+        with open(os.path.join(self.templ_dir, "caseFan.sdrs"), "w") as sdrs_handler:
+            sdrs_handler.write("sensor_number $ADDR\n")
+
+        self.cache = CompiledSDRCache(
+            os.path.join(self.work_dir, "cache"), self.templ_dir
+        )
+        self.sdrs_opt = {"caseFan": 'define ADDR "0x31"\n', "includes": ""}
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_key(self):
+        """Identical sensor layouts share a key"""
+        key = self.cache.key("0x20", self.sdrs_opt)
+
+        self.assertEqual(key, self.cache.key("0x20", dict(self.sdrs_opt)))
+        self.assertNotEqual(key, self.cache.key("0x22", self.sdrs_opt))
+        self.assertNotEqual(
+            key, self.cache.key("0x20", dict(self.sdrs_opt, caseFan=""))
+        )
+
+    def test_key_depends_on_templates(self):
+        """Updated .sdrs templates invalidate cached SDRs"""
+        key = self.cache.key("0x20", self.sdrs_opt)
+
+        with open(os.path.join(self.templ_dir, "caseFan.sdrs"), "a") as sdrs_handler:
+            sdrs_handler.write("sensor_type Fan\n")
+
+        new_cache = CompiledSDRCache(
+            os.path.join(self.work_dir, "cache"), self.templ_dir
+        )
+        self.assertNotEqual(key, new_cache.key("0x20", self.sdrs_opt))
+
+    def test_store_fetch(self):
+        """Compiled SDRs are copied to & from the cache"""
+        key = self.cache.key("0x20", self.sdrs_opt)
+        compiled_path = os.path.join(self.work_dir, "compiled")
+        dest_path = os.path.join(self.work_dir, "server", "emu_state", "sdr.20.main")
+
+        self.assertFalse(self.cache.fetch(key, dest_path))
+
+        with open(compiled_path, "wb") as sdr_handler:
+            sdr_handler.write(b"\x01\x02sdr")
+
+        self.cache.store(key, compiled_path)
+        self.assertTrue(self.cache.fetch(key, dest_path))
+
+        with open(dest_path, "rb") as sdr_handler:
+            self.assertEqual(sdr_handler.read(), b"\x01\x02sdr")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Unittests for the memory-mapped sensor value table"""
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from enginecore.state.sensor.storage import SensorTableStorage
+
+
+class SensorTableStorageTests(unittest.TestCase):
+    """Tests slot updates, re-opening & exporting of the table"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "sensor_values.tbl")
+        self.table = SensorTableStorage.create(self.path, ["CPU Temp", "PSU1 status"])
+
+    def tearDown(self):
+        SensorTableStorage._tables.clear()
+        self.tmp_dir.cleanup()
+
+    def test_set_get(self):
+        """Values are stored as strings & every update bumps slot version"""
+        self.table.set("CPU Temp", 45)
+        self.table.set("PSU1 status", "0x08")
+
+        self.assertEqual("45", self.table.get("CPU Temp"))
+        self.assertEqual("0x08", self.table.get("PSU1 status"))
+        self.assertEqual(2, self.table.version("CPU Temp"))
+
+        with self.table.lock("CPU Temp"):
+            self.table.set("CPU Temp", int(self.table.get("CPU Temp")) + 1)
+        self.assertEqual(4, self.table.version("CPU Temp"))
+
+        self.assertRaises(ValueError, self.table.set, "CPU Temp", "9" * 24)
+
+    def test_open(self):
+        """Table layout is read from the file header"""
+        self.table.set("PSU1 status", "0x01")
+        SensorTableStorage._tables.clear()
+
+        table = SensorTableStorage.open(self.path)
+        self.assertEqual(["CPU Temp", "PSU1 status"], table.sensor_names)
+        self.assertEqual("0x01", table.get("PSU1 status"))
+
+        self.assertIsNone(SensorTableStorage.open(self.path + "-missing"))
+
+    def test_export(self):
+        """Only sensor files of the updated values are re-written"""
+        versions = {}
+        self.table.set("CPU Temp", 30)
+        self.table.export(self.tmp_dir.name, versions)
+
+        cpu_temp_path = os.path.join(self.tmp_dir.name, "CPU Temp")
+        with open(cpu_temp_path) as sf_handler:
+            self.assertEqual("30", sf_handler.read())
+
+        os.remove(cpu_temp_path)
+        self.table.set("PSU1 status", "0x01")
+        self.table.export(self.tmp_dir.name, versions)
+
+        self.assertFalse(os.path.exists(cpu_temp_path))
+        with open(os.path.join(self.tmp_dir.name, "PSU1 status")) as sf_handler:
+            self.assertEqual("0x01", sf_handler.read())
+
+    def test_interrupted_update(self):
+        """Slot left mid-update by a writer that died is recovered"""
+        self.table.set("CPU Temp", 45)
+        self.table.READ_SPINS, self.table.READ_MAX_SLEEPS = 10, 2
+
+        # writer process was killed after marking the slot as being updated
+        struct.pack_into("<Q", self.table._mm, self.table._slot_offset(0), 3)
+
+        with self.assertLogs("enginecore.state.sensor.storage", "WARNING"):
+            self.assertEqual("45", self.table.get("CPU Temp"))
+        self.assertEqual(4, self.table.version("CPU Temp"))
+
+    def test_open_keeps_locks(self):
+        """Opening a table does not release slot locks held by the process"""
+        lock_check = (
+            "import fcntl, os, sys;"
+            "fd = os.open(sys.argv[1], os.O_RDWR);"
+            "fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, int(sys.argv[2]))"
+        )
+        slot_offset = str(self.table._slot_offset(0))
+
+        with self.table.lock("CPU Temp"):
+            SensorTableStorage._tables.clear()
+            SensorTableStorage.open(self.path)
+
+            locked = subprocess.run(
+                [sys.executable, "-c", lock_check, self.path, slot_offset],
+                stderr=subprocess.DEVNULL,
+            )
+            self.assertNotEqual(0, locked.returncode)
+
+
+if __name__ == "__main__":
+    unittest.main()
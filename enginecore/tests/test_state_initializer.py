@@ -0,0 +1,100 @@
+"""Unittests for .snmprec -> redis state conversion"""
+import os
+import tempfile
+import unittest
+
+from enginecore.state.state_initializer import (
+    asset_fingerprint,
+    load_snmprec,
+    snmprec_to_redis,
+)
+from enginecore.tools.utils import format_as_redis_key
+
+
+class SnmprecTests(unittest.TestCase):
+    """Tests parsing of the static OID files"""
+
+    snmprec_lines = [
+        "1.3.6.1.2.1.1.3.0|67|87320340",
+        "1.3.6.1.2.1.1.10.0|4|text",
+        "1.3.6.1.2.1.1.2.0|6|1.3.6.1.4.1.318.1.3.2.7",
+    ]
+
+    def setUp(self):
+        fd, self.snmprec_path = tempfile.mkstemp(suffix=".snmprec")
+        with os.fdopen(fd, "w") as sfile_handler:
+            sfile_handler.write("\n".join(self.snmprec_lines) + "\n")
+
+    def tearDown(self):
+        os.unlink(self.snmprec_path)
+
+    def test_load_snmprec(self):
+        """Each line is split into oid, data type & value"""
+        snmprec = load_snmprec(self.snmprec_path)
+        self.assertEqual(len(snmprec), 3)
+        self.assertEqual(snmprec[0], ("1.3.6.1.2.1.1.3.0", "67", "87320340"))
+
+    def test_graph_oids_override(self):
+        """OIDs defined in the graph db take precedence over static values"""
+        formatted_key = "1".zfill(10)
+        graph_oids = {"1.3.6.1.2.1.1.3.0": {"dtype": 67, "value": 0}}
+
+        oid_values, _ = snmprec_to_redis(
+            formatted_key, load_snmprec(self.snmprec_path), graph_oids
+        )
+
+        rkey = format_as_redis_key(formatted_key, "1.3.6.1.2.1.1.3.0")
+        self.assertEqual(oid_values[rkey], "67|0")
+        rkey = format_as_redis_key(formatted_key, "1.3.6.1.2.1.1.10.0")
+        self.assertEqual(oid_values[rkey], "4|text")
+
+    def test_oids_ordering(self):
+        """Ordering matches redis SORT ALPHA (padded OIDs sort numerically)"""
+        formatted_key = "1".zfill(10)
+        _, ordering = snmprec_to_redis(
+            formatted_key, load_snmprec(self.snmprec_path), {}
+        )
+
+        expected_oids = ["1.3.6.1.2.1.1.2.0", "1.3.6.1.2.1.1.3.0", "1.3.6.1.2.1.1.10.0"]
+        self.assertEqual(
+            ordering,
+            [format_as_redis_key(formatted_key, oid) for oid in expected_oids],
+        )
+
+
+class AssetFingerprintTests(unittest.TestCase):
+    """Tests change detection used by the warm start"""
+
+    labels = ["Asset", "UPS", "SNMPSim"]
+    props = {"key": 1, "type": "ups", "port": 1024}
+    oids = [{"OID": "1.3.6.1.4.1", "OIDName": "A"}, {"OID": "1.3.6.1.4.2"}]
+
+    def test_order_independent(self):
+        """Ordering of labels, OIDs & parents does not affect the hash"""
+        self.assertEqual(
+            asset_fingerprint(self.labels, self.props, self.oids, [2, 3]),
+            asset_fingerprint(
+                reversed(self.labels), dict(self.props), self.oids[::-1], [3, 2]
+            ),
+        )
+
+    def test_definition_changes(self):
+        """Updated properties, OIDs or power connections change the hash"""
+        fingerprint = asset_fingerprint(self.labels, self.props, self.oids, [2])
+
+        props = dict(self.props, port=1025)
+        oids = [dict(self.oids[0], OIDName="B"), self.oids[1]]
+
+        self.assertNotEqual(
+            fingerprint, asset_fingerprint(self.labels, props, self.oids, [2])
+        )
+        self.assertNotEqual(
+            fingerprint, asset_fingerprint(self.labels, self.props, oids, [2])
+        )
+        self.assertNotEqual(
+            fingerprint, asset_fingerprint(self.labels, self.props, self.oids, [3])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+"""Unittests for the in-memory storage model of a server"""
+import unittest
+
+from enginecore.state.storage_model import StorageModel
+
+from fake_graph import FakeGraphRef
+
+
+def storage_records():
+    """Storage components of a server with one controller"""
+    return [
+        {
+            "ctrl": {"controllerNum": 0, "alarmState": "OFF", "numDriveGroups": 1},
+            "cv": {"serialNumber": "CV1", "temperature": 20, "replacement": "No"},
+            "vds": [{"vdNum": 1, "DG": 1}, {"vdNum": 0, "DG": 0}],
+            "pds": [
+                {"drive": {"DID": 7, "slotNum": 1, "temperature": 20}, "vdNum": 0},
+                {"drive": {"DID": 4, "slotNum": 0, "temperature": 20}, "vdNum": 0},
+                {"drive": {"DID": 9, "slotNum": 2, "temperature": 20}, "vdNum": None},
+            ],
+        }
+    ]
+
+
+class StorageModelTests(unittest.TestCase):
+    """Tests queries & updates of the storage components kept in memory"""
+
+    def setUp(self):
+        self.db_down = False
+        self.graph_ref = FakeGraphRef(self._respond)
+        self.storage = StorageModel(1, graph_ref=self.graph_ref)
+
+    def _respond(self, query, _):
+        """Return storage components, write-back queries fail if db is down"""
+        if "UNWIND" not in query:
+            return storage_records()
+
+        if self.db_down:
+            raise ConnectionError("db is unavailable")
+        return []
+
+    def _updates(self):
+        """Write-back queries that succeeded as (label, updates) pairs"""
+        updates = []
+        for query, params in self.graph_ref.queries:
+            if "UNWIND" in query:
+                label = next(
+                    (name for name in ["PhysicalDrive", "CacheVault"] if name in query),
+                    "Controller",
+                )
+                updates.append((label, params["updates"]))
+
+        return updates
+
+    def test_loaded_once(self):
+        """Storage components are fetched on first access"""
+        for _ in range(3):
+            self.assertEqual(1, self.storage.get_controller_count())
+            self.assertEqual(
+                "OFF", self.storage.get_controller_details(0)["alarmState"]
+            )
+
+        self.assertIsNone(self.storage.get_controller_details(1))
+        self.assertEqual(1, len(self.graph_ref.queries))
+
+    def test_drives(self):
+        """Virtual drives contain their physical drives ordered by slot"""
+        drives = self.storage.get_all_drives("0")
+
+        self.assertEqual([4, 7, 9], sorted(pd["DID"] for pd in drives["pd"]))
+        # virtual drive without physical drives is not reported
+        self.assertEqual(1, len(drives["vd"]))
+        self.assertEqual([4, 7], [pd["DID"] for pd in drives["vd"][0]["pd"]])
+
+        # callers get copies of the records
+        drives["pd"][0]["Size"] = "1 GB"
+        self.assertNotIn("Size", self.storage.get_all_drives(0)["pd"][0])
+
+    def test_write_back(self):
+        """Updated properties are written back in batches"""
+        self.assertTrue(
+            self.storage.set_physical_drive_prop(0, 7, {"media_error_count": 2})
+        )
+        self.assertTrue(self.storage.set_controller_prop(0, {"alarm": "on"}))
+        self.assertTrue(self.storage.set_cv_replacement(0, "Yes", True))
+        self.assertTrue(
+            self.storage.set_physical_drive_prop(0, 7, {"other_error_count": 1})
+        )
+        self.assertFalse(self.storage.set_physical_drive_prop(0, 8, {"state": "Offln"}))
+
+        self.assertEqual(3, self.storage.pending_changes)
+        self.storage.flush()
+
+        updates = dict(self._updates())
+        self.assertEqual(
+            [
+                {
+                    "controller": 0,
+                    "DID": 7,
+                    "props": {"mediaErrorCount": 2, "otherErrorCount": 1},
+                }
+            ],
+            updates["PhysicalDrive"],
+        )
+        self.assertEqual({"alarm": "on"}, updates["Controller"][0]["props"])
+        self.assertEqual(
+            {"replacement": "Yes", "writeThrough": True},
+            updates["CacheVault"][0]["props"],
+        )
+
+        # nothing changed since the last flush
+        self.storage.flush()
+        self.assertEqual(3, len(self._updates()))
+
+    def test_write_back_failed(self):
+        """Changes are kept if they could not be written back"""
+        self.storage.set_controller_prop(0, {"alarm": "on"})
+
+        self.db_down = True
+        with self.assertRaises(ConnectionError):
+            self.storage.flush()
+
+        self.storage.set_controller_prop(0, {"alarm": "off"})
+        self.db_down = False
+        self.storage.flush()
+
+        self.assertEqual(
+            [("Controller", [{"controller": 0, "props": {"alarm": "off"}}])],
+            self._updates(),
+        )
+
+    def test_temperature(self):
+        """Temperature changes are limited"""
+        target = {
+            "controller": 0,
+            "attribute": "serialNumber",
+            "value": '"CV1"',
+            "hd_type": "CacheVault",
+        }
+
+        updated = self.storage.add_to_hd_component_temperature(
+            target, 5, {"lower": 18, "upper": 22}
+        )
+        self.assertEqual((True, 22), updated)
+
+        updated = self.storage.add_to_hd_component_temperature(
+            target, 5, {"lower": 18, "upper": 22}
+        )
+        self.assertEqual((False, 22), updated)
+
+        updated = self.storage.add_to_hd_component_temperature(
+            {**target, "attribute": "DID", "value": 4, "hd_type": "PhysicalDrive"},
+            -5,
+            {"lower": 18},
+        )
+        self.assertEqual((True, 18), updated)
+
+        elements = self.storage.get_all_hd_thermal_elements()
+        self.assertEqual(4, len(elements))
+        self.assertIn(
+            {"serialNumber": "CV1", "temperature": 22, "replacement": "No"},
+            [e["component"] for e in elements],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Unittests for the rendered storcli64 output cache"""
+import time
+import unittest
+
+from enginecore.state.agent.storcli_emu import StorCLIOutputCache
+
+
+class StorCLIOutputCacheTests(unittest.TestCase):
+    """Tests serving & invalidation of cached replies"""
+
+    command = ("/c0", "show", "all")
+    reply = {"stdout": "Controller = 0", "stderr": "", "status": 0}
+
+    def setUp(self):
+        self.cache = StorCLIOutputCache()
+
+    def test_cached_reply(self):
+        """Reply is served for the version it was rendered at"""
+        self.assertIsNone(self.cache.get(self.command, b"1"))
+
+        self.cache.put(self.command, b"1", self.reply)
+        self.assertEqual(self.cache.get(self.command, b"1"), self.reply)
+        self.assertIsNone(self.cache.get(("/c1", "show", "all"), b"1"))
+
+    def test_storage_updated(self):
+        """Storage updates invalidate cached replies"""
+        self.cache.put(self.command, None, self.reply)
+        self.assertEqual(self.cache.get(self.command, None), self.reply)
+
+        self.assertIsNone(self.cache.get(self.command, b"1"))
+
+    def test_expired(self):
+        """Time-dependent replies (drive rebuilds) go stale"""
+        self.cache.put(self.command, b"1", self.reply, time.time() + 60)
+        self.assertEqual(self.cache.get(self.command, b"1"), self.reply)
+
+        self.cache.put(self.command, b"1", self.reply, time.time() - 1)
+        self.assertIsNone(self.cache.get(self.command, b"1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Unittests for the vectorized sensor->sensor thermal impact"""
+import unittest
+
+import numpy as np
+
+from enginecore.state.sensor.thermal_model import SensorThermalModel
+
+
+def thermal_rel(source, target, **rel):
+    """Relationship details as returned by thermal relationships cache"""
+    return {
+        "source": {"name": source},
+        "target": {"name": target},
+        "rel": {"event": "up", "action": "increase", "rate": 1, **rel},
+    }
+
+
+def nearest_value(model, value):
+    """Degrees of the nearest model point"""
+    return model[min(model, key=lambda x: abs(int(x) - value))]
+
+
+class SensorThermalModelTests(unittest.TestCase):
+    """Tests heating/cooling of sensors & thermal bounds"""
+
+    names = ["PSU", "CPU", "Fan", "Inlet"]
+
+    def _step(self, values, *rels, ambient=20):
+        model = SensorThermalModel(self.names, rels, nearest_value)
+        return model.step(np.array(values, dtype=float), ambient).tolist()
+
+    def test_heating_paused(self):
+        """Target is heated until it reaches pauseAt"""
+        rel = thermal_rel("PSU", "CPU", degrees=3, pauseAt=28)
+
+        self.assertEqual([1, 25, 0, 20], self._step([1, 22, 0, 20], rel))
+        self.assertEqual([1, 28, 0, 20], self._step([1, 26, 0, 20], rel))
+        self.assertEqual([1, 30, 0, 20], self._step([1, 30, 0, 20], rel))
+
+    def test_cooling_to_ambient(self):
+        """Target is cooled on source down event but not below ambient"""
+        rel = thermal_rel(
+            "Fan", "CPU", event="down", action="decrease", degrees=3, pauseAt=10
+        )
+
+        self.assertEqual([0, 22, 0, 20], self._step([0, 25, 0, 20], rel))
+        self.assertEqual([0, 20, 0, 20], self._step([0, 22, 0, 20], rel))
+
+        # source is up: no impact
+        self.assertEqual([0, 24, 1, 20], self._step([0, 24, 1, 20], rel))
+
+    def test_shared_target(self):
+        """Relationships sharing a target are applied one after another"""
+        heating = thermal_rel("PSU", "CPU", degrees=5, pauseAt=40)
+        cooling = thermal_rel("Fan", "CPU", action="decrease", degrees=2, pauseAt=0)
+
+        self.assertEqual([1, 33, 1, 20], self._step([1, 30, 1, 20], heating, cooling))
+
+    def test_inactive_source(self):
+        """Non-numeric source values do not cause thermal impact"""
+        rel = thermal_rel("PSU", "CPU", degrees=1, pauseAt=40)
+        values = self._step([np.nan, 30, 1, 20], rel)
+        self.assertEqual(30, values[1])
+
+    def test_model(self):
+        """Degrees are looked up in relationship model"""
+        rel = thermal_rel("Fan", "CPU", model={"100": 2, "500": 6}, pauseAt=60)
+        self.assertEqual([0, 36, 45, 20], self._step([0, 30, 45, 20], rel))
+
+
+if __name__ == "__main__":
+    unittest.main()
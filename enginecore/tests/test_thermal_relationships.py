@@ -0,0 +1,76 @@
+"""Unittests for the in-memory cache of server thermal relationships"""
+import json
+import unittest
+
+from enginecore.state.sensor.thermal_relationships import ThermalRelationships
+
+from fake_graph import FakeGraphRef
+
+SENSOR_RECORDS = [
+    {
+        "source": {"name": "CPU Temp"},
+        "target": {"name": "Fan1"},
+        "rel": {"event": "up", "action": "increase", "rate": 2},
+    },
+    {
+        "source": {"name": "CPU Temp"},
+        "target": {"DID": 3},
+        "rel": {"event": "down", "action": "decrease", "rate": 1},
+    },
+]
+
+CPU_RECORDS = [{"name": "CPU Temp", "rel": {"model": json.dumps({"0": 0, "100": 30})}}]
+
+
+def thermal_records(query, _):
+    """Canned thermal relationships of a server"""
+    if ":CPU" in query:
+        return CPU_RECORDS
+    if "WHERE rel.event" in query:
+        # single relationship was deleted
+        return []
+    return SENSOR_RECORDS
+
+
+class ThermalRelationshipsTests(unittest.TestCase):
+    """Tests loading & invalidation of thermal relationships"""
+
+    def setUp(self):
+        self.graph_ref = FakeGraphRef(thermal_records)
+        self.relationships = ThermalRelationships(1, graph_ref=self.graph_ref)
+
+    def test_loaded_once(self):
+        """All relationships are fetched on first access"""
+        for _ in range(3):
+            rel = self.relationships.get_sensor_rel("CPU Temp", "name", "Fan1", "up")
+            self.assertEqual(2, rel["rel"]["rate"])
+
+            rel = self.relationships.get_sensor_rel("CPU Temp", "DID", 3, "down")
+            self.assertEqual("decrease", rel["rel"]["action"])
+
+        self.assertIsNone(
+            self.relationships.get_sensor_rel("CPU Temp", "name", "Fan1", "down")
+        )
+        self.assertEqual(2, len(self.graph_ref.queries))
+
+    def test_model_parsed(self):
+        """Relationship models are compiled when loaded"""
+        model = self.relationships.get_cpu_rel("CPU Temp")["model"]
+        self.assertEqual(2, len(model))
+        self.assertEqual((100, 30), model.nearest(70))
+
+    def test_deleted(self):
+        """Reloaded relationship is dropped if it no longer exists"""
+        self.assertIsNone(
+            self.relationships.reload_sensor_rel("CPU Temp", "name", "Fan1", "up")
+        )
+        self.assertIsNone(
+            self.relationships.get_sensor_rel("CPU Temp", "name", "Fan1", "up")
+        )
+        self.assertIsNotNone(
+            self.relationships.get_sensor_rel("CPU Temp", "DID", 3, "down")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
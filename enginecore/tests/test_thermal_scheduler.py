@@ -0,0 +1,68 @@
+"""Unittests for the scheduler running thermal relationship updates"""
+import queue
+import unittest
+
+from enginecore.state.sensor.thermal_scheduler import ThermalScheduler
+
+
+class ThermalSchedulerTests(unittest.TestCase):
+    """Tests scheduling, pausing & removal of thermal updates"""
+
+    def setUp(self):
+        self.scheduler = ThermalScheduler()
+        self.runs = queue.Queue()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def _task(self, name, delays):
+        """Task reporting its runs, returns delays one by one"""
+        delays = iter(delays)
+
+        def run():
+            self.runs.put(name)
+            return next(delays, None)
+
+        return run
+
+    def test_rates(self):
+        """Updates are run at their own rates"""
+        self.scheduler.enable("sensor")
+        self.scheduler.add_job("sensor", "fast", self._task("fast", [0.01] * 4))
+        self.scheduler.add_job("sensor", "slow", self._task("slow", [10]))
+
+        runs = [self.runs.get(timeout=1) for _ in range(6)]
+        self.assertEqual(1, runs.count("slow"))
+        self.assertEqual(5, runs.count("fast"))
+
+        self.assertRaises(queue.Empty, self.runs.get, timeout=0.1)
+        self.assertEqual(1, self.scheduler.num_jobs)
+
+    def test_disabled_group(self):
+        """Jobs of disabled groups are parked until enabled"""
+        self.scheduler.add_job("sensor", "job", self._task("job", []))
+        self.assertRaises(queue.Empty, self.runs.get, timeout=0.1)
+
+        self.scheduler.enable("sensor")
+        self.assertEqual("job", self.runs.get(timeout=1))
+
+    def test_remove(self):
+        """Removed jobs are not run again"""
+        self.scheduler.enable("sensor")
+        self.scheduler.add_job("sensor", "job", self._task("job", [0.05] * 10))
+        self.runs.get(timeout=1)
+
+        self.scheduler.remove_group("sensor")
+        self.assertRaises(queue.Empty, self.runs.get, timeout=0.2)
+        self.assertFalse(self.scheduler.has_job("sensor", "job"))
+
+    def test_duplicate(self):
+        """The same relationship cannot be scheduled twice"""
+        self.scheduler.add_job("sensor", "job", self._task("job", []))
+        self.assertRaises(
+            ValueError, self.scheduler.add_job, "sensor", "job", self._task("job", [])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Unittests for the libvirt domain lifecycle monitor"""
+import queue
+import unittest
+
+try:
+    import libvirt
+    from enginecore.state.hardware.vm_lifecycle import VMLifecycleMonitor
+except ImportError:
+    libvirt = None
+
+
+@unittest.skipIf(libvirt is None, "libvirt python bindings are not installed")
+class VMLifecycleMonitorTests(unittest.TestCase):
+    """Tests lifecycle events using libvirt test driver
+    (test:///default state is shared by connections within a process)"""
+
+    uri = "test:///default"
+    domain_name = "test"
+
+    def setUp(self):
+        self.monitor = VMLifecycleMonitor(uri=self.uri)
+        self.events = queue.Queue()
+
+        self.conn = libvirt.open(self.uri)
+        self.domain = self.conn.lookupByName(self.domain_name)
+        if not self.domain.isActive():
+            self.domain.create()
+
+    def tearDown(self):
+        self.monitor.stop()
+        if not self.domain.isActive():
+            self.domain.create()
+        self.conn.close()
+
+    def test_state_changes(self):
+        """Watchers are notified when domain is stopped & started"""
+        self.monitor.watch(self.domain_name, self.events.put)
+
+        self.domain.destroy()
+        self.assertFalse(self.events.get(timeout=2))
+
+        self.domain.create()
+        self.assertTrue(self.events.get(timeout=2))
+
+    def test_unwatch(self):
+        """Domains are no longer tracked once unwatched"""
+        self.monitor.watch(self.domain_name, self.events.put)
+        self.monitor.unwatch(self.domain_name)
+
+        self.domain.destroy()
+        self.assertRaises(queue.Empty, self.events.get, timeout=0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()